@@ -44,4 +44,6 @@ pip install eip712-structs
 echo "eip712-structs installed"
 pip install moralis
 echo "moralis installed"
+pip install numpy
+echo "numpy installed"
 
@@ -107,6 +107,41 @@ contract AggregatorDataProvider is
         public
         onlyOwner()
         onlyTestnet()
+    {
+        _setRoundData(
+            roundId,
+            answer,
+            startedAt,
+            updatedAt,
+            answeredInRound
+        );
+    }
+
+    // allows to replay historical rounds with a single transaction per chunk of rounds
+    function setRoundDataBatch(ChainlinkRoundData [] calldata rounds)
+        external
+        onlyOwner()
+        onlyTestnet()
+    {
+        for(uint256 i = 0; i < rounds.length; i++) {
+            _setRoundData(
+                rounds[i].roundId,
+                rounds[i].answer,
+                rounds[i].startedAt,
+                rounds[i].updatedAt,
+                rounds[i].answeredInRound
+            );
+        }
+    }
+
+    function _setRoundData (
+        uint80 roundId,
+        int256 answer,
+        uint256 startedAt,
+        uint256 updatedAt,
+        uint80 answeredInRound
+    )
+        internal
     {
         // update max roundId if necessary
         if(roundId > _maxRoundId) {
@@ -121,6 +156,10 @@ contract AggregatorDataProvider is
             updatedAt,
             answeredInRound
         );
+
+        // same events as chainlink aggregators, allows off-chain components to watch for new rounds
+        emit NewRound(roundId, msg.sender, startedAt);
+        emit AnswerUpdated(answer, roundId, updatedAt);
     }
 
     function getRoundData(uint80 _roundId)
@@ -0,0 +1,116 @@
+// SPDX-License-Identifier: Apache-2.0
+pragma solidity 0.8.2;
+
+/**
+ * @dev stand-in for a chainlink phase aggregator, only the functions used by scripts/price_feed.py
+ */
+contract MockChainlinkAggregator {
+
+    struct RoundData {
+        int256 answer;
+        uint256 startedAt;
+        uint256 updatedAt;
+    }
+
+    mapping(uint256 /* aggregator round id */ => RoundData) private _rounds;
+    uint256 private _latestRound;
+
+    function addRoundData(int256 answer, uint256 startedAt, uint256 updatedAt) external {
+        _latestRound++;
+        _rounds[_latestRound] = RoundData(answer, startedAt, updatedAt);
+    }
+
+    function getRoundData(uint80 aggregatorRoundId)
+        external
+        view
+        returns (
+            uint80 roundId,
+            int256 answer,
+            uint256 startedAt,
+            uint256 updatedAt,
+            uint80 answeredInRound
+        )
+    {
+        RoundData memory data = _rounds[aggregatorRoundId];
+        require(data.updatedAt > 0, "No data present");
+
+        return (aggregatorRoundId, data.answer, data.startedAt, data.updatedAt, aggregatorRoundId);
+    }
+
+    function latestRound() external view returns (uint256) {
+        return _latestRound;
+    }
+
+    function version() external pure returns (uint256) {
+        return 4;
+    }
+}
+
+
+/**
+ * @dev stand-in for a chainlink price feed proxy with multiple phases
+ * round ids are composed as phaseId * 2**64 + aggregatorRoundId like in the chainlink proxy
+ */
+contract MockPriceFeedProxy {
+
+    uint256 private constant PHASE_OFFSET = 64;
+
+    mapping(uint16 /* phase id */ => MockChainlinkAggregator) private _phaseAggregators;
+    uint16 private _phaseId;
+
+    string private _description;
+    uint8 private _decimals;
+
+    constructor(string memory feedDescription, uint8 feedDecimals) {
+        _description = feedDescription;
+        _decimals = feedDecimals;
+    }
+
+    function addPhase(MockChainlinkAggregator aggregator) external {
+        _phaseId++;
+        _phaseAggregators[_phaseId] = aggregator;
+    }
+
+    function getRoundData(uint80 roundId)
+        external
+        view
+        returns (
+            uint80 id,
+            int256 answer,
+            uint256 startedAt,
+            uint256 updatedAt,
+            uint80 answeredInRound
+        )
+    {
+        uint16 phase = uint16(roundId >> PHASE_OFFSET);
+        uint64 aggregatorRoundId = uint64(roundId);
+        require(address(_phaseAggregators[phase]) != address(0), "No data present");
+
+        (, answer, startedAt, updatedAt, ) = _phaseAggregators[phase].getRoundData(aggregatorRoundId);
+        return (roundId, answer, startedAt, updatedAt, roundId);
+    }
+
+    function phaseAggregators(uint16 phase) external view returns (address) {
+        return address(_phaseAggregators[phase]);
+    }
+
+    function phaseId() external view returns (uint16) {
+        return _phaseId;
+    }
+
+    function latestRound() external view returns (uint256) {
+        return (uint256(_phaseId) << PHASE_OFFSET) | _phaseAggregators[_phaseId].latestRound();
+    }
+
+    function description() external view returns (string memory) {
+        return _description;
+    }
+
+    function decimals() external view returns (uint8) {
+        return _decimals;
+    }
+
+    function version() external pure returns (uint256) {
+        return 4;
+    }
+}
@@ -0,0 +1,48 @@
+// SPDX-License-Identifier: Apache-2.0
+pragma solidity 0.8.2;
+
+/**
+ * @dev minimal read-only variant of Multicall3 (https://github.com/mds1/multicall)
+ * the canonical Multicall3 contract is available on mainnet, goerli, polygon and mumbai
+ * at address 0xcA11bde05977b3631167028862bE2a173976CA11
+ * this contract provides the same aggregate3 signature for local ganache chains
+ */
+contract Multicall3 {
+
+    struct Call3 {
+        address target;
+        bool allowFailure;
+        bytes callData;
+    }
+
+    struct Result {
+        bool success;
+        bytes returnData;
+    }
+
+    function aggregate3(Call3 [] calldata calls)
+        external
+        view
+        returns(Result [] memory returnData)
+    {
+        uint256 length = calls.length;
+        returnData = new Result[](length);
+
+        for(uint256 i = 0; i < length; i++) {
+            Call3 calldata calli = calls[i];
+            Result memory result = returnData[i];
+
+            (result.success, result.returnData) = calli.target.staticcall(calli.callData);
+            require(calli.allowFailure || result.success, "ERROR:MC3-001:CALL_FAILED");
+        }
+    }
+
+    function getBlockNumber() external view returns(uint256 blockNumber) {
+        blockNumber = block.number;
+    }
+
+    function getCurrentBlockTimestamp() external view returns(uint256 timestamp) {
+        // solhint-disable-next-line not-rely-on-time
+        timestamp = block.timestamp;
+    }
+}
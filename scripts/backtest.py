@@ -0,0 +1,367 @@
+# vectorized backtest of the UsdcPriceDataProvider depeg logic over historical chainlink rounds
+# results are identical to scripts/price_provider_model.py when every round is processed.
+#
+# input files: round files (scripts/round_file.py), output of scripts/price_feed.py or csv files
+# like tests/data/usdc_usd_depeg_230312.csv
+# one file per feed in --data-dir, file name derived from the pair, eg USDC/USD -> usdc_usd.txt
+#
+# example command lines
+# python -m scripts.backtest --help
+# python -m scripts.backtest --data-dir data --pair USDC/USD
+# python -m scripts.backtest --data-dir data --trigger 0.995 0.99 --recovery 0.999 0.998 --window 12 24 48
+
+import argparse
+import itertools
+import os
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from scripts.price_provider_model import (
+    CHAINLINK_USDC_DECIMALS,
+    DEPEG_TRIGGER_PRICE,
+    DEPEG_RECOVERY_PRICE,
+    DEPEG_RECOVERY_WINDOW,
+    CHAINLINK_USDC_USD_DEVIATION,
+    CHAINLINK_USDC_USD_HEARTBEAT,
+    CHAINLINK_HEARTBEAT_MARGIN,
+    COMPLIANCE_INITIALIZING,
+    COMPLIANCE_VALID,
+    COMPLIANCE_FAILED_ONCE,
+    COMPLIANCE_FAILED_MULTIPLE_TIMES,
+    STABILITY_STABLE,
+    STABILITY_TRIGGERED,
+    STABILITY_DEPEGGED,
+    EVENT_UPDATE,
+    EVENT_TRIGGER,
+    EVENT_RECOVERY,
+    EVENT_DEPEG,
+)
+
+from scripts.round_file import (
+    MAGIC as ROUND_FILE_MAGIC,
+    RoundFile,
+    open_rounds,
+    rounds_from_csv,
+    rounds_from_strings,
+)
+
+PHASE_OFFSET = 2 ** 64
+NET_DEFAULT = 'mainnet'
+FILE_EXTENSION = '.txt'
+
+
+class RoundSeries(object):
+    """round data of a single feed as numpy arrays, sorted by round id.
+
+    round ids are uint80 values and are kept as (phase_id, aggregator_round_id)
+    pairs, answers and timestamps are int64 (sufficient for usd price feeds).
+    """
+
+    def __init__(self, phase_id:np.ndarray, aggregator_round_id:np.ndarray, answer:np.ndarray, updated_at:np.ndarray):
+        # rounds without data are reported as 'initializing' by the contract and do not change the state
+        if np.any(updated_at == 0):
+            mask = updated_at > 0
+            (phase_id, aggregator_round_id, answer, updated_at) = (
+                phase_id[mask], aggregator_round_id[mask], answer[mask], updated_at[mask])
+
+        if np.any(answer < 0):
+            raise ValueError('negative answers are rejected by the contract')
+
+        if np.any(np.diff(updated_at) < 0):
+            raise ValueError('updatedAt timestamps must not decrease with increasing round ids')
+
+        self.phase_id = phase_id
+        self.aggregator_round_id = aggregator_round_id
+        self.answer = answer
+        self.updated_at = updated_at
+
+
+    @classmethod
+    def from_rounds(cls, rounds:list) -> 'RoundSeries':
+        """from (roundId, answer, startedAt, updatedAt, answeredInRound) tuples"""
+        rounds = sorted(rounds, key=lambda r: r[0])
+
+        return cls(
+            np.array([r[0] // PHASE_OFFSET for r in rounds], dtype=np.uint16),
+            np.array([r[0] % PHASE_OFFSET for r in rounds], dtype=np.uint64),
+            np.array([r[1] for r in rounds], dtype=np.int64),
+            np.array([r[3] for r in rounds], dtype=np.int64))
+
+
+    @classmethod
+    def from_round_file(cls, round_file:RoundFile) -> 'RoundSeries':
+        """zero-copy views on the (memory mapped) round file columns"""
+        return cls(
+            round_file.phase_id,
+            round_file.aggregator_round_id,
+            round_file.answer,
+            round_file.updated_at_int64)
+
+
+    def __len__(self):
+        return len(self.answer)
+
+
+    def get_round_id(self, index:int) -> int:
+        return int(self.phase_id[index]) * PHASE_OFFSET + int(self.aggregator_round_id[index])
+
+
+def load_rounds(file_name:str) -> RoundSeries:
+    """reads round files, csv files with a roundId,answer,updatedAt header or whitespace separated price_feed.py output"""
+    with open(file_name, 'rb') as data_file:
+        is_round_file = data_file.read(len(ROUND_FILE_MAGIC)) == ROUND_FILE_MAGIC
+
+    if is_round_file:
+        return RoundSeries.from_round_file(open_rounds(file_name))
+
+    with open(file_name, 'r') as data_file:
+        lines = [line for line in data_file if len(line.strip()) > 0 and line[0] not in ['#', '/']]
+
+    if len(lines) > 0 and lines[0].startswith('roundId'):
+        return RoundSeries.from_rounds(rounds_from_csv(file_name))
+
+    return from_strings(lines)
+
+
+def from_strings(data:list) -> RoundSeries:
+    """converts 'roundId answer startedAt updatedAt answeredInRound [...]' strings, eg USDC_CHAINLINK_DATA"""
+    return RoundSeries.from_rounds(rounds_from_strings(data))
+
+
+def next_index(mask:np.ndarray) -> np.ndarray:
+    """for each position i the smallest j >= i with mask[j], len(mask) if there is none"""
+    n = len(mask)
+    idx = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(idx[::-1])[::-1]
+
+
+def get_compliance(
+    series:RoundSeries,
+    deviation:int=CHAINLINK_USDC_USD_DEVIATION,
+    heartbeat:int=CHAINLINK_USDC_USD_HEARTBEAT,
+    heartbeat_margin:int=CHAINLINK_HEARTBEAT_MARGIN
+) -> dict:
+    """compliance state per round plus deviation and heartbeat violation masks"""
+    n = len(series)
+
+    # previous round exists if it has the same phase and the preceding aggregator round id
+    has_prev = np.zeros(n, dtype=bool)
+    has_prev[1:] = (series.phase_id[1:] == series.phase_id[:-1]) \
+        & (series.aggregator_round_id[1:] == series.aggregator_round_id[:-1] + 1)
+
+    deviation_exceeded = np.zeros(n, dtype=bool)
+    deviation_exceeded[1:] = np.abs(series.answer[1:] - series.answer[:-1]) > deviation
+    deviation_exceeded &= has_prev
+
+    heartbeat_exceeded = np.zeros(n, dtype=bool)
+    heartbeat_exceeded[1:] = np.abs(series.updated_at[1:] - series.updated_at[:-1]) > heartbeat + heartbeat_margin
+    heartbeat_exceeded &= has_prev
+
+    valid = ~(deviation_exceeded | heartbeat_exceeded)
+    valid_prev = np.ones(n, dtype=bool)
+    valid_prev[1:] = valid[:-1]
+
+    compliance = np.where(
+        ~has_prev,
+        COMPLIANCE_INITIALIZING,
+        np.where(
+            valid,
+            COMPLIANCE_VALID,
+            np.where(valid_prev, COMPLIANCE_FAILED_ONCE, COMPLIANCE_FAILED_MULTIPLE_TIMES)))
+
+    return {
+        'compliance': compliance,
+        'deviation_exceeded': deviation_exceeded,
+        'heartbeat_exceeded': heartbeat_exceeded,
+    }
+
+
+def find_events(
+    series:RoundSeries,
+    trigger_price:int=DEPEG_TRIGGER_PRICE,
+    recovery_price:int=DEPEG_RECOVERY_PRICE,
+    recovery_window:int=DEPEG_RECOVERY_WINDOW
+) -> tuple:
+    """returns (trigger indices, recovery indices, depeg index or -1).
+
+    the candidate masks and next-candidate lookups are computed in vectorized
+    passes, the loop only jumps from event to event.
+    """
+    n = len(series)
+    next_trigger = next_index(series.answer <= trigger_price)
+    next_recovery = next_index(series.answer >= recovery_price)
+
+    triggers = []
+    recoveries = []
+    depeg = -1
+    i = 0
+
+    while i < n:
+        t = next_trigger[i]
+        if t >= n:
+            break
+
+        triggers.append(t)
+
+        # depeg check precedes the recovery check in getStability
+        k = max(int(np.searchsorted(series.updated_at, series.updated_at[t] + recovery_window, side='right')), t + 1)
+        r = next_recovery[t + 1] if t + 1 < n else n
+
+        if k < n and k <= r:
+            depeg = k
+            break
+
+        if r >= n:
+            break
+
+        recoveries.append(r)
+        i = r + 1
+
+    return (triggers, recoveries, depeg)
+
+
+def get_states(series:RoundSeries, triggers:list, recoveries:list, depeg:int) -> dict:
+    """per round stability, event type, triggered at and depegged at (as returned by processLatestPriceInfo)"""
+    n = len(series)
+    stability = np.full(n, STABILITY_STABLE)
+    event_type = np.full(n, EVENT_UPDATE)
+    triggered_at = np.zeros(n, dtype=np.int64)
+    depegged_at = np.zeros(n, dtype=np.int64)
+
+    for idx, t in enumerate(triggers):
+        end = recoveries[idx] if idx < len(recoveries) else (depeg if depeg >= 0 else n)
+        stability[t:end] = STABILITY_TRIGGERED
+        event_type[t] = EVENT_TRIGGER
+
+        # the recovery price info still carries the triggered at timestamp
+        triggered_at[t:end + 1] = series.updated_at[t]
+
+        if idx < len(recoveries):
+            event_type[end] = EVENT_RECOVERY
+
+    if depeg >= 0:
+        stability[depeg:] = STABILITY_DEPEGGED
+        event_type[depeg] = EVENT_DEPEG
+        triggered_at[depeg:] = series.updated_at[triggers[-1]]
+        depegged_at[depeg:] = series.updated_at[depeg]
+
+    return {
+        'stability': stability,
+        'event_type': event_type,
+        'triggered_at': triggered_at,
+        'depegged_at': depegged_at,
+    }
+
+
+def run(series:RoundSeries, trigger_price:int, recovery_price:int, recovery_window:int) -> dict:
+    (triggers, recoveries, depeg) = find_events(series, trigger_price, recovery_price, recovery_window)
+
+    return {
+        'trigger_price': trigger_price,
+        'recovery_price': recovery_price,
+        'recovery_window': recovery_window,
+        'triggers': len(triggers),
+        'recoveries': len(recoveries),
+        'first_triggered_at': int(series.updated_at[triggers[0]]) if len(triggers) > 0 else 0,
+        'triggered_at': int(series.updated_at[triggers[-1]]) if len(triggers) > 0 else 0,
+        'depegged_at': int(series.updated_at[depeg]) if depeg >= 0 else 0,
+        'depeg_price': int(series.answer[depeg]) if depeg >= 0 else 0,
+        'depeg_round_id': series.get_round_id(depeg) if depeg >= 0 else 0,
+    }
+
+
+# series shared with worker processes, set once per worker by the pool initializer
+_worker_series = None
+
+
+def _init_worker(series:RoundSeries):
+    global _worker_series
+    _worker_series = series
+
+
+def _run_worker(params:tuple) -> dict:
+    return run(_worker_series, *params)
+
+
+def sweep(series:RoundSeries, grid:list, workers:int=None) -> list:
+    """runs all (trigger_price, recovery_price, recovery_window) configurations of grid in parallel"""
+    if workers == 1 or len(grid) < 2:
+        return [run(series, *params) for params in grid]
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(series,)) as pool:
+        chunk_size = max(1, len(grid) // (4 * (workers or os.cpu_count() or 1)))
+        return list(pool.map(_run_worker, grid, chunksize=chunk_size))
+
+
+def get_grid(trigger_prices:list, recovery_prices:list, recovery_windows:list) -> list:
+    """all combinations with trigger price below recovery price"""
+    return [
+        (trigger, recovery, window)
+        for (trigger, recovery, window) in itertools.product(trigger_prices, recovery_prices, recovery_windows)
+        if trigger < recovery]
+
+
+def pair_to_file_name(pair:str) -> str:
+    return '{}{}'.format(pair.lower().replace('/', '_'), FILE_EXTENSION)
+
+
+def print_report(pair:str, series:RoundSeries, results:list):
+    print('# {} rounds {} from {} to {}'.format(
+        pair,
+        len(series),
+        series.updated_at[0] if len(series) > 0 else '-',
+        series.updated_at[-1] if len(series) > 0 else '-'))
+    print('# pair trigger recovery window_h triggers recoveries first_triggered_at depegged_at depeg_price')
+
+    for result in results:
+        print('{} {:.4f} {:.4f} {} {} {} {} {} {:.4f}'.format(
+            pair,
+            result['trigger_price'] / 10 ** CHAINLINK_USDC_DECIMALS,
+            result['recovery_price'] / 10 ** CHAINLINK_USDC_DECIMALS,
+            result['recovery_window'] // 3600,
+            result['triggers'],
+            result['recoveries'],
+            result['first_triggered_at'],
+            result['depegged_at'],
+            result['depeg_price'] / 10 ** CHAINLINK_USDC_DECIMALS))
+
+
+def main() -> int:
+    from scripts.price_feed import feedAddress
+
+    parser = argparse.ArgumentParser(description='backtest depeg trigger/recovery/depeg logic on chainlink price feed data.')
+    parser.add_argument('--data-dir', type=str, default='.', help='directory with one data file per pair (eg usdc_usd.txt)')
+    parser.add_argument('--net', type=str, default=NET_DEFAULT, help='net of the feeds in price_feed.feedAddress')
+    parser.add_argument('--pair', type=str, nargs='*', help='pairs to backtest (default: all feeds of net)')
+    parser.add_argument('--trigger', type=float, nargs='*', default=[DEPEG_TRIGGER_PRICE / 10 ** CHAINLINK_USDC_DECIMALS])
+    parser.add_argument('--recovery', type=float, nargs='*', default=[DEPEG_RECOVERY_PRICE / 10 ** CHAINLINK_USDC_DECIMALS])
+    parser.add_argument('--window', type=int, nargs='*', default=[DEPEG_RECOVERY_WINDOW // 3600], help='recovery window [h]')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: number of cores)')
+    args = parser.parse_args()
+
+    unit = 10 ** CHAINLINK_USDC_DECIMALS
+    grid = get_grid(
+        [int(round(price * unit)) for price in args.trigger],
+        [int(round(price * unit)) for price in args.recovery],
+        [hours * 3600 for hours in args.window])
+
+    pairs = args.pair or list(feedAddress[args.net].keys())
+
+    for pair in pairs:
+        file_name = os.path.join(args.data_dir, pair_to_file_name(pair))
+
+        if not os.path.exists(file_name):
+            print('# {} no data file {}, fetch data with scripts/price_feed.py'.format(pair, file_name))
+            continue
+
+        series = load_rounds(file_name)
+        print_report(pair, series, sweep(series, grid, args.workers))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import time
+
+from collections import deque
+
+from brownie import web3
+
+# share of the block gas limit used per transaction
+BLOCK_GAS_FRACTION = 0.5
+
+# margin on top of the estimated gas for the transaction gas limit
+GAS_LIMIT_MARGIN = 1.2
+
+# smoothing factor for the gas per element measured from receipts
+GAS_SMOOTHING = 0.3
+
+# elements of the sample slice used to estimate the gas per element
+GAS_SAMPLE_SIZE = 10
+
+INITIAL_BATCH_SIZE = 10
+MAX_BATCH_SIZE = 500
+
+
+class GasBatchSizer(object):
+    """sizes batches for contract functions taking an unbounded array (processPolicies, addDepegBalances).
+
+    the gas of a batch is modelled as base gas + n * gas per element. both are
+    estimated with estimate_gas (eth_estimateGas) on a single element and on a
+    sample slice. batch sizes are chosen to keep the estimated gas including the
+    gas limit margin below block_gas_fraction of the block gas limit. gas used
+    from receipts refines the gas per element. batches that fail are split in
+    halves until the failing elements are isolated.
+    """
+
+    def __init__(
+        self,
+        estimate_gas,
+        block_gas_fraction:float=BLOCK_GAS_FRACTION,
+        initial_batch_size:int=INITIAL_BATCH_SIZE,
+        max_batch_size:int=MAX_BATCH_SIZE,
+        sample_size:int=GAS_SAMPLE_SIZE,
+        gas_limit_margin:float=GAS_LIMIT_MARGIN,
+        block_gas_limit:int=None,
+    ):
+        self.estimate_gas = estimate_gas
+        self.block_gas_fraction = block_gas_fraction
+        self.initial_batch_size = initial_batch_size
+        self.max_batch_size = max_batch_size
+        self.sample_size = sample_size
+        self.gas_limit_margin = gas_limit_margin
+        self.block_gas_limit = block_gas_limit
+
+        self.base_gas = 0
+        self.gas_per_element = 0
+        self.batch_size = min(initial_batch_size, max_batch_size)
+
+        self.started_at = 0.0
+        self.elements = 0
+        self.transactions = 0
+        self.splits = 0
+        self.gas_used = 0
+        self.gas_cost = 0
+        self.failed = {}
+
+
+    def calibrate(self, elements:list) -> int:
+        """estimates base gas and gas per element from a sample of elements, returns the resulting batch size.
+        the batch size is left unchanged if the sample cannot be estimated (eg a reverting element).
+        """
+        sample = elements[:self.sample_size]
+
+        if len(sample) == 0:
+            return self.batch_size
+
+        try:
+            gas_single = self.estimate_gas(sample[:1])
+            gas_sample = self.estimate_gas(sample) if len(sample) > 1 else gas_single
+        except Exception:
+            return self.batch_size
+
+        if len(sample) > 1:
+            self.gas_per_element = max(1, (gas_sample - gas_single) // (len(sample) - 1))
+            self.base_gas = max(0, gas_single - self.gas_per_element)
+        else:
+            self.gas_per_element = gas_single
+            self.base_gas = 0
+
+        return self.update_batch_size()
+
+
+    def get_gas_budget(self) -> int:
+        """estimated gas available per batch, the gas limit margin is kept free"""
+        block_gas_limit = self.block_gas_limit or web3.eth.get_block('latest')['gasLimit']
+        return int(block_gas_limit * self.block_gas_fraction / self.gas_limit_margin)
+
+
+    def get_gas_limit(self, gas:int) -> int:
+        return int(gas * self.gas_limit_margin)
+
+
+    def fits(self, batch_size:int, gas:int) -> bool:
+        """True if a batch with estimated gas fits the budget, single elements always fit"""
+        return batch_size == 1 or gas <= self.get_gas_budget()
+
+
+    def update_batch_size(self) -> int:
+        if self.gas_per_element == 0:
+            self.batch_size = min(self.initial_batch_size, self.max_batch_size)
+        else:
+            batch_size = (self.get_gas_budget() - self.base_gas) // self.gas_per_element
+            self.batch_size = max(1, min(self.max_batch_size, batch_size))
+
+        return self.batch_size
+
+
+    def record(self, batch_size:int, gas_used:int, gas_price:int=0) -> int:
+        """adds the receipt of a successful batch to the report and refines the gas per element"""
+        self.started_at = self.started_at or time.time()
+        self.elements += batch_size
+        self.transactions += 1
+        self.gas_used += gas_used
+        self.gas_cost += gas_used * (gas_price or 0)
+
+        gas_per_element = max(1, (gas_used - self.base_gas) // batch_size)
+
+        if self.gas_per_element == 0:
+            self.gas_per_element = gas_per_element
+        else:
+            self.gas_per_element = int(
+                GAS_SMOOTHING * gas_per_element
+                + (1 - GAS_SMOOTHING) * self.gas_per_element)
+
+        return self.update_batch_size()
+
+
+    def split(self, batch:list) -> tuple:
+        """halves of a failed batch, caps the batch size until new gas measurements arrive"""
+        half = len(batch) // 2
+        self.splits += 1
+        self.batch_size = max(1, min(self.batch_size, half))
+
+        return (batch[:half], batch[half:])
+
+
+    def send_all(self, elements:list, send) -> list:
+        """sends all elements in batches with send(batch, gas_limit) and returns the transactions.
+        batches failing gas estimation or the transaction itself are split, elements failing
+        as single element batches are recorded in failed (element index -> reason).
+        send is expected to wait for the receipt and to raise if the transaction reverts.
+        """
+        self.started_at = self.started_at or time.time()
+
+        if self.gas_per_element == 0:
+            self.calibrate(elements)
+
+        queue = deque(enumerate(elements))
+        transactions = []
+
+        while len(queue) > 0:
+            batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+            chunk = [element for (_, element) in batch]
+
+            try:
+                gas = self.estimate_gas(chunk)
+
+                if not self.fits(len(chunk), gas):
+                    raise RuntimeError('gas budget exceeded: {} > {}'.format(gas, self.get_gas_budget()))
+
+                tx = send(chunk, self.get_gas_limit(gas))
+
+            except Exception as ex:
+                if len(batch) == 1:
+                    self.failed[batch[0][0]] = repr(ex)
+                    continue
+
+                (first, second) = self.split(batch)
+                queue.extendleft(reversed(second))
+                queue.extendleft(reversed(first))
+                continue
+
+            self.record(len(chunk), tx.gas_used, getattr(tx, 'gas_price', 0))
+            transactions.append(tx)
+
+        return transactions
+
+
+    def get_report(self) -> dict:
+        elapsed = time.time() - self.started_at if self.started_at > 0 else 0.0
+
+        return {
+            'elements': self.elements,
+            'transactions': self.transactions,
+            'failed': len(self.failed),
+            'splits': self.splits,
+            'batch_size': self.batch_size,
+            'base_gas': self.base_gas,
+            'gas_per_element': self.gas_per_element,
+            'gas_used': self.gas_used,
+            'gas_cost': self.gas_cost,
+            'elapsed': elapsed,
+            'elements_per_minute': 60 * self.elements / elapsed if elapsed > 0 else 0.0,
+            'gas_per_transaction': self.gas_used // self.transactions if self.transactions > 0 else 0,
+        }
@@ -0,0 +1,114 @@
+import argparse
+import random
+import time
+
+from scripts.quote import (
+    BUNDLE_STATE_ACTIVE,
+    BundleMatchIndex,
+    bundle_fits,
+)
+
+DAY = 24 * 3600
+NOW = 1680000000
+
+BUNDLES_DEFAULT = 10000
+QUERIES_DEFAULT = 2000
+UPDATES_DEFAULT = 10000
+
+
+def get_bundles(count:int, seed:int=42) -> list:
+    """synthetic bundles with parameter ranges as accepted by DepegRiskpool.createBundle"""
+    rng = random.Random(seed)
+    tf = 10 ** 6
+    bundles = []
+
+    for bundle_id in range(1, count + 1):
+        min_sum_insured = rng.choice([2000, 5000, 10000, 25000]) * tf
+        min_duration = rng.choice([14, 30, 45, 60]) * DAY
+        capital = rng.randint(10000, 500000) * tf
+
+        bundles.append({
+            'bundleId': bundle_id,
+            'state': BUNDLE_STATE_ACTIVE,
+            'lifetime': rng.choice([30, 90, 180]) * DAY,
+            'minSumInsured': min_sum_insured,
+            'maxSumInsured': min_sum_insured + rng.choice([5000, 20000, 100000]) * tf,
+            'minDuration': min_duration,
+            'maxDuration': min(120 * DAY, min_duration + rng.choice([14, 30, 60]) * DAY),
+            'annualPercentageReturn': rng.randint(1, 200) * 1000,
+            'capital': capital,
+            'lockedCapital': rng.randint(0, capital),
+            'createdAt': NOW - rng.randint(0, 150) * DAY,
+        })
+
+    # active bundle list order
+    return sorted(bundles, key=lambda bundle: bundle['annualPercentageReturn'])
+
+
+def get_queries(count:int, seed:int=7) -> list:
+    rng = random.Random(seed)
+    tf = 10 ** 6
+
+    return [
+        (rng.randint(2000, 150000) * tf, rng.randint(14, 120) * DAY)
+        for _ in range(count)]
+
+
+def find_linear(bundles:list, sum_insured:int, duration:int, now:int) -> dict:
+    for bundle in bundles:
+        if bundle_fits(bundle, sum_insured, duration, now):
+            return bundle
+
+    return None
+
+
+# usage:
+# python -m scripts.benchmark_bundle_match
+# python -m scripts.benchmark_bundle_match --bundles 100000 --queries 1000
+def main() -> int:
+    parser = argparse.ArgumentParser(description='benchmark bundle matching: linear scan vs bundle match index.')
+    parser.add_argument('--bundles', type=int, default=BUNDLES_DEFAULT, help='number of synthetic bundles')
+    parser.add_argument('--queries', type=int, default=QUERIES_DEFAULT, help='number of (sum insured, duration) queries')
+    parser.add_argument('--updates', type=int, default=UPDATES_DEFAULT, help='number of capital updates')
+    args = parser.parse_args()
+
+    bundles = get_bundles(args.bundles)
+    queries = get_queries(args.queries)
+
+    start = time.perf_counter()
+    index = BundleMatchIndex(bundles)
+    index.find(0, 0, NOW)
+    time_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results_linear = [find_linear(bundles, sum_insured, duration, NOW) for (sum_insured, duration) in queries]
+    time_linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results_index = [index.find(sum_insured, duration, NOW) for (sum_insured, duration) in queries]
+    time_index = time.perf_counter() - start
+
+    assert results_index == results_linear
+
+    # capital changes (collateralize/fund) of random bundles
+    rng = random.Random(1)
+    start = time.perf_counter()
+
+    for _ in range(args.updates):
+        bundle = dict(rng.choice(bundles))
+        bundle['lockedCapital'] = rng.randint(0, bundle['capital'])
+        index.upsert(bundle)
+
+    time_updates = time.perf_counter() - start
+    matches = len([result for result in results_index if result])
+
+    print('bundles {} queries {} matches {} build {:.3f}s'.format(len(bundles), len(queries), matches, time_build))
+    print('linear {:.3f}s ({:.1f} us/query)'.format(time_linear, 10**6 * time_linear / len(queries)))
+    print('index  {:.3f}s ({:.1f} us/query) speedup {:.1f}x'.format(time_index, 10**6 * time_index / len(queries), time_linear / time_index))
+    print('updates {} {:.3f}s ({:.1f} us/update)'.format(args.updates, time_updates, 10**6 * time_updates / max(1, args.updates)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
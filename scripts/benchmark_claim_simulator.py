@@ -0,0 +1,72 @@
+import argparse
+import random
+import time
+
+from scripts.claim_simulator import (
+    ClaimSimulator,
+    calculate_claim_amount,
+)
+
+POLICIES_DEFAULT = 100000
+WALLETS_DEFAULT = 60000
+BUNDLES_DEFAULT = 200
+
+TARGET_PRICE = 10 ** 8
+DEPEG_PRICE = 91 * 10 ** 6
+SUM_INSURED_PERCENTAGE = 20
+DEPEG_BLOCK = 17000000
+
+
+def get_inputs(policies:int, wallets:int, bundles:int, seed:int=42) -> tuple:
+    """synthetic open claims, wallets with several policies and depeg balances below the protected balance"""
+    rng = random.Random(seed)
+    tf = 10 ** 6
+
+    addresses = ['0x{:040x}'.format(rng.getrandbits(160)) for _ in range(wallets)]
+    depeg_balances = {
+        address: (rng.randint(0, 200000) * tf, DEPEG_BLOCK)
+        for address in addresses}
+
+    open_claims = []
+    for idx in range(policies):
+        protected_balance = rng.randint(2000, 100000) * tf
+        open_claims.append((
+            '0x{:064x}'.format(idx + 1),
+            rng.choice(addresses),
+            protected_balance,
+            calculate_claim_amount(protected_balance, TARGET_PRICE, DEPEG_PRICE, SUM_INSURED_PERCENTAGE),
+            rng.randint(1, bundles)))
+
+    return (open_claims, depeg_balances)
+
+
+# usage:
+# python -m scripts.benchmark_claim_simulator
+# python -m scripts.benchmark_claim_simulator --policies 500000 --wallets 100000
+def main() -> int:
+    parser = argparse.ArgumentParser(description='benchmark claim simulation of open depeg claims.')
+    parser.add_argument('--policies', type=int, default=POLICIES_DEFAULT, help='number of open claims')
+    parser.add_argument('--wallets', type=int, default=WALLETS_DEFAULT, help='number of protected wallets')
+    parser.add_argument('--bundles', type=int, default=BUNDLES_DEFAULT, help='number of bundles')
+    args = parser.parse_args()
+
+    (open_claims, depeg_balances) = get_inputs(args.policies, args.wallets, args.bundles)
+    simulator = ClaimSimulator(TARGET_PRICE, DEPEG_PRICE, SUM_INSURED_PERCENTAGE, depeg_balances)
+
+    start = time.perf_counter()
+    simulation = simulator.simulate(open_claims)
+    time_simulation = time.perf_counter() - start
+
+    print('policies {} wallets {} bundles {}'.format(len(open_claims), len(depeg_balances), len(simulation['bundles'])))
+    print('reductions A {} B {} errors {} payout total {}'.format(
+        simulation['protectedAmountReductions'],
+        simulation['processedAmountReductions'],
+        simulation['errors'],
+        simulation['payoutAmount']))
+    print('simulation {:.3f}s ({:.2f} us/policy)'.format(time_simulation, 10**6 * time_simulation / max(1, len(open_claims))))
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+import time
+
+from brownie import (
+    accounts,
+    web3,
+    UsdcPriceDataProvider,
+    USD1,
+)
+
+from scripts.price_data import (
+    INJECT_CHUNK_SIZE,
+    inject_data_batch,
+)
+
+from scripts.round_file import rounds_from_csv
+
+DEPEG_DATA_230312 = './tests/data/usdc_usd_depeg_230312.csv'
+
+# compares per round setRoundData with chunked setRoundDataBatch injection
+# of the historical usdc depeg rounds on a fresh price data provider per run
+#
+# usage (testnets only):
+# brownie run scripts/benchmark_injection.py main --network=ganache
+# brownie run scripts/benchmark_injection.py main ./tests/data/usdc_usd_depeg_230312.csv 100 --network=ganache
+def main(csv_file_name=DEPEG_DATA_230312, chunk_size=INJECT_CHUNK_SIZE):
+    chunk_size = int(chunk_size)
+    owner = accounts[0]
+    token = USD1.deploy({'from': owner})
+    rounds = rounds_from_csv(csv_file_name)
+
+    print('chain_id {} rounds {} chunk_size {}'.format(web3.chain_id, len(rounds), chunk_size))
+    print('mode transactions gas time_s rounds_per_s')
+
+    # per round injection
+    feeder = UsdcPriceDataProvider.deploy(token, {'from': owner})
+    start = time.time()
+    gas_used = 0
+
+    for round_data in rounds:
+        tx = feeder.setRoundData(*round_data, {'from': owner})
+        gas_used += tx.gas_used
+
+    print_result('per_round', len(rounds), len(rounds), gas_used, time.time() - start)
+    latest_round_data = feeder.latestRoundData()
+
+    # batched injection
+    feeder = UsdcPriceDataProvider.deploy(token, {'from': owner})
+    block_number = web3.eth.block_number
+    start = time.time()
+    transactions = inject_data_batch(feeder, rounds, owner, chunk_size)
+    elapsed = time.time() - start
+
+    gas_used = sum([
+        web3.eth.get_block(block)['gasUsed']
+        for block in range(block_number + 1, web3.eth.block_number + 1)])
+
+    print_result('batch', len(rounds), transactions, gas_used, elapsed)
+    assert feeder.latestRoundData() == latest_round_data
+
+
+def print_result(mode, rounds, transactions, gas_used, elapsed):
+    print('{} {} {} {:.2f} {:.1f}'.format(
+        mode,
+        transactions,
+        gas_used,
+        elapsed,
+        rounds / elapsed if elapsed > 0 else 0.0))
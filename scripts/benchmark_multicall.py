@@ -0,0 +1,74 @@
+import time
+
+from brownie import (
+    web3,
+    DepegProduct,
+    DepegRiskpool,
+)
+
+from scripts.deploy_depeg import (
+    get_instance,
+    get_riskpool,
+)
+
+from scripts.multicall import (
+    Multicall,
+    CHUNK_SIZE_DEFAULT,
+)
+
+from scripts.util import contract_from_address
+
+BUNDLE_COUNTS = [10, 100, 1000]
+
+# usage (against an existing deployment):
+# brownie run scripts/benchmark_multicall.py main <product_address> --network=<network>
+# brownie run scripts/benchmark_multicall.py main <product_address> <multicall_address> 200 --network=ganache
+def main(product_address, multicall_address=None, chunk_size=CHUNK_SIZE_DEFAULT):
+    product = contract_from_address(DepegProduct, product_address)
+    (instance_service, instance_operator, treasury, instance_registry) = get_instance(product)
+    riskpool = get_riskpool(product, instance_service)
+
+    bundles = riskpool.bundles()
+    if bundles == 0:
+        print('riskpool {} has no bundles, nothing to benchmark'.format(riskpool))
+        return
+
+    bundle_ids = [riskpool.getBundleId(idx) for idx in range(bundles)]
+    print('chain_id {} riskpool {} bundles {} chunk_size {}'.format(web3.chain_id, riskpool, bundles, chunk_size))
+    print('bundles round_trips_seq round_trips_mc time_seq time_mc speedup')
+
+    for count in BUNDLE_COUNTS:
+        # bundles are repeated if the riskpool has less than count bundles
+        indices = [idx % bundles for idx in range(count)]
+        ids = [bundle_ids[idx] for idx in indices]
+
+        (time_seq, trips_seq) = benchmark_sequential(riskpool, indices, ids)
+        (time_mc, trips_mc) = benchmark_multicall(riskpool, indices, ids, multicall_address, int(chunk_size))
+
+        print('{} {} {} {:.3f} {:.3f} {:.1f}'.format(
+            count,
+            trips_seq,
+            trips_mc,
+            time_seq,
+            time_mc,
+            time_seq / time_mc if time_mc > 0 else 0))
+
+
+def benchmark_sequential(riskpool: DepegRiskpool, indices, ids):
+    start = time.perf_counter()
+
+    for idx, bundle_id in zip(indices, ids):
+        riskpool.getBundleId(idx)
+        riskpool.getBundleInfo(bundle_id).dict()
+
+    return (time.perf_counter() - start, 2 * len(ids))
+
+
+def benchmark_multicall(riskpool: DepegRiskpool, indices, ids, multicall_address, chunk_size):
+    multicall = Multicall(multicall_address, chunk_size)
+    start = time.perf_counter()
+
+    multicall.map(riskpool.getBundleId, indices)
+    [info.dict() for info in multicall.map(riskpool.getBundleInfo, ids)]
+
+    return (time.perf_counter() - start, multicall.round_trips)
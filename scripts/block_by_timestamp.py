@@ -1,76 +1,208 @@
-# source
-# https://github.com/ethereum/web3.py/issues/1872 
+# resolves the last block with block.timestamp <= a given timestamp.
+# interpolation search on block timestamps with a bisection fallback, every
+# fetched (block, timestamp) pair is kept in a sparse index that is persisted
+# per chain, lookups inside an already resolved gap need no rpc calls at all.
+#
+# usage (eg to find the depegged block for setDepeggedBlockNumber):
+# brownie run scripts/block_by_timestamp.py main 1678583975 --network=mainnet
 
-# from web3.middleware import geth_poa_middleware
-# from datetime import datetime
-# from web3 import Web3
-# import config
+import json
+import os
 
-# web3 = Web3(Web3.HTTPProvider(config.rpc_url))
-# web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+from bisect import bisect_right
 
-from datetime import datetime
 from brownie import web3
 
-def getLatestBlockTimestamp():
-    latestBlock = web3.eth.get_block('latest')
-    latestBlockTimestamp = latestBlock.timestamp
+from scripts.util import to_hex
 
-    return latestBlockTimestamp
+INDEX_DIRECTORY_DEFAULT = os.path.join('build', 'block_index')
 
-def getAverageBlockTime():
-    currentBlock = web3.eth.get_block('latest')
-    thenBlock = web3.eth.get_block(web3.eth.block_number - 500)
+# blocks this close to the highest known block may still be reorged
+# and are not written to the index file
+CONFIRMATIONS = 64
 
-    return float((currentBlock.timestamp - thenBlock.timestamp) / 500.0)
 
+class BlockIndex(object):
+    """sparse (block number -> timestamp) index.
 
-def estimateBlockNrByTimestamp(timestamp):
-    latestBlockTimestamp = getLatestBlockTimestamp()
-    average_time = latestBlockTimestamp - timestamp
-    if average_time < 0: raise ValueError('timestamp given by you exceed current block timestamp!')
-    average_block = average_time / getAverageBlockTime()
+    block timestamps are non-decreasing in the block number, so the index is
+    sorted by both. the index file records the genesis block hash, an index
+    written for a different chain (eg a restarted ganache) is discarded.
+    """
 
-    return int(web3.eth.blockNumber - average_block)
+    def __init__(self, file_name:str=None, genesis_hash:str=None):
+        self.file_name = file_name
+        self.genesis_hash = genesis_hash
+        self.block_numbers = []
+        self.timestamps = []
+        self.modified = False
 
+        if file_name and os.path.exists(file_name):
+            with open(file_name, 'r') as index_file:
+                data = json.load(index_file)
 
-def getBlockNrForTimestamp(timestamp):
-    block_nr = estimateBlockNrByTimestamp(timestamp)
+            if genesis_hash is None or data.get('genesis') == genesis_hash:
+                for (block_number, timestamp) in data['blocks']:
+                    self.add(block_number, timestamp)
 
-    timestamp_found = web3.eth.get_block(block_nr)['timestamp'] 
-    if timestamp_found == timestamp:
-        print('{} MATCH'.format(block_nr))
-        return block_nr
+                self.modified = False
 
-    average_block_time = getAverageBlockTime()
-    delta_blocks = getDeltaBlocks(timestamp_found, timestamp, average_block_time)
 
-    while abs(delta_blocks) > 0:
-        block_nr += delta_blocks
-        timestamp_found = web3.eth.get_block(block_nr)['timestamp']
+    def __len__(self) -> int:
+        return len(self.block_numbers)
 
-        if timestamp_found == timestamp:
-            print('{} MATCH'.format(block_nr))
-            return block_nr
 
-        dt = datetime.fromtimestamp(timestamp_found)
-        delta_blocks = getDeltaBlocks(timestamp_found, timestamp, average_block_time)
-        print('{} CHECKING {} ({}) target {} next delta {}'.format(
-            block_nr,
-            timestamp_found,
-            dt.strftime('%b-%d-%Y %I:%M:%S %p %Z'),
-            timestamp,
-            delta_blocks))
+    def add(self, block_number:int, timestamp:int):
+        idx = bisect_right(self.block_numbers, block_number)
 
-def getDeltaBlocks(timestamp_found, timestamp_target, average_block_time):
-    return int(-(timestamp_found - timestamp_target)/average_block_time)
+        if idx > 0 and self.block_numbers[idx - 1] == block_number:
+            return
 
+        self.block_numbers.insert(idx, block_number)
+        self.timestamps.insert(idx, timestamp)
+        self.modified = True
 
-hours_24_ago = datetime.utcnow().timestamp() - 24 * 60 * 60
-print(hours_24_ago) #1644892963.530618
 
-block_24_ago = estimateBlockNrByTimestamp(hours_24_ago)
-print(block_24_ago) # Block: 15265950
+    def get_bounds(self, timestamp:int) -> tuple:
+        """returns (lower, upper) (block_number, timestamp) pairs around timestamp.
+        lower is the last known block with timestamp <= timestamp, upper the first known
+        block after it, either is None if the index holds no such block.
+        """
+        idx = bisect_right(self.timestamps, timestamp)
+        lower = (self.block_numbers[idx - 1], self.timestamps[idx - 1]) if idx > 0 else None
+        upper = (self.block_numbers[idx], self.timestamps[idx]) if idx < len(self) else None
 
-blockInfo = web3.eth.get_block(block_24_ago)
-print(blockInfo.timestamp) #1644893303
\ No newline at end of file
+        return (lower, upper)
+
+
+    def save(self):
+        if not self.file_name or not self.modified:
+            return
+
+        # recent blocks stay in memory only
+        max_block_number = self.block_numbers[-1] - CONFIRMATIONS if len(self) > 0 else 0
+        blocks = [
+            [block_number, timestamp]
+            for (block_number, timestamp) in zip(self.block_numbers, self.timestamps)
+            if block_number <= max_block_number]
+
+        directory = os.path.dirname(self.file_name)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # atomic replace, concurrent readers never see a partial file
+        with open(self.file_name + '.tmp', 'w') as index_file:
+            json.dump({'genesis': self.genesis_hash, 'blocks': blocks}, index_file)
+
+        os.replace(self.file_name + '.tmp', self.file_name)
+        self.modified = False
+
+
+class BlockResolver(object):
+    """finds the last block with block.timestamp <= timestamp.
+
+    each step interpolates the block number between the current bounds, a step
+    that does not halve the search range is followed by a bisection step.
+    this keeps the number of get_block calls close to log log n for regular
+    block times and bounded by 2 log n otherwise.
+    """
+
+    def __init__(self, w3=web3, index_file:str=None, use_index_file:bool=True):
+        self.web3 = w3
+        self.rpc_calls = 0
+
+        genesis = self._get_block(0)
+
+        if use_index_file and index_file is None:
+            index_file = os.path.join(INDEX_DIRECTORY_DEFAULT, '{}.json'.format(w3.chain_id))
+
+        self.index = BlockIndex(
+            index_file if use_index_file else None,
+            to_hex(genesis['hash']))
+
+        self.index.add(0, genesis['timestamp'])
+
+
+    def get_block_number(self, timestamp:int) -> int:
+        timestamp = int(timestamp)
+        (lower, upper) = self.index.get_bounds(timestamp)
+
+        if lower is None:
+            raise ValueError('timestamp {} before genesis block timestamp {}'.format(
+                timestamp, self.index.timestamps[0]))
+
+        if upper is None:
+            latest = self._get_block('latest')
+            self.index.add(latest['number'], latest['timestamp'])
+
+            if latest['timestamp'] <= timestamp:
+                self.index.save()
+                return latest['number']
+
+            (lower, upper) = self.index.get_bounds(timestamp)
+
+        ((lo, lo_timestamp), (hi, hi_timestamp)) = (lower, upper)
+        bisect_next = False
+
+        while hi - lo > 1:
+            if bisect_next:
+                block_number = (lo + hi) // 2
+            else:
+                block_number = lo + (timestamp - lo_timestamp) * (hi - lo) // (hi_timestamp - lo_timestamp)
+                block_number = min(max(block_number, lo + 1), hi - 1)
+
+            range_before = hi - lo
+            block_timestamp = self.get_timestamp(block_number)
+
+            if block_timestamp <= timestamp:
+                (lo, lo_timestamp) = (block_number, block_timestamp)
+            else:
+                (hi, hi_timestamp) = (block_number, block_timestamp)
+
+            bisect_next = not bisect_next and 2 * (hi - lo) > range_before
+
+        self.index.save()
+        return lo
+
+
+    def get_timestamp(self, block_number:int) -> int:
+        idx = bisect_right(self.index.block_numbers, block_number)
+
+        if idx > 0 and self.index.block_numbers[idx - 1] == block_number:
+            return self.index.timestamps[idx - 1]
+
+        timestamp = self._get_block(block_number)['timestamp']
+        self.index.add(block_number, timestamp)
+
+        return timestamp
+
+
+    def _get_block(self, block_identifier):
+        self.rpc_calls += 1
+        return self.web3.eth.get_block(block_identifier)
+
+
+resolvers = {}
+
+def getBlockNrForTimestamp(timestamp:int, indexFile:str=None) -> int:
+    """last block with block.timestamp <= timestamp (resolvers and their index are kept per chain)"""
+    key = (web3.chain_id, indexFile)
+
+    if key not in resolvers:
+        resolvers[key] = BlockResolver(web3, indexFile)
+
+    return resolvers[key].get_block_number(timestamp)
+
+
+def main(timestamp, index_file=None):
+    resolver = BlockResolver(web3, index_file)
+    block_number = resolver.get_block_number(int(timestamp))
+    block = web3.eth.get_block(block_number)
+
+    print('chain_id {} timestamp {} block {} block timestamp {} rpc calls {} index size {}'.format(
+        web3.chain_id,
+        timestamp,
+        block_number,
+        block['timestamp'],
+        resolver.rpc_calls,
+        len(resolver.index)))
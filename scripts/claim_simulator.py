@@ -0,0 +1,266 @@
+# claim simulator: expected payouts of the open depeg claims before processPolicies is sent.
+# replicates DepegProduct.processPolicy in python: protected balance from the application data
+# (getProtectedBalance), case A and case B over-insurance reductions against the depeg balance
+# of the protected wallet, _processedBalance accumulation in processing order and the payout
+# cap by calculateClaimAmount. all chain reads are batched with multicall and pinned to a single block.
+#
+# brownie run scripts/claim_simulator.py main <product address> --network=<network>
+# brownie run scripts/claim_simulator.py main <product address> simulation.json --network=<network>
+
+import json
+import time
+
+from brownie import web3
+
+from scripts.multicall import Multicall
+from scripts.portfolio_export import decode_application_data
+
+# DepegProduct.CLAIM_ID
+CLAIM_ID = 0
+
+# processPolicy require statements, a failing policy reverts and leaves processed balances untouched
+ERROR_DEPEG_BALANCE_MISSING = 'ERROR:DP-043:DEPEG_BALANCE_MISSING'
+ERROR_DEPEG_BALANCE_ZERO = 'ERROR:DP-044:DEPEG_BALANCE_ZERO'
+ERROR_BALANCE_PROCESSED_ALREADY = 'ERROR:DP-045:PROTECTED_BALANCE_PROCESSED_ALREADY'
+
+# depeg balance lowered after policies of the wallet were processed (arithmetic underflow)
+ERROR_BALANCE_UNDERFLOW = 'ERROR:DEPEG_BALANCE_BELOW_PROCESSED_BALANCE'
+
+
+def calculate_claim_amount(token_amount:int, target_price:int, depeg_price:int, sum_insured_percentage:int) -> int:
+    """DepegProduct.calculateClaimAmount"""
+    depeg_price = get_capped_depeg_price(target_price, depeg_price, sum_insured_percentage)
+    return (token_amount * (target_price - depeg_price)) // target_price
+
+
+def get_capped_depeg_price(target_price:int, depeg_price:int, sum_insured_percentage:int) -> int:
+    """depeg price raised to DepegRiskpool.getProtectedMinDepegPrice if it is below (depegPriceIsBelowProtectedDepegPrice)"""
+    if 100 * depeg_price < target_price * (100 - sum_insured_percentage):
+        return (target_price * (100 - sum_insured_percentage)) // 100
+
+    return depeg_price
+
+
+class ClaimSimulator(object):
+    """replays processPolicy for a list of open claims in processing order.
+
+    policies are (processId, wallet, protectedBalance, claimAmount, bundleId) tuples,
+    depeg balances map lower case wallet addresses to (balance, blockNumber) and
+    processed balances to the already processed amounts (getProcessedBalance).
+    """
+
+    def __init__(
+        self,
+        target_price:int,
+        depeg_price:int,
+        sum_insured_percentage:int,
+        depeg_balances:dict,
+        processed_balances:dict=None,
+    ):
+        self.target_price = target_price
+        self.depeg_price = depeg_price
+        self.sum_insured_percentage = sum_insured_percentage
+        self.depeg_balances = depeg_balances
+        self.processed_balances = processed_balances or {}
+
+        # calculateClaimAmount(amount) == amount * price_delta // target_price
+        self.price_delta = target_price - get_capped_depeg_price(target_price, depeg_price, sum_insured_percentage)
+
+
+    def simulate(self, policies:list) -> dict:
+        """expected payouts per policy and per bundle, total liquidity needed and processed balances afterwards"""
+        started_at = time.perf_counter()
+
+        target_price = self.target_price
+        price_delta = self.price_delta
+        depeg_balances = self.depeg_balances
+        processed = dict(self.processed_balances)
+
+        results = []
+        bundles = {}
+        total_payout = 0
+        reductions_a = 0
+        reductions_b = 0
+        errors = 0
+
+        for (process_id, wallet, protected_balance, claim_amount, bundle_id) in policies:
+            wallet_key = wallet.lower()
+            (depeg_balance, block_number) = depeg_balances.get(wallet_key, (0, 0))
+            protected_amount = protected_balance
+            reduction_a = False
+            reduction_b = False
+            error = None
+
+            if block_number == 0:
+                error = ERROR_DEPEG_BALANCE_MISSING
+            elif depeg_balance == 0:
+                error = ERROR_DEPEG_BALANCE_ZERO
+            else:
+                # case A: single policy covers more than the depeg balance
+                if depeg_balance < protected_amount:
+                    protected_amount = depeg_balance
+                    reduction_a = True
+
+                # case B: policies of the same wallet sum up to more than the depeg balance
+                processed_balance = processed.get(wallet_key, 0)
+                amount_left = depeg_balance - processed_balance
+
+                if amount_left < 0:
+                    error = ERROR_BALANCE_UNDERFLOW
+                elif amount_left == 0:
+                    error = ERROR_BALANCE_PROCESSED_ALREADY
+                elif amount_left < protected_amount:
+                    protected_amount = amount_left
+                    reduction_b = True
+
+            if error:
+                errors += 1
+                results.append({
+                    'processId': process_id,
+                    'wallet': wallet,
+                    'bundleId': bundle_id,
+                    'protectedBalance': protected_balance,
+                    'protectedAmount': 0,
+                    'claimAmount': claim_amount,
+                    'payoutAmount': 0,
+                    'protectedAmountReduction': False,
+                    'processedAmountReduction': False,
+                    'error': error,
+                })
+                continue
+
+            processed[wallet_key] = processed_balance + protected_amount
+
+            payout_amount = (protected_amount * price_delta) // target_price
+            if claim_amount < payout_amount:
+                payout_amount = claim_amount
+
+            total_payout += payout_amount
+            reductions_a += reduction_a
+            reductions_b += reduction_b
+
+            bundle = bundles.get(bundle_id)
+            if bundle is None:
+                bundle = bundles[bundle_id] = {'policies': 0, 'claimAmount': 0, 'payoutAmount': 0}
+
+            bundle['policies'] += 1
+            bundle['claimAmount'] += claim_amount
+            bundle['payoutAmount'] += payout_amount
+
+            results.append({
+                'processId': process_id,
+                'wallet': wallet,
+                'bundleId': bundle_id,
+                'protectedBalance': protected_balance,
+                'protectedAmount': protected_amount,
+                'claimAmount': claim_amount,
+                'payoutAmount': payout_amount,
+                'protectedAmountReduction': reduction_a,
+                'processedAmountReduction': reduction_b,
+                'error': None,
+            })
+
+        return {
+            'policies': results,
+            'bundles': bundles,
+            'payoutAmount': total_payout,
+            'protectedAmountReductions': reductions_a,
+            'processedAmountReductions': reductions_b,
+            'errors': errors,
+            'processedBalances': processed,
+            'elapsed': time.perf_counter() - started_at,
+        }
+
+
+def get_open_claims(product, instance_service, multicall:Multicall, block_number:int) -> list:
+    """(processId, wallet, protectedBalance, claimAmount, bundleId) for policiesToProcess() in getPolicyToProcess order"""
+    count = product.policiesToProcess(block_identifier=block_number)
+    policies = multicall.map(product.getPolicyToProcess, list(range(count)), block_identifier=block_number)
+    process_ids = [process_id for (process_id, _) in policies]
+
+    applications = multicall.map(instance_service.getApplication, process_ids, block_identifier=block_number)
+    claims = multicall.map(
+        instance_service.getClaim,
+        [(process_id, CLAIM_ID) for process_id in process_ids],
+        block_identifier=block_number)
+
+    open_claims = []
+
+    for ((process_id, wallet), application, claim) in zip(policies, applications, claims):
+        data = decode_application_data(application.dict()['data'])
+        open_claims.append((
+            str(process_id),
+            str(wallet),
+            data['protectedBalance'],
+            claim.dict()['claimAmount'],
+            data['bundleId']))
+
+    return open_claims
+
+
+def get_claim_simulator(product, riskpool, wallets:list, multicall:Multicall, block_number:int) -> ClaimSimulator:
+    """simulator with prices, depeg balances and processed balances of the wallets read at block_number"""
+    unique_wallets = list({wallet.lower(): wallet for wallet in wallets}.values())
+    depeg_balances = multicall.map(product.getDepegBalance, unique_wallets, block_identifier=block_number)
+    processed_balances = multicall.map(product.getProcessedBalance, unique_wallets, block_identifier=block_number)
+
+    (target_price, depeg_price_info, sum_insured_percentage) = multicall.call([
+        (product.getTargetPrice, ()),
+        (product.getDepegPriceInfo, ()),
+        (riskpool.getSumInsuredPercentage, ())],
+        block_identifier=block_number)
+
+    return ClaimSimulator(
+        target_price,
+        depeg_price_info.dict()['price'],
+        sum_insured_percentage,
+        {
+            wallet.lower(): (depeg_balance.dict()['balance'], depeg_balance.dict()['blockNumber'])
+            for (wallet, depeg_balance) in zip(unique_wallets, depeg_balances)},
+        {
+            wallet.lower(): processed_balance
+            for (wallet, processed_balance) in zip(unique_wallets, processed_balances)})
+
+
+def simulate_open_claims(product, riskpool, instance_service, multicall:Multicall=None, block_number:int=None) -> dict:
+    """reads all open claims and the state used by processPolicy at a single block and simulates processing them in order"""
+    multicall = multicall or Multicall()
+    block_number = block_number or web3.eth.block_number
+
+    policies = get_open_claims(product, instance_service, multicall, block_number)
+    simulator = get_claim_simulator(product, riskpool, [wallet for (_, wallet, _, _, _) in policies], multicall, block_number)
+
+    simulation = simulator.simulate(policies)
+    simulation['block'] = block_number
+    simulation['targetPrice'] = simulator.target_price
+    simulation['depegPrice'] = simulator.depeg_price
+    simulation['sumInsuredPercentage'] = simulator.sum_insured_percentage
+
+    return simulation
+
+
+def main(product_address, file_name=None):
+    from scripts.deploy_depeg import get_product_graph
+
+    graph = get_product_graph(product_address)
+    simulation = simulate_open_claims(graph['product'], graph['riskpool'], graph['instance_service'])
+
+    print('block {} policies {} errors {} reductions A {} B {} payout total {} (simulated in {:.3f}s)'.format(
+        simulation['block'],
+        len(simulation['policies']),
+        simulation['errors'],
+        simulation['protectedAmountReductions'],
+        simulation['processedAmountReductions'],
+        simulation['payoutAmount'],
+        simulation['elapsed']))
+
+    for (bundle_id, bundle) in sorted(simulation['bundles'].items()):
+        print('bundle {} policies {} payout {}'.format(bundle_id, bundle['policies'], bundle['payoutAmount']))
+
+    if file_name:
+        with open(file_name, 'w') as json_file:
+            json.dump(simulation, json_file, indent=2)
+
+        print('simulation written to {}'.format(file_name))
+
+    return simulation
@@ -0,0 +1,112 @@
+import hashlib
+import json
+
+from collections import OrderedDict
+from threading import RLock
+
+from brownie import (
+    web3,
+    Contract,
+)
+
+CACHE_SIZE_DEFAULT = 256
+
+
+def get_abi_hash(abi:list) -> str:
+    return hashlib.sha256(json.dumps(abi, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ContractCache(object):
+    """lru bounded cache for brownie contract handles and resolved component graphs.
+
+    handles are keyed by (chain_id, address, abi hash), so the same address
+    may be cached with different abis (eg product and its IComponent view).
+    graphs are keyed by (chain_id, name, address) and hold the result of a
+    resolver function, eg the product -> instance -> riskpool chain.
+    both caches are cleared by invalidate().
+    """
+
+    def __init__(self, max_size:int=CACHE_SIZE_DEFAULT):
+        self.lock = RLock()
+        self.max_size = max_size
+        self.contracts = OrderedDict()
+        self.graphs = OrderedDict()
+        self.abi_hashes = {}
+
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, contract_class, contract_address):
+        """returns a (cached) contract handle for the class abi at the provided address"""
+        with self.lock:
+            key = (web3.chain_id, str(contract_address).lower(), self._get_abi_hash(contract_class.abi))
+
+            if key in self.contracts:
+                self.hits += 1
+                self.contracts.move_to_end(key)
+                return self.contracts[key]
+
+            self.misses += 1
+            contract = Contract.from_abi(contract_class._name, contract_address, contract_class.abi)
+            self._put(self.contracts, key, contract)
+
+            return contract
+
+
+    def get_graph(self, name:str, address, resolver):
+        """returns the cached result of resolver(address), resolver is called once per chain and address"""
+        key = (web3.chain_id, name, str(address).lower())
+
+        with self.lock:
+            if key in self.graphs:
+                self.hits += 1
+                self.graphs.move_to_end(key)
+                return self.graphs[key]
+
+            self.misses += 1
+            graph = resolver(address)
+            self._put(self.graphs, key, graph)
+
+            return graph
+
+
+    def invalidate(self):
+        with self.lock:
+            self.contracts.clear()
+            self.graphs.clear()
+
+
+    def invalidate_graphs(self):
+        """drops resolved graphs only, handles stay valid as long as the chain is unchanged"""
+        with self.lock:
+            self.graphs.clear()
+
+
+    def get_stats(self) -> dict:
+        return {
+            'contracts': len(self.contracts),
+            'graphs': len(self.graphs),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+    def _get_abi_hash(self, abi:list) -> str:
+        # abi lists of contract classes are long lived, the hash is computed once per list
+        abi_id = id(abi)
+
+        if abi_id not in self.abi_hashes or self.abi_hashes[abi_id][0] is not abi:
+            self.abi_hashes[abi_id] = (abi, get_abi_hash(abi))
+
+        return self.abi_hashes[abi_id][1]
+
+
+    def _put(self, cache:OrderedDict, key, value):
+        cache[key] = value
+
+        if len(cache) > self.max_size:
+            cache.popitem(last=False)
+
+
+contract_cache = ContractCache()
@@ -0,0 +1,119 @@
+from brownie import interface
+
+from scripts.batch_sizer import (
+    BLOCK_GAS_FRACTION,
+    MAX_BATCH_SIZE,
+    GasBatchSizer,
+)
+
+from scripts.multicall import Multicall
+
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+
+
+class DepegBalanceSnapshot(object):
+    """reads protected wallet balances at the depegged block and uploads them with addDepegBalances.
+
+    wallets are collected from the policies with open claims (getPolicyToProcess)
+    or from all policies (getProtectedWallet), balances are read with batched
+    balanceOf calls pinned to getDepeggedBlockNumber() (requires an archive node
+    for past blocks), no external balance api is involved.
+    """
+
+    def __init__(self, product, multicall:Multicall=None):
+        self.product = product
+        self.multicall = multicall or Multicall()
+        self.token = interface.IERC20Metadata(product.getProtectedToken())
+
+
+    def get_protected_wallets(self, all_policies:bool=False) -> list:
+        """deduplicated protected wallets (order of first appearance)"""
+        if all_policies:
+            process_ids = self.multicall.map(self.product.getPolicyId, list(range(self.product.policies())))
+            wallets = self.multicall.map(self.product.getProtectedWallet, process_ids)
+        else:
+            policies = self.multicall.map(self.product.getPolicyToProcess, list(range(self.product.policiesToProcess())))
+            wallets = [wallet for (_, wallet) in policies]
+
+        unique_wallets = {}
+        for wallet in wallets:
+            if str(wallet) != ZERO_ADDRESS:
+                unique_wallets.setdefault(str(wallet).lower(), str(wallet))
+
+        return list(unique_wallets.values())
+
+
+    def get_balances(self, wallets:list, block_number:int) -> list:
+        """returns (wallet, block_number, balance) tuples with balanceOf at block_number"""
+        balances = self.multicall.map(self.token.balanceOf, wallets, block_identifier=block_number)
+        return [(wallet, block_number, balance) for (wallet, balance) in zip(wallets, balances)]
+
+
+    def get_missing_wallets(self, wallets:list, block_number:int) -> list:
+        """wallets without depeg balance for block_number"""
+        depeg_balances = self.multicall.map(self.product.getDepegBalance, wallets)
+        return [
+            wallet for (wallet, depeg_balance) in zip(wallets, depeg_balances)
+            if depeg_balance[1] != block_number]
+
+
+    def get_batch_sizer(self, owner, max_batch_size:int=MAX_BATCH_SIZE) -> GasBatchSizer:
+        """batch sizer for addDepegBalances transactions from owner"""
+        return GasBatchSizer(
+            lambda chunk: self.product.addDepegBalances.estimate_gas(chunk, {'from': owner}),
+            block_gas_fraction=BLOCK_GAS_FRACTION,
+            max_batch_size=max_batch_size)
+
+
+    def get_chunk_size(self, depeg_balances:list, owner) -> int:
+        """number of depeg balances per transaction to stay below a share of the block gas limit"""
+        if len(depeg_balances) == 0:
+            return 1
+
+        return self.get_batch_sizer(owner).calibrate(depeg_balances)
+
+
+    def upload(self, depeg_balances:list, owner, chunk_size:int=None) -> dict:
+        """uploads depeg balances in gas sized chunks and counts LogDepegDepegBalanceAdded/Error events.
+        chunk_size caps the number of balances per transaction. raises a RuntimeError if the
+        contract rejected any balance or a balance could not be uploaded.
+        """
+        sizer = self.get_batch_sizer(owner, chunk_size or MAX_BATCH_SIZE)
+        transactions = sizer.send_all(
+            depeg_balances,
+            lambda chunk, gas_limit: self.product.addDepegBalances(chunk, {'from': owner, 'gas_limit': gas_limit}))
+
+        report = sizer.get_report()
+        report.update({
+            'balances': len(depeg_balances),
+            'chunk_size': sizer.batch_size,
+            'added': 0,
+            'errors': len(sizer.failed),
+        })
+
+        for tx in transactions:
+            report['added'] += len(tx.events['LogDepegDepegBalanceAdded']) if 'LogDepegDepegBalanceAdded' in tx.events else 0
+            report['errors'] += len(tx.events['LogDepegDepegBalanceError']) if 'LogDepegDepegBalanceError' in tx.events else 0
+
+        if report['errors'] > 0:
+            raise RuntimeError('{} of {} depeg balances rejected: {}'.format(report['errors'], len(depeg_balances), report))
+
+        return report
+
+
+    def run(self, owner, all_policies:bool=False, force:bool=False, chunk_size:int=None) -> dict:
+        """collect wallets, read balances at the depegged block and upload the missing ones"""
+        block_number = self.product.getDepeggedBlockNumber()
+
+        if block_number == 0:
+            raise RuntimeError('depegged block number not set')
+
+        wallets = self.get_protected_wallets(all_policies)
+        missing_wallets = wallets if force else self.get_missing_wallets(wallets, block_number)
+        depeg_balances = self.get_balances(missing_wallets, block_number)
+
+        report = self.upload(depeg_balances, owner, chunk_size)
+        report['block_number'] = block_number
+        report['wallets'] = len(wallets)
+
+        return report
@@ -28,6 +28,19 @@ from scripts.depeg_product import GifDepegProductComplete
 from scripts.instance import GifInstance
 from scripts.setup import create_bundle
 
+from scripts.contract_cache import contract_cache
+from scripts.multicall import Multicall
+from scripts.portfolio_export import PortfolioExport
+from scripts.quote import get_quote_engine
+
+from scripts.setup_snapshot import (
+    SetupSnapshot,
+    SnapshotRead,
+    get_block,
+    read_values,
+    to_plain,
+)
+
 from scripts.util import (
     contract_from_address,
     new_accounts,
@@ -128,16 +141,38 @@ def get_deploy_timestamp(name):
     return int(timestamp[:-2])
 
 
-def get_policy(process_id, product_address):
+def get_product_graph(product_address):
+    """returns the (cached) contracts around the product, resolved once per chain and product address"""
+    return contract_cache.get_graph('deploy_depeg', product_address, _resolve_product_graph)
+
+
+def _resolve_product_graph(product_address):
     product = contract_from_address(DepegProduct, product_address)
+    (instance_service, instance_operator, treasury, instance_registry) = get_instance(product)
+
+    return {
+        'product': product,
+        'token': contract_from_address(interface.IERC20Metadata, product.getToken()),
+        'protected_token': contract_from_address(interface.IERC20Metadata, product.getProtectedToken()),
+        'instance_service': instance_service,
+        'instance_operator': instance_operator,
+        'treasury': treasury,
+        'instance_registry': instance_registry,
+        'riskpool': get_riskpool(product, instance_service),
+    }
+
+
+def get_policy(process_id, product_address):
+    graph = get_product_graph(product_address)
+    product = graph['product']
     product_contract = (DepegProduct._name, product.getId(), str(product))
 
-    token = contract_from_address(interface.IERC20Metadata, product.getToken())
-    protected_token = contract_from_address(interface.IERC20Metadata, product.getProtectedToken())
+    token = graph['token']
+    protected_token = graph['protected_token']
     tf = 10**token.decimals()
 
-    (instance_service, instance_operator, treasury, instance_registry) = get_instance(product)
-    riskpool = get_riskpool(product, instance_service)
+    instance_service = graph['instance_service']
+    riskpool = graph['riskpool']
 
     meta = instance_service.getMetadata(process_id).dict()
     application = instance_service.getApplication(process_id).dict()
@@ -176,14 +211,14 @@ def get_policy(process_id, product_address):
 
 
 def get_bundle(bundle_id, product_address):
-    product = contract_from_address(DepegProduct, product_address)
+    graph = get_product_graph(product_address)
 
-    token = contract_from_address(interface.IERC20Metadata, product.getToken())
-    protected_token = contract_from_address(interface.IERC20Metadata, product.getProtectedToken())
+    token = graph['token']
+    protected_token = graph['protected_token']
     tf = 10**token.decimals()
 
-    (instance_service, instance_operator, treasury, instance_registry) = get_instance(product)
-    riskpool = get_riskpool(product, instance_service)
+    instance_service = graph['instance_service']
+    riskpool = graph['riskpool']
     riskpool_contract = (DepegRiskpool._name, riskpool.getId(), str(riskpool))
 
     chain_registry = contract_from_address(interface.IChainRegistryFacadeExt, riskpool.getChainRegistry())
@@ -242,53 +277,234 @@ def get_bundle(bundle_id, product_address):
     return bundle_setup
 
 
-def get_setup(product_address):
+def get_setup(product_address, multicall=None):
+    (snapshot, contracts) = get_setup_snapshot(product_address, multicall)
+    setup = get_setup_from_snapshot(snapshot)
 
-    product = contract_from_address(DepegProduct, product_address)
-    product_id = product.getId()
-    product_name = b2s(product.getName())
-    product_contract = (DepegProduct._name, str(product))
-    product_owner = product.owner()
+    return (
+        setup,
+        contracts['product'],
+        contracts['feeder'],
+        contracts['riskpool'],
+        contracts['registry'],
+        contracts['staking'],
+        contracts['dip_token'],
+        contracts['token'],
+        contracts['protected_token'],
+        contracts['instance_service']
+    )
 
-    token = contract_from_address(interface.IERC20Metadata, product.getToken())
-    protected_token = contract_from_address(interface.IERC20Metadata, product.getProtectedToken())
 
-    feeder_address = product.getPriceDataProvider()
-    feeder = contract_from_address(UsdcPriceDataProvider, feeder_address)
-    feeder_contract = (UsdcPriceDataProvider._name, str(feeder))
-    feeder_token = contract_from_address(interface.IERC20Metadata, feeder.getToken())
+def get_setup_snapshot(product_address, multicall=None):
+    """reads all values needed for get_setup in a few multicall batches pinned to the latest block.
+
+    returns the snapshot and the contracts involved. addresses of feeder, tokens and
+    staking/registry/nft are resolved first (one batch per dependency level),
+    all other values are read with a single batch.
+    """
+    graph = get_product_graph(product_address)
+    multicall = multicall or Multicall()
+    block = get_block()
+
+    product = graph['product']
+    token = graph['token']
+    protected_token = graph['protected_token']
+    instance_service = graph['instance_service']
+    instance_registry = graph['instance_registry']
+    treasury = graph['treasury']
+    riskpool = graph['riskpool']
+
+    addresses = to_plain({
+        'product.address': product.address,
+        'product.token_address': token.address,
+        'product.protected_token_address': protected_token.address,
+        'riskpool.address': riskpool.address,
+        'instance.operator': graph['instance_operator'],
+    })
+
+    addresses.update(read_values([
+        SnapshotRead('product.id', product.getId),
+        SnapshotRead('product.name', product.getName),
+        SnapshotRead('riskpool.id', riskpool.getId),
+        SnapshotRead('riskpool.name', riskpool.getName),
+        SnapshotRead('feeder.address', product.getPriceDataProvider),
+        SnapshotRead('riskpool.token_address', riskpool.getErc20Token),
+        SnapshotRead('riskpool.staking', riskpool.getStaking),
+        SnapshotRead('instance.wallet', instance_service.getInstanceWallet),
+        SnapshotRead('instance.treasury', instance_service.getTreasuryAddress),
+    ], multicall, block['number']))
+
+    feeder = contract_from_address(UsdcPriceDataProvider, addresses['feeder.address'])
+    riskpool_token = contract_from_address(interface.IERC20Metadata, addresses['riskpool.token_address'])
+    (staking, registry, nft, dip_token) = (None, None, None, None)
 
-    (instance_service, instance_operator, treasury, instance_registry) = get_instance(product)
-    riskpool = get_riskpool(product, instance_service)
-    riskpool_id = riskpool.getId()
-    riskpool_name = b2s(riskpool.getName())
-    riskpool_contract = (DepegRiskpool._name, str(riskpool))
-    riskpool_sum_insured_cap = riskpool.getSumOfSumInsuredCap()
-    riskpool_owner = riskpool.owner()
+    links = [
+        SnapshotRead('feeder.token_address', feeder.getToken),
+        SnapshotRead('riskpool.wallet', instance_service.getRiskpoolWallet, (addresses['riskpool.id'],)),
+    ]
 
-    riskpool_capital_cap = -1
-    try:
-        riskpool_capital_cap = riskpool.getRiskpoolCapitalCap()
-    except Exception as e:
-        print('failed to call riskpool.getRiskpoolCapitalCap(): {}'.format(e))
+    if addresses['riskpool.staking'] != ZERO_ADDRESS:
+        staking = contract_from_address(interface.IStakingFacade, addresses['riskpool.staking'])
+        links += [
+            SnapshotRead('staking.dip_address', staking.getDip),
+            SnapshotRead('staking.registry', staking.getRegistry),
+            SnapshotRead('staking.wallet', staking.getStakingWallet),
+        ]
 
-    riskpool_bundle_cap = riskpool.getBundleCapitalCap()
-    riskpool_token = contract_from_address(interface.IERC20Metadata, riskpool.getErc20Token())
+    addresses.update(read_values(links, multicall, block['number']))
+    feeder_token = contract_from_address(interface.IERC20Metadata, addresses['feeder.token_address'])
 
-    (staking, registry, nft, dip_token) = (None, None, None, None)
+    if staking:
+        dip_token = contract_from_address(DIP, addresses['staking.dip_address'])
+        registry = contract_from_address(interface.IChainRegistryFacadeExt, addresses['staking.registry'])
+        addresses.update(read_values([
+            SnapshotRead('registry.nft', registry.getNft),
+            SnapshotRead('registry.chain', registry.toChain, (web3.chain_id,)),
+        ], multicall, block['number']))
+
+        nft = contract_from_address(interface.IChainNftFacade, addresses['registry.nft'])
+
+    reads = [
+        # instance
+        SnapshotRead('instance.id', instance_service.getInstanceId),
+        SnapshotRead('instance.chain_name', instance_service.getChainName),
+        SnapshotRead('instance.chain_id', instance_service.getChainId),
+        SnapshotRead('instance.registry', instance_service.getRegistry),
+        SnapshotRead('instance.release', instance_registry.getRelease),
+        SnapshotRead('instance.products', instance_service.products),
+        SnapshotRead('instance.oracles', instance_service.oracles),
+        SnapshotRead('instance.riskpools', instance_service.riskpools),
+        SnapshotRead('instance.bundles', instance_service.bundles),
+        SnapshotRead('instance.wallet_balance', token.balanceOf, (addresses['instance.wallet'],)),
+        SnapshotRead('instance.fee_fraction_full_unit', instance_service.getFeeFractionFullUnit),
+
+        # product
+        SnapshotRead('product.owner', product.owner),
+        SnapshotRead('product.state', instance_service.getComponentState, (addresses['product.id'],)),
+        SnapshotRead('product.riskpool_id', product.getRiskpoolId),
+        SnapshotRead('product.fee_spec', treasury.getFeeSpecification, (addresses['product.id'],)),
+        SnapshotRead('product.token_symbol', token.symbol),
+        SnapshotRead('product.token_decimals', token.decimals),
+        SnapshotRead('product.protected_token_symbol', protected_token.symbol),
+        SnapshotRead('product.protected_token_decimals', protected_token.decimals),
+        SnapshotRead('product.applications', product.applications),
+        SnapshotRead('product.policies', product.policies),
+
+        # feeder
+        SnapshotRead('feeder.new_price_info', feeder.isNewPriceInfoEventAvailable),
+        SnapshotRead('feeder.aggregator', feeder.getAggregatorAddress),
+        SnapshotRead('feeder.description', feeder.description),
+        SnapshotRead('feeder.decimals', feeder.decimals),
+        SnapshotRead('feeder.trigger_price', feeder.DEPEG_TRIGGER_PRICE),
+        SnapshotRead('feeder.recovery_price', feeder.DEPEG_RECOVERY_PRICE),
+        SnapshotRead('feeder.recovery_window', feeder.DEPEG_RECOVERY_WINDOW),
+        SnapshotRead('feeder.latest_answer', feeder.latestAnswer),
+        SnapshotRead('feeder.latest_timestamp', feeder.latestTimestamp),
+        SnapshotRead('feeder.triggered_at', feeder.getTriggeredAt),
+        SnapshotRead('feeder.depegged_at', feeder.getDepeggedAt),
+        SnapshotRead('feeder.token_symbol', feeder_token.symbol),
+        SnapshotRead('feeder.token_decimals', feeder_token.decimals),
+
+        # riskpool
+        SnapshotRead('riskpool.owner', riskpool.owner),
+        SnapshotRead('riskpool.state', instance_service.getComponentState, (addresses['riskpool.id'],)),
+        SnapshotRead('riskpool.fee_spec', treasury.getFeeSpecification, (addresses['riskpool.id'],)),
+        SnapshotRead('riskpool.token_symbol', riskpool_token.symbol),
+        SnapshotRead('riskpool.token_decimals', riskpool_token.decimals),
+        SnapshotRead('riskpool.sum_insured_cap', riskpool.getSumOfSumInsuredCap),
+        SnapshotRead('riskpool.sum_insured_percentage', riskpool.getSumInsuredPercentage, optional=True),
+        SnapshotRead('riskpool.bundles', riskpool.bundles),
+        SnapshotRead('riskpool.bundles_active', riskpool.activeBundles),
+        SnapshotRead('riskpool.bundles_max', riskpool.getMaximumNumberOfActiveBundles),
+        SnapshotRead('riskpool.capital_cap', riskpool.getRiskpoolCapitalCap, optional=True),
+        SnapshotRead('riskpool.bundle_capital_cap', riskpool.getBundleCapitalCap),
+        SnapshotRead('riskpool.balance', riskpool.getBalance),
+        SnapshotRead('riskpool.capital', riskpool.getCapital),
+        SnapshotRead('riskpool.capacity', riskpool.getCapacity),
+        SnapshotRead('riskpool.total_value_locked', riskpool.getTotalValueLocked),
+        SnapshotRead('riskpool.wallet_allowance', riskpool_token.allowance, (addresses['riskpool.wallet'], addresses['instance.treasury'])),
+        SnapshotRead('riskpool.wallet_balance', riskpool_token.balanceOf, (addresses['riskpool.wallet'],)),
+
+        # bundle and policy limits
+        SnapshotRead('bundle.apr_max', riskpool.MAX_APR),
+        SnapshotRead('bundle.apr_100_percent', riskpool.APR_100_PERCENTAGE),
+        SnapshotRead('bundle.lifetime_min', riskpool.MIN_BUNDLE_LIFETIME),
+        SnapshotRead('bundle.lifetime_max', riskpool.MAX_BUNDLE_LIFETIME),
+        SnapshotRead('policy.duration_min', riskpool.MIN_POLICY_DURATION),
+        SnapshotRead('policy.duration_max', riskpool.MAX_POLICY_DURATION),
+        SnapshotRead('policy.protection_min', riskpool.MIN_POLICY_COVERAGE),
+        SnapshotRead('policy.protection_max', riskpool.MAX_POLICY_COVERAGE),
+    ]
 
-    if riskpool.getStaking() != ZERO_ADDRESS:
-        staking = contract_from_address(interface.IStakingFacade, riskpool.getStaking())
-        staking_contract = (interface.IStakingFacade._name, str(staking))
-        staking_owner = staking.owner()
-        dip_token = contract_from_address(DIP, staking.getDip())
+    if nft:
+        reads += [
+            SnapshotRead('nft.name', nft.name),
+            SnapshotRead('nft.symbol', nft.symbol),
+            SnapshotRead('nft.registry', nft.getRegistry),
+            SnapshotRead('nft.total_minted', nft.totalMinted, optional=True),
+        ]
+
+    if registry:
+        chain = addresses['registry.chain']
+        reads += [
+            SnapshotRead('registry.owner', registry.owner),
+            SnapshotRead('registry.instances', registry.objects, (chain, 20)),
+            SnapshotRead('registry.riskpools', registry.objects, (chain, 23)),
+            SnapshotRead('registry.bundles', registry.objects, (chain, 40)),
+            SnapshotRead('registry.stakes', registry.objects, (chain, 10)),
+            SnapshotRead('registry.version', registry.version),
+            SnapshotRead('registry.version_parts', registry.versionParts),
+        ]
+
+    if staking:
+        reads += [
+            SnapshotRead('staking.owner', staking.owner),
+            SnapshotRead('staking.dip_symbol', dip_token.symbol),
+            SnapshotRead('staking.dip_decimals', dip_token.decimals),
+            SnapshotRead('staking.rate_decimals', staking.rateDecimals),
+            SnapshotRead('staking.reward_balance', staking.rewardBalance),
+            SnapshotRead('staking.reward_reserves', staking.rewardReserves),
+            SnapshotRead('staking.reward_rate', staking.rewardRate),
+            SnapshotRead('staking.reward_rate_max', staking.maxRewardRate),
+            SnapshotRead('staking.stake_balance', staking.stakeBalance, optional=True),
+            SnapshotRead('staking.staking_rate', staking.stakingRate, (addresses['registry.chain'], riskpool_token.address)),
+            SnapshotRead('staking.wallet_balance', dip_token.balanceOf, (addresses['staking.wallet'],)),
+            SnapshotRead('staking.wallet_allowance', dip_token.allowance, (addresses['staking.wallet'], staking.address)),
+            SnapshotRead('staking.version', staking.version),
+            SnapshotRead('staking.version_parts', staking.versionParts),
+        ]
+
+    values = dict(addresses)
+    values.update(read_values(reads, multicall, block['number']))
+
+    snapshot = SetupSnapshot(web3.chain_id, block['number'], block['timestamp'], values)
+    contracts = {
+        'product': product,
+        'feeder': feeder,
+        'riskpool': riskpool,
+        'registry': registry,
+        'staking': staking,
+        'dip_token': dip_token,
+        'token': token,
+        'protected_token': protected_token,
+        'instance_service': instance_service,
+    }
 
-        registry = contract_from_address(interface.IChainRegistryFacadeExt, staking.getRegistry())
-        registry_contract = (interface.IChainRegistryFacadeExt._name, str(registry))
-        registry_owner = registry.owner()
+    return (snapshot, contracts)
 
-        nft = contract_from_address(interface.IChainNftFacade, registry.getNft())
-        nft_contract = (interface.IChainNftFacade._name, str(nft))
+
+def get_setup_from_snapshot(snapshot):
+    """renders the get_setup dict from a setup snapshot (no chain access)"""
+    v = snapshot.values
+
+    # token factors
+    tf = 10 ** v['product.token_decimals']
+    rtf = 10 ** v['riskpool.token_decimals']
+    ff = 10 ** v['feeder.decimals']
+    spd = 24 * 3600
+
+    product_name = _hex_to_str(v['product.name'])
+    riskpool_name = _hex_to_str(v['riskpool.name'])
 
     setup = {}
     setup['instance'] = {}
@@ -302,186 +518,168 @@ def get_setup(product_address):
     setup['staking'] = {}
 
     # instance specifics
-    setup['instance']['id'] = str(instance_service.getInstanceId())
-    setup['instance']['chain'] = (instance_service.getChainName(), instance_service.getChainId())
-    setup['instance']['instance_registry'] = instance_service.getRegistry()
-    setup['instance']['instance_operator'] = instance_operator
-    setup['instance']['release'] = b2s(instance_registry.getRelease())
-    setup['instance']['wallet'] = instance_service.getInstanceWallet()
-    setup['instance']['products'] = instance_service.products()
-    setup['instance']['oracles'] = instance_service.oracles()
-    setup['instance']['riskpools'] = instance_service.riskpools()
-    setup['instance']['bundles'] = instance_service.bundles()
-
-    wallet_balance = token.balanceOf(instance_service.getInstanceWallet())
-    setup['instance']['wallet_balance'] = (wallet_balance / 10 ** token.decimals(), wallet_balance)
+    setup['instance']['id'] = v['instance.id']
+    setup['instance']['chain'] = (v['instance.chain_name'], v['instance.chain_id'])
+    setup['instance']['instance_registry'] = v['instance.registry']
+    setup['instance']['instance_operator'] = v['instance.operator']
+    setup['instance']['release'] = _hex_to_str(v['instance.release'])
+    setup['instance']['wallet'] = v['instance.wallet']
+    setup['instance']['products'] = v['instance.products']
+    setup['instance']['oracles'] = v['instance.oracles']
+    setup['instance']['riskpools'] = v['instance.riskpools']
+    setup['instance']['bundles'] = v['instance.bundles']
+    setup['instance']['wallet_balance'] = (v['instance.wallet_balance'] / tf, v['instance.wallet_balance'])
 
     # product specifics
-    setup['product']['contract'] = product_contract
-    setup['product']['id'] = product_id
-    setup['product']['owner'] = product_owner
-    setup['product']['state'] = _getComponentState(product.getId(), instance_service)
-    setup['product']['riskpool_id'] = product.getRiskpoolId()
+    setup['product']['contract'] = (DepegProduct._name, v['product.address'])
+    setup['product']['id'] = v['product.id']
+    setup['product']['owner'] = v['product.owner']
+    setup['product']['state'] = (COMPONENT_STATE[v['product.state']], v['product.state'])
+    setup['product']['riskpool_id'] = v['product.riskpool_id']
     setup['product']['deployed_at'] = (get_iso_datetime(get_deploy_timestamp(product_name)), get_deploy_timestamp(product_name))
-    setup['product']['premium_fee'] = _get_fee_spec(product_id, treasury, instance_service)
-    setup['product']['token'] = (token.symbol(), str(token), token.decimals())
-    setup['product']['protected_token'] = (protected_token.symbol(), str(protected_token), protected_token.decimals())
-    setup['product']['applications'] = product.applications()
-    setup['product']['policies'] = product.policies()
+    setup['product']['premium_fee'] = _to_fee_spec(v['product.fee_spec'], v['instance.fee_fraction_full_unit'])
+    setup['product']['token'] = (v['product.token_symbol'], v['product.token_address'], v['product.token_decimals'])
+    setup['product']['protected_token'] = (v['product.protected_token_symbol'], v['product.protected_token_address'], v['product.protected_token_decimals'])
+    setup['product']['applications'] = v['product.applications']
+    setup['product']['policies'] = v['product.policies']
 
     # feeder specifics
-    (new_info, price_info, time_since) = feeder.isNewPriceInfoEventAvailable()
-    setup['feeder']['aggregator'] = ('AggregatorV2V3Interface', feeder.getAggregatorAddress())
-    setup['feeder']['contract'] = feeder_contract
-    setup['feeder']['description'] = feeder.description()
-    setup['feeder']['decimals'] = feeder.decimals()
-    setup['feeder']['trigger_price'] = (feeder.DEPEG_TRIGGER_PRICE()/10**feeder.decimals(), feeder.DEPEG_TRIGGER_PRICE())
-    setup['feeder']['recovery_price'] = (feeder.DEPEG_RECOVERY_PRICE()/10**feeder.decimals(), feeder.DEPEG_RECOVERY_PRICE())
-    setup['feeder']['recovery_window_h'] = (feeder.DEPEG_RECOVERY_WINDOW()/3600, feeder.DEPEG_RECOVERY_WINDOW())
-    setup['feeder']['info'] = price_info.dict()
-    setup['feeder']['info_new'] = new_info
-    setup['feeder']['info_new_since'] = time_since
-    setup['feeder']['latest_price'] = (feeder.latestAnswer()/10**feeder.decimals(), feeder.latestAnswer())
-    setup['feeder']['latest_timestamp'] = (get_iso_datetime(feeder.latestTimestamp()), feeder.latestTimestamp())
-    setup['feeder']['triggered_at'] = (get_iso_datetime(feeder.getTriggeredAt()), feeder.getTriggeredAt())
-    setup['feeder']['depegged_at'] = (get_iso_datetime(feeder.getDepeggedAt()), feeder.getDepeggedAt())
-    setup['feeder']['token'] = (feeder_token.symbol(), str(feeder_token), feeder_token.decimals())
+    new_price_info = v['feeder.new_price_info']
+    setup['feeder']['aggregator'] = ('AggregatorV2V3Interface', v['feeder.aggregator'])
+    setup['feeder']['contract'] = (UsdcPriceDataProvider._name, v['feeder.address'])
+    setup['feeder']['description'] = v['feeder.description']
+    setup['feeder']['decimals'] = v['feeder.decimals']
+    setup['feeder']['trigger_price'] = (v['feeder.trigger_price'] / ff, v['feeder.trigger_price'])
+    setup['feeder']['recovery_price'] = (v['feeder.recovery_price'] / ff, v['feeder.recovery_price'])
+    setup['feeder']['recovery_window_h'] = (v['feeder.recovery_window'] / 3600, v['feeder.recovery_window'])
+    setup['feeder']['info'] = new_price_info['priceInfo']
+    setup['feeder']['info_new'] = new_price_info['newEvent']
+    setup['feeder']['info_new_since'] = new_price_info['timeSinceEvent']
+    setup['feeder']['latest_price'] = (v['feeder.latest_answer'] / ff, v['feeder.latest_answer'])
+    setup['feeder']['latest_timestamp'] = (get_iso_datetime(v['feeder.latest_timestamp']), v['feeder.latest_timestamp'])
+    setup['feeder']['triggered_at'] = (get_iso_datetime(v['feeder.triggered_at']), v['feeder.triggered_at'])
+    setup['feeder']['depegged_at'] = (get_iso_datetime(v['feeder.depegged_at']), v['feeder.depegged_at'])
+    setup['feeder']['token'] = (v['feeder.token_symbol'], v['feeder.token_address'], v['feeder.token_decimals'])
 
     # riskpool specifics
-    setup['riskpool']['contract'] = riskpool_contract
-    setup['riskpool']['id'] = riskpool_id
-    setup['riskpool']['owner'] = riskpool_owner
-    setup['riskpool']['state'] = _getComponentState(riskpool.getId(), instance_service)
-    setup['riskpool']['staking'] = riskpool.getStaking()
+    riskpool_capital_cap = v['riskpool.capital_cap'] if v['riskpool.capital_cap'] is not None else -1
+    sum_insured_percentage = v['riskpool.sum_insured_percentage'] if v['riskpool.sum_insured_percentage'] is not None else 100
+
+    setup['riskpool']['contract'] = (DepegRiskpool._name, v['riskpool.address'])
+    setup['riskpool']['id'] = v['riskpool.id']
+    setup['riskpool']['owner'] = v['riskpool.owner']
+    setup['riskpool']['state'] = (COMPONENT_STATE[v['riskpool.state']], v['riskpool.state'])
+    setup['riskpool']['staking'] = v['riskpool.staking']
     setup['riskpool']['deployed_at'] = (get_iso_datetime(get_deploy_timestamp(riskpool_name)), get_deploy_timestamp(riskpool_name))
-    setup['riskpool']['capital_fee'] = _get_fee_spec(riskpool_id, treasury, instance_service)
-    setup['riskpool']['token'] = (riskpool_token.symbol(), str(riskpool_token), riskpool_token.decimals())
-
-    setup['riskpool']['sum_insured_cap'] = (riskpool_sum_insured_cap / 10**riskpool_token.decimals(), riskpool_sum_insured_cap)
-
-    try:
-        setup['riskpool']['sum_insured_percentage'] = (riskpool.getSumInsuredPercentage()/100, riskpool.getSumInsuredPercentage())
-    except Exception as e:
-        setup['riskpool']['sum_insured_percentage'] = (1.0, 100)
-
-    setup['riskpool']['bundles'] = riskpool.bundles()
-    setup['riskpool']['bundles_active'] = riskpool.activeBundles()
-    setup['riskpool']['bundles_max'] = riskpool.getMaximumNumberOfActiveBundles()
-    setup['riskpool']['capital_cap'] = (riskpool_capital_cap / 10**riskpool_token.decimals(), riskpool_capital_cap)
-
-    setup['riskpool']['balance'] = (riskpool.getBalance() / 10**riskpool_token.decimals(), riskpool.getBalance())
-    setup['riskpool']['capital'] = (riskpool.getCapital() / 10**riskpool_token.decimals(), riskpool.getCapital())
-    setup['riskpool']['capacity'] = (riskpool.getCapacity() / 10**riskpool_token.decimals(), riskpool.getCapacity())
-    setup['riskpool']['total_value_locked'] = (riskpool.getTotalValueLocked() / 10**riskpool_token.decimals(), riskpool.getTotalValueLocked())
-
-    riskpool_wallet = instance_service.getRiskpoolWallet(riskpool_id)
-    setup['riskpool']['wallet'] = riskpool_wallet
-    setup['riskpool']['wallet_allowance'] = (riskpool_token.allowance(riskpool_wallet, instance_service.getTreasuryAddress()) / 10**riskpool_token.decimals(), riskpool_token.balanceOf(riskpool_wallet))
-    setup['riskpool']['wallet_balance'] = (riskpool_token.balanceOf(riskpool_wallet) / 10**riskpool_token.decimals(), riskpool_token.balanceOf(riskpool_wallet))
+    setup['riskpool']['capital_fee'] = _to_fee_spec(v['riskpool.fee_spec'], v['instance.fee_fraction_full_unit'])
+    setup['riskpool']['token'] = (v['riskpool.token_symbol'], v['riskpool.token_address'], v['riskpool.token_decimals'])
+    setup['riskpool']['sum_insured_cap'] = (v['riskpool.sum_insured_cap'] / rtf, v['riskpool.sum_insured_cap'])
+    setup['riskpool']['sum_insured_percentage'] = (sum_insured_percentage / 100, sum_insured_percentage)
+    setup['riskpool']['bundles'] = v['riskpool.bundles']
+    setup['riskpool']['bundles_active'] = v['riskpool.bundles_active']
+    setup['riskpool']['bundles_max'] = v['riskpool.bundles_max']
+    setup['riskpool']['capital_cap'] = (riskpool_capital_cap / rtf, riskpool_capital_cap)
+    setup['riskpool']['balance'] = (v['riskpool.balance'] / rtf, v['riskpool.balance'])
+    setup['riskpool']['capital'] = (v['riskpool.capital'] / rtf, v['riskpool.capital'])
+    setup['riskpool']['capacity'] = (v['riskpool.capacity'] / rtf, v['riskpool.capacity'])
+    setup['riskpool']['total_value_locked'] = (v['riskpool.total_value_locked'] / rtf, v['riskpool.total_value_locked'])
+    setup['riskpool']['wallet'] = v['riskpool.wallet']
+    setup['riskpool']['wallet_allowance'] = (v['riskpool.wallet_allowance'] / rtf, v['riskpool.wallet_allowance'])
+    setup['riskpool']['wallet_balance'] = (v['riskpool.wallet_balance'] / rtf, v['riskpool.wallet_balance'])
 
     # bundle specifics
-    spd = 24 * 3600
-    setup['bundle']['apr_max'] = (riskpool.MAX_APR()/riskpool.APR_100_PERCENTAGE(), riskpool.MAX_APR())
-    setup['bundle']['capital_cap'] = (riskpool_bundle_cap / 10**riskpool_token.decimals(), riskpool_bundle_cap)
-    setup['bundle']['lifetime_min'] = (riskpool.MIN_BUNDLE_LIFETIME()/spd , riskpool.MIN_BUNDLE_LIFETIME())
-    setup['bundle']['lifetime_max'] = (riskpool.MAX_BUNDLE_LIFETIME()/spd , riskpool.MAX_BUNDLE_LIFETIME())
+    setup['bundle']['apr_max'] = (v['bundle.apr_max'] / v['bundle.apr_100_percent'], v['bundle.apr_max'])
+    setup['bundle']['capital_cap'] = (v['riskpool.bundle_capital_cap'] / rtf, v['riskpool.bundle_capital_cap'])
+    setup['bundle']['lifetime_min'] = (v['bundle.lifetime_min'] / spd, v['bundle.lifetime_min'])
+    setup['bundle']['lifetime_max'] = (v['bundle.lifetime_max'] / spd, v['bundle.lifetime_max'])
 
     # policy specifics
-    setup['policy']['duration_min'] = (riskpool.MIN_POLICY_DURATION()/spd , riskpool.MIN_POLICY_DURATION())
-    setup['policy']['duration_max'] = (riskpool.MAX_POLICY_DURATION()/spd , riskpool.MAX_POLICY_DURATION())
-    setup['policy']['protection_min'] = (riskpool.MIN_POLICY_COVERAGE()/10**token.decimals() , riskpool.MIN_POLICY_COVERAGE())
-    setup['policy']['protection_max'] = (riskpool.MAX_POLICY_COVERAGE()/10**token.decimals() , riskpool.MAX_POLICY_COVERAGE())
-
-    if nft:
-        setup['nft']['contract'] = nft_contract
-        setup['nft']['name'] = nft.name()
-        setup['nft']['symbol'] = nft.symbol()
-        setup['nft']['registry'] = nft.getRegistry()
-
-        try:
-            setup['nft']['total_minted'] = nft.totalMinted()
-        except Exception as e:
-            setup['nft']['total_minted'] = 'n/a'
+    setup['policy']['duration_min'] = (v['policy.duration_min'] / spd, v['policy.duration_min'])
+    setup['policy']['duration_max'] = (v['policy.duration_max'] / spd, v['policy.duration_max'])
+    setup['policy']['protection_min'] = (v['policy.protection_min'] / tf, v['policy.protection_min'])
+    setup['policy']['protection_max'] = (v['policy.protection_max'] / tf, v['policy.protection_max'])
+
+    if 'nft.name' in v:
+        setup['nft']['contract'] = (interface.IChainNftFacade._name, v['registry.nft'])
+        setup['nft']['name'] = v['nft.name']
+        setup['nft']['symbol'] = v['nft.symbol']
+        setup['nft']['registry'] = v['nft.registry']
+        setup['nft']['total_minted'] = v['nft.total_minted'] if v['nft.total_minted'] is not None else 'n/a'
     else:
         setup['nft']['setup'] = 'WARNING nft contract not linked, not ready to use'
 
-    if registry:
-        chain_id = registry.toChain(web3.chain_id)
-        registry_version = _get_version(registry)
-        setup['registry']['contract'] = registry_contract
-        setup['registry']['owner'] = registry_owner
-        setup['registry']['nft'] = registry.getNft()
-        setup['registry']['instances'] = registry.objects(chain_id, 20)
-        setup['registry']['riskpools'] = registry.objects(chain_id, 23)
-        setup['registry']['bundles'] = registry.objects(chain_id, 40)
-        setup['registry']['stakes'] = registry.objects(chain_id, 10)
-        setup['registry']['version'] = registry_version
+    if 'registry.owner' in v:
+        setup['registry']['contract'] = (interface.IChainRegistryFacadeExt._name, v['staking.registry'])
+        setup['registry']['owner'] = v['registry.owner']
+        setup['registry']['nft'] = v['registry.nft']
+        setup['registry']['instances'] = v['registry.instances']
+        setup['registry']['riskpools'] = v['registry.riskpools']
+        setup['registry']['bundles'] = v['registry.bundles']
+        setup['registry']['stakes'] = v['registry.stakes']
+        setup['registry']['version'] = _to_version(v['registry.version_parts'], v['registry.version'])
     else:
         setup['registry']['setup'] = 'WARNING registry contract not linked, not ready to use'
 
-    if staking:
-        staking_rate = staking.stakingRate(chain_id, riskpool_token)
-        staking_version = _get_version(staking)
-        wallet_balance = dip_token.balanceOf(staking.getStakingWallet())
-        setup['staking']['contract'] = staking_contract
-        setup['staking']['chain'] = (web3.chain_id, str(chain_id))
-        setup['staking']['owner'] = staking_owner
-        setup['staking']['registry'] = staking.getRegistry()
-        setup['staking']['dip'] = (dip_token.symbol(), str(dip_token), dip_token.decimals())
-        setup['staking']['reward_balance'] = (staking.rewardBalance()/10**dip_token.decimals(), staking.rewardBalance())
-        setup['staking']['reward_rate'] = (staking.rewardRate()/10**staking.rateDecimals(), staking.rewardRate())
-        setup['staking']['reward_rate_max'] = (staking.maxRewardRate()/10**staking.rateDecimals(), staking.maxRewardRate())
-        setup['staking']['stake_balance'] = _getStakeBalance(staking, dip_token)
-        setup['staking']['staking_rate_usdt'] = (staking_rate/10**staking.rateDecimals(), staking_rate)
-        setup['staking']['wallet'] = staking.getStakingWallet()
-        setup['staking']['wallet_balance'] = (wallet_balance/10**dip_token.decimals(), wallet_balance)
-        setup['staking']['version'] = staking_version
-
-        swa_raw = dip_token.allowance(staking.getStakingWallet(), staking)
-        swa = [swa_raw/10**dip_token.decimals(), swa_raw]
-        if staking.address == staking.getStakingWallet():
+    if 'staking.owner' in v:
+        df = 10 ** v['staking.dip_decimals']
+        rf = 10 ** v['staking.rate_decimals']
+        wallet_balance = v['staking.wallet_balance']
+        reward_balance = v['staking.reward_balance']
+        reward_reserves = v['staking.reward_reserves']
+        stake_balance = v['staking.stake_balance']
+
+        setup['staking']['contract'] = (interface.IStakingFacade._name, v['riskpool.staking'])
+        setup['staking']['chain'] = (snapshot.chain_id, v['registry.chain'])
+        setup['staking']['owner'] = v['staking.owner']
+        setup['staking']['registry'] = v['staking.registry']
+        setup['staking']['dip'] = (v['staking.dip_symbol'], v['staking.dip_address'], v['staking.dip_decimals'])
+        setup['staking']['reward_balance'] = (reward_balance / df, reward_balance)
+        setup['staking']['reward_rate'] = (v['staking.reward_rate'] / rf, v['staking.reward_rate'])
+        setup['staking']['reward_rate_max'] = (v['staking.reward_rate_max'] / rf, v['staking.reward_rate_max'])
+        setup['staking']['stake_balance'] = (stake_balance / df, stake_balance) if stake_balance is not None else ('n/a', 0)
+        setup['staking']['staking_rate_usdt'] = (v['staking.staking_rate'] / rf, v['staking.staking_rate'])
+        setup['staking']['wallet'] = v['staking.wallet']
+        setup['staking']['wallet_balance'] = (wallet_balance / df, wallet_balance)
+        setup['staking']['version'] = _to_version(v['staking.version_parts'], v['staking.version'])
+
+        swa_raw = v['staking.wallet_allowance']
+        swa = [swa_raw / df, swa_raw]
+        if v['riskpool.staking'] == v['staking.wallet']:
             setup['staking']['wallet_allowance'] = (swa[0], swa[1], "OK wallet address is contract address")
         else:
             if swa_raw == 0:
                 setup['staking']['wallet_allowance'] = (0, 0, "WARNING wallet allowance missing for staking contract, not ready to use")
-            elif swa_raw < wallet_balance:            
+            elif swa_raw < wallet_balance:
                 setup['staking']['wallet_allowance'] = (swa[0], swa[1], "WARNING wallet allowance not sufficient to cover wallet balance, make sure you know what you are doing")
             else:
                 setup['staking']['wallet_allowance'] = (swa[0], swa[1], "OK wallet allowance covers wallet balance")
 
-        if staking.rewardBalance() <= staking.rewardReserves():
-            setup['staking']['reward_reserves'] = (staking.rewardReserves()/10**dip_token.decimals(), staking.rewardReserves())
+        if reward_balance <= reward_reserves:
+            setup['staking']['reward_reserves'] = (reward_reserves / df, reward_reserves)
         else:
             reward_reserves_warning = 'WARNING reward reserves missing [DIP]{:.2f} to payout full reward balance'.format(
-                (staking.rewardBalance() - staking.rewardReserves())/10**dip_token.decimals())
+                (reward_balance - reward_reserves) / df)
 
-            setup['staking']['reward_reserves'] = (staking.rewardReserves()/10**dip_token.decimals(), staking.rewardReserves(), reward_reserves_warning)
+            setup['staking']['reward_reserves'] = (reward_reserves / df, reward_reserves, reward_reserves_warning)
     else:
         setup['staking']['setup'] = 'WARNING staking contract not linked, not ready to use'
 
-    return (
-        setup,
-        product,
-        feeder,
-        riskpool,
-        registry,
-        staking,
-        dip_token,
-        token,
-        protected_token,
-        instance_service
-    )
+    return setup
 
 
-def _getStakeBalance(staking, dip):
-    stake_balance = 0
+def _hex_to_str(value:str) -> str:
+    return b2s(bytes.fromhex(value[2:]))
 
-    try: 
-        stake_balance = staking.stakeBalance()
-    except Exception as e:
-        return ('n/a', 0)
 
-    return (stake_balance/10**dip.decimals(), stake_balance)
+def _to_fee_spec(spec:dict, fraction_full_unit:int):
+    if spec['componentId'] == 0:
+        return 'WARNING no fee spec available, not ready to use'
+
+    return (spec['fractionalFee']/fraction_full_unit, spec['fixedFee'])
+
+
+def _to_version(parts:dict, version:int):
+    return ('v{}.{}.{}'.format(parts['major'], parts['minor'], parts['patch']), version)
 
 
 def _get_application_state(state):
@@ -495,25 +693,6 @@ def _get_policy_state(state):
 def _get_bundle_state(state):
     return (BUNDLE_STATE[state], state)
 
-def _getComponentState(component_id, instance_service):
-    state = instance_service.getComponentState(component_id)
-    return (COMPONENT_STATE[state], state)
-
-
-def _get_version(versionable):
-    (major, minor, patch) = versionable.versionParts()
-    return('v{}.{}.{}'.format(major, minor, patch), versionable.version())
-
-
-def _get_fee_spec(component_id, treasury, instance_service):
-    spec = treasury.getFeeSpecification(component_id).dict()
-
-    if spec['componentId'] == 0:
-        return 'WARNING no fee spec available, not ready to use'
-
-    return (
-        spec['fractionalFee']/instance_service.getFeeFractionFullUnit(), spec['fixedFee'])
-
 
 def get_riskpool(product, instance_service):
     riskpool_id = product.getRiskpoolId()
@@ -1408,40 +1587,16 @@ def best_premium(
     protectedBalance,
     durationDays
 ):
-    sumInsured = riskpool.calculateSumInsured(protectedBalance)
-    bundleData = get_bundle_data(instanceService, riskpool)
-    aprMin = 100.0
-    bundleId = None
-
-    for idx in range(len(bundleData)):
-        bundle = bundleData[idx]
-
-        if sumInsured < bundle['minSumInsured']:
-            continue
+    # bundle matching and premium math off-chain, see scripts/quote.py
+    engine = get_quote_engine(product, riskpool, instanceService)
+    now = web3.eth.get_block('latest')['timestamp']
+    quote = engine.quote(protectedBalance, durationDays * 24 * 3600, now)
 
-        if sumInsured > bundle['maxSumInsured']:
-            continue
+    if not quote['bundleId']:
+        sumInsured = quote['sumInsured']
+        return {'bundleId':None, 'apr':None, 'premium':sumInsured, 'netPremium':sumInsured, 'comment':quote['comment']}
 
-        if durationDays < bundle['minDuration']:
-            continue
-
-        if durationDays > bundle['maxDuration']:
-            continue
-
-        if aprMin < bundle['apr']:
-            continue
-
-        bundleId = bundle['bundleId']
-        aprMin = bundle['apr']
-
-    if not bundleId:
-        return {'bundleId':None, 'apr':None, 'premium':sumInsured, 'netPremium':sumInsured, 'comment':'no matching bundle'}
-
-    duration = durationDays * 24 * 3600
-    netPremium = product.calculateNetPremium(sumInsured, duration, bundleId)
-    premium = product.calculatePremium(netPremium)
-
-    return {'bundleId':bundleId, 'apr':aprMin, 'premium':premium, 'netPremium':netPremium, 'comment':'recommended bundle'}
+    return {'bundleId':quote['bundleId'], 'apr':quote['apr'], 'premium':quote['premium'], 'netPremium':quote['netPremium'], 'comment':quote['comment']}
 
 
 def new_policy(
@@ -1486,53 +1641,27 @@ def inspect_applications(instanceService, product, riskpool, usd1, usd2):
     mul_usd1 = 10**usd1.decimals()
     mul_usd2 = 10**usd2.decimals()
 
-    processIds = product.applications()
+    # batched reads, application data is decoded locally
+    rows = PortfolioExport(product, instanceService).get_rows(0, product.applications(), web3.eth.block_number)
 
     # print header row
     print('i customer product id type state wallet premium suminsured duration bundle maxpremium')
 
     # print individual rows
-    for idx in range(processIds):
-        processId = product.getApplicationId(idx) 
-        metadata = instanceService.getMetadata(processId)
-        customer = metadata[0]
-        productId = metadata[1]
-
-        application = instanceService.getApplication(processId)
-        state = application[0]
-        premium = application[1]
-        suminsured = application[2]
-        appdata = application[3]
-
-        (
-            wallet,
-            protected_balance,
-            duration,
-            bundle_id,
-            maxpremium
-        ) = riskpool.decodeApplicationParameterFromData(appdata)
-
-        if state == 2:
-            policy = instanceService.getPolicy(processId)
-            state = policy[0]
-            kind = 'policy'
-        else:
-            policy = None
-            kind = 'application'
-
+    for row in rows:
         print('{} {} {} {} {} {} {} {:.1f} {:.1f} {} {} {:.1f}'.format(
-            idx,
-            _shortenAddress(customer),
-            productId,
-            processId,
-            kind,
-            state,
-            _shortenAddress(wallet),
-            premium/mul_usd2,
-            suminsured/mul_usd1,
-            duration/(24*3600),
-            str(bundle_id) if bundle_id > 0 else 'n/a',
-            maxpremium/mul_usd2,
+            row['idx'],
+            _shortenAddress(row['owner']),
+            row['productId'],
+            row['processId'],
+            row['kind'],
+            row['policyState'] if row['kind'] == 'policy' else row['applicationState'],
+            _shortenAddress(row['wallet']),
+            row['premium']/mul_usd2,
+            row['sumInsured']/mul_usd1,
+            row['duration']/(24*3600),
+            str(row['bundleId']) if row['bundleId'] > 0 else 'n/a',
+            row['maxPremium']/mul_usd2,
         ))
 
 
@@ -0,0 +1,145 @@
+from brownie import (
+    web3,
+    Contract,
+)
+
+# canonical multicall3 deployment, see https://github.com/mds1/multicall
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+MULTICALL3_NAME = 'Multicall3'
+
+# chains where the canonical multicall3 contract is available
+# mainnet, goerli, polygon, mumbai
+MULTICALL3_CHAIN_IDS = [1, 5, 137, 80001]
+
+CHUNK_SIZE_DEFAULT = 100
+
+# subset of the Multicall3 abi that is used here
+MULTICALL3_ABI = [
+    {
+        "inputs": [{
+            "components": [
+                {"internalType": "address", "name": "target", "type": "address"},
+                {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                {"internalType": "bytes", "name": "callData", "type": "bytes"}],
+            "internalType": "struct Multicall3.Call3[]", "name": "calls", "type": "tuple[]"}],
+        "name": "aggregate3",
+        "outputs": [{
+            "components": [
+                {"internalType": "bool", "name": "success", "type": "bool"},
+                {"internalType": "bytes", "name": "returnData", "type": "bytes"}],
+            "internalType": "struct Multicall3.Result[]", "name": "returnData", "type": "tuple[]"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+    {
+        "inputs": [],
+        "name": "getBlockNumber",
+        "outputs": [{"internalType": "uint256", "name": "blockNumber", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+]
+
+
+def get_multicall_address(address:str=None) -> str:
+    """returns the explicitly provided address or the canonical multicall3 address for supported chains"""
+    if address and len(address) > 0:
+        return address
+
+    if web3.chain_id in MULTICALL3_CHAIN_IDS:
+        return MULTICALL3_ADDRESS
+
+    return None
+
+
+class Multicall(object):
+    """batches view calls into multicall3 aggregate3 calls of at most chunk_size calls each.
+
+    calls are specified as (method, args) tuples where method is a brownie
+    contract method, eg (riskpool.getBundleInfo, (bundle_id,)).
+    without a multicall contract address the calls are executed sequentially.
+    """
+
+    def __init__(
+        self,
+        address:str=None,
+        chunk_size:int=CHUNK_SIZE_DEFAULT
+    ):
+        if chunk_size < 1:
+            raise ValueError('chunk size must be positive, got {}'.format(chunk_size))
+
+        self.address = get_multicall_address(address)
+        self.chunk_size = chunk_size
+        self.contract = None
+        self.round_trips = 0
+
+        if self.address:
+            self.contract = Contract.from_abi(MULTICALL3_NAME, self.address, MULTICALL3_ABI)
+
+
+    def is_batching(self) -> bool:
+        return self.contract is not None
+
+
+    def call(
+        self,
+        calls:list,
+        block_identifier=None,
+        allow_failure=False
+    ) -> list:
+        """executes all calls and returns the decoded results in the order of the calls.
+
+        failed calls raise a RuntimeError unless allow_failure is set,
+        in which case the result for the failed call is None.
+        """
+        if not self.contract:
+            return self._call_sequential(calls, block_identifier, allow_failure)
+
+        results = []
+        for start in range(0, len(calls), self.chunk_size):
+            chunk = calls[start:start + self.chunk_size]
+            payload = [
+                (method._address, True, method.encode_input(*args))
+                for (method, args) in chunk]
+
+            response = self.contract.aggregate3(payload, block_identifier=block_identifier)
+            self.round_trips += 1
+
+            for (method, args), (success, return_data) in zip(chunk, response):
+                if success:
+                    results.append(method.decode_output(return_data))
+                elif allow_failure:
+                    results.append(None)
+                else:
+                    raise RuntimeError('multicall: {}{} failed'.format(method._name, args))
+
+        return results
+
+
+    def map(
+        self,
+        method,
+        args_list:list,
+        block_identifier=None,
+        allow_failure=False
+    ) -> list:
+        """calls the same method for each entry in args_list"""
+        calls = [(method, args if isinstance(args, tuple) else (args,)) for args in args_list]
+        return self.call(calls, block_identifier, allow_failure)
+
+
+    def _call_sequential(self, calls, block_identifier, allow_failure) -> list:
+        results = []
+
+        for (method, args) in calls:
+            try:
+                results.append(method.call(*args, block_identifier=block_identifier))
+            except Exception as ex:
+                if not allow_failure:
+                    raise RuntimeError('multicall: {}{} failed: {}'.format(method._name, args, ex)) from ex
+
+                results.append(None)
+            finally:
+                self.round_trips += 1
+
+        return results
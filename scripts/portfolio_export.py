@@ -0,0 +1,466 @@
+# portfolio export: one row per application (and its policy, if underwritten) of a depeg product.
+# all reads are batched with multicall and pinned to a single block, application data
+# is decoded locally (same layout as DepegRiskpool.encodeApplicationParameterAsData).
+# output format is taken from the file extension: .csv, .ndjson/.jsonl or .parquet (requires pyarrow).
+# a meta file next to the export records the number of exported applications (updated after
+# every chunk), a refresh only reads and appends applications created since the last export.
+# parquet exports are written with a single ParquetWriter and replace the file when complete.
+#
+# brownie run scripts/portfolio_export.py main <product address> portfolio.csv --network=<network>
+# brownie run scripts/portfolio_export.py main <product address> portfolio.csv True --network=<network>
+
+import csv
+import json
+import os
+import time
+
+from brownie import web3
+from web3 import Web3
+
+try:
+    from eth_abi import decode as decodeAbi
+except ImportError:
+    from eth_abi import decode_abi as decodeAbi
+
+from scripts.multicall import Multicall
+
+# enum ApplicationState {Applied, Revoked, Underwritten, Declined}
+APPLICATION_STATE_UNDERWRITTEN = 2
+
+# wallet, protectedBalance, duration, bundleId, maxPremium
+APPLICATION_DATA_TYPES = ['address', 'uint256', 'uint256', 'uint256', 'uint256']
+
+# process ids per progress step (each step is 2-3 multicall round trips per multicall chunk)
+CHUNK_SIZE_DEFAULT = 500
+
+META_EXTENSION = '.meta.json'
+
+FORMATS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.parquet': 'parquet',
+}
+
+FIELDS = [
+    'idx',
+    'processId',
+    'owner',
+    'productId',
+    'kind',
+    'applicationState',
+    'policyState',
+    'wallet',
+    'protectedBalance',
+    'sumInsured',
+    'premium',
+    'maxPremium',
+    'duration',
+    'bundleId',
+    'premiumPaid',
+    'payoutMax',
+    'payoutAmount',
+    'claimsCount',
+    'openClaimsCount',
+    'createdAt',
+    'policyCreatedAt',
+    'updatedAt',
+]
+
+# token amounts are uint256 and are kept as decimal text in parquet files
+AMOUNT_FIELDS = [
+    'protectedBalance',
+    'sumInsured',
+    'premium',
+    'maxPremium',
+    'premiumPaid',
+    'payoutMax',
+    'payoutAmount',
+]
+
+INT_FIELDS = [
+    'idx',
+    'productId',
+    'applicationState',
+    'policyState',
+    'duration',
+    'bundleId',
+    'claimsCount',
+    'openClaimsCount',
+    'createdAt',
+    'policyCreatedAt',
+    'updatedAt',
+]
+
+
+class PortfolioExport(object):
+    """reads all applications and policies of a depeg product in batches.
+
+    process ids are taken from product.getApplicationId(idx), metadata,
+    application and policy structs are read from the instance service.
+    policy fields of applications that are not underwritten are None.
+    """
+
+    def __init__(self, product, instance_service, multicall:Multicall=None, chunk_size:int=CHUNK_SIZE_DEFAULT):
+        if chunk_size < 1:
+            raise ValueError('chunk size must be positive, got {}'.format(chunk_size))
+
+        self.product = product
+        self.instance_service = instance_service
+        self.multicall = multicall or Multicall()
+        self.chunk_size = chunk_size
+
+
+    def get_rows(self, start:int, end:int, block_number:int) -> list:
+        """rows for the applications with index start <= idx < end"""
+        indices = list(range(start, end))
+        process_ids = self.multicall.map(self.product.getApplicationId, indices, block_identifier=block_number)
+
+        calls = []
+        for process_id in process_ids:
+            calls.append((self.instance_service.getMetadata, (process_id,)))
+            calls.append((self.instance_service.getApplication, (process_id,)))
+
+        results = self.multicall.call(calls, block_identifier=block_number)
+        metadata = [result.dict() for result in results[0::2]]
+        applications = [result.dict() for result in results[1::2]]
+
+        underwritten = [
+            process_id for (process_id, application) in zip(process_ids, applications)
+            if application['state'] == APPLICATION_STATE_UNDERWRITTEN]
+
+        policy_results = self.multicall.map(self.instance_service.getPolicy, underwritten, block_identifier=block_number)
+        policies = {str(process_id): policy.dict() for (process_id, policy) in zip(underwritten, policy_results)}
+
+        return [
+            to_row(idx, process_id, meta, application, policies.get(str(process_id)))
+            for (idx, process_id, meta, application) in zip(indices, process_ids, metadata, applications)]
+
+
+    def export(self, file_name:str, full:bool=False, report=print) -> dict:
+        """writes (full) or appends (refresh) rows to file_name and returns an export summary.
+
+        a refresh falls back to a full export if the meta file is missing or
+        belongs to a different chain, product or format.
+        """
+        file_format = get_format(file_name)
+        head = web3.eth.get_block('latest')
+        block_number = head['number']
+        applications = self.product.applications(block_identifier=block_number)
+
+        meta = read_meta(file_name)
+        start = 0
+
+        if not full and is_matching_meta(meta, web3.chain_id, self.product.address, file_format):
+            start = min(get_resume_index(file_name, file_format, meta), applications)
+
+        # an interrupted export leaves no meta pointing at a partially rewritten file
+        if start == 0:
+            remove_meta(file_name)
+
+        meta = {
+            'chain_id': web3.chain_id,
+            'product': self.product.address,
+            'format': file_format,
+            'applications': start,
+            'block': block_number,
+            'timestamp': head['timestamp'],
+        }
+
+        round_trips = self.multicall.round_trips
+        started_at = time.perf_counter()
+        parquet_writer = ParquetExportWriter(file_name, append=start > 0) if file_format == 'parquet' else None
+
+        for chunk_start in range(start, applications, self.chunk_size):
+            chunk_end = min(chunk_start + self.chunk_size, applications)
+            rows = self.get_rows(chunk_start, chunk_end, block_number)
+
+            if parquet_writer:
+                parquet_writer.write(rows)
+            else:
+                # meta after every chunk: a refresh resumes from the last completely written chunk
+                write_rows(file_name, file_format, rows, append=chunk_start > 0)
+                meta['applications'] = chunk_end
+                meta['size'] = os.path.getsize(file_name)
+                write_meta(file_name, meta)
+
+            if report:
+                elapsed = time.perf_counter() - started_at
+                report('{}/{} applications, {:.1f} rows/s, {} round trips'.format(
+                    chunk_end,
+                    applications,
+                    (chunk_end - start) / max(elapsed, 1e-9),
+                    self.multicall.round_trips - round_trips))
+
+        if parquet_writer:
+            parquet_writer.close()
+        elif applications == 0:
+            # empty export, header only for csv
+            write_rows(file_name, file_format, [], append=False)
+
+        elapsed = time.perf_counter() - started_at
+        meta['applications'] = applications
+
+        if file_format != 'parquet':
+            meta['size'] = os.path.getsize(file_name)
+
+        write_meta(file_name, meta)
+
+        return {
+            'file': file_name,
+            'rows': applications,
+            'new_rows': applications - start,
+            'block': block_number,
+            'elapsed': elapsed,
+            'rows_per_second': (applications - start) / max(elapsed, 1e-9),
+            'round_trips': self.multicall.round_trips - round_trips,
+        }
+
+
+def decode_application_data(data) -> dict:
+    """local equivalent of DepegRiskpool.decodeApplicationParameterFromData"""
+    raw = bytes.fromhex(data[2:]) if isinstance(data, str) else bytes(data)
+    (wallet, protected_balance, duration, bundle_id, max_premium) = decodeAbi(APPLICATION_DATA_TYPES, raw)
+
+    return {
+        'wallet': Web3.toChecksumAddress(wallet),
+        'protectedBalance': protected_balance,
+        'duration': duration,
+        'bundleId': bundle_id,
+        'maxPremium': max_premium,
+    }
+
+
+def to_row(idx:int, process_id, metadata:dict, application:dict, policy:dict=None) -> dict:
+    data = decode_application_data(application['data'])
+
+    return {
+        'idx': idx,
+        'processId': str(process_id),
+        'owner': str(metadata['owner']),
+        'productId': metadata['productId'],
+        'kind': 'policy' if policy else 'application',
+        'applicationState': application['state'],
+        'policyState': policy['state'] if policy else None,
+        'wallet': str(data['wallet']),
+        'protectedBalance': data['protectedBalance'],
+        'sumInsured': application['sumInsuredAmount'],
+        'premium': application['premiumAmount'],
+        'maxPremium': data['maxPremium'],
+        'duration': data['duration'],
+        'bundleId': data['bundleId'],
+        'premiumPaid': policy['premiumPaidAmount'] if policy else None,
+        'payoutMax': policy['payoutMaxAmount'] if policy else None,
+        'payoutAmount': policy['payoutAmount'] if policy else None,
+        'claimsCount': policy['claimsCount'] if policy else None,
+        'openClaimsCount': policy['openClaimsCount'] if policy else None,
+        'createdAt': application['createdAt'],
+        'policyCreatedAt': policy['createdAt'] if policy else None,
+        'updatedAt': max(application['updatedAt'], policy['updatedAt']) if policy else application['updatedAt'],
+    }
+
+
+def get_format(file_name:str) -> str:
+    extension = os.path.splitext(file_name)[1].lower()
+
+    if extension not in FORMATS:
+        raise ValueError('unsupported export file extension "{}", use one of {}'.format(extension, ', '.join(FORMATS.keys())))
+
+    return FORMATS[extension]
+
+
+class ParquetExportWriter(object):
+    """writes the rows of one export run with a single ParquetWriter.
+
+    rows go to a temporary file that replaces file_name on close, an interrupted
+    export leaves the previous file untouched. parquet files can't be appended
+    to, for append the existing rows are copied once at the start.
+    """
+
+    def __init__(self, file_name:str, append:bool=False):
+        pq = _get_parquet()
+
+        self.file_name = file_name
+        self.tmp_file_name = file_name + '.tmp'
+        self.schema = _get_parquet_schema()
+        self.writer = pq.ParquetWriter(self.tmp_file_name, self.schema)
+
+        if append and os.path.exists(file_name):
+            self.writer.write_table(pq.read_table(file_name, schema=self.schema))
+
+
+    def write(self, rows:list):
+        import pyarrow as pa
+        self.writer.write_table(pa.Table.from_pylist([_to_text(row) for row in rows], schema=self.schema))
+
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.tmp_file_name, self.file_name)
+
+
+def write_rows(file_name:str, file_format:str, rows:list, append:bool=False):
+    if file_format == 'csv':
+        _write_csv(file_name, rows, append)
+    elif file_format == 'ndjson':
+        _write_ndjson(file_name, rows, append)
+    elif file_format == 'parquet':
+        _write_parquet(file_name, rows, append)
+    else:
+        raise ValueError('unsupported export format "{}"'.format(file_format))
+
+
+def read_rows(file_name:str) -> list:
+    """reads an export file back into row dicts (integer fields as int, missing values as None)"""
+    file_format = get_format(file_name)
+
+    if file_format == 'csv':
+        with open(file_name, 'r', newline='') as csv_file:
+            return [_from_text(row) for row in csv.DictReader(csv_file)]
+
+    if file_format == 'ndjson':
+        with open(file_name, 'r') as ndjson_file:
+            return [json.loads(line) for line in ndjson_file if len(line.strip()) > 0]
+
+    pq = _get_parquet()
+    return [_from_text(row) for row in pq.read_table(file_name).to_pylist()]
+
+
+def get_meta_file_name(file_name:str) -> str:
+    return file_name + META_EXTENSION
+
+
+def read_meta(file_name:str) -> dict:
+    meta_file_name = get_meta_file_name(file_name)
+
+    if not os.path.exists(meta_file_name):
+        return None
+
+    with open(meta_file_name, 'r') as meta_file:
+        return json.load(meta_file)
+
+
+def remove_meta(file_name:str):
+    if os.path.exists(get_meta_file_name(file_name)):
+        os.remove(get_meta_file_name(file_name))
+
+
+def get_resume_index(file_name:str, file_format:str, meta:dict) -> int:
+    """number of applications in file_name that a refresh can keep, 0 if the file doesn't match its meta.
+    rows written after the last meta update (interrupted export) are cut off.
+    """
+    if not os.path.exists(file_name):
+        return 0
+
+    if file_format == 'parquet':
+        return meta['applications']
+
+    size = os.path.getsize(file_name)
+
+    if 'size' not in meta or size < meta['size']:
+        return 0
+
+    if size > meta['size']:
+        os.truncate(file_name, meta['size'])
+
+    return meta['applications']
+
+
+def write_meta(file_name:str, meta:dict):
+    with open(get_meta_file_name(file_name), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+
+def is_matching_meta(meta:dict, chain_id:int, product_address:str, file_format:str) -> bool:
+    return (
+        meta is not None
+        and meta['chain_id'] == chain_id
+        and meta['product'].lower() == str(product_address).lower()
+        and meta['format'] == file_format)
+
+
+def _write_csv(file_name:str, rows:list, append:bool):
+    with open(file_name, 'a' if append else 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=FIELDS)
+
+        if not append:
+            writer.writeheader()
+
+        writer.writerows(rows)
+
+
+def _write_ndjson(file_name:str, rows:list, append:bool):
+    with open(file_name, 'a' if append else 'w') as ndjson_file:
+        for row in rows:
+            ndjson_file.write(json.dumps(row))
+            ndjson_file.write('\n')
+
+
+def _write_parquet(file_name:str, rows:list, append:bool):
+    """parquet files can't be appended to, existing rows are read and rewritten"""
+    pq = _get_parquet()
+    import pyarrow as pa
+
+    schema = _get_parquet_schema()
+    table = pa.Table.from_pylist([_to_text(row) for row in rows], schema=schema)
+
+    if append and os.path.exists(file_name):
+        table = pa.concat_tables([pq.read_table(file_name, schema=schema), table])
+
+    pq.write_table(table, file_name)
+
+
+def _get_parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        (field, pa.int64() if field in INT_FIELDS else pa.string())
+        for field in FIELDS])
+
+
+def _get_parquet():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as ex:
+        raise RuntimeError('parquet export requires pyarrow (pip install pyarrow)') from ex
+
+    return pq
+
+
+def _to_text(row:dict) -> dict:
+    return {
+        field: str(value) if field in AMOUNT_FIELDS and value is not None else value
+        for (field, value) in row.items()}
+
+
+def _from_text(row:dict) -> dict:
+    return {
+        field: _parse_value(field, value)
+        for (field, value) in row.items()}
+
+
+def _parse_value(field:str, value):
+    if value is None or value == '':
+        return None
+
+    if field in INT_FIELDS or field in AMOUNT_FIELDS:
+        return int(value)
+
+    return value
+
+
+def main(product_address, file_name, full=False):
+    from scripts.deploy_depeg import get_product_graph
+
+    graph = get_product_graph(product_address)
+    export = PortfolioExport(graph['product'], graph['instance_service'])
+    summary = export.export(file_name, full=full in [True, 'True', 'true', '1'])
+
+    print('exported {} rows ({} new) at block {} to {} in {:.1f}s ({:.1f} rows/s, {} round trips)'.format(
+        summary['rows'],
+        summary['new_rows'],
+        summary['block'],
+        summary['file'],
+        summary['elapsed'],
+        summary['rows_per_second'],
+        summary['round_trips']))
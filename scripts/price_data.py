@@ -37,6 +37,9 @@ STATE_STABILITY = {
     'Depegged': 4,
 }
 
+# rounds per setRoundDataBatch transaction (~150k gas per round)
+INJECT_CHUNK_SIZE = 50
+
 # actual chainlink aggregator data, may be validated against
 # https://etherscan.io/address/0x8fFfFfd4AfB6115b954Bd326cbe7B4BA576818f6#readContract
 USDC_CHAINLINK_DATA = [
@@ -220,6 +223,37 @@ def inject_data(
         )
 
 
+def inject_data_batch(
+    usdc_feeder,
+    data,
+    owner=None,
+    chunk_size=INJECT_CHUNK_SIZE,
+    sleep=False
+) -> int:
+    """injects data strings or round data tuples with setRoundDataBatch, one transaction per chunk.
+    with sleep=True the chain time is moved to the last updatedAt of each chunk before the chunk is sent.
+    returns the number of transactions.
+    """
+    rounds = [data_to_round_data(d) if isinstance(d, str) else tuple(d) for d in data]
+    tx_params = {'from': owner} if owner else {}
+    transactions = 0
+
+    for start in range(0, len(rounds), chunk_size):
+        chunk = rounds[start:start + chunk_size]
+
+        if sleep:
+            sleep_time = max([round_data[3] for round_data in chunk]) - chain.time()
+            assert sleep_time >= 0
+
+            chain.sleep(sleep_time)
+            chain.mine(1)
+
+        usdc_feeder.setRoundDataBatch(chunk, tx_params)
+        transactions += 1
+
+    return transactions
+
+
 def data_to_round_data(data):
     round_data = data.split()
     round_id = int(round_data[0])
@@ -4,9 +4,27 @@
 import argparse
 import sys
 
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
 from dotenv import dotenv_values
 from web3 import Web3
 
+try:
+    from eth_abi import decode as decodeAbi
+except ImportError:
+    from eth_abi import decode_abi as decodeAbi
+
+from scripts.round_store import RoundStore
+
+# download defaults: concurrent requests, rounds per json-rpc batch and rounds per store append
+WORKERS_DEFAULT = 8
+BATCH_SIZE_DEFAULT = 50
+CHUNK_SIZE_DEFAULT = 1000
+
+ROUND_DATA_TYPES = ['uint80', 'int256', 'uint256', 'uint256', 'uint80']
+
 # RPC endpoint URLs
 rpcEndpoint = {}
 
@@ -71,14 +89,101 @@ def getAggregators(feed):
     return aggregators
 
 
-def fetchAggregatorData(feed, phaseId, latestRound):
+def fetchAggregatorData(feed, phaseId, latestRound, workers=WORKERS_DEFAULT, batchSize=0):
+    print('# roundId answer startedAt updatedAt answeredInRound phaseId aggregatorRoundId')
+    for startRound in range(1, latestRound + 1, CHUNK_SIZE_DEFAULT):
+        endRound = min(startRound + CHUNK_SIZE_DEFAULT - 1, latestRound)
+
+        for row in fetchPhaseRounds(feed, phaseId, startRound, endRound, workers, batchSize):
+            print(*row[2:], row[0], row[1])
+
+
+def fetchRoundData(feed, roundIds, workers=WORKERS_DEFAULT):
+    """getRoundData for all round ids, fanned out over a bounded pool of concurrent requests"""
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(lambda roundId: tuple(feed.functions.getRoundData(roundId).call()), roundIds))
+
+
+def fetchRoundDataBatch(feed, roundIds, workers=WORKERS_DEFAULT, batchSize=BATCH_SIZE_DEFAULT):
+    """getRoundData for all round ids with json-rpc batch requests of batchSize eth_call each"""
+    endpoint = feed.web3.provider.endpoint_uri
+    batches = [roundIds[i:i + batchSize] for i in range(0, len(roundIds), batchSize)]
+
+    def fetchBatch(batch):
+        payload = [
+            {
+                'jsonrpc': '2.0',
+                'id': i,
+                'method': 'eth_call',
+                'params': [{'to': feed.address, 'data': feed.encodeABI(fn_name='getRoundData', args=[roundId])}, 'latest'],
+            }
+            for i, roundId in enumerate(batch)]
+
+        response = requests.post(endpoint, json=payload, timeout=60)
+        response.raise_for_status()
+        results = sorted(response.json(), key=lambda result: result['id'])
+
+        if len(results) != len(batch):
+            raise RuntimeError('batch size mismatch: {} requests {} results'.format(len(batch), len(results)))
+
+        for result in results:
+            if 'error' in result:
+                raise RuntimeError('getRoundData({}) failed: {}'.format(batch[result['id']], result['error']))
+
+        return [tuple(decodeAbi(ROUND_DATA_TYPES, bytes.fromhex(result['result'][2:]))) for result in results]
+
+    with ThreadPoolExecutor(workers) as pool:
+        return [data for batchData in pool.map(fetchBatch, batches) for data in batchData]
+
+
+def fetchPhaseRounds(feed, phaseId, startRound, endRound, workers=WORKERS_DEFAULT, batchSize=0):
+    """returns (phaseId, aggregatorRoundId, roundId, answer, startedAt, updatedAt, answeredInRound) rows"""
     roundIdBase = phaseId * 2**64
+    aggregatorRoundIds = list(range(startRound, endRound + 1))
+    roundIds = [roundIdBase + aggregatorRoundId for aggregatorRoundId in aggregatorRoundIds]
+
+    if batchSize > 0:
+        data = fetchRoundDataBatch(feed, roundIds, workers, batchSize)
+    else:
+        data = fetchRoundData(feed, roundIds, workers)
+
+    return [(phaseId, aggregatorRoundId) + tuple(d) for aggregatorRoundId, d in zip(aggregatorRoundIds, data)]
+
+
+def download(web3, feed, store, trunc=0, workers=WORKERS_DEFAULT, batchSize=0, chunkSize=CHUNK_SIZE_DEFAULT):
+    """fetches all rounds of all phases not yet in store. returns the number of new rounds.
+    resumes after the last stored round of each phase, repeated calls only fetch new rounds.
+    """
+    newRounds = 0
+
+    for phaseId, address in getAggregators(feed):
+        aggregator = getAggregator(web3, address)
+        latestRound = aggregator.functions.latestRound().call()
+
+        # if truncate defined, set number of samples to min(latestRound, trunc)
+        if trunc > 0 and latestRound > trunc:
+            latestRound = trunc
+
+        lastStoredRound = store.get_last_round(feed.address, phaseId)
+        print('# phaseId {} aggregatorAddress {} latestRound {} stored {}'.format(phaseId, address, latestRound, lastStoredRound))
+
+        for startRound in range(lastStoredRound + 1, latestRound + 1, chunkSize):
+            endRound = min(startRound + chunkSize - 1, latestRound)
+            rows = fetchPhaseRounds(feed, phaseId, startRound, endRound, workers, batchSize)
+            store.append(feed.address, rows)
+            newRounds += len(rows)
 
+            print('# phaseId {} rounds {}..{} stored'.format(phaseId, startRound, endRound))
+
+    return newRounds
+
+
+def dump(feed, store):
+    """prints the stored rounds in the same format as fetchAggregatorData"""
     print('# roundId answer startedAt updatedAt answeredInRound phaseId aggregatorRoundId')
-    for aggregatorRoundId in range(1, latestRound + 1):
-        roundId = roundIdBase + aggregatorRoundId
-        data = feed.functions.getRoundData(roundId).call()
-        print(data[0], data[1], data[2], data[3], data[4], phaseId, aggregatorRoundId)
+    for roundData in store.read_rounds(feed.address):
+        roundId = roundData[0]
+        print(*roundData, roundId // 2**64, roundId % 2**64)
 
 
 def configure():
@@ -88,14 +193,26 @@ def configure():
         rpcEndpoint['mainnet'] = config['RPC_MAINNET']
 
 
-def do(net, pair, trunc):
+def do(net, pair, trunc, storeDirectory=None, workers=WORKERS_DEFAULT, batchSize=0, dumpStore=False):
     feed = getFeed(net, pair)
-    aggregators = getAggregators(feed)
     web3 = getWeb3(net)
     description = feed.functions.description().call()
 
     print('# net {} chainId {} feedAddress {} description "{}"'.format(net, web3.eth.chain_id, feed.address, description))
 
+    if storeDirectory:
+        store = RoundStore(storeDirectory)
+
+        if dumpStore:
+            dump(feed, store)
+        else:
+            newRounds = download(web3, feed, store, trunc, workers, batchSize)
+            print('# new rounds {} total rounds {}'.format(newRounds, store.get_rows(feed.address)))
+
+        return
+
+    aggregators = getAggregators(feed)
+
     for a in aggregators:
         phaseId, address = a
         aggregator = getAggregator(web3, address)
@@ -110,7 +227,7 @@ def do(net, pair, trunc):
             if trunc > 0 and latestRound > trunc:
                 latestRound = trunc
             
-            fetchAggregatorData(feed, phaseId, latestRound)
+            fetchAggregatorData(feed, phaseId, latestRound, workers, batchSize)
 
         except:
             exInfo = sys.exc_info()
@@ -122,17 +239,24 @@ def main() -> int:
     parser.add_argument('--pair', type=str, help='pair, eg: USDC/USD, USDT/USD')
     parser.add_argument('--net', type=str, default='mainnet', help='net to connect, one of: goerli, mainnet')
     parser.add_argument('--trunc', type=int, default=0, help='truncate feed data after n samples per phase (default: 0 = disable truncate)')
+    parser.add_argument('--store', type=str, default=None, help='round store directory, downloads/refreshes the store instead of printing')
+    parser.add_argument('--dump', action='store_true', help='print the rounds in --store instead of downloading')
+    parser.add_argument('--workers', type=int, default=WORKERS_DEFAULT, help='concurrent requests (default: {})'.format(WORKERS_DEFAULT))
+    parser.add_argument('--batch', type=int, default=0, help='rounds per json-rpc batch request (default: 0 = no batching)')
     args = parser.parse_args()
 
     configure()
-    do(args.net, args.pair, args.trunc)
+    do(args.net, args.pair, args.trunc, args.store, args.workers, args.batch, args.dump)
 
     return 0
 
 
-# example command lines for calling this script
-# python scripts/price_feed.py --help
-# python scripts/price_feed.py --pair USDC/USD --trunc 2
-# python scripts/price_feed.py --net mainnet --pair USDC/USD > chainlink_usdc_usd_all.txt
+# example command lines for calling this script (from the repository root)
+# python -m scripts.price_feed --help
+# python -m scripts.price_feed --pair USDC/USD --trunc 2
+# python -m scripts.price_feed --net mainnet --pair USDC/USD > chainlink_usdc_usd_all.txt
+# python -m scripts.price_feed --pair USDC/USD --store data/rounds --workers 16
+# python -m scripts.price_feed --pair USDC/USD --store data/rounds --batch 100
+# python -m scripts.price_feed --pair USDC/USD --store data/rounds --dump > usdc_usd.txt
 if __name__ == '__main__':
     sys.exit(main())
\ No newline at end of file
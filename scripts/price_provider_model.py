@@ -0,0 +1,290 @@
+# off-chain reference model of contracts/UsdcPriceDataProvider.sol
+# all arithmetic is done on python integers and follows the solidity code
+# line by line, including reverts (raised as RuntimeError) and uint256 casts.
+# the model has no brownie dependency and can be used for fast backtests.
+
+UINT256_MODULUS = 2 ** 256
+
+CHAINLINK_USDC_DECIMALS = 8
+
+# see UsdcPriceDataProvider constants
+DEPEG_TRIGGER_PRICE = 995 * 10**CHAINLINK_USDC_DECIMALS // 1000
+DEPEG_RECOVERY_PRICE = 999 * 10**CHAINLINK_USDC_DECIMALS // 1000
+DEPEG_RECOVERY_WINDOW = 24 * 3600
+
+CHAINLINK_USDC_USD_DEVIATION = 25 * 10**CHAINLINK_USDC_DECIMALS // 10000
+CHAINLINK_HEARTBEAT_MARGIN = 100
+CHAINLINK_USDC_USD_HEARTBEAT = 24 * 3600
+
+# enum values of IPriceDataProvider (same as in scripts/price_data.py)
+COMPLIANCE_UNDEFINED = 0
+COMPLIANCE_INITIALIZING = 1
+COMPLIANCE_VALID = 2
+COMPLIANCE_FAILED_ONCE = 3
+COMPLIANCE_FAILED_MULTIPLE_TIMES = 4
+
+STABILITY_UNDEFINED = 0
+STABILITY_INITIALIZING = 1
+STABILITY_STABLE = 2
+STABILITY_TRIGGERED = 3
+STABILITY_DEPEGGED = 4
+
+EVENT_UNDEFINED = 0
+EVENT_UPDATE = 1
+EVENT_TRIGGER = 2
+EVENT_RECOVERY = 3
+EVENT_DEPEG = 4
+
+
+def new_price_info(
+    id:int=0,
+    price:int=0,
+    compliance:int=COMPLIANCE_UNDEFINED,
+    stability:int=STABILITY_UNDEFINED,
+    event_type:int=EVENT_UNDEFINED,
+    triggered_at:int=0,
+    depegged_at:int=0,
+    created_at:int=0
+) -> dict:
+    """price info dict with the same keys as IPriceDataProvider.PriceInfo().dict()"""
+    return {
+        'id': id,
+        'price': price,
+        'compliance': compliance,
+        'stability': stability,
+        'eventType': event_type,
+        'triggeredAt': triggered_at,
+        'depeggedAt': depegged_at,
+        'createdAt': created_at,
+    }
+
+
+class UsdcPriceDataProviderModel(object):
+
+    def __init__(
+        self,
+        trigger_price:int=DEPEG_TRIGGER_PRICE,
+        recovery_price:int=DEPEG_RECOVERY_PRICE,
+        recovery_window:int=DEPEG_RECOVERY_WINDOW,
+        deviation:int=CHAINLINK_USDC_USD_DEVIATION,
+        heartbeat:int=CHAINLINK_USDC_USD_HEARTBEAT,
+        heartbeat_margin:int=CHAINLINK_HEARTBEAT_MARGIN
+    ):
+        self.trigger_price = trigger_price
+        self.recovery_price = recovery_price
+        self.recovery_window = recovery_window
+        self.deviation = deviation
+        self.heartbeat = heartbeat
+        self.heartbeat_margin = heartbeat_margin
+
+        # AggregatorDataProvider state (testnet mode)
+        self.rounds = {}
+        self.max_round_id = 0
+
+        # UsdcPriceDataProvider state
+        self.depeg_price_info = new_price_info()
+        self.triggered_at = 0
+        self.depegged_at = 0
+
+
+    def set_round_data(
+        self,
+        round_id:int,
+        answer:int,
+        started_at:int,
+        updated_at:int,
+        answered_in_round:int
+    ):
+        if round_id > self.max_round_id:
+            self.max_round_id = round_id
+
+        self.rounds[round_id] = (round_id, answer, started_at, updated_at, answered_in_round)
+
+
+    def add_round_data(self, answer:int, started_at:int):
+        self.max_round_id += 1
+        self.set_round_data(self.max_round_id, answer, started_at, started_at, self.max_round_id)
+
+
+    def get_round_data(self, round_id:int) -> tuple:
+        return self.rounds.get(round_id, (0, 0, 0, 0, 0))
+
+
+    def latest_round_data(self) -> tuple:
+        return self.get_round_data(self.max_round_id)
+
+
+    def is_exceeding_deviation(self, price1:int, price2:int) -> bool:
+        if price1 >= price2:
+            return price1 - price2 > self.deviation
+
+        return price2 - price1 > self.deviation
+
+
+    def is_exceeding_heartbeat(self, time1:int, time2:int) -> bool:
+        if time1 >= time2:
+            return time1 - time2 > self.heartbeat + self.heartbeat_margin
+
+        return time2 - time1 > self.heartbeat + self.heartbeat_margin
+
+
+    def get_compliance(self, round_id:int, price:int, updated_at:int) -> tuple:
+        """returns (price_deviation_is_valid, heartbeat_is_valid, previous_price, previous_updated_at)"""
+        if round_id == 0:
+            return (True, True, 0, 0)
+
+        (_, previous_price_int, _, previous_updated_at, _) = self.get_round_data(round_id - 1)
+
+        if previous_updated_at == 0:
+            return (True, True, 0, previous_updated_at)
+
+        # uint256(int256) cast
+        previous_price = previous_price_int % UINT256_MODULUS
+
+        return (
+            not self.is_exceeding_deviation(price, previous_price),
+            not self.is_exceeding_heartbeat(updated_at, previous_updated_at),
+            previous_price,
+            previous_updated_at)
+
+
+    def get_compliance_state(self, round_id:int, price:int, updated_at:int) -> int:
+        (
+            price_deviation_is_valid,
+            heartbeat_is_valid,
+            previous_price,
+            previous_updated_at
+        ) = self.get_compliance(round_id, price, updated_at)
+
+        if previous_updated_at == 0:
+            return COMPLIANCE_INITIALIZING
+
+        if price_deviation_is_valid and heartbeat_is_valid:
+            return COMPLIANCE_VALID
+
+        (
+            previous_price_deviation_is_valid,
+            previous_heartbeat_is_valid,
+            _,
+            pre_previous_updated_at
+        ) = self.get_compliance(round_id - 1, previous_price, previous_updated_at)
+
+        if (previous_price_deviation_is_valid and previous_heartbeat_is_valid) or pre_previous_updated_at == 0:
+            return COMPLIANCE_FAILED_ONCE
+
+        return COMPLIANCE_FAILED_MULTIPLE_TIMES
+
+
+    def get_stability(self, round_id:int, price:int, updated_at:int) -> int:
+        if updated_at == 0:
+            return STABILITY_INITIALIZING
+
+        if self.depegged_at > 0:
+            return STABILITY_DEPEGGED
+
+        if self.triggered_at > 0:
+            if updated_at < self.triggered_at:
+                # checked arithmetic in solidity 0.8
+                raise RuntimeError('arithmetic underflow: updatedAt {} < triggeredAt {}'.format(updated_at, self.triggered_at))
+
+            if updated_at - self.triggered_at > self.recovery_window:
+                return STABILITY_DEPEGGED
+
+            if price >= self.recovery_price:
+                return STABILITY_STABLE
+
+            return STABILITY_TRIGGERED
+
+        if price <= self.trigger_price:
+            return STABILITY_TRIGGERED
+
+        return STABILITY_STABLE
+
+
+    def get_latest_price_info(self) -> dict:
+        (round_id, answer, _, updated_at, _) = self.latest_round_data()
+
+        if answer < 0:
+            raise RuntimeError('ERROR:UPDP-020:NEGATIVE_PRICE_VALUES_INVALID')
+
+        price = answer
+        compliance = self.get_compliance_state(round_id, price, updated_at)
+        stability = self.get_stability(round_id, price, updated_at)
+
+        event_type = EVENT_UPDATE
+        triggered_at = self.triggered_at
+        depegged_at = self.depegged_at
+
+        if stability == STABILITY_DEPEGGED and self.depegged_at == 0:
+            event_type = EVENT_DEPEG
+            depegged_at = updated_at
+        elif stability == STABILITY_TRIGGERED and self.triggered_at == 0:
+            event_type = EVENT_TRIGGER
+            triggered_at = updated_at
+        elif stability == STABILITY_STABLE and self.triggered_at > 0:
+            event_type = EVENT_RECOVERY
+
+        return new_price_info(
+            round_id,
+            price,
+            compliance,
+            stability,
+            event_type,
+            triggered_at,
+            depegged_at,
+            updated_at)
+
+
+    def process_latest_price_info(self) -> dict:
+        price_info = self.get_latest_price_info()
+
+        if price_info['eventType'] == EVENT_DEPEG:
+            self.depeg_price_info = dict(price_info)
+            self.depegged_at = price_info['depeggedAt']
+        elif price_info['eventType'] == EVENT_TRIGGER:
+            self.triggered_at = price_info['triggeredAt']
+        elif price_info['eventType'] == EVENT_RECOVERY:
+            self.triggered_at = 0
+
+        return price_info
+
+
+    def is_new_price_info_event_available(self, block_timestamp:int) -> tuple:
+        """returns (new_event, price_info, time_since_event)"""
+        price_info = self.get_latest_price_info()
+        new_event = price_info['eventType'] not in [EVENT_UNDEFINED, EVENT_UPDATE]
+
+        if price_info['createdAt'] > 0 and block_timestamp < price_info['createdAt']:
+            raise RuntimeError('arithmetic underflow: block timestamp {} < createdAt {}'.format(block_timestamp, price_info['createdAt']))
+
+        time_since_event = 0 if price_info['createdAt'] == 0 else block_timestamp - price_info['createdAt']
+        return (new_event, price_info, time_since_event)
+
+
+    def force_depeg_for_next_price_info(self):
+        if self.triggered_at <= self.recovery_window:
+            raise RuntimeError('ERROR:UPDP-030:TRIGGERED_AT_TOO_SMALL')
+
+        self.triggered_at -= self.recovery_window
+
+
+    def reset_depeg(self):
+        # same as the contract: event type of the depeg price info is not reset
+        event_type = self.depeg_price_info['eventType']
+        self.depeg_price_info = new_price_info(event_type=event_type)
+
+        self.triggered_at = 0
+        self.depegged_at = 0
+
+
+    def process_rounds(self, rounds:list) -> list:
+        """sets each (round_id, answer, started_at, updated_at, answered_in_round) round and processes it.
+        returns the resulting price info sequence.
+        """
+        price_infos = []
+
+        for round_data in rounds:
+            self.set_round_data(*round_data)
+            price_infos.append(self.process_latest_price_info())
+
+        return price_infos
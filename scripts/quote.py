@@ -0,0 +1,450 @@
+# off-chain premium quotes for the depeg product.
+# the functions below reproduce the integer math of DepegRiskpool (calculateSumInsured,
+# calculatePremium, bundleMatchesApplication2/detailedBundleApplicationMatch),
+# BasicRiskpool2._lockCollateral and DepegProduct.calculatePremium exactly,
+# a quote engine answers from decoded bundle data without any rpc calls.
+
+from bisect import insort
+
+from scripts.multicall import Multicall
+
+# see DepegRiskpool
+ONE_YEAR_DURATION = 365 * 24 * 3600
+APR_100_PERCENTAGE = 10 ** 6
+
+# see IBundle.BundleState
+BUNDLE_STATE_ACTIVE = 0
+
+COMMENT_MATCH = 'recommended bundle'
+COMMENT_NO_MATCH = 'no matching bundle'
+COMMENT_NO_CAPACITY = 'insufficient riskpool capacity'
+
+# bounds of an empty subtree (matches nothing)
+INF = 2 ** 256
+EMPTY_BOUNDS = (INF, -1, INF, -1, -1, -1)
+
+
+def calculate_sum_insured(protected_balance:int, sum_insured_percentage:int) -> int:
+    """DepegRiskpool.calculateSumInsured"""
+    return (protected_balance * sum_insured_percentage) // 100
+
+
+def calculate_net_premium(sum_insured:int, duration:int, annual_percentage_return:int) -> int:
+    """DepegRiskpool.calculatePremium"""
+    policy_duration_return = annual_percentage_return * duration // ONE_YEAR_DURATION
+    return sum_insured * policy_duration_return // APR_100_PERCENTAGE
+
+
+def calculate_premium(net_premium:int, fixed_fee:int, fractional_fee:int, fraction_full_unit:int) -> int:
+    """DepegProduct.calculatePremium (net premium plus fixed and fractional fees)"""
+    return fraction_full_unit * (net_premium + fixed_fee) // (fraction_full_unit - fractional_fee)
+
+
+def calculate_fee(amount:int, fixed_fee:int, fractional_fee:int, fraction_full_unit:int) -> int:
+    """DepegProduct.calculateFee (fee amount only)"""
+    fee_amount = fixed_fee
+
+    if fractional_fee > 0:
+        fee_amount += (fractional_fee * amount) // fraction_full_unit
+
+    return fee_amount
+
+
+def is_bundle_expired(bundle:dict, now:int) -> bool:
+    """expiry check of DepegRiskpool.bundleMatchesApplication2, lifetime includes extensions"""
+    return now > bundle['createdAt'] + bundle['lifetime']
+
+
+def bundle_matches_application(
+    bundle:dict,
+    sum_insured:int,
+    duration:int,
+    max_net_premium:int,
+    application_bundle_id:int=0
+) -> bool:
+    """DepegRiskpool.detailedBundleApplicationMatch"""
+    if application_bundle_id > 0 and bundle['bundleId'] != application_bundle_id:
+        return False
+
+    sum_insured_ok = bundle['minSumInsured'] <= sum_insured <= bundle['maxSumInsured']
+    duration_ok = bundle['minDuration'] <= duration <= bundle['maxDuration']
+
+    premium = calculate_net_premium(sum_insured, duration, bundle['annualPercentageReturn'])
+    premium_ok = premium <= max_net_premium
+
+    return sum_insured_ok and duration_ok and premium_ok
+
+
+def get_bundle_bounds(bundle:dict) -> tuple:
+    """(minSumInsured, maxSumInsured, minDuration, maxDuration, free capital, expiry) of an active bundle"""
+    if bundle['state'] != BUNDLE_STATE_ACTIVE:
+        return EMPTY_BOUNDS
+
+    return (
+        bundle['minSumInsured'],
+        bundle['maxSumInsured'],
+        bundle['minDuration'],
+        bundle['maxDuration'],
+        bundle['capital'] - bundle['lockedCapital'],
+        bundle['createdAt'] + bundle['lifetime'])
+
+
+def bundle_fits(bundle:dict, sum_insured:int, duration:int, now:int) -> bool:
+    """bundle is active, not expired, matches sum insured and duration and has enough free capital"""
+    return _bounds_fit(get_bundle_bounds(bundle), sum_insured, duration, now)
+
+
+class BundleMatchIndex(object):
+    """active bundles in riskpool priority order with a bounds segment tree.
+
+    bundles are ordered by (apr, activation sequence) like the active bundle list
+    of BasicRiskpool2. each tree node holds the bounds of its subtree (smallest
+    minSumInsured/minDuration, largest maxSumInsured/maxDuration, free capital
+    and expiry), find() descends to the leftmost fitting leaf and skips subtrees
+    whose bounds exclude the application. bundles with similar ranges end up
+    with a search close to O(log n), the worst case remains a full scan.
+
+    capital and state updates of known bundles touch a single leaf (O(log n)),
+    new bundles are inserted into the priority order and the tree is rebuilt
+    once before the next search.
+    """
+
+    def __init__(self, bundles:list=None):
+        self.bundles = {}
+        self.bundle_keys = {}
+        self.keys = []
+        self.sequence = 0
+
+        self.leaves = []
+        self.positions = {}
+        self.size = 0
+        self.tree = []
+        self.dirty = False
+
+        for bundle in bundles or []:
+            self.upsert(bundle)
+
+
+    def __len__(self) -> int:
+        return len(self.bundles)
+
+
+    def __contains__(self, bundle_id:int) -> bool:
+        return bundle_id in self.bundles
+
+
+    def get(self, bundle_id:int) -> dict:
+        return self.bundles.get(bundle_id)
+
+
+    def get_bundles(self) -> list:
+        """bundles in priority order"""
+        return [self.bundles[key[2]] for key in self.keys if self.bundle_keys.get(key[2]) == key]
+
+
+    def upsert(self, bundle:dict):
+        """adds a new bundle (after known bundles with the same apr) or updates a known one"""
+        bundle_id = bundle['bundleId']
+
+        if bundle_id not in self.bundles:
+            self.sequence += 1
+            key = (bundle['annualPercentageReturn'], self.sequence, bundle_id)
+            insort(self.keys, key)
+
+            self.bundles[bundle_id] = bundle
+            self.bundle_keys[bundle_id] = key
+            self.dirty = True
+            return
+
+        self.bundles[bundle_id] = bundle
+
+        if not self.dirty:
+            self._set_leaf(self.positions[bundle_id], get_bundle_bounds(bundle))
+
+
+    def remove(self, bundle_id:int):
+        """removes a bundle (eg locked or closed), re-activated bundles are added again with upsert"""
+        if bundle_id not in self.bundles:
+            return
+
+        del self.bundles[bundle_id]
+        del self.bundle_keys[bundle_id]
+
+        if not self.dirty:
+            self._set_leaf(self.positions.pop(bundle_id), EMPTY_BOUNDS)
+
+
+    def find(self, sum_insured:int, duration:int, now:int) -> dict:
+        """first bundle in priority order that fits the application, None if no bundle fits"""
+        if self.dirty:
+            self._rebuild()
+
+        tree = self.tree
+        stack = [1] if len(self.leaves) > 0 else []
+
+        while stack:
+            node = stack.pop()
+
+            if not _bounds_fit(tree[node], sum_insured, duration, now):
+                continue
+
+            if node >= self.size:
+                return self.bundles[self.leaves[node - self.size]]
+
+            # left subtree holds the lower apr bundles
+            stack.append(2 * node + 1)
+            stack.append(2 * node)
+
+        return None
+
+
+    def _rebuild(self):
+        # drops keys of removed and re-added bundles
+        self.keys = [key for key in self.keys if self.bundle_keys.get(key[2]) == key]
+        self.leaves = [bundle_id for (_, _, bundle_id) in self.keys]
+        self.positions = {bundle_id: idx for (idx, bundle_id) in enumerate(self.leaves)}
+
+        size = 1
+        while size < len(self.leaves):
+            size *= 2
+
+        tree = [EMPTY_BOUNDS] * (2 * size)
+
+        for (idx, bundle_id) in enumerate(self.leaves):
+            tree[size + idx] = get_bundle_bounds(self.bundles[bundle_id])
+
+        for node in range(size - 1, 0, -1):
+            tree[node] = _merge_bounds(tree[2 * node], tree[2 * node + 1])
+
+        self.size = size
+        self.tree = tree
+        self.dirty = False
+
+
+    def _set_leaf(self, position:int, bounds:tuple):
+        node = self.size + position
+        self.tree[node] = bounds
+        node //= 2
+
+        while node > 0:
+            self.tree[node] = _merge_bounds(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+
+def _bounds_fit(bounds:tuple, sum_insured:int, duration:int, now:int) -> bool:
+    (min_sum_insured, max_sum_insured, min_duration, max_duration, capacity, expiry) = bounds
+
+    return (
+        min_sum_insured <= sum_insured <= max_sum_insured
+        and min_duration <= duration <= max_duration
+        and capacity >= sum_insured
+        and expiry >= now)
+
+
+def _merge_bounds(left:tuple, right:tuple) -> tuple:
+    return (
+        min(left[0], right[0]),
+        max(left[1], right[1]),
+        min(left[2], right[2]),
+        max(left[3], right[3]),
+        max(left[4], right[4]),
+        max(left[5], right[5]))
+
+
+class QuoteEngine(object):
+    """premium quotes from decoded bundle, pool and fee data.
+
+    bundles are expected in the order of DepegRiskpool.getActiveBundleIds
+    (increasing apr), the first bundle that matches the application and has
+    enough free capital is the one _lockCollateral would pick.
+    all inputs are plain ints, quotes need no chain access.
+    """
+
+    def __init__(
+        self,
+        bundles:list,
+        pool:dict,
+        fee:dict,
+        sum_insured_percentage:int
+    ):
+        self.index = BundleMatchIndex(bundles)
+        self.pool = pool
+        self.fee = fee
+        self.sum_insured_percentage = sum_insured_percentage
+
+
+    @property
+    def bundles(self) -> list:
+        return self.index.get_bundles()
+
+
+    def set_params(self, pool:dict, fee:dict, sum_insured_percentage:int):
+        self.pool = pool
+        self.fee = fee
+        self.sum_insured_percentage = sum_insured_percentage
+
+
+    def update_bundle(self, bundle:dict):
+        self.index.upsert(bundle)
+
+
+    def remove_bundle(self, bundle_id:int):
+        self.index.remove(bundle_id)
+
+
+    def get_sum_insured(self, protected_balance:int) -> int:
+        return calculate_sum_insured(protected_balance, self.sum_insured_percentage)
+
+
+    def get_net_premium(self, sum_insured:int, duration:int, bundle:dict) -> int:
+        return calculate_net_premium(sum_insured, duration, bundle['annualPercentageReturn'])
+
+
+    def get_premium(self, net_premium:int) -> int:
+        return calculate_premium(
+            net_premium,
+            self.fee['fixedFee'],
+            self.fee['fractionalFee'],
+            self.fee['fractionFullUnit'])
+
+
+    def has_pool_capacity(self, sum_insured:int) -> bool:
+        """pool level checks of BasicRiskpool2._lockCollateral and the sum insured cap"""
+        capital_ok = self.pool['capital'] > self.pool['lockedCapital'] + sum_insured
+        cap_ok = self.pool['sumOfSumInsuredAtRisk'] + sum_insured <= self.pool['sumOfSumInsuredCap']
+
+        return capital_ok and cap_ok
+
+
+    def quote(self, protected_balance:int, duration:int, now:int, bundle_id:int=0) -> dict:
+        """returns the quote for the first matching bundle (restricted to bundle_id if > 0)"""
+        sum_insured = self.get_sum_insured(protected_balance)
+        result = {
+            'bundleId': None,
+            'apr': None,
+            'annualPercentageReturn': None,
+            'protectedBalance': protected_balance,
+            'sumInsured': sum_insured,
+            'duration': duration,
+            'netPremium': None,
+            'premium': None,
+            'comment': COMMENT_NO_MATCH,
+        }
+
+        if not self.has_pool_capacity(sum_insured):
+            result['comment'] = COMMENT_NO_CAPACITY
+            return result
+
+        # the product sets the application max net premium from the bundle apr,
+        # the premium check of detailedBundleApplicationMatch always passes
+        if bundle_id > 0:
+            bundle = self.index.get(bundle_id)
+            bundle = bundle if bundle and bundle_fits(bundle, sum_insured, duration, now) else None
+        else:
+            bundle = self.index.find(sum_insured, duration, now)
+
+        if not bundle:
+            return result
+
+        net_premium = self.get_net_premium(sum_insured, duration, bundle)
+
+        result['bundleId'] = bundle['bundleId']
+        result['apr'] = 100 * bundle['annualPercentageReturn'] / APR_100_PERCENTAGE
+        result['annualPercentageReturn'] = bundle['annualPercentageReturn']
+        result['netPremium'] = net_premium
+        result['premium'] = self.get_premium(net_premium)
+        result['comment'] = COMMENT_MATCH
+
+        return result
+
+
+def get_quote_params(
+    product,
+    riskpool,
+    instance_service,
+    multicall:Multicall,
+    block_identifier=None
+) -> tuple:
+    """reads (active bundle ids, pool, fee, sum_insured_percentage) with a single batched call"""
+    (
+        bundle_ids,
+        pool,
+        fee_spec,
+        fraction_full_unit,
+        sum_insured_percentage,
+    ) = multicall.call([
+        (riskpool.getActiveBundleIds, ()),
+        (instance_service.getRiskpool, (riskpool.getId(),)),
+        (product.getFeeSpecification, (product.getId(),)),
+        (product.getFeeFractionFullUnit, ()),
+        (riskpool.getSumInsuredPercentage, ()),
+    ], block_identifier=block_identifier)
+
+    fee = {
+        'fixedFee': fee_spec.dict()['fixedFee'],
+        'fractionalFee': fee_spec.dict()['fractionalFee'],
+        'fractionFullUnit': fraction_full_unit,
+    }
+
+    return (list(bundle_ids), to_quote_pool(pool), fee, sum_insured_percentage)
+
+
+def get_quote_bundles(riskpool, bundle_ids:list, multicall:Multicall, block_identifier=None) -> list:
+    """decoded bundle data, a single getBundleInfo call per bundle (batched via multicall if available)"""
+    bundle_infos = multicall.map(riskpool.getBundleInfo, bundle_ids, block_identifier=block_identifier)
+    return [to_quote_bundle(info) for info in bundle_infos]
+
+
+def get_quote_data(
+    product,
+    riskpool,
+    instance_service,
+    multicall:Multicall=None,
+    block_identifier=None
+) -> tuple:
+    """reads (bundles, pool, fee, sum_insured_percentage) for a QuoteEngine, all reads pinned to one block"""
+    multicall = multicall or Multicall()
+
+    (bundle_ids, pool, fee, sum_insured_percentage) = get_quote_params(
+        product, riskpool, instance_service, multicall, block_identifier)
+
+    bundles = get_quote_bundles(riskpool, bundle_ids, multicall, block_identifier)
+
+    return (bundles, pool, fee, sum_insured_percentage)
+
+
+def to_quote_bundle(bundle_info) -> dict:
+    """bundle attributes used for matching from a DepegRiskpool.BundleInfo"""
+    info = bundle_info.dict()
+
+    return {
+        key: info[key] for key in [
+            'bundleId',
+            'state',
+            'lifetime',
+            'minSumInsured',
+            'maxSumInsured',
+            'minDuration',
+            'maxDuration',
+            'annualPercentageReturn',
+            'capital',
+            'lockedCapital',
+            'createdAt',
+        ]}
+
+
+def to_quote_pool(pool) -> dict:
+    """pool attributes used for capacity checks from an IPool.Pool"""
+    info = pool.dict()
+
+    return {
+        key: info[key] for key in [
+            'capital',
+            'lockedCapital',
+            'sumOfSumInsuredCap',
+            'sumOfSumInsuredAtRisk',
+        ]}
+
+
+def get_quote_engine(product, riskpool, instance_service, multicall:Multicall=None) -> QuoteEngine:
+    return QuoteEngine(*get_quote_data(product, riskpool, instance_service, multicall))
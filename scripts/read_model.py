@@ -0,0 +1,801 @@
+# event sourced read model of a depeg product in a local sqlite database.
+# the indexer tails the logs of product, riskpool, price data provider and (optional)
+# distribution contract, stores all decoded events and maintains projection tables
+# (policies, claims, price events, distributors) that are queried without any node access.
+# block hashes of the last REORG_DEPTH indexed blocks are kept, when the hash of the
+# cursor block changes the events after the fork point are dropped and the projections
+# are rebuilt from the remaining events.
+#
+# brownie run scripts/read_model.py main <product address> depeg.db --network=<network>
+# brownie run scripts/read_model.py main <product address> depeg.db <distribution address> <start block> --network=<network>
+
+import base64
+import json
+import os
+import sqlite3
+import time
+
+from threading import RLock
+
+from brownie import web3
+from web3 import Web3
+
+try:
+    from eth_abi import decode as decodeAbi
+except ImportError:
+    from eth_abi import decode_abi as decodeAbi
+
+from scripts.multicall import Multicall
+from scripts.portfolio_export import decode_application_data
+from scripts.util import to_hex
+
+# number of most recent indexed blocks with known hashes (max rollback depth)
+REORG_DEPTH = 64
+
+# max block range per eth_getLogs request
+MAX_BLOCK_RANGE = 2000
+
+UPDATE_INTERVAL = 5
+
+# sqlite integers are signed 64 bit, larger values are stored as decimal text
+# (only in columns without type affinity, eg the user supplied maxPremium)
+MAX_DB_INT = 2 ** 63 - 1
+
+# policy states (application states until underwritten)
+STATE_APPLIED = 'Applied'
+STATE_ACTIVE = 'Active'
+STATE_EXPIRED = 'Expired'
+STATE_CLOSED = 'Closed'
+
+CLAIM_STATE_CREATED = 'Created'
+CLAIM_STATE_CONFIRMED = 'Confirmed'
+CLAIM_STATE_PAID = 'Paid'
+
+PRICE_EVENTS = [
+    'LogPriceDataTriggered',
+    'LogPriceDataRecovered',
+    'LogPriceDataDepegged',
+    'LogDepegPriceEvent',
+]
+
+EVENT_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, hash TEXT NOT NULL)',
+    '''CREATE TABLE IF NOT EXISTS events (
+        blockNumber INTEGER NOT NULL,
+        logIndex INTEGER NOT NULL,
+        transactionHash TEXT,
+        contract TEXT NOT NULL,
+        event TEXT NOT NULL,
+        args TEXT NOT NULL,
+        PRIMARY KEY (blockNumber, logIndex))''',
+]
+
+# projections are rebuilt from the stored events when the version changes
+PROJECTION_VERSION = 2
+
+PROJECTION_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS policies (
+        processId TEXT PRIMARY KEY,
+        policyHolder TEXT,
+        protectedWallet TEXT,
+        protectedBalance INTEGER,
+        sumInsured INTEGER,
+        premium INTEGER,
+        maxPremium,
+        duration INTEGER,
+        bundleId INTEGER,
+        createdAt INTEGER,
+        expiresAt INTEGER,
+        state TEXT,
+        claimState TEXT,
+        claimAmount INTEGER,
+        payoutAmount INTEGER,
+        distributor TEXT,
+        createdSeq INTEGER,
+        createdBlock INTEGER,
+        updatedBlock INTEGER)''',
+    'CREATE INDEX IF NOT EXISTS policies_created ON policies (createdSeq, processId)',
+    'CREATE INDEX IF NOT EXISTS policies_expires ON policies (expiresAt, processId)',
+    'CREATE INDEX IF NOT EXISTS policies_state ON policies (state, createdSeq, processId)',
+    'CREATE INDEX IF NOT EXISTS policies_wallet ON policies (protectedWallet COLLATE NOCASE, createdSeq, processId)',
+    'CREATE INDEX IF NOT EXISTS policies_holder ON policies (policyHolder COLLATE NOCASE, createdSeq, processId)',
+    'CREATE INDEX IF NOT EXISTS policies_bundle ON policies (bundleId, createdSeq, processId)',
+    '''CREATE TABLE IF NOT EXISTS claims (
+        processId TEXT NOT NULL,
+        claimId INTEGER NOT NULL,
+        state TEXT,
+        claimAmount INTEGER,
+        accountBalance INTEGER,
+        payoutId INTEGER,
+        payoutAmount INTEGER,
+        createdBlock INTEGER,
+        updatedBlock INTEGER,
+        PRIMARY KEY (processId, claimId))''',
+    '''CREATE TABLE IF NOT EXISTS price_events (
+        blockNumber INTEGER NOT NULL,
+        logIndex INTEGER NOT NULL,
+        event TEXT NOT NULL,
+        priceId INTEGER,
+        price INTEGER,
+        triggeredAt INTEGER,
+        depeggedAt INTEGER,
+        recoveredAt INTEGER,
+        PRIMARY KEY (blockNumber, logIndex))''',
+    '''CREATE TABLE IF NOT EXISTS distributors (
+        distributor TEXT PRIMARY KEY,
+        commissionAmount INTEGER,
+        commissionBalance INTEGER,
+        policiesSold INTEGER,
+        updatedBlock INTEGER)''',
+]
+
+PROJECTION_TABLES = ['policies', 'claims', 'price_events', 'distributors']
+
+# policy listing: sort keys (column), filters (condition), page size limit
+# sorting is always followed by processId, pages are selected by (sort value, processId) > cursor
+POLICY_SORT_KEYS = {
+    'created': 'createdSeq',
+    'expiry': 'expiresAt',
+    'protectedBalance': 'protectedBalance',
+    'sumInsured': 'sumInsured',
+}
+
+POLICY_FILTERS = {
+    'state': 'state = ?',
+    'claimState': 'claimState = ?',
+    'protectedWallet': 'protectedWallet = ? COLLATE NOCASE',
+    'policyHolder': 'policyHolder = ? COLLATE NOCASE',
+    'bundleId': 'bundleId = ?',
+    'expiresAfter': 'expiresAt >= ?',
+    'expiresBefore': 'expiresAt < ?',
+}
+
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 1000
+
+# log index range per block for the policy creation sequence
+SEQUENCE_FACTOR = 100000
+
+
+class ReadModel(object):
+    """sqlite read model, written by a single EventIndexer, read by any number of processes.
+
+    events are dicts with blockNumber, logIndex, transactionHash, contract,
+    event and args keys. all projections are derived from the stored events
+    only, a rollback replays them without node access.
+    """
+
+    def __init__(self, db_file:str, read_only:bool=False):
+        self.db_file = db_file
+        self.read_only = read_only
+        self.lock = RLock()
+        self.db = None
+
+
+    def connect(self):
+        with self.lock:
+            if self.db:
+                return self.db
+
+            if self.read_only:
+                if not os.path.exists(self.db_file):
+                    raise RuntimeError('read model {} not found, start the indexer first'.format(self.db_file))
+
+                self.db = sqlite3.connect('file:{}?mode=ro'.format(self.db_file), uri=True, check_same_thread=False)
+            else:
+                self.db = sqlite3.connect(self.db_file, check_same_thread=False)
+                self.db.row_factory = sqlite3.Row
+                # readers in other processes don't block the indexer
+                self.db.execute('PRAGMA journal_mode=WAL')
+
+                for statement in EVENT_SCHEMA:
+                    self.db.execute(statement)
+
+                self.db.commit()
+
+                if self.get_meta('projection_version') != PROJECTION_VERSION:
+                    self._rebuild_projections()
+
+            self.db.row_factory = sqlite3.Row
+            return self.db
+
+
+    def close(self):
+        with self.lock:
+            if self.db:
+                self.db.close()
+                self.db = None
+
+
+    def get_meta(self, key:str, default=None):
+        with self.lock:
+            row = self.connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+            return json.loads(row['value']) if row else default
+
+
+    def set_meta(self, key:str, value):
+        with self.lock:
+            db = self.connect()
+            db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+            db.commit()
+
+
+    def get_cursor(self) -> tuple:
+        """(block number, block hash) of the last indexed block, (None, None) for an empty model"""
+        cursor = self.get_meta('cursor')
+        return (cursor['block'], cursor['hash']) if cursor else (None, None)
+
+
+    def get_block_hashes(self) -> list:
+        """(number, hash) of the most recent indexed blocks, newest first"""
+        with self.lock:
+            rows = self.connect().execute('SELECT number, hash FROM blocks ORDER BY number DESC').fetchall()
+            return [(row['number'], row['hash']) for row in rows]
+
+
+    def ingest(self, events:list, block_number:int, block_hash:str, block_hashes:dict=None):
+        """stores the events up to and including block_number and moves the cursor (single transaction)"""
+        with self.lock:
+            db = self.connect()
+
+            with db:
+                for event in events:
+                    db.execute(
+                        'INSERT INTO events (blockNumber, logIndex, transactionHash, contract, event, args) VALUES (?, ?, ?, ?, ?, ?)',
+                        (event['blockNumber'], event['logIndex'], event['transactionHash'], event['contract'], event['event'], json.dumps(event['args'])))
+
+                    _apply(db, event)
+
+                hashes = dict(block_hashes or {})
+                hashes[block_number] = block_hash
+
+                db.executemany('INSERT OR REPLACE INTO blocks (number, hash) VALUES (?, ?)', hashes.items())
+                db.execute('DELETE FROM blocks WHERE number <= ?', (block_number - REORG_DEPTH,))
+                db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (
+                    'cursor', json.dumps({'block': block_number, 'hash': block_hash})))
+
+
+    def rollback(self, block_number:int, block_hash:str=None):
+        """drops everything after block_number and rebuilds the projections from the remaining events"""
+        with self.lock:
+            db = self.connect()
+
+            with db:
+                db.execute('DELETE FROM events WHERE blockNumber > ?', (block_number,))
+                db.execute('DELETE FROM blocks WHERE number > ?', (block_number,))
+
+                if block_hash is None:
+                    row = db.execute('SELECT hash FROM blocks WHERE number = ?', (block_number,)).fetchone()
+                    block_hash = row['hash'] if row else None
+
+                db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (
+                    'cursor', json.dumps({'block': block_number, 'hash': block_hash})))
+
+                _replay(db)
+
+
+    def _rebuild_projections(self):
+        """(re)creates the projection tables and replays all stored events"""
+        db = self.db
+
+        with db:
+            for table in PROJECTION_TABLES:
+                db.execute('DROP TABLE IF EXISTS {}'.format(table))
+
+            for statement in PROJECTION_SCHEMA:
+                db.execute(statement)
+
+            _replay(db)
+            db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (
+                'projection_version', json.dumps(PROJECTION_VERSION)))
+
+
+    def get_events(self, event:str=None, from_block:int=0, limit:int=1000) -> list:
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT * FROM events WHERE (? IS NULL OR event = ?) AND blockNumber >= ? ORDER BY blockNumber, logIndex LIMIT ?',
+                (event, event, from_block, limit)).fetchall()
+
+            return [_to_event(row) for row in rows]
+
+
+    def get_policy(self, process_id:str) -> dict:
+        with self.lock:
+            db = self.connect()
+            row = db.execute('SELECT * FROM policies WHERE processId = ?', (process_id.lower(),)).fetchone()
+
+            if not row:
+                return None
+
+            policy = _to_dict(row)
+            policy['claims'] = [
+                _to_dict(claim) for claim in db.execute(
+                    'SELECT * FROM claims WHERE processId = ? ORDER BY claimId', (policy['processId'],)).fetchall()]
+
+            return policy
+
+
+    def get_policies(self, state:str=None, offset:int=0, limit:int=100) -> list:
+        """policies in creation order, optionally restricted to a state"""
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT * FROM policies WHERE (? IS NULL OR state = ?) ORDER BY createdSeq LIMIT ? OFFSET ?',
+                (state, state, limit, offset)).fetchall()
+
+            return [_to_dict(row) for row in rows]
+
+
+    def get_policy_page(
+        self,
+        filters:dict=None,
+        sort:str='created',
+        descending:bool=False,
+        cursor:str=None,
+        limit:int=PAGE_SIZE_DEFAULT
+    ) -> dict:
+        """one page of policies matching all filters (see POLICY_FILTERS), sorted by sort and processId.
+
+        returns the policies and the cursor for the next page (None for the last page).
+        pages are selected with the sort index instead of an offset, the page latency
+        does not depend on the position of the page or the number of policies.
+        """
+        if sort not in POLICY_SORT_KEYS:
+            raise ValueError('unsupported sort "{}", use one of {}'.format(sort, ', '.join(POLICY_SORT_KEYS.keys())))
+
+        if limit <= 0 or limit > PAGE_SIZE_MAX:
+            raise ValueError('limit needs to be in range 1..{}'.format(PAGE_SIZE_MAX))
+
+        column = POLICY_SORT_KEYS[sort]
+        conditions = []
+        params = []
+
+        for (name, value) in (filters or {}).items():
+            if name not in POLICY_FILTERS:
+                raise ValueError('unsupported filter "{}", use one of {}'.format(name, ', '.join(POLICY_FILTERS.keys())))
+
+            if value is not None:
+                conditions.append(POLICY_FILTERS[name])
+                params.append(value)
+
+        if cursor:
+            (cursor_value, cursor_process_id) = decode_page_cursor(cursor, sort, descending)
+            conditions.append('({}, processId) {} (?, ?)'.format(column, '<' if descending else '>'))
+            params += [cursor_value, cursor_process_id]
+
+        query = 'SELECT * FROM policies {} ORDER BY {} {}, processId {} LIMIT ?'.format(
+            'WHERE ' + ' AND '.join(conditions) if len(conditions) > 0 else '',
+            column,
+            'DESC' if descending else 'ASC',
+            'DESC' if descending else 'ASC')
+
+        with self.lock:
+            rows = self.connect().execute(query, params + [limit + 1]).fetchall()
+            (block, _) = self.get_cursor()
+
+        policies = [_to_dict(row) for row in rows[:limit]]
+        next_cursor = None
+
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_page_cursor(sort, descending, last[column], last['processId'])
+
+        return {
+            'block': block,
+            'policies': policies,
+            'next': next_cursor,
+        }
+
+
+    def get_totals(self) -> dict:
+        with self.lock:
+            db = self.connect()
+            states = {
+                row['state']: {'count': row['count'], 'sumInsured': row['sumInsured'], 'premium': row['premium']}
+                for row in db.execute(
+                    'SELECT state, COUNT(*) AS count, SUM(sumInsured) AS sumInsured, SUM(premium) AS premium FROM policies GROUP BY state')}
+
+            claims = db.execute(
+                'SELECT COUNT(*) AS count, SUM(claimAmount) AS claimAmount, SUM(payoutAmount) AS payoutAmount FROM claims').fetchone()
+
+            (block, _) = self.get_cursor()
+
+            return {
+                'block': block,
+                'applications': sum([state['count'] for state in states.values()]),
+                'policies': sum([state['count'] for (name, state) in states.items() if name != STATE_APPLIED]),
+                'states': states,
+                'claims': claims['count'],
+                'claimAmount': claims['claimAmount'] or 0,
+                'payoutAmount': claims['payoutAmount'] or 0,
+                'distributors': db.execute('SELECT COUNT(*) FROM distributors').fetchone()[0],
+            }
+
+
+    def get_price_events(self, limit:int=100) -> list:
+        """most recent price events first"""
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT * FROM price_events ORDER BY blockNumber DESC, logIndex DESC LIMIT ?', (limit,)).fetchall()
+
+            return [_to_dict(row) for row in rows]
+
+
+    def get_distributors(self) -> list:
+        with self.lock:
+            rows = self.connect().execute('SELECT * FROM distributors ORDER BY distributor').fetchall()
+            return [_to_dict(row) for row in rows]
+
+
+class EventIndexer(object):
+    """tails the contract logs into a ReadModel.
+
+    contracts is a list of (name, brownie contract) tuples, events of
+    all contracts are fetched with one eth_getLogs request per block range.
+    LogDepegApplicationCreated events are enriched with the application
+    parameters (duration, bundle id, max premium, created at) read in
+    batches from the instance service, so projections can be rebuilt
+    from stored events only.
+    """
+
+    def __init__(
+        self,
+        read_model:ReadModel,
+        contracts:list,
+        instance_service=None,
+        multicall:Multicall=None,
+        start_block:int=0,
+        confirmations:int=0,
+        max_block_range:int=MAX_BLOCK_RANGE
+    ):
+        self.read_model = read_model
+        self.instance_service = instance_service
+        self.multicall = multicall or Multicall()
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.max_block_range = max_block_range
+
+        self.addresses = [contract.address for (_, contract) in contracts]
+        self.names = {contract.address.lower(): name for (name, contract) in contracts}
+        self.event_abis = {}
+
+        for (_, contract) in contracts:
+            self.event_abis.update(get_event_abis(contract.abi))
+
+        self.rollbacks = 0
+
+
+    def update(self) -> int:
+        """indexes all blocks up to head - confirmations, returns the number of new events"""
+        head = web3.eth.block_number - self.confirmations
+        (cursor, cursor_hash) = self.read_model.get_cursor()
+
+        if cursor is None:
+            cursor = self.start_block - 1
+        elif cursor_hash and cursor <= web3.eth.block_number and to_hex(web3.eth.get_block(cursor)['hash']) != cursor_hash:
+            cursor = self._rollback()
+
+        new_events = 0
+
+        for from_block in range(cursor + 1, head + 1, self.max_block_range):
+            to_block = min(from_block + self.max_block_range - 1, head)
+            logs = web3.eth.get_logs({
+                'fromBlock': from_block,
+                'toBlock': to_block,
+                'address': self.addresses})
+
+            events = [self.decode(log) for log in logs]
+            events = [event for event in events if event]
+            self._enrich(events)
+
+            block_hashes = {log['blockNumber']: to_hex(log['blockHash']) for log in logs}
+            self.read_model.ingest(events, to_block, to_hex(web3.eth.get_block(to_block)['hash']), block_hashes)
+            new_events += len(events)
+
+        return new_events
+
+
+    def decode(self, log) -> dict:
+        topic = to_hex(log['topics'][0]) if len(log['topics']) > 0 else None
+
+        if topic not in self.event_abis:
+            return None
+
+        event_abi = self.event_abis[topic]
+
+        return {
+            'blockNumber': log['blockNumber'],
+            'logIndex': log['logIndex'],
+            'transactionHash': to_hex(log['transactionHash']),
+            'contract': self.names.get(str(log['address']).lower(), str(log['address'])),
+            'event': event_abi['name'],
+            'args': decode_log(event_abi, log),
+        }
+
+
+    def _rollback(self) -> int:
+        """rolls the read model back to the most recent block that is still part of the chain"""
+        self.rollbacks += 1
+
+        for (number, block_hash) in self.read_model.get_block_hashes():
+            if number <= web3.eth.block_number and to_hex(web3.eth.get_block(number)['hash']) == block_hash:
+                self.read_model.rollback(number, block_hash)
+                return number
+
+        # reorg deeper than the kept block hashes
+        self.read_model.rollback(self.start_block - 1)
+        return self.start_block - 1
+
+
+    def _enrich(self, events:list):
+        created = [event for event in events if event['event'] == 'LogDepegApplicationCreated']
+
+        if not self.instance_service or len(created) == 0:
+            return
+
+        applications = self.multicall.map(
+            self.instance_service.getApplication,
+            [event['args']['processId'] for event in created])
+
+        for (event, application) in zip(created, applications):
+            application = application.dict()
+            data = decode_application_data(application['data'])
+
+            event['args']['duration'] = data['duration']
+            event['args']['bundleId'] = data['bundleId']
+            event['args']['maxPremium'] = data['maxPremium']
+            event['args']['createdAt'] = application['createdAt']
+
+
+def get_sequence(block_number:int, log_index:int) -> int:
+    return block_number * SEQUENCE_FACTOR + log_index
+
+
+def encode_page_cursor(sort:str, descending:bool, value, process_id:str) -> str:
+    text = json.dumps([sort, descending, value, process_id])
+    return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def decode_page_cursor(cursor:str, sort:str, descending:bool) -> tuple:
+    """returns (sort value, process id) of the last row of the previous page"""
+    try:
+        (cursor_sort, cursor_descending, value, process_id) = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception as ex:
+        raise ValueError('invalid cursor "{}"'.format(cursor)) from ex
+
+    if cursor_sort != sort or cursor_descending != descending:
+        raise ValueError('cursor does not match sort {} (descending {})'.format(sort, descending))
+
+    return (value, process_id)
+
+
+def get_event_abis(abi:list) -> dict:
+    """topic -> event abi for all events of the contract abi"""
+    return {
+        to_hex(Web3.keccak(text=get_event_signature(entry))): entry
+        for entry in abi if entry['type'] == 'event'}
+
+
+def get_event_signature(event_abi:dict) -> str:
+    return '{}({})'.format(event_abi['name'], ','.join([_get_abi_type(item) for item in event_abi['inputs']]))
+
+
+def decode_log(event_abi:dict, log) -> dict:
+    """decodes the indexed (static types only) and data arguments of a log, bytes are returned as hex strings"""
+    inputs = event_abi['inputs']
+    indexed = [item for item in inputs if item.get('indexed')]
+    not_indexed = [item for item in inputs if not item.get('indexed')]
+
+    data = log['data']
+    data = bytes.fromhex(data[2:]) if isinstance(data, str) else bytes(data)
+    values = dict(zip(
+        [item['name'] for item in not_indexed],
+        decodeAbi([_get_abi_type(item) for item in not_indexed], data)))
+
+    for (item, topic) in zip(indexed, log['topics'][1:]):
+        topic = bytes.fromhex(topic[2:]) if isinstance(topic, str) else bytes(topic)
+        values[item['name']] = decodeAbi([_get_abi_type(item)], topic)[0]
+
+    return {item['name']: _to_json_value(values[item['name']]) for item in inputs}
+
+
+def _get_abi_type(item:dict) -> str:
+    if item['type'].startswith('tuple'):
+        return '({}){}'.format(','.join([_get_abi_type(component) for component in item['components']]), item['type'][5:])
+
+    return item['type']
+
+
+def _to_json_value(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(item) for item in value]
+
+    if isinstance(value, str) and value.startswith('0x') and len(value) == 42:
+        return Web3.toChecksumAddress(value)
+
+    return value
+
+
+def _to_event(row) -> dict:
+    return {
+        'blockNumber': row['blockNumber'],
+        'logIndex': row['logIndex'],
+        'transactionHash': row['transactionHash'],
+        'contract': row['contract'],
+        'event': row['event'],
+        'args': json.loads(row['args']),
+    }
+
+
+def _to_dict(row) -> dict:
+    return {key: _from_db(row[key]) for key in row.keys()}
+
+
+def _to_db(value):
+    if isinstance(value, int) and not isinstance(value, bool) and value > MAX_DB_INT:
+        return str(value)
+
+    return value
+
+
+def _from_db(value):
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+
+    return value
+
+
+def _replay(db):
+    for table in PROJECTION_TABLES:
+        db.execute('DELETE FROM {}'.format(table))
+
+    for event in db.execute('SELECT * FROM events ORDER BY blockNumber, logIndex').fetchall():
+        _apply(db, _to_event(event))
+
+
+def _apply(db, event:dict):
+    """updates the projection tables for a single event"""
+    name = event['event']
+    args = event['args']
+    block_number = event['blockNumber']
+
+    if name == 'LogDepegApplicationCreated':
+        created_at = args.get('createdAt')
+        duration = args.get('duration')
+
+        db.execute(
+            '''INSERT OR REPLACE INTO policies
+                (processId, policyHolder, protectedWallet, protectedBalance, sumInsured, premium,
+                maxPremium, duration, bundleId, createdAt, expiresAt, state, createdSeq, createdBlock, updatedBlock)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            [_to_db(value) for value in [
+                args['processId'].lower(),
+                args['policyHolder'],
+                args['protectedWallet'],
+                args['protectedBalance'],
+                args['sumInsuredAmount'],
+                args['premiumAmount'],
+                args.get('maxPremium'),
+                duration,
+                args.get('bundleId'),
+                created_at,
+                created_at + duration if created_at and duration else 0,
+                STATE_APPLIED,
+                get_sequence(block_number, event['logIndex']),
+                block_number,
+                block_number]])
+
+    elif name == 'LogDepegPolicyCreated':
+        _set_policy_state(db, args['processId'], STATE_ACTIVE, block_number)
+
+    elif name == 'LogDepegPolicyExpired':
+        _set_policy_state(db, args['processId'], STATE_EXPIRED, block_number)
+
+    elif name == 'LogDepegPolicyClosed':
+        _set_policy_state(db, args['processId'], STATE_CLOSED, block_number)
+
+    elif name == 'LogDepegClaimCreated':
+        process_id = args['processId'].lower()
+        db.execute(
+            'INSERT OR REPLACE INTO claims (processId, claimId, state, claimAmount, createdBlock, updatedBlock) VALUES (?, ?, ?, ?, ?, ?)',
+            (process_id, args['claimId'], CLAIM_STATE_CREATED, _to_db(args['claimAmount']), block_number, block_number))
+        db.execute(
+            'UPDATE policies SET claimState = ?, claimAmount = ?, updatedBlock = ? WHERE processId = ?',
+            (CLAIM_STATE_CREATED, _to_db(args['claimAmount']), block_number, process_id))
+
+    elif name == 'LogDepegClaimConfirmed':
+        process_id = args['processId'].lower()
+        db.execute(
+            'UPDATE claims SET state = ?, claimAmount = ?, accountBalance = ?, updatedBlock = ? WHERE processId = ? AND claimId = ?',
+            (CLAIM_STATE_CONFIRMED, _to_db(args['claimAmount']), _to_db(args['accountBalance']), block_number, process_id, args['claimId']))
+        db.execute(
+            'UPDATE policies SET claimState = ?, claimAmount = ?, updatedBlock = ? WHERE processId = ?',
+            (CLAIM_STATE_CONFIRMED, _to_db(args['claimAmount']), block_number, process_id))
+
+    elif name == 'LogDepegPayoutProcessed':
+        process_id = args['processId'].lower()
+        db.execute(
+            'UPDATE claims SET state = ?, payoutId = ?, payoutAmount = ?, updatedBlock = ? WHERE processId = ? AND claimId = ?',
+            (CLAIM_STATE_PAID, args['payoutId'], _to_db(args['payoutAmount']), block_number, process_id, args['claimId']))
+        db.execute(
+            'UPDATE policies SET claimState = ?, payoutAmount = COALESCE(payoutAmount, 0) + ?, updatedBlock = ? WHERE processId = ?',
+            (CLAIM_STATE_PAID, _to_db(args['payoutAmount']), block_number, process_id))
+
+    elif name == 'LogDepegPolicySold':
+        db.execute(
+            'UPDATE policies SET distributor = ?, updatedBlock = ? WHERE processId = ?',
+            (args['distributor'], block_number, args['processId'].lower()))
+
+    elif name == 'LogDistributionInfoUpdated':
+        db.execute(
+            'INSERT OR REPLACE INTO distributors (distributor, commissionAmount, commissionBalance, policiesSold, updatedBlock) VALUES (?, ?, ?, ?, ?)',
+            (args['distributor'], _to_db(args['commissionAmount']), _to_db(args['commissionBalance']), args['totalPoliciesSold'], block_number))
+
+    elif name in PRICE_EVENTS:
+        db.execute(
+            '''INSERT OR REPLACE INTO price_events
+                (blockNumber, logIndex, event, priceId, price, triggeredAt, depeggedAt, recoveredAt)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+            (block_number, event['logIndex'], name, args['priceId'], _to_db(args['price']),
+                args.get('triggeredAt'), args.get('depeggedAt'), args.get('recoveredAt')))
+
+
+def _set_policy_state(db, process_id:str, state:str, block_number:int):
+    db.execute(
+        'UPDATE policies SET state = ?, updatedBlock = ? WHERE processId = ?',
+        (state, block_number, process_id.lower()))
+
+
+def get_indexer(product_address:str, db_file:str, distribution_address:str=None, start_block:int=0, multicall:Multicall=None) -> EventIndexer:
+    from brownie import (
+        DepegDistribution,
+        DepegRiskpool,
+        UsdcPriceDataProvider,
+    )
+
+    from scripts.deploy_depeg import get_product_graph
+    from scripts.util import contract_from_address
+
+    graph = get_product_graph(product_address)
+    product = graph['product']
+    contracts = [
+        ('product', product),
+        ('riskpool', contract_from_address(DepegRiskpool, graph['riskpool'].address)),
+        ('feeder', contract_from_address(UsdcPriceDataProvider, product.getPriceDataProvider())),
+    ]
+
+    if distribution_address:
+        contracts.append(('distribution', contract_from_address(DepegDistribution, distribution_address)))
+
+    read_model = ReadModel(db_file)
+    meta = {'chain_id': web3.chain_id, 'product': product.address}
+
+    if read_model.get_meta('setup', meta) != meta:
+        raise RuntimeError('read model {} belongs to {}, not to {}'.format(db_file, read_model.get_meta('setup'), meta))
+
+    read_model.set_meta('setup', meta)
+
+    return EventIndexer(
+        read_model,
+        contracts,
+        instance_service=graph['instance_service'],
+        multicall=multicall,
+        start_block=int(start_block))
+
+
+def main(product_address, db_file, distribution_address=None, start_block=0, interval=UPDATE_INTERVAL):
+    indexer = get_indexer(product_address, db_file, distribution_address, start_block)
+
+    while True:
+        started_at = time.perf_counter()
+        new_events = indexer.update()
+        (block, _) = indexer.read_model.get_cursor()
+
+        if new_events > 0:
+            print('block {} new events {} ({:.2f}s, rollbacks {})'.format(
+                block, new_events, time.perf_counter() - started_at, indexer.rollbacks))
+
+        time.sleep(int(interval))
@@ -0,0 +1,265 @@
+# compact binary columnar file format for chainlink round data
+#
+# layout (little endian): 64 byte header, then one contiguous block per column
+#   header: magic 'RNDFILE1', rows uint64, flags uint64, zero padding
+#   uint64 columns: aggregatorRoundId, answer (4 limbs, int256 two's complement),
+#                   startedAt, updatedAt, answeredInRound (low 64 bits)
+#   uint16 columns: phaseId, answeredInRound (phase, high 16 bits)
+# round ids (uint80) are split into phaseId and aggregatorRoundId as in the chainlink proxy.
+# rows are sorted by round id, files are opened as read-only memory maps and
+# slices by round range or time range are numpy views (no copies).
+#
+# example command lines
+# python -m scripts.round_file tests/data/usdc_usd_depeg_230312.csv usdc_usd.rounds
+# python -m scripts.round_file usdc_usd.txt usdc_usd.rounds
+
+import csv
+import sys
+
+import numpy as np
+
+MAGIC = b'RNDFILE1'
+HEADER_SIZE = 64
+
+# flags
+FLAG_TIME_SORTED = 1
+
+PHASE_OFFSET = 2 ** 64
+UINT64_MASK = 2 ** 64 - 1
+INT256_MODULUS = 2 ** 256
+ANSWER_LIMBS = 4
+
+# name, dtype, limbs per row
+COLUMNS = [
+    ('aggregator_round_id', np.uint64, 1),
+    ('answer_limbs', np.uint64, ANSWER_LIMBS),
+    ('started_at', np.uint64, 1),
+    ('updated_at', np.uint64, 1),
+    ('answered_in_round_low', np.uint64, 1),
+    ('phase_id', np.uint16, 1),
+    ('answered_in_round_phase', np.uint16, 1),
+]
+
+
+class RoundFile(object):
+    """round data columns backed by a memory map (or any numpy arrays of the same layout).
+
+    slicing with [] or the slice_* methods returns a RoundFile with views on the same memory.
+    """
+
+    def __init__(self, columns:dict, time_sorted:bool):
+        for (name, _, _) in COLUMNS:
+            setattr(self, name, columns[name])
+
+        self.time_sorted = time_sorted
+
+
+    def __len__(self):
+        return len(self.aggregator_round_id)
+
+
+    def __getitem__(self, index:slice) -> 'RoundFile':
+        if not isinstance(index, slice) or index.step not in [None, 1]:
+            raise TypeError('only contiguous slices are supported')
+
+        return RoundFile({name: getattr(self, name)[index] for (name, _, _) in COLUMNS}, self.time_sorted)
+
+
+    @property
+    def updated_at_int64(self) -> np.ndarray:
+        return self.updated_at.view(np.int64)
+
+
+    @property
+    def answer(self) -> np.ndarray:
+        """answers as int64 view, raises ValueError if any answer needs more than 64 bits"""
+        low = self.answer_limbs[:, 0].view(np.int64)
+        sign_extension = np.where(low < 0, np.uint64(UINT64_MASK), np.uint64(0))
+
+        if not np.all(self.answer_limbs[:, 1:] == sign_extension[:, None]):
+            raise ValueError('answers exceed int64 range, use get_answer()')
+
+        return low
+
+
+    def get_round_id(self, index:int) -> int:
+        return int(self.phase_id[index]) * PHASE_OFFSET + int(self.aggregator_round_id[index])
+
+
+    def get_answer(self, index:int) -> int:
+        value = 0
+
+        for limb in reversed(range(ANSWER_LIMBS)):
+            value = (value << 64) | int(self.answer_limbs[index, limb])
+
+        return value - INT256_MODULUS if value >= INT256_MODULUS // 2 else value
+
+
+    def get_round(self, index:int) -> tuple:
+        """(roundId, answer, startedAt, updatedAt, answeredInRound) with python ints"""
+        return (
+            self.get_round_id(index),
+            self.get_answer(index),
+            int(self.started_at[index]),
+            int(self.updated_at[index]),
+            int(self.answered_in_round_phase[index]) * PHASE_OFFSET + int(self.answered_in_round_low[index]))
+
+
+    def get_rounds(self) -> list:
+        return [self.get_round(index) for index in range(len(self))]
+
+
+    def find_round(self, round_id:int, side:str='left') -> int:
+        """insertion index of round_id (same semantics as numpy.searchsorted)"""
+        phase_id = round_id // PHASE_OFFSET
+        start = int(np.searchsorted(self.phase_id, phase_id, side='left'))
+        end = int(np.searchsorted(self.phase_id, phase_id, side='right'))
+
+        return start + int(np.searchsorted(self.aggregator_round_id[start:end], round_id % PHASE_OFFSET, side=side))
+
+
+    def slice_rounds(self, from_round_id:int, to_round_id:int) -> 'RoundFile':
+        """rounds with from_round_id <= roundId <= to_round_id"""
+        return self[self.find_round(from_round_id):self.find_round(to_round_id, side='right')]
+
+
+    def slice_time(self, from_timestamp:int, to_timestamp:int) -> 'RoundFile':
+        """rounds with from_timestamp <= updatedAt <= to_timestamp"""
+        if not self.time_sorted:
+            raise ValueError('updatedAt is not sorted by round id, time slices are not supported')
+
+        start = int(np.searchsorted(self.updated_at, np.uint64(from_timestamp), side='left'))
+        end = int(np.searchsorted(self.updated_at, np.uint64(to_timestamp), side='right'))
+
+        return self[start:end]
+
+
+def get_column_offsets(rows:int) -> dict:
+    offsets = {}
+    offset = HEADER_SIZE
+
+    for (name, dtype, limbs) in COLUMNS:
+        offsets[name] = offset
+        offset += rows * limbs * np.dtype(dtype).itemsize
+
+    offsets['end'] = offset
+    return offsets
+
+
+def write(file_name:str, rounds:list):
+    """writes (roundId, answer, startedAt, updatedAt, answeredInRound) tuples sorted by round id"""
+    rounds = sorted(rounds, key=lambda r: r[0])
+    rows = len(rounds)
+
+    if len(set([r[0] for r in rounds])) != rows:
+        raise ValueError('duplicate round ids')
+
+    for (round_id, answer, started_at, updated_at, answered_in_round) in rounds:
+        if not (0 <= round_id < 2 ** 80 and 0 <= answered_in_round < 2 ** 80):
+            raise ValueError('round id {} exceeds uint80'.format(round_id))
+        if not -INT256_MODULUS // 2 <= answer < INT256_MODULUS // 2:
+            raise ValueError('answer {} exceeds int256'.format(answer))
+        if not (0 <= started_at <= UINT64_MASK and 0 <= updated_at <= UINT64_MASK):
+            raise ValueError('timestamps of round {} exceed uint64'.format(round_id))
+
+    answers = [r[1] % INT256_MODULUS for r in rounds]
+    columns = {
+        'aggregator_round_id': np.array([r[0] & UINT64_MASK for r in rounds], dtype=np.uint64),
+        'answer_limbs': np.array(
+            [[(a >> (64 * limb)) & UINT64_MASK for limb in range(ANSWER_LIMBS)] for a in answers],
+            dtype=np.uint64).reshape((rows, ANSWER_LIMBS)),
+        'started_at': np.array([r[2] for r in rounds], dtype=np.uint64),
+        'updated_at': np.array([r[3] for r in rounds], dtype=np.uint64),
+        'answered_in_round_low': np.array([r[4] & UINT64_MASK for r in rounds], dtype=np.uint64),
+        'phase_id': np.array([r[0] >> 64 for r in rounds], dtype=np.uint16),
+        'answered_in_round_phase': np.array([r[4] >> 64 for r in rounds], dtype=np.uint16),
+    }
+
+    flags = FLAG_TIME_SORTED if np.all(np.diff(columns['updated_at'].astype(np.int64)) >= 0) else 0
+    header = MAGIC + np.array([rows, flags], dtype='<u8').tobytes()
+
+    with open(file_name, 'wb') as round_file:
+        round_file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+        for (name, dtype, _) in COLUMNS:
+            round_file.write(columns[name].astype(np.dtype(dtype).newbyteorder('<')).tobytes())
+
+
+def open_rounds(file_name:str) -> RoundFile:
+    """memory maps the file read-only"""
+    with open(file_name, 'rb') as round_file:
+        header = round_file.read(HEADER_SIZE)
+
+    if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+        raise ValueError('{} is not a round file'.format(file_name))
+
+    (rows, flags) = np.frombuffer(header, dtype='<u8', count=2, offset=len(MAGIC))
+    rows = int(rows)
+    offsets = get_column_offsets(rows)
+    columns = {}
+
+    for (name, dtype, limbs) in COLUMNS:
+        if rows == 0:
+            columns[name] = np.zeros((0, limbs) if limbs > 1 else 0, dtype=dtype)
+            continue
+
+        columns[name] = np.memmap(
+            file_name,
+            dtype=np.dtype(dtype).newbyteorder('<'),
+            mode='r',
+            offset=offsets[name],
+            shape=(rows, limbs) if limbs > 1 else (rows,))
+
+    return RoundFile(columns, bool(int(flags) & FLAG_TIME_SORTED))
+
+
+def rounds_from_csv(csv_file_name:str, comment_chars:list=['#', '/']) -> list:
+    """reads csv files with roundId, answer, updatedAt (and optional startedAt, answeredInRound) columns"""
+    with open(csv_file_name, 'r') as csv_file:
+        lines = [line for line in csv_file if len(line.strip()) > 0 and line[0] not in comment_chars]
+
+    rounds = []
+
+    for row in csv.DictReader(lines):
+        round_id = int(row['roundId'])
+        updated_at = int(row['updatedAt'])
+        rounds.append((
+            round_id,
+            int(row['answer']),
+            int(row.get('startedAt') or updated_at),
+            updated_at,
+            int(row.get('answeredInRound') or round_id)))
+
+    return rounds
+
+
+def rounds_from_strings(data:list) -> list:
+    """converts 'roundId answer startedAt updatedAt answeredInRound [...]' strings (eg USDC_CHAINLINK_DATA
+    or scripts/price_feed.py output), '#' comment lines are skipped
+    """
+    return [
+        tuple([int(value) for value in line.split()[:5]])
+        for line in data
+        if len(line.strip()) > 0 and line.strip()[0] != '#']
+
+
+def convert(input_file_name:str, output_file_name:str) -> int:
+    """converts a csv or text round data file to a round file, returns the number of rounds"""
+    with open(input_file_name, 'r') as input_file:
+        lines = [line for line in input_file if len(line.strip()) > 0 and line[0] not in ['#', '/']]
+
+    if len(lines) > 0 and lines[0].startswith('roundId'):
+        rounds = rounds_from_csv(input_file_name)
+    else:
+        rounds = rounds_from_strings(lines)
+
+    write(output_file_name, rounds)
+    return len(rounds)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('usage: python -m scripts.round_file <input csv/txt file> <output round file>')
+        sys.exit(1)
+
+    print('{} rounds written to {}'.format(convert(sys.argv[1], sys.argv[2]), sys.argv[2]))
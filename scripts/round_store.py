@@ -0,0 +1,158 @@
+# append-only columnar store for chainlink round data
+# one directory per feed, one file per column with one decimal integer per line
+# (decimal text keeps uint80 round ids and int256 answers exact).
+# meta.json holds the number of committed rows and the last stored aggregator round per phase,
+# rows written after the last committed meta update (eg interrupted downloads) are dropped on open.
+
+import json
+import os
+
+from threading import Lock
+
+COLUMNS = [
+    'phaseId',
+    'aggregatorRoundId',
+    'roundId',
+    'answer',
+    'startedAt',
+    'updatedAt',
+    'answeredInRound',
+]
+
+META_FILE = 'meta.json'
+COLUMN_FILE_EXTENSION = '.col'
+
+
+class RoundStore(object):
+    """round data keyed by (feed, phaseId, aggregatorRoundId).
+
+    rows of a phase are appended in increasing aggregatorRoundId order, appending
+    a round at or below the last stored round of its phase is rejected.
+    phases may be extended in any order (eg after a truncated download).
+    """
+
+    def __init__(self, directory:str):
+        self.directory = directory
+        self.lock = Lock()
+        self.meta = {}
+
+        os.makedirs(directory, exist_ok=True)
+
+
+    def get_feeds(self) -> list:
+        return sorted([
+            name for name in os.listdir(self.directory)
+            if os.path.exists(os.path.join(self.directory, name, META_FILE))])
+
+
+    def get_rows(self, feed:str) -> int:
+        with self.lock:
+            return self._get_meta(feed)['rows']
+
+
+    def get_last_round(self, feed:str, phase_id:int) -> int:
+        """last stored aggregator round id of the phase, 0 if the phase has no rows yet"""
+        with self.lock:
+            return self._get_meta(feed)['phases'].get(str(phase_id), 0)
+
+
+    def append(self, feed:str, rows:list) -> int:
+        """appends rows (tuples in COLUMNS order) and returns the number of rows of the feed"""
+        if len(rows) == 0:
+            return self.get_rows(feed)
+
+        with self.lock:
+            meta = self._get_meta(feed)
+            phases = dict(meta['phases'])
+
+            for row in rows:
+                (phase_id, aggregator_round_id) = row[:2]
+
+                if aggregator_round_id <= phases.get(str(phase_id), 0):
+                    raise ValueError('round {}/{} not after last stored round of feed {}'.format(
+                        phase_id, aggregator_round_id, feed))
+
+                phases[str(phase_id)] = aggregator_round_id
+
+            feed_directory = self._get_feed_directory(feed)
+
+            for (idx, column) in enumerate(COLUMNS):
+                with open(os.path.join(feed_directory, column + COLUMN_FILE_EXTENSION), 'a') as column_file:
+                    column_file.write(''.join(['{}\n'.format(int(row[idx])) for row in rows]))
+
+            meta['rows'] += len(rows)
+            meta['phases'] = phases
+            self._write_meta(feed, meta)
+
+            return meta['rows']
+
+
+    def read(self, feed:str, columns:list=COLUMNS) -> dict:
+        """returns a dict column -> list of python ints"""
+        with self.lock:
+            rows = self._get_meta(feed)['rows']
+            feed_directory = self._get_feed_directory(feed)
+            data = {}
+
+            for column in columns:
+                with open(os.path.join(feed_directory, column + COLUMN_FILE_EXTENSION), 'r') as column_file:
+                    data[column] = [int(line) for (_, line) in zip(range(rows), column_file)]
+
+            return data
+
+
+    def read_rounds(self, feed:str) -> list:
+        """returns (roundId, answer, startedAt, updatedAt, answeredInRound) tuples ordered by round id"""
+        data = self.read(feed, COLUMNS[2:])
+        return sorted(zip(*[data[column] for column in COLUMNS[2:]]))
+
+
+    def _get_feed_directory(self, feed:str) -> str:
+        return os.path.join(self.directory, feed.lower())
+
+
+    def _get_meta(self, feed:str) -> dict:
+        key = feed.lower()
+
+        if key not in self.meta:
+            feed_directory = self._get_feed_directory(feed)
+            meta_file_name = os.path.join(feed_directory, META_FILE)
+
+            if os.path.exists(meta_file_name):
+                with open(meta_file_name, 'r') as meta_file:
+                    self.meta[key] = json.load(meta_file)
+            else:
+                os.makedirs(feed_directory, exist_ok=True)
+                self.meta[key] = {'feed': feed, 'rows': 0, 'phases': {}}
+                self._write_meta(feed, self.meta[key])
+
+            self._truncate(feed, self.meta[key]['rows'])
+
+        return self.meta[key]
+
+
+    def _write_meta(self, feed:str, meta:dict):
+        # atomic replace, the meta file is the commit point of an append
+        meta_file_name = os.path.join(self._get_feed_directory(feed), META_FILE)
+
+        with open(meta_file_name + '.tmp', 'w') as meta_file:
+            json.dump(meta, meta_file)
+
+        os.replace(meta_file_name + '.tmp', meta_file_name)
+
+
+    def _truncate(self, feed:str, rows:int):
+        feed_directory = self._get_feed_directory(feed)
+
+        for column in COLUMNS:
+            column_file_name = os.path.join(feed_directory, column + COLUMN_FILE_EXTENSION)
+
+            if not os.path.exists(column_file_name):
+                open(column_file_name, 'w').close()
+                continue
+
+            with open(column_file_name, 'r+') as column_file:
+                for _ in range(rows):
+                    column_file.readline()
+
+                column_file.truncate(column_file.tell())
@@ -0,0 +1,96 @@
+from web3 import Web3
+
+from brownie import (
+    web3,
+    Contract,
+)
+
+from scripts.util import to_hex
+
+# see chainlink AggregatorInterface
+ANSWER_UPDATED_TOPIC = to_hex(Web3.keccak(text='AnswerUpdated(int256,uint256,uint256)'))
+NEW_ROUND_TOPIC = to_hex(Web3.keccak(text='NewRound(uint256,address,uint256)'))
+
+# chainlink feed addresses point to a proxy, the events are emitted by the underlying aggregator
+AGGREGATOR_PROXY_NAME = 'EACAggregatorProxy'
+AGGREGATOR_PROXY_ABI = [
+    {
+        "inputs": [],
+        "name": "aggregator",
+        "outputs": [{"internalType": "address", "name": "", "type": "address"}],
+        "stateMutability": "view",
+        "type": "function"
+    },
+]
+
+
+def resolve_aggregator_address(feed_address:str) -> str:
+    """returns the aggregator behind a chainlink proxy or the feed address itself if it is not a proxy"""
+    try:
+        proxy = Contract.from_abi(AGGREGATOR_PROXY_NAME, feed_address, AGGREGATOR_PROXY_ABI)
+        aggregator_address = proxy.aggregator()
+
+        if int(aggregator_address, 16) > 0:
+            return str(aggregator_address)
+    except Exception:
+        pass
+
+    return feed_address
+
+
+class RoundWatcher(object):
+    """detects new chainlink rounds by tailing AnswerUpdated/NewRound logs.
+
+    the watcher keeps a block cursor and only queries logs for blocks that
+    have not been seen yet: an idle poll costs a single eth_blockNumber call.
+    the aggregator address is re-resolved when requested to follow
+    aggregator upgrades of chainlink proxies (phase changes).
+    """
+
+    def __init__(self, feed_address:str, from_block:int=None):
+        self.feed_address = feed_address
+        self.aggregator_address = resolve_aggregator_address(feed_address)
+        self.last_block = from_block if from_block is not None else web3.eth.block_number
+        self.polls = 0
+        self.log_queries = 0
+
+
+    def refresh_aggregator(self) -> bool:
+        """re-resolves the aggregator address, returns true if it changed"""
+        aggregator_address = resolve_aggregator_address(self.feed_address)
+
+        if aggregator_address == self.aggregator_address:
+            return False
+
+        self.aggregator_address = aggregator_address
+        return True
+
+
+    def poll(self) -> list:
+        """returns round ids of all new rounds since the last poll (in block order)"""
+        self.polls += 1
+        block_number = web3.eth.block_number
+
+        if block_number <= self.last_block:
+            return []
+
+        logs = web3.eth.get_logs({
+            'fromBlock': self.last_block + 1,
+            'toBlock': block_number,
+            'address': self.aggregator_address,
+            'topics': [[ANSWER_UPDATED_TOPIC, NEW_ROUND_TOPIC]]})
+
+        self.log_queries += 1
+        self.last_block = block_number
+
+        round_ids = []
+        for log in logs:
+            # round id is the second indexed topic of AnswerUpdated and the first of NewRound
+            topics = [to_hex(topic) for topic in log['topics']]
+            round_id = int(topics[2] if topics[0] == ANSWER_UPDATED_TOPIC else topics[1], 16)
+
+            if round_id not in round_ids:
+                round_ids.append(round_id)
+
+        return round_ids
+
@@ -0,0 +1,142 @@
+# consistent snapshots of contract view functions.
+# reads are declared up front as (name, method, args) and fetched in multicall
+# batches pinned to a single block. the resulting snapshot only holds plain
+# python values (ints, strings, bools, lists, dicts), it can be stored as json
+# and compared with an earlier snapshot.
+
+import json
+
+from brownie import web3
+
+from scripts.multicall import Multicall
+
+
+class SnapshotRead(object):
+    """a named view call, optional reads may fail (value None) without failing the snapshot"""
+
+    def __init__(self, name:str, method, args:tuple=(), optional:bool=False):
+        self.name = name
+        self.method = method
+        self.args = args
+        self.optional = optional
+
+
+class SetupSnapshot(object):
+    """named values read at a single block"""
+
+    def __init__(self, chain_id:int, block_number:int, timestamp:int, values:dict):
+        self.chain_id = chain_id
+        self.block_number = block_number
+        self.timestamp = timestamp
+        self.values = values
+
+
+    def __getitem__(self, name:str):
+        return self.values[name]
+
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.values
+
+
+    def get(self, name:str, default=None):
+        return self.values.get(name, default)
+
+
+    def diff(self, previous) -> dict:
+        """returns name -> (previous value, value) for all values that differ, missing values are None"""
+        names = sorted(set(self.values.keys()) | set(previous.values.keys()))
+
+        return {
+            name: (previous.values.get(name), self.values.get(name))
+            for name in names
+            if previous.values.get(name) != self.values.get(name)}
+
+
+    def to_dict(self) -> dict:
+        return {
+            'chain_id': self.chain_id,
+            'block_number': self.block_number,
+            'timestamp': self.timestamp,
+            'values': self.values,
+        }
+
+
+    @classmethod
+    def from_dict(cls, data:dict):
+        return cls(data['chain_id'], data['block_number'], data['timestamp'], data['values'])
+
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+
+    @classmethod
+    def from_json(cls, text:str):
+        return cls.from_dict(json.loads(text))
+
+
+    def save(self, file_name:str):
+        with open(file_name, 'w') as snapshot_file:
+            snapshot_file.write(self.to_json())
+
+
+    @classmethod
+    def load(cls, file_name:str):
+        with open(file_name, 'r') as snapshot_file:
+            return cls.from_json(snapshot_file.read())
+
+
+def get_block(block_identifier='latest') -> dict:
+    block = web3.eth.get_block(block_identifier)
+    return {'number': block['number'], 'timestamp': block['timestamp']}
+
+
+def read_values(reads:list, multicall:Multicall, block_number:int) -> dict:
+    """executes the reads in multicall batches, raises a RuntimeError if a required read fails"""
+    results = multicall.call(
+        [(read.method, read.args) for read in reads],
+        block_identifier=block_number,
+        allow_failure=True)
+
+    failed = [read.name for (read, result) in zip(reads, results) if result is None and not read.optional]
+    if len(failed) > 0:
+        raise RuntimeError('snapshot reads failed at block {}: {}'.format(block_number, ', '.join(failed)))
+
+    return {read.name: to_plain(result) for (read, result) in zip(reads, results)}
+
+
+def take_snapshot(reads:list, multicall:Multicall=None, block:dict=None) -> SetupSnapshot:
+    """reads all values at the provided (default: latest) block"""
+    multicall = multicall or Multicall()
+    block = block or get_block()
+    values = read_values(reads, multicall, block['number'])
+
+    return SetupSnapshot(web3.chain_id, block['number'], block['timestamp'], values)
+
+
+def to_plain(value):
+    """converts brownie return values (structs, tuples, hex bytes, addresses) to json compatible values"""
+    if value is None or isinstance(value, (bool, float)):
+        return value
+
+    if isinstance(value, int):
+        return int(value)
+
+    if hasattr(value, 'dict') and callable(value.dict) and _has_named_fields(value):
+        return {key: to_plain(item) for (key, item) in value.dict().items()}
+
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+
+    return str(value)
+
+
+def _has_named_fields(value) -> bool:
+    try:
+        return len(value.dict()) > 0
+    except Exception:
+        return False
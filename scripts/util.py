@@ -10,9 +10,11 @@ from brownie import (
     Contract, 
 )
 
+from scripts.contract_cache import contract_cache
+
 
 def contract_from_address(contractClass, contractAddress):
-    return Contract.from_abi(contractClass._name, contractAddress, contractClass.abi)
+    return contract_cache.get(contractClass, contractAddress)
 
 from brownie import accounts, config, project
 from brownie.convert import to_bytes
@@ -48,6 +50,12 @@ def s2b(text:str):
 def b2s(b32: bytes):
     return b322s(b32)
 
+def to_hex(value) -> str:
+    """0x prefixed lower case hex string for str/bytes/HexBytes values"""
+    text = value if isinstance(value, str) else bytes(value).hex()
+    text = text.lower()
+    return text if text.startswith('0x') else '0x' + text
+
 def keccak256(text:str):
     return Web3.solidityKeccak(['string'], [text]).hex()
 
@@ -88,7 +96,7 @@ def encode_function_data(*args, initializer=None):
     return b''
 
 def contract_from_address(contractClass, contractAddress):
-    return Contract.from_abi(contractClass._name, contractAddress, contractClass.abi)
+    return contract_cache.get(contractClass, contractAddress)
 
 
 def new_accounts(count=20):
@@ -6,9 +6,11 @@ from threading import Thread
 from loguru import logger
 
 from fastapi import HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRouter
 
+from server.executor import executor
+
 from server.product import (
     ProductStatus,
     Product,
@@ -16,23 +18,45 @@ from server.product import (
     product_owner_account
 )
 
-from server.util import write_csv_temp_file
+from server.util import (
+    stream_csv,
+    stream_gzip,
+    stream_ndjson,
+)
 
 TAG_PRODUCT = 'Product'
 
+MEDIA_TYPE_CSV = 'text/csv'
+MEDIA_TYPE_NDJSON = 'application/x-ndjson'
+MEDIA_TYPE_GZIP = 'application/gzip'
+
 # setup for router
 router = APIRouter(prefix='/v1')
 
+# heavy reads get low concurrency, every export chunk runs through executor.iterate under the product/export limit
+executor.set_limit('product/status', max_concurrent=8, timeout=15)
+executor.set_limit('product/price_info', max_concurrent=8, timeout=15)
+executor.set_limit('product/bundles', max_concurrent=2, timeout=60)
+executor.set_limit('product/stakes', max_concurrent=2, timeout=60)
+executor.set_limit('product/quote', max_concurrent=16, timeout=15)
+executor.set_limit('product/export', max_concurrent=2, timeout=60)
+executor.set_limit('product/portfolio', max_concurrent=16, timeout=15)
+
 
 @router.get('/product', tags=[TAG_PRODUCT])
 async def get_product_status() -> ProductStatus:
-    return product.get_status()
+    return await executor.run('product/status', product.get_status)
+
+
+@router.get('/product/snapshot_stats', tags=[TAG_PRODUCT])
+async def get_product_snapshot_stats() -> dict:
+    return product.get_snapshot_stats()
 
 
 @router.get('/product/price_info', tags=[TAG_PRODUCT])
 async def get_product_price_info() -> dict:
     try:
-        return product.get_price_info()
+        return await executor.run('product/price_info', product.get_price_info)
 
     except RuntimeError as ex:
         logger.warning(ex)
@@ -45,7 +69,37 @@ async def get_product_price_info() -> dict:
 @router.get('/product/bundles', tags=[TAG_PRODUCT])
 async def get_riskpool_bundles() -> dict:
     try:
-        return product.get_bundle_infos()
+        return await executor.run('product/bundles', product.get_bundle_infos)
+
+    except RuntimeError as ex:
+        logger.warning(ex)
+
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+
+@router.get('/product/bundles/csv', response_class=StreamingResponse, tags=[TAG_PRODUCT])
+async def export_riskpool_bundles(gzip:bool=False) -> StreamingResponse:
+    try:
+        infos = await executor.run('product/export', product.iter_bundle_infos)
+        rows = (info for (_, info) in infos)
+        return to_streaming_response('product/export', stream_csv(rows), MEDIA_TYPE_CSV, 'bundles.csv', gzip)
+
+    except RuntimeError as ex:
+        logger.warning(ex)
+
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+
+@router.get('/product/bundles/ndjson', response_class=StreamingResponse, tags=[TAG_PRODUCT])
+async def export_riskpool_bundles_ndjson(gzip:bool=False) -> StreamingResponse:
+    try:
+        infos = await executor.run('product/export', product.iter_bundle_infos)
+        rows = (info for (_, info) in infos)
+        return to_streaming_response('product/export', stream_ndjson(rows), MEDIA_TYPE_NDJSON, 'bundles.ndjson', gzip)
 
     except RuntimeError as ex:
         logger.warning(ex)
@@ -55,16 +109,25 @@ async def get_riskpool_bundles() -> dict:
             detail=getattr(ex, 'message', repr(ex))) from ex
 
 
-@router.get('/product/bundles/csv', response_class=FileResponse, tags=[TAG_PRODUCT])
-async def export_riskpool_bundles() -> dict:
+@router.get('/product/quote', tags=[TAG_PRODUCT])
+async def get_quote(protected_balance:int, duration_days:int, bundle_id:int=0) -> dict:
+    """premium quote for the protected balance (token units incl. decimals), answered from the bundle index"""
     try:
-        data = product.get_bundle_infos()
-        csv_file_path = write_csv_temp_file(data)
+        return await executor.run('product/quote', product.get_quote, protected_balance, duration_days, bundle_id)
+
+    except (ValueError, RuntimeError) as ex:
+        logger.warning(ex)
 
-        response = FileResponse(csv_file_path, media_type="text/csv")
-        response.headers["Content-Disposition"] = "attachment; filename=applications_onchain.csv"
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
 
-        return response
+
+@router.get('/product/portfolio', tags=[TAG_PRODUCT])
+async def get_portfolio() -> dict:
+    """application, policy and claim totals, answered from the local read model"""
+    try:
+        return await executor.run('product/portfolio', product.get_portfolio)
 
     except RuntimeError as ex:
         logger.warning(ex)
@@ -74,10 +137,23 @@ async def export_riskpool_bundles() -> dict:
             detail=getattr(ex, 'message', repr(ex))) from ex
 
 
+@router.get('/product/portfolio/policies', tags=[TAG_PRODUCT])
+async def get_portfolio_policies(state:str=None, offset:int=0, limit:int=100) -> list:
+    try:
+        return await executor.run('product/portfolio', product.get_portfolio_policies, state, offset, limit)
+
+    except (ValueError, RuntimeError) as ex:
+        logger.warning(ex)
+
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+
 @router.get('/product/stakes', tags=[TAG_PRODUCT])
 async def get_stakes() -> dict:
     try:
-        return product.get_stake_infos()
+        return await executor.run('product/stakes', product.get_stake_infos)
 
     except RuntimeError as ex:
         logger.warning(ex)
@@ -87,16 +163,27 @@ async def get_stakes() -> dict:
             detail=getattr(ex, 'message', repr(ex))) from ex
 
 
-@router.get('/product/stakes/csv', response_class=FileResponse, tags=[TAG_PRODUCT])
-async def export_stakes() -> dict:
+@router.get('/product/stakes/csv', response_class=StreamingResponse, tags=[TAG_PRODUCT])
+async def export_stakes(gzip:bool=False) -> StreamingResponse:
     try:
-        data = product.get_stake_infos()
-        csv_file_path = write_csv_temp_file(data)
+        infos = await executor.run('product/export', product.iter_stake_infos)
+        rows = (info for (_, info) in infos)
+        return to_streaming_response('product/export', stream_csv(rows), MEDIA_TYPE_CSV, 'stakes.csv', gzip)
+
+    except (ValueError, RuntimeError) as ex:
+        logger.warning(ex)
+
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
 
-        response = FileResponse(csv_file_path, media_type="text/csv")
-        response.headers["Content-Disposition"] = "attachment; filename=applications_onchain.csv"
 
-        return response
+@router.get('/product/stakes/ndjson', response_class=StreamingResponse, tags=[TAG_PRODUCT])
+async def export_stakes_ndjson(gzip:bool=False) -> StreamingResponse:
+    try:
+        infos = await executor.run('product/export', product.iter_stake_infos)
+        rows = (info for (_, info) in infos)
+        return to_streaming_response('product/export', stream_ndjson(rows), MEDIA_TYPE_NDJSON, 'stakes.ndjson', gzip)
 
     except (ValueError, RuntimeError) as ex:
         logger.warning(ex)
@@ -104,3 +191,17 @@ async def export_stakes() -> dict:
         raise HTTPException(
             status_code=400,
             detail=getattr(ex, 'message', repr(ex))) from ex
+
+
+def to_streaming_response(endpoint:str, chunks, media_type:str, file_name:str, gzip:bool) -> StreamingResponse:
+    # chunks are lazy (multicall reads per bundle/stake chunk), they are produced in the chain pool
+    # under the limit and timeout of the endpoint instead of the starlette thread pool
+    if gzip:
+        chunks = stream_gzip(chunks)
+        media_type = MEDIA_TYPE_GZIP
+        file_name = '{}.gz'.format(file_name)
+
+    response = StreamingResponse(executor.iterate(endpoint, chunks), media_type=media_type)
+    response.headers["Content-Disposition"] = "attachment; filename={}".format(file_name)
+
+    return response
@@ -1,72 +1,59 @@
-import sched
-import time
-
-from threading import Thread
-
 from loguru import logger
 
-from fastapi import HTTPException
 from fastapi.routing import APIRouter
 
 from server.settings import (
     Settings,
-    settings
+    settings,
+    PRICE_TRIGGER_LOGS,
 )
 
 from server.jobs import (
-    queue,
-    Job
+    scheduler,
+    Job,
+    MISSED_RUN_COALESCE,
+    MISSED_RUN_SKIP,
 )
 
-from server.product import process_latest_price
+from server.product import (
+    process_latest_price,
+    process_latest_price_on_new_round,
+    process_latest_price_periodic,
+)
 
 # setup for router
 router = APIRouter(prefix='/v1')
 
-# scheduler
-PRIORITY = 1
-INTERVAL = 5 # seconds to wait for new data
-
-# domain specific setup
-
-# setup scheduling
-schedule = sched.scheduler(time.time, time.sleep)
-next_event = None
-events = 0
-
 
 @router.on_event('startup')
 async def startup_event():
     logger.info('starting scheduler')
-    thread = Thread(target = start_scheduler)
-    thread.start()
+
+    if settings.price_trigger == PRICE_TRIGGER_LOGS:
+        # cheap poll for new aggregator rounds, late polls are simply dropped
+        scheduler.add(Job(
+            name='round_watcher',
+            method_to_run=process_latest_price_on_new_round,
+            interval=settings.round_watch_interval,
+            missed_run_policy=MISSED_RUN_SKIP))
+
+        scheduler.add(Job(
+            name='checker',
+            method_to_run=process_latest_price_periodic,
+            interval=settings.checker_fallback_interval,
+            missed_run_policy=MISSED_RUN_COALESCE))
+    else:
+        # price checks that fall behind are coalesced into a single check
+        scheduler.add(Job(
+            name='checker',
+            method_to_run=process_latest_price,
+            interval=settings.checker_interval,
+            missed_run_policy=MISSED_RUN_COALESCE))
+
+    scheduler.start()
 
 
 @router.on_event("shutdown")
 def shutdown_event():
-    global schedule
-
     logger.info('stopping scheduler')
-    if schedule and next_event:
-        schedule.cancel(next_event)
-
-    logger.info('scheduler stopped')
-
-
-def start_scheduler():
-    global next_event
-
-    queue.add(Job(name='checker', method_to_run=process_latest_price, interval=settings.checker_interval))
-
-    next_event = schedule.enter(settings.scheduler_interval, PRIORITY, schedule_event, (schedule,))
-    logger.info('scheduler started')
-    schedule.run()
-
-
-def schedule_event(s):
-    global events
-    global next_event
-
-    events += 1
-    queue.execute()
-    next_event = schedule.enter(settings.scheduler_interval, PRIORITY, schedule_event, (s,))
+    scheduler.stop()
@@ -14,7 +14,7 @@ from server.settings import (
 )
 
 from server.jobs import (
-    queue,
+    scheduler,
     Job
 )
 
@@ -41,7 +41,7 @@ feeder = PriceFeed()
 
 
 def add_price_injection_job():
-    queue.add(Job(name='feeder', method_to_run=inject_price, interval=settings.feeder_interval))
+    scheduler.add(Job(name='feeder', method_to_run=inject_price, interval=settings.feeder_interval))
 
 
 def inject_price():
@@ -0,0 +1,151 @@
+from loguru import logger
+
+from scripts.quote import (
+    QuoteEngine,
+    get_quote_params,
+    get_quote_bundles,
+)
+
+from server.log_index import (
+    LogIndex,
+    get_log_words,
+)
+from server.settings import settings
+from server.util import (
+    get_project,
+    get_unix_time,
+    contract_from_address,
+    s2b,
+)
+
+# gif modules emitting bundle, pool and fee events (registry names of the proxies)
+GIF_MODULES = ['Bundle', 'Pool', 'Treasury']
+
+
+class BundleIndex(LogIndex):
+    """in-process index of the active bundles for premium quotes.
+
+    the index is seeded with batched reads and kept current by tailing the
+    logs of the riskpool and the bundle, pool and treasury modules. any new
+    log refreshes the active bundle list, pool capacity and fees, only bundles
+    mentioned in the logs (or newly activated) are re-read and updated in
+    the bundle match index of the QuoteEngine.
+    quotes are computed from memory, the index is brought up to date at most
+    every max_staleness seconds.
+    """
+
+    def __init__(self, resync_interval:int, max_staleness:int):
+        super().__init__(resync_interval)
+        self.max_staleness = max_staleness
+
+        self.product = None
+        self.riskpool = None
+        self.instance_service = None
+        self.multicall = None
+
+        self.bundles = {}
+        self.engine = None
+
+
+    def connect(self, product, riskpool, instance_service, multicall):
+        with self.lock:
+            # a failed connect leaves the index disconnected, not attached to a previous product
+            self.riskpool = None
+            self.seeded_at = 0
+
+            instance_registry = contract_from_address(get_project().interface.IRegistry, product.getRegistry())
+            module_addresses = [str(instance_registry.getContract(s2b(module))) for module in GIF_MODULES]
+
+            self.product = product
+            self.riskpool = riskpool
+            self.instance_service = instance_service
+            self.multicall = multicall
+            self.addresses = list({riskpool.address, *module_addresses})
+
+
+    def is_connected(self) -> bool:
+        return self.riskpool is not None
+
+
+    def get_engine(self) -> QuoteEngine:
+        """returns the quote engine, updates the index first if it is older than max_staleness"""
+        if not self.is_seeded() or get_unix_time() - self.updated_at > self.max_staleness:
+            self.update()
+
+        return self.engine
+
+
+    def get_now(self) -> int:
+        """approximation of the next block timestamp, used for the bundle expiry check"""
+        return self.last_timestamp + max(0, get_unix_time() - self.updated_at)
+
+
+    def quote(self, protected_balance:int, duration:int, bundle_id:int=0) -> dict:
+        engine = self.get_engine()
+
+        # refreshes modify the engine in place
+        with self.lock:
+            quote = engine.quote(protected_balance, duration, self.get_now(), bundle_id)
+            quote['block'] = self.last_block
+
+        return quote
+
+
+    def _seed(self, block_number:int):
+        self.bundles = {}
+        self._refresh(set(), block_number)
+
+        logger.info('bundle index seeded with {} active bundles at block {}'.format(len(self.bundles), block_number))
+
+
+    def _process_logs(self, logs:list, block_number:int):
+        dirty_ids = self._get_affected_bundles(logs)
+        logger.info('bundle index: {} logs, {} bundles to refresh (block {})'.format(len(logs), len(dirty_ids), block_number))
+        self._refresh(dirty_ids, block_number)
+
+
+    def _get_affected_bundles(self, logs:list) -> set:
+        """returns the known bundle ids mentioned in the logs.
+
+        bundle events of the gif modules and the riskpool carry the bundle id
+        as a topic or data word, all 32 byte words are matched against the
+        known bundle ids.
+        """
+        dirty_ids = set()
+
+        for log in logs:
+            dirty_ids.update({word for word in get_log_words(log) if word in self.bundles})
+
+        return dirty_ids
+
+
+    def _refresh(self, dirty_ids:set, block_number:int):
+        (bundle_ids, pool, fee, sum_insured_percentage) = get_quote_params(
+            self.product,
+            self.riskpool,
+            self.instance_service,
+            self.multicall,
+            block_identifier=block_number)
+
+        if not self.engine or len(self.bundles) == 0:
+            self.engine = QuoteEngine([], pool, fee, sum_insured_percentage)
+        else:
+            self.engine.set_params(pool, fee, sum_insured_percentage)
+
+        # bundles no longer active are dropped, new and mentioned bundles are (re)read
+        for bundle_id in set(self.bundles.keys()) - set(bundle_ids):
+            self.engine.remove_bundle(bundle_id)
+            del self.bundles[bundle_id]
+
+        refresh_ids = [bundle_id for bundle_id in bundle_ids if bundle_id in dirty_ids or bundle_id not in self.bundles]
+
+        # new bundles are added in active list order (increasing apr)
+        for bundle in get_quote_bundles(self.riskpool, refresh_ids, self.multicall, block_identifier=block_number):
+            self.bundles[bundle['bundleId']] = bundle
+            self.engine.update_bundle(bundle)
+
+
+# full resync as safety net for state changes not visible in logs
+bundle_index = BundleIndex(
+    settings.bundle_index_resync_interval,
+    settings.bundle_index_max_staleness)
@@ -0,0 +1,141 @@
+import asyncio
+
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from loguru import logger
+
+from server.settings import settings
+
+POOL_MONITOR = 'monitor'
+POOL_CHAIN = 'chain'
+
+# items pulled from a blocking iterator per pool call
+ITERATE_BATCH_SIZE = 100
+
+
+class EndpointLimit(object):
+    """concurrency limit and timeout for blocking calls of a single endpoint"""
+
+    def __init__(
+        self,
+        pool:str,
+        max_concurrent:int,
+        timeout:float
+    ):
+        self.pool = pool
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.semaphore = None
+
+
+    def get_semaphore(self) -> asyncio.Semaphore:
+        # semaphore needs to be created inside the running event loop (python 3.9)
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        return self.semaphore
+
+
+class ChainExecutor(object):
+    """runs blocking brownie/web3 calls outside of the event loop.
+
+    monitor endpoints use a small dedicated pool so that health checks stay
+    responsive while heavy reads (bundles, stakes, exports) saturate the chain pool.
+    every endpoint has its own concurrency limit and timeout. a call that
+    times out is not interrupted, its concurrency slot is released only once
+    the underlying call has completed.
+    """
+
+    def __init__(
+        self,
+        chain_pool_size:int,
+        monitor_pool_size:int
+    ):
+        self.pools = {
+            POOL_CHAIN: ThreadPoolExecutor(chain_pool_size, thread_name_prefix=POOL_CHAIN),
+            POOL_MONITOR: ThreadPoolExecutor(monitor_pool_size, thread_name_prefix=POOL_MONITOR),
+        }
+
+        self.limits = {}
+
+
+    def set_limit(
+        self,
+        endpoint:str,
+        pool:str=POOL_CHAIN,
+        max_concurrent:int=None,
+        timeout:float=None
+    ):
+        if pool not in self.pools:
+            raise ValueError('unknown pool {}'.format(pool))
+
+        self.limits[endpoint] = EndpointLimit(
+            pool,
+            max_concurrent or settings.endpoint_max_concurrent,
+            timeout or settings.endpoint_timeout)
+
+
+    def get_limit(self, endpoint:str) -> EndpointLimit:
+        if endpoint not in self.limits:
+            self.set_limit(endpoint)
+
+        return self.limits[endpoint]
+
+
+    async def run(self, endpoint:str, method, *args):
+        """runs method(*args) in the thread pool of the endpoint, raises http 503/504 on overload/timeout"""
+        limit = self.get_limit(endpoint)
+        semaphore = limit.get_semaphore()
+
+        try:
+            await asyncio.wait_for(semaphore.acquire(), limit.timeout)
+        except asyncio.TimeoutError as ex:
+            logger.warning('{}: no free slot after {}s'.format(endpoint, limit.timeout))
+            raise HTTPException(
+                status_code=503,
+                detail='{}: too many concurrent requests'.format(endpoint)) from ex
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pools[limit.pool], method, *args)
+        future.add_done_callback(lambda _: semaphore.release())
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), limit.timeout)
+        except asyncio.TimeoutError as ex:
+            logger.warning('{}: timeout after {}s'.format(endpoint, limit.timeout))
+            raise HTTPException(
+                status_code=504,
+                detail='{}: timeout after {}s'.format(endpoint, limit.timeout)) from ex
+
+
+    async def iterate(self, endpoint:str, iterator, batch_size:int=ITERATE_BATCH_SIZE):
+        """async generator over a blocking (lazy) iterator, every batch of items is produced with run().
+        each batch is subject to the concurrency limit and timeout of the endpoint, a 503/504
+        in the middle of a stream ends the stream.
+        """
+        iterator = iter(iterator)
+
+        while True:
+            items = await self.run(endpoint, _next_items, iterator, batch_size)
+
+            for item in items:
+                yield item
+
+            if len(items) < batch_size:
+                return
+
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False)
+
+
+def _next_items(iterator, count:int) -> list:
+    return list(islice(iterator, count))
+
+
+executor = ChainExecutor(
+    settings.chain_pool_size,
+    settings.monitor_pool_size)
@@ -1,3 +1,15 @@
+import heapq
+import itertools
+import math
+import random
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import (
+    Condition,
+    Thread,
+)
+
 from typing import (
     Callable,
     Optional
@@ -6,12 +18,21 @@ from typing import (
 from loguru import logger
 from pydantic import BaseModel
 
-from server.util import get_unix_time
+from server.settings import settings
 
 # default time between executions: 1h
 JOB_INTERVAL_DEFAULT = 3600
 JOB_FIRST_ID = 1000
 
+# missed run policies (runs are missed when the scheduler falls behind or a job overlaps with itself)
+# skip: drop missed runs, continue with the next slot in the future
+# coalesce: replace all missed runs with a single immediate run
+# catch_up: execute every missed run, one after the other
+MISSED_RUN_SKIP = 'skip'
+MISSED_RUN_COALESCE = 'coalesce'
+MISSED_RUN_CATCH_UP = 'catch_up'
+MISSED_RUN_POLICIES = [MISSED_RUN_SKIP, MISSED_RUN_COALESCE, MISSED_RUN_CATCH_UP]
+
 job_id = JOB_FIRST_ID
 
 
@@ -20,8 +41,13 @@ class Job(BaseModel):
     id:Optional[int] = None
     name:Optional[str] = None
     method_to_run:Callable = None
-    next_execution:Optional[int] = None
+    next_execution:Optional[float] = None
     interval:int = JOB_INTERVAL_DEFAULT
+    missed_run_policy:str = MISSED_RUN_COALESCE
+    jitter:float = 0.0
+    running:bool = False
+    executions:int = 0
+    missed:int = 0
 
 
     def __init__(self, *args, **kwargs):
@@ -31,8 +57,11 @@ class Job(BaseModel):
         self.id = job_id
         job_id += 1
 
+        if self.missed_run_policy not in MISSED_RUN_POLICIES:
+            raise ValueError('unknown missed run policy {}'.format(self.missed_run_policy))
+
         if not self.next_execution:
-            self.next_execution = get_unix_time()
+            self.next_execution = time.time()
 
 
     def __hash__(self):
@@ -62,36 +91,152 @@ class Job(BaseModel):
             logger.warning('execute job {}: method missing'.format(self))
 
 
-class Queue(BaseModel):
+    def get_due_time(self) -> float:
+        """scheduled time plus random jitter, jitter never shifts the schedule itself"""
+        if self.jitter > 0:
+            return self.next_execution + random.uniform(0, self.jitter)
+
+        return self.next_execution
 
-    queue:set[Job] = set()
 
+    def reschedule(self, now:float):
+        """advances next_execution after a run according to the missed run policy"""
+        next_execution = self.next_execution + self.interval
 
-    def add(self, job):
-        self.queue.add(job)
-        logger.info('added job {} to queue. jobs in queue: {}'.format(
-            job, len(self.queue)))
+        if next_execution >= now or self.missed_run_policy == MISSED_RUN_CATCH_UP:
+            self.next_execution = next_execution
+            return
 
+        missed_runs = math.ceil((now - next_execution) / self.interval)
+        self.missed += missed_runs
 
-    def remove(self, job):
-        self.queue.remove(job)
-        logger.info('removed job {} from queue. jobs in queue: {}'.format(
-            job, len(self.queue)))
+        if self.missed_run_policy == MISSED_RUN_SKIP:
+            self.next_execution = next_execution + missed_runs * self.interval
+        else:
+            self.next_execution = now
 
+        logger.warning('job {}: {} missed run(s), policy {}'.format(self, missed_runs, self.missed_run_policy))
 
-    def execute(self):
-        logger.debug('checking for scheduled jobs. jobs in queue: {}'.format(len(self.queue)))
-        now = get_unix_time()
 
-        for job in self.queue:
-            if job.next_execution < now:
-                job.execute()
+class Scheduler(object):
+    """runs jobs at their next_execution time.
+
+    jobs are kept in a min-heap on their due time and the scheduler thread
+    sleeps until the earliest job is due (or a new job is added). due jobs
+    are executed on a worker pool, a job is never executed concurrently
+    with itself: it is re-inserted into the heap only once its run completed.
+    every push gives the job a new generation, heap entries of an older
+    generation (job removed or re-added meanwhile) are dropped when popped.
+    """
+
+    def __init__(self, workers:int):
+        self.workers = workers
+        self.condition = Condition()
+        self.heap = []
+        self.jobs = {}
+        self.generations = {}
+        self.sequence = itertools.count()
+
+        self.pool = None
+        self.thread = None
+        self.stopped = True
+
+
+    def add(self, job:Job):
+        with self.condition:
+            self.jobs[job.id] = job
+            self._push(job)
+            self.condition.notify()
+
+        logger.info('added job {} to scheduler. jobs in scheduler: {}'.format(
+            job, len(self.jobs)))
+
+
+    def remove(self, job:Job):
+        # heap entries of removed jobs are dropped when they are popped
+        with self.condition:
+            self.jobs.pop(job.id, None)
+            self.generations.pop(job.id, None)
+            self.condition.notify()
+
+        logger.info('removed job {} from scheduler. jobs in scheduler: {}'.format(
+            job, len(self.jobs)))
+
+
+    def start(self):
+        with self.condition:
+            if not self.stopped:
+                return
+
+            self.stopped = False
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='job')
+            self.thread = Thread(target=self._run, name='scheduler', daemon=True)
+            self.thread.start()
+
+        logger.info('scheduler started with {} workers'.format(self.workers))
+
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+        if self.thread:
+            self.thread.join()
+
+        if self.pool:
+            self.pool.shutdown(wait=False)
+
+        logger.info('scheduler stopped')
+
+
+    def _push(self, job:Job):
+        generation = next(self.sequence)
+        self.generations[job.id] = generation
+        heapq.heappush(self.heap, (job.get_due_time(), generation, job))
+
+
+    def _run(self):
+        with self.condition:
+            while not self.stopped:
+                if len(self.heap) == 0:
+                    self.condition.wait()
+                    continue
+
+                (due_time, generation, job) = self.heap[0]
+                delay = due_time - time.time()
+
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                heapq.heappop(self.heap)
+
+                # stale entry of a removed or re-added job, or a job re-added while running
+                if self.generations.get(job.id) != generation or job.running:
+                    continue
+
+                job.running = True
+                self.pool.submit(self._execute, job)
+
+
+    def _execute(self, job:Job):
+        try:
+            job.execute()
+        except Exception as ex:
+            logger.exception('job {} failed: {}'.format(job, ex))
+
+        with self.condition:
+            job.running = False
+            job.executions += 1
 
-                if job.interval > 0:
-                    job.next_execution += job.interval
-                    logger.debug('re-scheduled job {} at {}'.format(job, job.next_execution))
-                else:
-                    self.remove(job)
+            if job.interval > 0 and job.id in self.jobs:
+                job.reschedule(time.time())
+                self._push(job)
+                self.condition.notify()
+            else:
+                self.jobs.pop(job.id, None)
+                self.generations.pop(job.id, None)
 
 
-queue = Queue()
\ No newline at end of file
+scheduler = Scheduler(settings.scheduler_workers)
@@ -0,0 +1,124 @@
+# usage:
+# 1. start uvicorn server (see server/main.py)
+# 2. run load test (from repository root)
+#    - python -m server.load_test
+#    - python -m server.load_test --url http://localhost:8000 --workers 16 --duration 30
+#
+# hammers /v1/product/stakes with concurrent requests and measures the
+# latency of /v1/monitor/account at the same time. with blocking chain reads
+# outside of the event loop the p99 of the monitor endpoint should stay close
+# to its latency on an idle server.
+
+import argparse
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from threading import Event
+from urllib.request import urlopen
+
+URL = 'http://localhost:8000'
+HEAVY_ENDPOINT = '/v1/product/stakes'
+PROBE_ENDPOINT = '/v1/monitor/account'
+
+WORKERS = 16
+DURATION = 30
+PROBE_INTERVAL = 0.1
+REQUEST_TIMEOUT = 120
+
+
+def request(url:str) -> tuple:
+    """returns (latency in seconds, http status or None for connection errors)"""
+    start = time.perf_counter()
+    status = None
+
+    try:
+        with urlopen(url, timeout=REQUEST_TIMEOUT) as response:
+            response.read()
+            status = response.status
+    except (OSError, HTTPException) as ex:
+        # http errors (URLError.code), connection and read timeouts/resets count as errors
+        status = getattr(ex, 'code', None)
+
+    return (time.perf_counter() - start, status)
+
+
+def hammer(url:str, stop:Event) -> list:
+    results = []
+
+    while not stop.is_set():
+        results.append(request(url))
+
+    return results
+
+
+def probe(url:str, stop:Event) -> list:
+    results = []
+
+    while not stop.is_set():
+        results.append(request(url))
+        time.sleep(PROBE_INTERVAL)
+
+    return results
+
+
+def percentile(values:list, pct:float) -> float:
+    if len(values) == 0:
+        return 0.0
+
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def print_report(name:str, results:list, duration:float):
+    latencies = [latency for (latency, _) in results]
+    errors = len([status for (_, status) in results if status != 200])
+
+    print('{} requests {} errors {} rps {:.1f} p50 {:.3f}s p95 {:.3f}s p99 {:.3f}s max {:.3f}s'.format(
+        name,
+        len(results),
+        errors,
+        len(results) / duration,
+        percentile(latencies, 50),
+        percentile(latencies, 95),
+        percentile(latencies, 99),
+        max(latencies) if len(latencies) > 0 else 0.0))
+
+
+def run(url:str, workers:int, duration:int):
+    heavy_url = '{}{}'.format(url, HEAVY_ENDPOINT)
+    probe_url = '{}{}'.format(url, PROBE_ENDPOINT)
+
+    # baseline on idle server
+    stop = Event()
+    with ThreadPoolExecutor(1) as pool:
+        baseline = pool.submit(probe, probe_url, stop)
+        time.sleep(min(5, duration))
+        stop.set()
+
+    print_report('{} (idle)'.format(PROBE_ENDPOINT), baseline.result(), min(5, duration))
+
+    # probe while heavy endpoint is hammered
+    stop = Event()
+    with ThreadPoolExecutor(workers + 1) as pool:
+        probe_future = pool.submit(probe, probe_url, stop)
+        heavy_futures = [pool.submit(hammer, heavy_url, stop) for _ in range(workers)]
+
+        time.sleep(duration)
+        stop.set()
+
+    heavy_results = [result for future in heavy_futures for result in future.result()]
+
+    print_report('{} ({} workers)'.format(HEAVY_ENDPOINT, workers), heavy_results, duration)
+    print_report('{} (under load)'.format(PROBE_ENDPOINT), probe_future.result(), duration)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='monitor api load test')
+    parser.add_argument('--url', default=URL)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--duration', type=int, default=DURATION)
+
+    args = parser.parse_args()
+    run(args.url, args.workers, args.duration)
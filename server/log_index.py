@@ -0,0 +1,95 @@
+from threading import RLock
+
+from brownie import web3
+
+from scripts.util import to_hex
+
+from server.util import get_unix_time
+
+
+def get_log_words(log) -> list:
+    """indexed topics (without the event signature) and 32 byte data words of a log as ints"""
+    data = to_hex(log['data'])[2:]
+    words = [int(to_hex(topic), 16) for topic in log['topics'][1:]]
+    words += [int(data[i:i+64], 16) for i in range(0, len(data) - 63, 64)]
+    return words
+
+
+class LogIndex(object):
+    """base of the in-process indexes kept current by tailing contract logs.
+
+    seed reads the complete state at the latest block, update fetches the logs
+    of addresses since the last processed block and hands them to
+    _process_logs. the index is seeded again when it is older than
+    resync_interval seconds (safety net for state changes not visible in logs).
+    subclasses implement is_connected, _seed and _process_logs.
+    """
+
+    def __init__(self, resync_interval:int):
+        self.lock = RLock()
+        self.resync_interval = resync_interval
+        self.addresses = []
+
+        self.last_block = 0
+        self.last_timestamp = 0
+        self.updated_at = 0
+        self.seeded_at = 0
+
+
+    def is_connected(self) -> bool:
+        raise NotImplementedError()
+
+
+    def is_seeded(self) -> bool:
+        return self.seeded_at > 0
+
+
+    def seed(self):
+        if not self.is_connected():
+            raise RuntimeError('connect to product')
+
+        with self.lock:
+            head = web3.eth.get_block('latest')
+            block_number = head['number']
+
+            self._seed(block_number)
+
+            self.last_block = block_number
+            self.last_timestamp = head['timestamp']
+            self.updated_at = get_unix_time()
+            self.seeded_at = self.updated_at
+
+
+    def update(self):
+        """processes logs since the last processed block, seeds the index if necessary"""
+        if not self.is_seeded() or get_unix_time() - self.seeded_at > self.resync_interval:
+            self.seed()
+            return
+
+        with self.lock:
+            head = web3.eth.get_block('latest')
+            block_number = head['number']
+
+            if block_number > self.last_block:
+                logs = web3.eth.get_logs({
+                    'fromBlock': self.last_block + 1,
+                    'toBlock': block_number,
+                    'address': self.addresses})
+
+                if len(logs) > 0:
+                    self._process_logs(logs, block_number)
+
+                self.last_block = block_number
+
+            self.last_timestamp = head['timestamp']
+            self.updated_at = get_unix_time()
+
+
+    def _seed(self, block_number:int):
+        """reads the complete index state at block_number"""
+        raise NotImplementedError()
+
+
+    def _process_logs(self, logs:list, block_number:int):
+        """updates the index state affected by logs, state is read at block_number"""
+        raise NotImplementedError()
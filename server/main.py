@@ -20,7 +20,13 @@ from fastapi import Depends, FastAPI, HTTPException
 from fastapi.responses import RedirectResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
+from scripts.contract_cache import contract_cache
+
 from server.auth import setup_auth, authenticate
+from server.executor import (
+    POOL_MONITOR,
+    executor,
+)
 from server.setup_logging import setup_logging
 
 from server.api_v1_product import router as api_router_product
@@ -71,26 +77,21 @@ if node.chain_id not in MAINNET_CHAIN_ID:
     app.include_router(api_router_testnet)
     add_price_injection_job()
 
+# health checks run on the dedicated monitor pool
+executor.set_limit('monitor/account', pool=POOL_MONITOR, max_concurrent=8, timeout=5)
+executor.set_limit('monitor/new_event', pool=POOL_MONITOR, max_concurrent=8, timeout=10)
+executor.set_limit('monitor/process_price', max_concurrent=1, timeout=120)
 
-@app.get('/v1/monitor/account', tags=[TAG_MONITOR])
-async def get_account_state(threshold:float=0.0) -> dict:
-    try:
-        account = monitor_account.get_account()
-        balance = None
-        balance_eth = None
 
-        if network.is_connected():
-            balance = account.balance()
-            balance_eth = balance/10**18
+@app.on_event("shutdown")
+def shutdown_executor():
+    executor.shutdown()
 
-            if balance_eth < float(threshold):
-                raise RuntimeError('balance [ETH] {:.4f} < threshold of [ETH] {}'.format(balance_eth, threshold))
 
-        return {
-            'account': account.address,
-            'balance': balance,
-            'balance_eth':balance_eth
-        }
+@app.get('/v1/monitor/account', tags=[TAG_MONITOR])
+async def get_account_state(threshold:float=0.0) -> dict:
+    try:
+        return await executor.run('monitor/account', get_account_balance, threshold)
 
     except RuntimeError as ex:
         logger.warning(ex)
@@ -103,7 +104,7 @@ async def get_account_state(threshold:float=0.0) -> dict:
 @app.get('/v1/monitor/new_event', tags=[TAG_MONITOR])
 async def new_price_event() -> str:
     try:
-        return product.is_new_event_available()
+        return await executor.run('monitor/new_event', product.is_new_event_available)
 
     except RuntimeError as ex:
         logger.warning(ex)
@@ -118,7 +119,7 @@ async def process_price_info(credentials: Annotated[HTTPBasicCredentials, Depend
     authenticate(credentials.username, credentials.password)
 
     try:
-        return product.process_latest_price_info()
+        return await executor.run('monitor/process_price', product.process_latest_price_info)
 
     except (RuntimeError, ValueError) as ex:
         message = getattr(ex, 'message', repr(ex))
@@ -133,6 +134,25 @@ async def process_price_info(credentials: Annotated[HTTPBasicCredentials, Depend
             detail=message) from ex
 
 
+def get_account_balance(threshold:float) -> dict:
+    account = monitor_account.get_account()
+    balance = None
+    balance_eth = None
+
+    if network.is_connected():
+        balance = account.balance()
+        balance_eth = balance/10**18
+
+        if balance_eth < float(threshold):
+            raise RuntimeError('balance [ETH] {:.4f} < threshold of [ETH] {}'.format(balance_eth, threshold))
+
+    return {
+        'account': account.address,
+        'balance': balance,
+        'balance_eth':balance_eth
+    }
+
+
 @app.get('/v1/settings', tags=[TAG_SETTINGS])
 async def get_settings() -> Settings:
     return settings
@@ -144,6 +164,9 @@ async def reload_settings(credentials: Annotated[HTTPBasicCredentials, Depends(s
 
     global settings
     settings = Settings()
+
+    # addresses may have changed, handles are resolved again on next access
+    contract_cache.invalidate()
     return settings
 
 
@@ -2,6 +2,8 @@ from loguru import logger
 from brownie import network
 from pydantic import BaseModel
 
+from scripts.contract_cache import contract_cache
+
 
 NETWORK_DEFAULT = 'ganache'
 CHAIN_ID_DEFAULT = 1337
@@ -32,6 +34,7 @@ class BrownieNode(BaseModel):
         # logger.info("connecting to network '{}' (chain_id: {})", self.network_id, network.chain.id)
         logger.info("connecting to network '{}'", self.network_id)
         network.connect(self.network_id)
+        contract_cache.invalidate()
         self.chain_id = network.chain.id
 
         logger.info("successfully connected (chain_id: {})", self.chain_id)
@@ -41,6 +44,7 @@ class BrownieNode(BaseModel):
     def disconnect(self) -> NodeStatus:
         logger.info("disconnecting from network '{}'", self.network_id)
         network.disconnect(self.network_id)
+        contract_cache.invalidate()
         logger.info("successfully disconnected")
         return self.get_status()
 
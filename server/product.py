@@ -1,6 +1,7 @@
 
 import os
 
+from threading import Lock
 from typing import Optional
 
 from loguru import logger
@@ -19,8 +20,16 @@ from brownie.project.Project import (
     USD1
 )
 
+from scripts.contract_cache import contract_cache
+from scripts.multicall import Multicall
+from scripts.read_model import ReadModel
+from scripts.round_watcher import RoundWatcher
+
 from server.account import BrownieAccount
+from server.bundle_index import bundle_index
 from server.settings import settings
+from server.snapshot import SnapshotCache
+from server.stake_index import stake_index
 from server.util import (
     b2s,
     s2b,
@@ -76,8 +85,6 @@ STATE_OBJECT[3] = 'Suspended'
 STATE_OBJECT[4] = 'Archived'
 STATE_OBJECT[5] = 'Burned'
 
-OBJECT_STAKE = 10
-
 product_contract = None
 feeder_contract = None
 
@@ -86,6 +93,18 @@ riskpool_contract = None
 registry_contract = None
 staking_contract = None
 
+multicall = None
+round_watcher = None
+
+# product and price feed state shared by status and price info requests
+product_snapshot = SnapshotCache(settings.snapshot_max_staleness)
+
+# policy listings and totals from the local read model (written by scripts/read_model.py)
+read_model = ReadModel(settings.read_model_file, read_only=True) if settings.read_model_file else None
+
+# avoids duplicate processing txs when round watcher and periodic check overlap
+processing_lock = Lock()
+
 
 def process_latest_price():
     global product_contract
@@ -96,17 +115,41 @@ def process_latest_price():
         
         product.connect()
 
-    logger.debug(product_contract.isNewPriceInfoEventAvailable().dict())
+    with processing_lock:
+        price_event = product_contract.isNewPriceInfoEventAvailable()
+        logger.debug(price_event.dict())
 
-    if product_contract.isNewPriceInfoEventAvailable()[0]:
-        logger.info('contract call: product.processLatestPriceInfo')
-        product_contract.processLatestPriceInfo({'from': monitor_account.get_account()})
-    else:
-        logger.info('no new price event: skipping processing')
+        if price_event[0]:
+            logger.info('contract call: product.processLatestPriceInfo')
+            product_contract.processLatestPriceInfo({'from': monitor_account.get_account()})
+            product_snapshot.invalidate()
+        else:
+            logger.info('no new price event: skipping processing')
 
     return {}
 
 
+def process_latest_price_on_new_round():
+    """checks for a new price event only when a new aggregator round has landed"""
+    if not product_contract:
+        product.connect()
+
+    round_ids = round_watcher.poll()
+    if len(round_ids) == 0:
+        return {}
+
+    logger.info('new aggregator round(s) {}'.format(round_ids))
+    return process_latest_price()
+
+
+def process_latest_price_periodic():
+    """safety net for the round watcher, also follows aggregator upgrades of chainlink proxies"""
+    if round_watcher and round_watcher.refresh_aggregator():
+        logger.info('round watcher: new aggregator {}'.format(round_watcher.aggregator_address))
+
+    return process_latest_price()
+
+
 class ProductStatus(BaseModel):
 
     depeg_state:Optional[str]
@@ -147,6 +190,8 @@ class Product(BaseModel):
         global instance_service_contract
         global registry_contract
         global staking_contract
+        global multicall
+        global round_watcher
 
         if not network.is_connected():
             raise RuntimeError('connect to network first')
@@ -158,6 +203,10 @@ class Product(BaseModel):
         if self.contract_address and len(self.contract_address) > 0:
             logger.info("connecting to address {} ...", self.contract_address)
 
+            # (re)connect resolves the full contract graph again
+            contract_cache.invalidate()
+            product_snapshot.invalidate()
+
             # TODO cleanup
             # product_contract = contract_from_address(DepegProduct, self.contract_address)
 
@@ -181,6 +230,22 @@ class Product(BaseModel):
 
             self.provider_address = product_contract.getPriceDataProvider()
             feeder_contract = contract_from_address(UsdcPriceDataProvider, self.provider_address)
+
+            round_watcher = RoundWatcher(feeder_contract.getAggregatorAddress())
+            logger.info("watching rounds of aggregator {}".format(round_watcher.aggregator_address))
+
+            multicall = Multicall(settings.multicall_address, settings.multicall_chunk_size)
+            logger.info("multicall address {} chunk size {}".format(multicall.address, multicall.chunk_size))
+
+            try:
+                stake_index.connect(registry_contract, staking_contract, multicall)
+            except Exception as ex:
+                logger.warning('failed to connect stake index: {}'.format(ex))
+
+            try:
+                bundle_index.connect(product_contract, riskpool_contract, instance_service_contract, multicall)
+            except Exception as ex:
+                logger.warning('failed to connect bundle index: {}'.format(ex))
         else:
             raise RuntimeError('depeg product address missing in .env file')
 
@@ -194,77 +259,91 @@ class Product(BaseModel):
 
 
     def get_bundle_infos(self) -> dict:
+        return dict(self.iter_bundle_infos())
+
+
+    def iter_bundle_infos(self):
+        """returns a generator of (bundle_id, info) tuples.
+
+        bundles are fetched in multicall chunks, so consumers may start
+        processing before all bundles have been read.
+        """
         if not riskpool_contract:
             raise RuntimeError('connect to product')
 
-        bundle = {}
-        bundle_count = riskpool_contract.bundles()
-        for idx in range(bundle_count):
-            bundle_id = riskpool_contract.getBundleId(idx)
-            info = riskpool_contract.getBundleInfo(bundle_id).dict()
-            info['stateLabel'] = STATE_BUNDLE[info['state']]
-            info['livetimeFrom'] = timestamp_to_iso_date(info['createdAt'])
-            info['lifetimeTo'] = timestamp_to_iso_date(info['createdAt'] + info['lifetime'])
-            bundle[bundle_id] = info
+        # pin all reads to a single block to get a consistent view
+        block_number = web3.eth.block_number
+        bundle_count = riskpool_contract.bundles(block_identifier=block_number)
+
+        return self._fetch_bundle_infos(bundle_count, block_number)
+
+
+    def _fetch_bundle_infos(self, bundle_count:int, block_number:int):
+        chunk_size = multicall.chunk_size
+
+        for start in range(0, bundle_count, chunk_size):
+            bundle_ids = multicall.map(
+                riskpool_contract.getBundleId,
+                range(start, min(start + chunk_size, bundle_count)),
+                block_identifier=block_number)
 
-        return bundle
+            bundle_infos = multicall.map(
+                riskpool_contract.getBundleInfo,
+                bundle_ids,
+                block_identifier=block_number)
+
+            for bundle_id, bundle_info in zip(bundle_ids, bundle_infos):
+                info = bundle_info.dict()
+                info['stateLabel'] = STATE_BUNDLE[info['state']]
+                info['livetimeFrom'] = timestamp_to_iso_date(info['createdAt'])
+                info['lifetimeTo'] = timestamp_to_iso_date(info['createdAt'] + info['lifetime'])
+
+                yield (bundle_id, info)
 
 
     def get_stake_infos(self) -> dict:
         if not registry_contract:
             raise RuntimeError('connect to product')
 
-        stake = {}
-        bundle_cache = {}
+        # brings index up to date with the latest block, then answers from memory
+        stake_index.update()
+        return stake_index.get_stake_infos()
 
-        chain_id = registry_contract.toChain(web3.chain_id)
-        stake_count = registry_contract.objects(chain_id, OBJECT_STAKE)
-        for idx in range(stake_count):
-            stake_id = registry_contract.getNftId(chain_id, OBJECT_STAKE, idx)
-            info_raw = staking_contract.getInfo(stake_id)
-            rewards_increment = staking_contract.calculateRewardsIncrement(info_raw)
 
-            info = info_raw.dict()
-            bundle_nft = info['target']
-            target_info = registry_contract.decodeBundleData(bundle_nft).dict()
+    def iter_stake_infos(self):
+        """returns a generator of (stake_id, info) tuples"""
+        return iter(self.get_stake_infos().items())
 
-            (bundle_id, bundle_name, bundle_expiry, bundle_cache) = self.get_bundle_attributes(bundle_nft, bundle_cache)
 
-            info['rewardTotalNow'] = info['rewardBalance'] + rewards_increment
-            info['bundleId'] = bundle_id
-            info['bundleName'] = bundle_name
-            info['bundleExpiryAt'] = bundle_expiry
+    def get_portfolio(self) -> dict:
+        """application, policy and claim totals answered from the read model"""
+        if not read_model:
+            raise RuntimeError('read model not configured (read_model_file)')
 
-            info['stakeOwner'] = registry_contract.ownerOf(stake_id)
-            info['stakingStarted'] = timestamp_to_iso_date(info['createdAt'])
-            info['unstakingAfter'] = timestamp_to_iso_date(bundle_expiry)
-            info['stakedDip'] = info['stakeBalance'] / 10**18
-            info['rewardDip'] = info['rewardTotalNow'] / 10**18
+        return read_model.get_totals()
 
-            stake[stake_id] = info
 
-        return stake
+    def get_portfolio_policies(self, state:str=None, offset:int=0, limit:int=100) -> list:
+        if not read_model:
+            raise RuntimeError('read model not configured (read_model_file)')
 
+        if offset < 0 or limit <= 0:
+            raise ValueError('offset must not be negative and limit needs to be positive')
 
-    def get_bundle_attributes(self, bundle_nft:int, bundle_cache:dict):
-        if bundle_nft in bundle_cache:
-            (bundle_id, bundle_name, bundle_expiry) = bundle_cache[bundle_nft]
-            return (bundle_id, bundle_name, bundle_expiry, bundle_cache)
+        return read_model.get_policies(state, offset, limit)
 
-        info = registry_contract.decodeBundleData(bundle_nft).dict()
 
-        bundle_id = info['bundleId']
-        bundle_name = info['displayName']
-        bundle_expiry = info['expiryAt']
+    def get_quote(self, protected_balance:int, duration_days:int, bundle_id:int=0) -> dict:
+        if not riskpool_contract:
+            raise RuntimeError('connect to product')
 
-        values = (
-            bundle_id,
-            bundle_name,
-            bundle_expiry
-        )
+        if protected_balance <= 0 or duration_days <= 0:
+            raise ValueError('protected balance and duration need to be positive')
 
-        bundle_cache[bundle_nft] = values
-        return (bundle_id, bundle_name, bundle_expiry, bundle_cache)
+        if not bundle_index.is_connected():
+            raise RuntimeError('bundle index unavailable, quotes are disabled until the product is reconnected')
+
+        return bundle_index.quote(protected_balance, duration_days * 24 * 3600, bundle_id)
 
 
     def reactivate(self) -> ProductStatus:
@@ -277,6 +356,7 @@ class Product(BaseModel):
 
         logger.info('contract call: product.reactivateProduct')
         product_contract.reactivateProduct({'from': product_owner_account.get_account()})
+        product_snapshot.invalidate()
 
         return self.get_status()
 
@@ -311,12 +391,14 @@ class Product(BaseModel):
             prov_contract = product.get_provider_contract()
 
             if prod_contract and prov_contract:
+                snapshot = product_snapshot.get(self._fetch_snapshot)
+
                 return ProductStatus(
-                    depeg_state = STATE_PRODUCT[prod_contract.getDepegState()],
-                    triggered_at = prod_contract.getTriggeredAt(),
-                    depegged_at = prod_contract.getDepeggedAt(),
+                    depeg_state = STATE_PRODUCT[snapshot['depeg_state']],
+                    triggered_at = snapshot['triggered_at'],
+                    depegged_at = snapshot['depegged_at'],
                     owner_address = product_owner.address,
-                    owner_balance = product_owner.balance()/10**18,
+                    owner_balance = snapshot['owner_balance']/10**18,
                     product_address = prod_contract.address,
                     provider_address = prov_contract.address,
                     chain_id = network.chain.id,
@@ -335,9 +417,10 @@ class Product(BaseModel):
         provider = self.get_provider_contract()
 
         if provider:
-            latest_price_info = provider.getLatestPriceInfo().dict()
-            depege_price_info = provider.getDepegPriceInfo().dict()
-            new_price = provider.isNewPriceInfoEventAvailable().dict()
+            snapshot = product_snapshot.get(self._fetch_snapshot)
+            latest_price_info = snapshot['latest_price_info']
+            depege_price_info = snapshot['depeg_price_info']
+            new_price = snapshot['new_price']
 
             return {
                 'is_new_event_available': {
@@ -346,12 +429,52 @@ class Product(BaseModel):
                 },
                 'get_latest_price_info': self.to_price_info(latest_price_info),
                 'get_depeg_price_info': self.to_price_info(depege_price_info),
-                'latest_round_data': provider.latestRoundData().dict()
+                'latest_round_data': snapshot['latest_round_data']
             }
 
         raise RuntimeError('connect product contract first')
 
 
+    def get_snapshot_stats(self) -> dict:
+        return product_snapshot.get_stats()
+
+
+    def _fetch_snapshot(self, block_number:int) -> dict:
+        """reads product and price feed state with a single batched call pinned to block_number"""
+        (
+            depeg_state,
+            triggered_at,
+            depegged_at,
+            latest_price_info,
+            depeg_price_info,
+            new_price,
+            latest_round_data,
+        ) = multicall.call([
+            (product_contract.getDepegState, ()),
+            (product_contract.getTriggeredAt, ()),
+            (product_contract.getDepeggedAt, ()),
+            (feeder_contract.getLatestPriceInfo, ()),
+            (feeder_contract.getDepegPriceInfo, ()),
+            (feeder_contract.isNewPriceInfoEventAvailable, ()),
+            (feeder_contract.latestRoundData, ()),
+        ], block_identifier=block_number)
+
+        owner_balance = web3.eth.get_balance(
+            product_owner_account.get_account().address,
+            block_identifier=block_number)
+
+        return {
+            'depeg_state': depeg_state,
+            'triggered_at': triggered_at,
+            'depegged_at': depegged_at,
+            'owner_balance': owner_balance,
+            'latest_price_info': latest_price_info.dict(),
+            'depeg_price_info': depeg_price_info.dict(),
+            'new_price': new_price.dict(),
+            'latest_round_data': latest_round_data.dict(),
+        }
+
+
     def get_latest_price_info(self) -> PriceInfo:
         product_contract = self.get_product_contract()
         price_info_dict = product_contract.getLatestPriceInfo().dict()
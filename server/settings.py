@@ -11,11 +11,33 @@ VERSION = 1.1
 DESCRIPTION = "API Server to monitor price feed data for the USDC depeg protection product"
 
 ENV_FILE = 'server/.env'
-SCHEDULER_INTERVAL = 5
+SCHEDULER_WORKERS = 4
 
 CHECKER_INTERVAL = 10
+ROUND_WATCH_INTERVAL = 2
+CHECKER_FALLBACK_INTERVAL = 3600
+
+# logs: check for price events only when a new aggregator round is detected
+# interval: check for price events every checker_interval seconds
+PRICE_TRIGGER_LOGS = 'logs'
+PRICE_TRIGGER_INTERVAL = 'interval'
 FEEDER_INTERVAL = 15
 
+MULTICALL_CHUNK_SIZE = 100
+STAKE_INDEX_RESYNC_INTERVAL = 3600
+BUNDLE_INDEX_RESYNC_INTERVAL = 3600
+BUNDLE_INDEX_MAX_STALENESS = 5
+
+SNAPSHOT_MAX_STALENESS = 0
+
+# sqlite file maintained by scripts/read_model.py, empty: read model disabled
+READ_MODEL_FILE = ''
+
+CHAIN_POOL_SIZE = 8
+MONITOR_POOL_SIZE = 2
+ENDPOINT_MAX_CONCURRENT = 4
+ENDPOINT_TIMEOUT = 30
+
 class Settings(BaseSettings):
 
     application_title:str = None
@@ -29,10 +51,37 @@ class Settings(BaseSettings):
 
     product_contract_address: str = ''
 
-    scheduler_interval: int = SCHEDULER_INTERVAL
+    scheduler_workers: int = SCHEDULER_WORKERS
     checker_interval: int = CHECKER_INTERVAL
+    price_trigger: str = PRICE_TRIGGER_LOGS
+    round_watch_interval: int = ROUND_WATCH_INTERVAL
+    checker_fallback_interval: int = CHECKER_FALLBACK_INTERVAL
     feeder_interval: int = FEEDER_INTERVAL
 
+    # empty address: canonical multicall3 (if available for chain) or sequential calls
+    multicall_address: str = ''
+    multicall_chunk_size: int = MULTICALL_CHUNK_SIZE
+
+    stake_index_resync_interval: int = STAKE_INDEX_RESYNC_INTERVAL
+
+    # seconds quotes are served from the bundle index without checking for new logs
+    bundle_index_resync_interval: int = BUNDLE_INDEX_RESYNC_INTERVAL
+    bundle_index_max_staleness: int = BUNDLE_INDEX_MAX_STALENESS
+
+    # seconds a status snapshot is served without checking for a new block (0: check every request)
+    snapshot_max_staleness: int = SNAPSHOT_MAX_STALENESS
+
+    # local event sourced read model (indexer runs as separate process)
+    read_model_file: str = READ_MODEL_FILE
+
+    # thread pools for blocking chain reads, monitor pool is reserved for health checks
+    chain_pool_size: int = CHAIN_POOL_SIZE
+    monitor_pool_size: int = MONITOR_POOL_SIZE
+
+    # defaults for endpoints without explicit limits (timeout in seconds)
+    endpoint_max_concurrent: int = ENDPOINT_MAX_CONCURRENT
+    endpoint_timeout: int = ENDPOINT_TIMEOUT
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
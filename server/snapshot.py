@@ -0,0 +1,63 @@
+import time
+
+from threading import Lock
+
+from brownie import web3
+
+
+class SnapshotCache(object):
+    """read-through cache for a snapshot of on-chain state keyed by block number.
+
+    all consumers asking during the same block share the snapshot of a single
+    fetch(block_number) call. with max_staleness > 0 a snapshot younger than
+    max_staleness seconds is served without checking for a new block at all.
+    """
+
+    def __init__(self, max_staleness:int=0):
+        self.lock = Lock()
+        self.max_staleness = max_staleness
+
+        self.snapshot = None
+        self.block_number = None
+        self.fetched_at = 0
+
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, fetch) -> dict:
+        with self.lock:
+            if self.snapshot is not None and time.time() - self.fetched_at < self.max_staleness:
+                self.hits += 1
+                return self.snapshot
+
+            block_number = web3.eth.block_number
+
+            if self.snapshot is not None and block_number == self.block_number:
+                self.hits += 1
+                return self.snapshot
+
+            self.misses += 1
+            self.snapshot = fetch(block_number)
+            self.block_number = block_number
+            self.fetched_at = time.time()
+
+            return self.snapshot
+
+
+    def invalidate(self):
+        with self.lock:
+            self.snapshot = None
+            self.block_number = None
+
+
+    def get_stats(self) -> dict:
+        requests = self.hits + self.misses
+
+        return {
+            'block_number': self.block_number,
+            'max_staleness': self.max_staleness,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests > 0 else 0.0,
+        }
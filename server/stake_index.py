@@ -0,0 +1,202 @@
+from loguru import logger
+
+from brownie import web3
+
+from scripts.util import to_hex
+
+from server.log_index import (
+    LogIndex,
+    get_log_words,
+)
+from server.settings import settings
+from server.util import timestamp_to_iso_date
+
+OBJECT_STAKE = 10
+
+# see registry-contracts Staking.YEAR_DURATION
+YEAR_DURATION = 365 * 24 * 3600
+
+# keccak256('Transfer(address,address,uint256)')
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+
+
+def calculate_rewards_increment(
+    stake_balance:int,
+    updated_at:int,
+    now:int,
+    reward_rate:int,
+    rate_decimals:int
+) -> int:
+    """off-chain version of Staking.calculateRewardsIncrement (fixed point math with rate_decimals)"""
+    if now <= updated_at:
+        return 0
+
+    unit = 10 ** rate_decimals
+    year_fraction = (now - updated_at) * unit // YEAR_DURATION
+    reward_duration = reward_rate * year_fraction // unit
+    return stake_balance * reward_duration // unit
+
+
+class StakeIndex(LogIndex):
+    """in-process index of all stakes.
+
+    the index is seeded once with batched reads and then kept current by
+    tailing the logs of the staking, registry and nft contracts.
+    stakes mentioned in new logs are re-read, all other stakes are served
+    from memory. reward totals are recomputed locally from the cached
+    stake info and the current reward rate.
+    """
+
+    def __init__(self, resync_interval:int):
+        super().__init__(resync_interval)
+
+        self.registry = None
+        self.staking = None
+        self.multicall = None
+
+        self.chain = None
+        self.reward_rate = 0
+        self.rate_decimals = 0
+
+        self.stakes = {}
+        self.owners = {}
+        self.bundles = {}
+
+
+    def connect(self, registry, staking, multicall):
+        with self.lock:
+            self.registry = registry
+            self.staking = staking
+            self.multicall = multicall
+
+            nft_address = registry.getNft()
+            self.addresses = list({staking.address, registry.address, str(nft_address)})
+            self.chain = registry.toChain(web3.chain_id)
+            self.rate_decimals = staking.rateDecimals()
+            self.seeded_at = 0
+
+
+    def is_connected(self) -> bool:
+        return self.registry is not None
+
+
+    def get_stake_infos(self) -> dict:
+        with self.lock:
+            stake = {}
+
+            for stake_id, info_raw in self.stakes.items():
+                info = dict(info_raw)
+                (bundle_id, bundle_name, bundle_expiry) = self.bundles[info['target']]
+
+                rewards_increment = calculate_rewards_increment(
+                    info['stakeBalance'],
+                    info['updatedAt'],
+                    self.last_timestamp,
+                    self.reward_rate,
+                    self.rate_decimals)
+
+                info['rewardTotalNow'] = info['rewardBalance'] + rewards_increment
+                info['bundleId'] = bundle_id
+                info['bundleName'] = bundle_name
+                info['bundleExpiryAt'] = bundle_expiry
+
+                info['stakeOwner'] = self.owners[stake_id]
+                info['stakingStarted'] = timestamp_to_iso_date(info['createdAt'])
+                info['unstakingAfter'] = timestamp_to_iso_date(bundle_expiry)
+                info['stakedDip'] = info['stakeBalance'] / 10**18
+                info['rewardDip'] = info['rewardTotalNow'] / 10**18
+
+                stake[stake_id] = info
+
+            return stake
+
+
+    def _seed(self, block_number:int):
+        stake_count = self.registry.objects(self.chain, OBJECT_STAKE, block_identifier=block_number)
+        stake_ids = self.multicall.map(
+            self.registry.getNftId,
+            [(self.chain, OBJECT_STAKE, idx) for idx in range(stake_count)],
+            block_identifier=block_number)
+
+        self.stakes = {}
+        self.owners = {}
+        self.bundles = {}
+
+        self.reward_rate = self.staking.rewardRate(block_identifier=block_number)
+        self._refresh_stakes(stake_ids, block_number)
+
+        logger.info('stake index seeded with {} stakes at block {}'.format(len(self.stakes), block_number))
+
+
+    def _process_logs(self, logs:list, block_number:int):
+        stake_count = self.registry.objects(self.chain, OBJECT_STAKE, block_identifier=block_number)
+        new_ids = []
+
+        if stake_count > len(self.stakes):
+            new_ids = self.multicall.map(
+                self.registry.getNftId,
+                [(self.chain, OBJECT_STAKE, idx) for idx in range(len(self.stakes), stake_count)],
+                block_identifier=block_number)
+
+        (dirty_ids, refresh_all) = self._get_affected_stakes(logs)
+
+        if refresh_all:
+            self.reward_rate = self.staking.rewardRate(block_identifier=block_number)
+            dirty_ids = set(self.stakes.keys())
+
+        stake_ids = list(dirty_ids.union(new_ids))
+        logger.info('stake index: {} logs, {} stakes to refresh (block {})'.format(len(logs), len(stake_ids), block_number))
+
+        self._refresh_stakes(stake_ids, block_number)
+
+
+    def _get_affected_stakes(self, logs:list):
+        """returns the stake ids mentioned in the logs and whether a full refresh is needed.
+
+        the staking contract abi is not available here, known stake ids are
+        therefore matched against all 32 byte words of topics and data.
+        a staking log that does not mention any known stake (eg a reward rate
+        update) requires a full refresh. bundles mentioned in logs (eg lifetime
+        extensions) are dropped from the bundle cache.
+        """
+        dirty_ids = set()
+        refresh_all = False
+
+        for log in logs:
+            words = get_log_words(log)
+            mentioned = {word for word in words if word in self.stakes}
+            dirty_ids.update(mentioned)
+
+            for word in words:
+                self.bundles.pop(word, None)
+
+            is_transfer = len(log['topics']) > 0 and to_hex(log['topics'][0]) == TRANSFER_TOPIC
+            if not is_transfer and log['address'] == self.staking.address and len(mentioned) == 0:
+                refresh_all = True
+
+        return (dirty_ids, refresh_all)
+
+
+    def _refresh_stakes(self, stake_ids:list, block_number:int):
+        if len(stake_ids) > 0:
+            infos = self.multicall.map(self.staking.getInfo, stake_ids, block_identifier=block_number)
+            owners = self.multicall.map(self.registry.ownerOf, stake_ids, block_identifier=block_number)
+
+            for stake_id, info, owner in zip(stake_ids, infos, owners):
+                self.stakes[stake_id] = info.dict()
+                self.owners[stake_id] = owner
+
+        # (re)load bundle attributes missing in cache
+        targets = list({info['target'] for info in self.stakes.values()} - set(self.bundles.keys()))
+        bundle_data = self.multicall.map(self.registry.decodeBundleData, targets, block_identifier=block_number)
+
+        for bundle_nft, data in zip(targets, bundle_data):
+            info = data.dict()
+            self.bundles[bundle_nft] = (
+                info['bundleId'],
+                info['displayName'],
+                info['expiryAt'])
+
+
+# full resync as safety net for state changes not visible in logs
+stake_index = StakeIndex(settings.stake_index_resync_interval)
@@ -1,17 +1,22 @@
 import csv
-import tempfile
+import io
+import json
+import zlib
 
 from datetime import datetime
+from typing import (
+    Iterable,
+    Iterator,
+)
 
 from loguru import logger
 
-from brownie import (
-    project,
-    Contract
-)
+from brownie import project
 
 from web3 import Web3
 
+from scripts.contract_cache import contract_cache
+
 PROJECT_NAME = 'WorkspaceProject'
 
 depeg_project = None
@@ -35,6 +40,11 @@ def get_project():
 
 
 def get_contracts(product_address:str):
+    """returns the (cached) contract graph for the product, see contract_cache.invalidate"""
+    return contract_cache.get_graph('server', product_address, _resolve_contracts)
+
+
+def _resolve_contracts(product_address:str):
     dp = get_project()
 
     product = contract_from_address(dp.DepegProduct, product_address)
@@ -79,34 +89,53 @@ def timestamp_to_iso_date(timestamp:int) -> str:
 
 
 def contract_from_address(contract_class, contract_address):
-    return Contract.from_abi(
-        contract_class._name,
-        contract_address,
-        contract_class.abi)
+    return contract_cache.get(contract_class, contract_address)
+
+
+def stream_csv(rows:Iterable[dict], field_names:list[str]=None) -> Iterator[str]:
+    """yields csv text row by row, field names are taken from the first row if not provided"""
+    buffer = io.StringIO()
+    csv_writer = None
+
+    for row in rows:
+        if not csv_writer:
+            if not field_names or len(field_names) == 0:
+                field_names = list(row.keys())
+
+            logger.info('csv field names: {}'.format(field_names))
+            csv_writer = csv.DictWriter(buffer, field_names)
+            csv_writer.writeheader()
+
+        csv_writer.writerow(row)
+        yield _drain(buffer)
+
+    if not csv_writer and field_names:
+        csv.DictWriter(buffer, field_names).writeheader()
 
+    yield _drain(buffer)
 
-def write_csv_temp_file(data:dict, field_names:list[str]=None) -> str:
-    if not field_names or len(field_names) == 0:
-        keys = list(data.keys())
-        if len(keys) >= 1:
-            row_id = keys[0]
-            row = data[row_id]
-            logger.info('row_id: {}, row: {}'.format(row_id, row))
 
-            field_names = list(row.keys())
+def stream_ndjson(rows:Iterable[dict]) -> Iterator[str]:
+    """yields one json document per row (newline delimited json)"""
+    for row in rows:
+        yield json.dumps(row, default=str) + '\n'
 
-    logger.info('csv field names: {}'.format(field_names))
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as temp_file:
-        temp_file_path = temp_file.name
+def stream_gzip(chunks:Iterable[str]) -> Iterator[bytes]:
+    """gzip compresses a stream of text chunks on the fly"""
+    # wbits 16 + MAX_WBITS: gzip header and trailer
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
 
-    logger.info('csv file name: {}'.format(temp_file_path))
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if len(data) > 0:
+            yield data
 
-    with open(temp_file_path, 'w', newline='') as f:
-        csv_writer = csv.DictWriter(f, field_names)
-        csv_writer.writeheader()
+    yield compressor.flush()
 
-        for key in data.keys():
-            csv_writer.writerow(data[key])
 
-    return temp_file_path
+def _drain(buffer:io.StringIO) -> str:
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return text
@@ -8,12 +8,26 @@ from loguru import logger
 from fastapi import HTTPException
 from fastapi.routing import APIRouter
 
+from scripts.contract_cache import contract_cache
+from scripts.depeg_balances import DepegBalanceSnapshot
+from scripts.multicall import Multicall
+from scripts.read_model import (
+    PAGE_SIZE_DEFAULT,
+    ReadModel,
+)
+
 from server_processor.settings import (
     Settings,
     settings
 )
 
+from server_processor.claim_pipeline import (
+    ProcessingReport,
+    claim_pipeline,
+)
+
 from server_processor.node import NodeStatus
+from server_processor.wallet_index import wallet_index
 from server_processor.product import (
     ProductStatus,
     Product
@@ -29,6 +43,10 @@ OPENAPI_TAGS = [
         'name': 'product',
         'description': 'Access to the depeg product contract'
     },
+    {
+        'name': 'wallet',
+        'description': 'Applications and policies by policy holder and protected wallet'
+    },
     {
         'name': 'node',
         'description': 'Connecting and disconnecting to blockchain'
@@ -51,12 +69,111 @@ instance_service = None
 depeg_product = None
 token = None
 
+# policy listings and totals from the local read model (written by scripts/read_model.py)
+read_model = ReadModel(settings.read_model_file, read_only=True) if settings.read_model_file else None
+
 
 @router.get('/policy', tags=['policy'])
 async def get_policy() -> dict:
     return product.get_policy_overview(depeg_product)
 
 
+@router.get('/policy/process', tags=['policy'])
+async def get_claim_processing_report() -> ProcessingReport:
+    return claim_pipeline.get_report()
+
+
+@router.put('/policy/process', tags=['policy'])
+async def start_claim_processing(retry_failed:bool=False) -> ProcessingReport:
+    if not depeg_product:
+        raise HTTPException(status_code=400, detail='connect to product first')
+
+    try:
+        return claim_pipeline.start(depeg_product, product.owner.get_account(), retry_failed)
+
+    except RuntimeError as ex:
+        raise HTTPException(
+            status_code=409,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+
+@router.put('/policy/process/stop', tags=['policy'])
+def stop_claim_processing() -> ProcessingReport:
+    return claim_pipeline.stop()
+
+
+@router.get('/policy/totals', tags=['policy'])
+def get_policy_totals() -> dict:
+    """application, policy and claim totals answered from the local read model"""
+    if not read_model:
+        raise HTTPException(status_code=400, detail='read model not configured (read_model_file)')
+
+    try:
+        return read_model.get_totals()
+
+    except RuntimeError as ex:
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+
+@router.get('/policies', tags=['policy'])
+def get_policies(
+    state:str=None,
+    claim_state:str=None,
+    protected_wallet:str=None,
+    policy_holder:str=None,
+    bundle_id:int=None,
+    expires_after:int=None,
+    expires_before:int=None,
+    sort:str='created',
+    descending:bool=False,
+    cursor:str=None,
+    limit:int=PAGE_SIZE_DEFAULT,
+) -> dict:
+    """cursor paginated policy listing from the local read model, pass 'next' of a page as cursor for the following page"""
+    if not read_model:
+        raise HTTPException(status_code=400, detail='read model not configured (read_model_file)')
+
+    filters = {
+        'state': state,
+        'claimState': claim_state,
+        'protectedWallet': protected_wallet,
+        'policyHolder': policy_holder,
+        'bundleId': bundle_id,
+        'expiresAfter': expires_after,
+        'expiresBefore': expires_before,
+    }
+
+    try:
+        return read_model.get_policy_page(filters, sort, descending, cursor, limit)
+
+    except (ValueError, RuntimeError) as ex:
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+
+@router.get('/policies/{process_id}', tags=['policy'])
+def get_policies_by_id(process_id:str) -> dict:
+    """policy with decoded application parameters and claims from the local read model"""
+    if not read_model:
+        raise HTTPException(status_code=400, detail='read model not configured (read_model_file)')
+
+    try:
+        policy = read_model.get_policy(process_id)
+
+    except RuntimeError as ex:
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+    if not policy:
+        raise HTTPException(status_code=404, detail='no policy for process id {}'.format(process_id))
+
+    return policy
+
+
 @router.get('/policy/{process_id}', tags=['policy'])
 async def get_policy_by_id(process_id:str) -> dict:
     return product.get_policy(instance_service, process_id)
@@ -69,6 +186,25 @@ async def get_product_status() -> ProductStatus:
     return product.get_status(depeg_product)
 
 
+@router.put('/product/depeg_balances', tags=['product'])
+def upload_depeg_balances(all_policies:bool=False, force:bool=False) -> dict:
+    """reads protected wallet balances at the depegged block and adds the missing ones via addDepegBalances"""
+    if not depeg_product:
+        raise HTTPException(status_code=400, detail='connect to product first')
+
+    try:
+        snapshot = DepegBalanceSnapshot(
+            depeg_product,
+            Multicall(settings.multicall_address, settings.multicall_chunk_size))
+
+        return snapshot.run(product.owner.get_account(), all_policies, force)
+
+    except (RuntimeError, ValueError) as ex:
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+
 @router.put('/product/connect', tags=['product'])
 async def connect_to_product_contract() -> ProductStatus:
     global instance_service
@@ -88,6 +224,12 @@ async def connect_to_product_contract() -> ProductStatus:
             settings.product_owner_mnemonic
         )
 
+        wallet_index.connect(
+            depeg_product,
+            instance_service,
+            Multicall(settings.multicall_address, settings.multicall_chunk_size))
+        wallet_index.start()
+
         return product.get_status(depeg_product)
 
     except (RuntimeError, ValueError) as ex:
@@ -96,6 +238,19 @@ async def connect_to_product_contract() -> ProductStatus:
             detail=getattr(ex, 'message', repr(ex))) from ex
 
 
+@router.get('/wallet/{address}', tags=['wallet'])
+def get_wallet(address:str) -> dict:
+    """process ids held by and protecting address, answered from the in-memory wallet index (seeded in the background)"""
+    try:
+        wallet_index.update()
+        return wallet_index.get_wallet(address)
+
+    except RuntimeError as ex:
+        raise HTTPException(
+            status_code=400,
+            detail=getattr(ex, 'message', repr(ex))) from ex
+
+
 @router.get('/node', tags=['node'])
 async def get_node_status() -> NodeStatus:
     return settings.node.get_status()
@@ -120,6 +275,9 @@ async def get_settings() -> Settings:
 async def reload_settings() -> Settings:
     global settings
     settings = Settings()
+
+    # addresses may have changed, handles are resolved again on next access
+    contract_cache.invalidate()
     return settings
 
 
@@ -145,6 +303,12 @@ async def startup_event():
             settings.product_owner_mnemonic
         )
 
+        wallet_index.connect(
+            depeg_product,
+            instance_service,
+            Multicall(settings.multicall_address, settings.multicall_chunk_size))
+        wallet_index.start()
+
         logger.info('successfully connected to chain and product')
 
     except (RuntimeError, ValueError) as ex:
@@ -155,4 +319,6 @@ async def startup_event():
 
 @router.on_event("shutdown")
 def shutdown_event():
+    claim_pipeline.stop()
+    wallet_index.stop()
     settings.node.disconnect()
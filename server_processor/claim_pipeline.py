@@ -0,0 +1,484 @@
+import json
+import os
+import time
+
+from collections import deque
+from threading import (
+    Lock,
+    Thread,
+)
+
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+from loguru import logger
+from pydantic import BaseModel
+
+from brownie import web3
+from web3.exceptions import TransactionNotFound
+
+from scripts.batch_sizer import GasBatchSizer
+from scripts.multicall import Multicall
+
+from server_processor.settings import settings
+
+# submission attempts per batch before the batch is split
+SUBMIT_RETRIES = 3
+
+# gas price increase for replacing a pending transaction (nodes require at least 10%)
+REPLACEMENT_PRICE_INCREASE = 1.125
+
+POLL_INTERVAL = 1.0
+
+BATCH_PENDING = 'pending'
+BATCH_CONFIRMED = 'confirmed'
+BATCH_REVERTED = 'reverted'
+
+
+class BatchRecord(BaseModel):
+
+    tx_hash:str
+    nonce:int
+    process_ids:List[str]
+    gas_limit:int
+    gas_price:int = 0
+    replaced:List[str] = []
+    gas_used:int = 0
+    status:str = BATCH_PENDING
+    submitted_at:float = 0.0
+    confirmed_at:float = 0.0
+
+
+class ProcessingState(BaseModel):
+    """persisted progress, allows a restarted pipeline to resume"""
+
+    product_address:str
+    processed:List[str] = []
+    failed:Dict[str, str] = {}
+    pending:List[BatchRecord] = []
+    transactions:int = 0
+    gas_used:int = 0
+    gas_cost:int = 0
+    gas_per_policy:int = 0
+
+
+class ProcessingReport(BaseModel):
+
+    running:bool
+    product_address:Optional[str]
+    policies_queued:int
+    policies_processed:int
+    policies_failed:int
+    policies_in_flight:int
+    transactions:int
+    transactions_in_flight:int
+    gas_used:int
+    gas_cost:int
+    gas_per_policy:int
+    batch_size:int
+    elapsed:float
+    policies_per_minute:float
+
+
+class ClaimPipeline(object):
+    """drains DepegProduct.policiesToProcess() with processPolicies transactions.
+
+    process ids are paged from getPolicyToProcess(idx) at a pinned block and
+    packed into batches sized by a GasBatchSizer: estimated gas stays below a
+    fraction of the block gas limit and the gas per policy follows the receipts.
+    up to max_in_flight transactions are sent with locally managed nonces,
+    transactions pending longer than confirmation_timeout are replaced with
+    the same nonce and a higher gas price.
+    batches that fail gas estimation or revert are split until the failing
+    policies are isolated, these are recorded as failed and skipped.
+    progress is written to state_file after every change.
+    """
+
+    def __init__(
+        self,
+        state_file:str,
+        max_in_flight:int,
+        block_gas_fraction:float,
+        initial_batch_size:int,
+        max_batch_size:int,
+        confirmation_timeout:int,
+    ):
+        self.state_file = state_file
+        self.max_in_flight = max_in_flight
+        self.block_gas_fraction = block_gas_fraction
+        self.initial_batch_size = initial_batch_size
+        self.max_batch_size = max_batch_size
+        self.confirmation_timeout = confirmation_timeout
+
+        self.lock = Lock()
+        self.thread = None
+        self.stop_requested = False
+
+        self.state = None
+        self.queue = deque()
+        self.retries = {}
+        self.sizer = None
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self.processed_in_run = 0
+
+
+    def start(self, product, account, retry_failed:bool=False) -> ProcessingReport:
+        with self.lock:
+            if self.is_running():
+                raise RuntimeError('claim processing already running')
+
+            self.stop_requested = False
+            self.thread = Thread(target=self._run_safe, args=(product, account, retry_failed), daemon=True)
+            self.thread.start()
+
+        return self.get_report()
+
+
+    def stop(self) -> ProcessingReport:
+        self.stop_requested = True
+
+        if self.thread:
+            self.thread.join()
+
+        return self.get_report()
+
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+
+    def get_report(self) -> ProcessingReport:
+        with self.lock:
+            state = self.state
+            in_flight = [batch for batch in state.pending] if state else []
+            end = time.time() if self.is_running() or self.finished_at == 0 else self.finished_at
+            elapsed = end - self.started_at if self.started_at > 0 else 0.0
+
+            return ProcessingReport(
+                running = self.is_running(),
+                product_address = state.product_address if state else None,
+                policies_queued = len(self.queue),
+                policies_processed = len(state.processed) if state else 0,
+                policies_failed = len(state.failed) if state else 0,
+                policies_in_flight = sum([len(batch.process_ids) for batch in in_flight]),
+                transactions = state.transactions if state else 0,
+                transactions_in_flight = len(in_flight),
+                gas_used = state.gas_used if state else 0,
+                gas_cost = state.gas_cost if state else 0,
+                gas_per_policy = state.gas_per_policy if state else 0,
+                batch_size = self.sizer.batch_size if self.sizer else self.initial_batch_size,
+                elapsed = elapsed,
+                policies_per_minute = 60 * self.processed_in_run / elapsed if elapsed > 0 else 0.0)
+
+
+    def run(self, product, account, retry_failed:bool=False):
+        """blocking processing loop, returns when all policies are processed or stop() was called.
+        with retry_failed policies that failed in a previous run (eg missing depeg balance) are attempted again.
+        """
+        self.started_at = time.time()
+        self.finished_at = 0.0
+        self.processed_in_run = 0
+        self._prepare(product, account, retry_failed)
+
+        # settle transactions of a previous run before reading the open policies
+        while len(self.state.pending) > 0 and not self.stop_requested:
+            self._check_pending(product, account)
+            time.sleep(POLL_INTERVAL)
+
+        self._read_queue(product)
+
+        logger.info('claim processing started: {} policies to process, batch size {}', len(self.queue), self.sizer.batch_size)
+        nonce = web3.eth.get_transaction_count(account.address, 'pending')
+
+        while (len(self.queue) > 0 or len(self.state.pending) > 0) and not self.stop_requested:
+            while len(self.queue) > 0 and len(self.state.pending) < self.max_in_flight and not self.stop_requested:
+                nonce = self._submit_next_batch(product, account, nonce)
+
+            if self._check_pending(product, account):
+                nonce = web3.eth.get_transaction_count(account.address, 'pending')
+
+            time.sleep(POLL_INTERVAL if len(self.state.pending) > 0 else 0)
+
+        self.finished_at = time.time()
+        report = self.get_report()
+        logger.info('claim processing finished: {} processed {} failed {} tx {:.1f} policies/min',
+            report.policies_processed,
+            report.policies_failed,
+            report.transactions,
+            report.policies_per_minute)
+
+
+    def get_policies_to_process(self, product) -> list:
+        """process ids of policiesToProcess() read at a single block, the set changes with every processed policy"""
+        block_number = web3.eth.block_number
+        count = product.policiesToProcess(block_identifier=block_number)
+        multicall = Multicall(settings.multicall_address, settings.multicall_chunk_size)
+        results = multicall.map(product.getPolicyToProcess, list(range(count)), block_identifier=block_number)
+
+        return [str(process_id) for (process_id, _) in results]
+
+
+    def _run_safe(self, product, account, retry_failed:bool):
+        try:
+            self.run(product, account, retry_failed)
+        except Exception as ex:
+            self.finished_at = time.time()
+            logger.exception('claim processing failed: {}', ex)
+
+
+    def _prepare(self, product, account, retry_failed:bool):
+        """loads the persisted state of the product and sets up the batch sizer"""
+        with self.lock:
+            self.state = self._load_state(product.address)
+            self.retries = {}
+
+            if retry_failed:
+                self.state.failed = {}
+
+            self.sizer = GasBatchSizer(
+                lambda batch: product.processPolicies.estimate_gas(batch, {'from': account}),
+                block_gas_fraction=self.block_gas_fraction,
+                initial_batch_size=self.initial_batch_size,
+                max_batch_size=self.max_batch_size)
+
+            self.sizer.gas_per_element = self.state.gas_per_policy
+
+
+    def _read_queue(self, product):
+        """queues open policies not yet processed or failed, calibrates the batch size on the first run"""
+        with self.lock:
+            known = set(self.state.processed) | set(self.state.failed.keys())
+            self.queue = deque([process_id for process_id in self.get_policies_to_process(product) if process_id not in known])
+
+            if self.sizer.gas_per_element == 0:
+                self.sizer.calibrate(list(self.queue))
+                self.state.gas_per_policy = self.sizer.gas_per_element
+            else:
+                self.sizer.update_batch_size()
+
+
+    def _submit_next_batch(self, product, account, nonce:int) -> int:
+        with self.lock:
+            batch = [self.queue.popleft() for _ in range(min(self.sizer.batch_size, len(self.queue)))]
+
+        try:
+            gas = self.sizer.estimate_gas(batch)
+        except Exception as ex:
+            self._split_or_fail(batch, 'estimate gas: {}'.format(ex))
+            return nonce
+
+        if not self.sizer.fits(len(batch), gas):
+            self._split_or_fail(batch, 'gas budget exceeded')
+            return nonce
+
+        if self.sizer.gas_per_element == 0:
+            with self.lock:
+                self.sizer.calibrate(batch)
+                self.state.gas_per_policy = self.sizer.gas_per_element
+
+        gas_price = web3.eth.gas_price
+
+        try:
+            tx = product.processPolicies(
+                batch,
+                {
+                    'from': account,
+                    'nonce': nonce,
+                    'gas_limit': self.sizer.get_gas_limit(gas),
+                    'gas_price': gas_price,
+                    'required_confs': 0,
+                })
+        except Exception as ex:
+            # eg nonce mismatch after external transactions: resync nonce and retry
+            logger.warning('submitting batch of {} policies failed: {}', len(batch), ex)
+            key = tuple(batch)
+            self.retries[key] = self.retries.get(key, 0) + 1
+
+            if self.retries[key] >= SUBMIT_RETRIES:
+                self._split_or_fail(batch, 'submit: {}'.format(ex))
+            else:
+                with self.lock:
+                    self.queue.extendleft(reversed(batch))
+
+            return web3.eth.get_transaction_count(account.address, 'pending')
+
+        with self.lock:
+            self.state.pending.append(BatchRecord(
+                tx_hash=str(tx.txid),
+                nonce=nonce,
+                process_ids=batch,
+                gas_limit=self.sizer.get_gas_limit(gas),
+                gas_price=gas_price,
+                submitted_at=time.time()))
+
+            self.state.transactions += 1
+            self._save_state()
+
+        logger.info('submitted batch of {} policies tx {} nonce {}', len(batch), tx.txid, nonce)
+        return nonce + 1
+
+
+    def _check_pending(self, product, account) -> bool:
+        """collects receipts of pending batches, returns True if the nonce needs to be resynced.
+        batches not confirmed within confirmation_timeout are replaced with the same nonce and a
+        higher gas price, the batch stays pending until one of its transactions is mined.
+        """
+        resync_nonce = False
+
+        for batch in list(self.state.pending):
+            (tx_hash, receipt) = self._get_receipt(batch)
+
+            if not receipt:
+                if time.time() - batch.submitted_at > self.confirmation_timeout:
+                    resync_nonce |= self._replace(product, account, batch)
+
+                continue
+
+            with self.lock:
+                self.state.pending.remove(batch)
+                batch.tx_hash = tx_hash
+                batch.gas_used = receipt['gasUsed']
+                batch.confirmed_at = time.time()
+                self.state.gas_used += batch.gas_used
+                self.state.gas_cost += batch.gas_used * receipt.get('effectiveGasPrice', 0)
+
+                if receipt['status'] == 1:
+                    batch.status = BATCH_CONFIRMED
+                    self.state.processed.extend(batch.process_ids)
+                    self.processed_in_run += len(batch.process_ids)
+                    self.sizer.record(len(batch.process_ids), batch.gas_used, receipt.get('effectiveGasPrice', 0))
+                    self.state.gas_per_policy = self.sizer.gas_per_element
+                else:
+                    batch.status = BATCH_REVERTED
+
+                self._save_state()
+
+            if batch.status == BATCH_REVERTED:
+                logger.warning('batch tx {} reverted, splitting {} policies', batch.tx_hash, len(batch.process_ids))
+                self._requeue_open(product, batch.process_ids, 'transaction {} reverted'.format(batch.tx_hash))
+
+        return resync_nonce
+
+
+    def _get_receipt(self, batch:BatchRecord):
+        """(tx hash, receipt) of the mined transaction of the batch (latest or a replaced one), (None, None) while pending"""
+        for tx_hash in [batch.tx_hash] + batch.replaced:
+            try:
+                return (tx_hash, web3.eth.get_transaction_receipt(tx_hash))
+            except TransactionNotFound:
+                pass
+
+        return (None, None)
+
+
+    def _replace(self, product, account, batch:BatchRecord) -> bool:
+        """re-broadcasts the batch with its nonce and a higher gas price, returns True if the nonce needs to be resynced"""
+        gas_price = max(web3.eth.gas_price, int(batch.gas_price * REPLACEMENT_PRICE_INCREASE) + 1)
+        logger.warning('batch tx {} not confirmed after {}s, replacing with gas price {}', batch.tx_hash, self.confirmation_timeout, gas_price)
+
+        try:
+            tx = product.processPolicies(
+                batch.process_ids,
+                {
+                    'from': account,
+                    'nonce': batch.nonce,
+                    'gas_limit': batch.gas_limit,
+                    'gas_price': gas_price,
+                    'required_confs': 0,
+                })
+
+        except Exception as ex:
+            # nonce used: one of the batch transactions was mined meanwhile, or an external transaction took the nonce
+            if web3.eth.get_transaction_count(account.address) > batch.nonce and not self._get_receipt(batch)[1]:
+                logger.warning('nonce {} of batch tx {} used by another transaction', batch.nonce, batch.tx_hash)
+
+                with self.lock:
+                    self.state.pending.remove(batch)
+                    self._save_state()
+
+                self._requeue_open(product, batch.process_ids, 'nonce {} used by another transaction'.format(batch.nonce))
+                return True
+
+            logger.warning('replacing batch tx {} failed: {}', batch.tx_hash, ex)
+
+            with self.lock:
+                batch.submitted_at = time.time()
+                self._save_state()
+
+            return False
+
+        with self.lock:
+            batch.replaced.append(batch.tx_hash)
+            batch.tx_hash = str(tx.txid)
+            batch.gas_price = gas_price
+            batch.submitted_at = time.time()
+            self._save_state()
+
+        return False
+
+
+    def _requeue_open(self, product, process_ids:list, reason:str):
+        """splits/fails only policies still in the on-chain process set, the others were processed by another transaction"""
+        open_policies = set(self.get_policies_to_process(product))
+        still_open = [process_id for process_id in process_ids if process_id in open_policies]
+        processed = [process_id for process_id in process_ids if process_id not in open_policies]
+
+        if len(processed) > 0:
+            logger.info('{} policies of failed batch already processed', len(processed))
+
+            with self.lock:
+                self.state.processed.extend(processed)
+                self._save_state()
+
+        if len(still_open) > 0:
+            self._split_or_fail(still_open, reason)
+
+
+    def _split_or_fail(self, batch:list, reason:str):
+        with self.lock:
+            if len(batch) == 1:
+                logger.warning('policy {} failed: {}', batch[0], reason)
+                self.state.failed[batch[0]] = reason
+                self._save_state()
+                return
+
+            (first, second) = self.sizer.split(batch)
+            self.queue.extendleft(reversed(second))
+            self.queue.extendleft(reversed(first))
+
+
+    def _load_state(self, product_address:str) -> ProcessingState:
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as state_file:
+                state = ProcessingState(**json.load(state_file))
+
+            if state.product_address.lower() == product_address.lower():
+                logger.info('resuming claim processing: {} processed {} failed {} pending',
+                    len(state.processed), len(state.failed), len(state.pending))
+                return state
+
+        return ProcessingState(product_address=product_address)
+
+
+    def _save_state(self):
+        state_dir = os.path.dirname(self.state_file)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+        with open(self.state_file + '.tmp', 'w') as state_file:
+            state_file.write(self.state.json())
+
+        os.replace(self.state_file + '.tmp', self.state_file)
+
+
+claim_pipeline = ClaimPipeline(
+    settings.processing_state_file,
+    settings.processing_max_in_flight,
+    settings.processing_block_gas_fraction,
+    settings.processing_initial_batch_size,
+    settings.processing_max_batch_size,
+    settings.processing_confirmation_timeout)
@@ -2,6 +2,8 @@ from loguru import logger
 from brownie import network
 from pydantic import BaseModel
 
+from scripts.contract_cache import contract_cache
+
 
 NETWORK_DEFAULT = 'ganache'
 
@@ -28,6 +30,7 @@ class BrownieNode(BaseModel):
 
         logger.info("connecting to network '{}'", self.network_id)
         network.connect(self.network_id)
+        contract_cache.invalidate()
         logger.info("successfully connected")
         return self.get_status()
 
@@ -35,6 +38,7 @@ class BrownieNode(BaseModel):
     def disconnect(self) -> NodeStatus:
         logger.info("disconnecting from network '{}'", self.network_id)
         network.disconnect(self.network_id)
+        contract_cache.invalidate()
         logger.info("successfully disconnected")
         return self.get_status()
 
@@ -12,6 +12,24 @@ SCHEDULER_INTERVAL = 5
 CHECKER_INTERVAL = 10
 FEEDER_INTERVAL = 15
 
+MULTICALL_CHUNK_SIZE = 100
+
+# runtime state, kept outside the source tree
+PROCESSING_STATE_FILE = 'build/claim_processing.json'
+PROCESSING_MAX_IN_FLIGHT = 4
+PROCESSING_BLOCK_GAS_FRACTION = 0.5
+PROCESSING_INITIAL_BATCH_SIZE = 10
+PROCESSING_MAX_BATCH_SIZE = 200
+PROCESSING_CONFIRMATION_TIMEOUT = 600
+
+# sqlite file maintained by scripts/read_model.py, empty: read model disabled
+READ_MODEL_FILE = ''
+
+WALLET_INDEX_RESYNC_INTERVAL = 3600
+WALLET_INDEX_RESYNC_DEPTH = 1000
+WALLET_INDEX_UPDATE_INTERVAL = 10
+WALLET_INDEX_START_BLOCK = 0
+
 class Settings(BaseSettings):
 
     application_title:str = None
@@ -29,6 +47,29 @@ class Settings(BaseSettings):
     product_owner_id: int = -1
     product_owner_mnemonic: str = ''
 
+    # empty address: canonical multicall3 (if available for chain) or sequential calls
+    multicall_address: str = ''
+    multicall_chunk_size: int = MULTICALL_CHUNK_SIZE
+
+    # claim processing pipeline: progress file, concurrent transactions,
+    # max share of block gas limit per batch, batch size bounds, seconds until a pending tx is replaced with a higher gas price
+    processing_state_file: str = PROCESSING_STATE_FILE
+    processing_max_in_flight: int = PROCESSING_MAX_IN_FLIGHT
+    processing_block_gas_fraction: float = PROCESSING_BLOCK_GAS_FRACTION
+    processing_initial_batch_size: int = PROCESSING_INITIAL_BATCH_SIZE
+    processing_max_batch_size: int = PROCESSING_MAX_BATCH_SIZE
+    processing_confirmation_timeout: int = PROCESSING_CONFIRMATION_TIMEOUT
+
+    # local event sourced read model (indexer runs as separate process)
+    read_model_file: str = READ_MODEL_FILE
+
+    # holder/protected wallet -> process ids index, seconds between rescans of the last resync depth blocks,
+    # seconds between log tail updates, start block (0: product deploy block derived via eth_getCode)
+    wallet_index_resync_interval: int = WALLET_INDEX_RESYNC_INTERVAL
+    wallet_index_resync_depth: int = WALLET_INDEX_RESYNC_DEPTH
+    wallet_index_update_interval: int = WALLET_INDEX_UPDATE_INTERVAL
+    wallet_index_start_block: int = WALLET_INDEX_START_BLOCK
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         logger.info("(re)load settings from '{}'", ENV_FILE)
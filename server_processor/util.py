@@ -3,6 +3,8 @@ from datetime import datetime
 from brownie import Contract
 from web3 import Web3
 
+from scripts.contract_cache import contract_cache
+
 
 def s2b(text: str):
     return '{:0<66}'.format(Web3.toHex(text.encode('ascii')))[:66]
@@ -19,10 +21,7 @@ def get_unix_time() -> int:
 
 
 def contract_from_address(contract_class, contract_address):
-    return Contract.from_abi(
-        contract_class._name,
-        contract_address,
-        contract_class.abi)
+    return contract_cache.get(contract_class, contract_address)
 
 
 def get_package(substring: str):
@@ -0,0 +1,336 @@
+import time
+
+from threading import (
+    RLock,
+    Thread,
+)
+
+from loguru import logger
+
+from brownie import web3
+
+from scripts.portfolio_export import decode_application_data
+from scripts.read_model import (
+    MAX_BLOCK_RANGE,
+    decode_log,
+    get_event_abis,
+)
+
+from server_processor.settings import settings
+from server_processor.util import get_unix_time
+
+APPLICATION_CREATED = 'LogDepegApplicationCreated'
+
+# blocks rescanned by the periodic resync (drops applications of reorged blocks)
+RESYNC_DEPTH = 1000
+
+# seconds between log tail updates of the background thread
+UPDATE_INTERVAL = 10
+
+
+class WalletIndex(object):
+    """in-process index of all applications by policy holder and protected wallet.
+
+    the index is seeded by a background thread from the LogDepegApplicationCreated
+    logs of the product, starting at start_block (0: product deploy block) and then
+    kept current by tailing these logs. duration and bundle id are decoded from the
+    application data (batched getApplication reads), balances are the protected
+    balances at application time. every resync_interval seconds the last
+    resync_depth blocks are rescanned to drop applications of reorged blocks.
+    requests only tail the logs since the last processed block.
+    """
+
+    def __init__(
+        self,
+        resync_interval:int,
+        start_block:int=0,
+        resync_depth:int=RESYNC_DEPTH,
+        update_interval:int=UPDATE_INTERVAL,
+        max_block_range:int=MAX_BLOCK_RANGE,
+    ):
+        self.lock = RLock()
+        self.resync_interval = resync_interval
+        self.start_block = start_block
+        self.resync_depth = resync_depth
+        self.update_interval = update_interval
+        self.max_block_range = max_block_range
+
+        self.product = None
+        self.instance_service = None
+        self.multicall = None
+        self.topic = None
+        self.event_abi = None
+        self.from_block = 0
+
+        self.holders = {}
+        self.wallets = {}
+        self.applications = {}
+
+        self.last_block = 0
+        self.seeded_at = 0
+        self.resynced_at = 0
+
+        self.thread = None
+        self.stop_requested = False
+
+
+    def connect(self, product, instance_service, multicall):
+        with self.lock:
+            self.product = product
+            self.instance_service = instance_service
+            self.multicall = multicall
+
+            for (topic, event_abi) in get_event_abis(product.abi).items():
+                if event_abi['name'] == APPLICATION_CREATED:
+                    (self.topic, self.event_abi) = (topic, event_abi)
+
+            self.from_block = 0
+            self.seeded_at = 0
+
+
+    def start(self):
+        """starts the background thread seeding, tailing and resyncing the index"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.stop_requested = False
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.stop_requested = True
+
+        if self.thread:
+            self.thread.join()
+
+
+    def is_seeded(self) -> bool:
+        return self.seeded_at > 0
+
+
+    def seed(self):
+        """full scan from the start block, the current index stays available until the new one is complete"""
+        if not self.product:
+            raise RuntimeError('connect to product')
+
+        if not self.from_block:
+            self.from_block = self.start_block or get_deploy_block(self.product.address)
+
+        block_number = web3.eth.block_number
+        entries = self._read_applications(self.from_block, block_number)
+
+        with self.lock:
+            self.holders = {}
+            self.wallets = {}
+            self.applications = {}
+
+            for entry in entries:
+                self.add(*entry)
+
+            self.last_block = block_number
+            self.seeded_at = get_unix_time()
+            self.resynced_at = self.seeded_at
+
+        logger.info('wallet index seeded with {} applications at block {}'.format(len(entries), block_number))
+
+
+    def update(self):
+        """processes logs since the last processed block"""
+        if not self.is_seeded():
+            raise RuntimeError('wallet index not seeded yet')
+
+        with self.lock:
+            block_number = web3.eth.block_number
+
+            if block_number > self.last_block:
+                for entry in self._read_applications(self.last_block + 1, block_number):
+                    self.add(*entry)
+
+                self.last_block = block_number
+
+
+    def resync(self):
+        """rescans the last resync_depth blocks, applications no longer in these blocks are dropped"""
+        if not self.is_seeded():
+            raise RuntimeError('wallet index not seeded yet')
+
+        with self.lock:
+            block_number = web3.eth.block_number
+            from_block = max(self.from_block, self.last_block - self.resync_depth + 1)
+
+            for process_id in [
+                process_id for (process_id, info) in self.applications.items()
+                if info['blockNumber'] >= from_block
+            ]:
+                self.remove(process_id)
+
+            for entry in self._read_applications(from_block, block_number):
+                self.add(*entry)
+
+            self.last_block = block_number
+            self.resynced_at = get_unix_time()
+
+
+    def add(self, process_id:str, holder:str, wallet:str, info:dict):
+        with self.lock:
+            process_id = process_id.lower()
+
+            if process_id in self.applications:
+                return
+
+            self.applications[process_id] = info
+            self.holders.setdefault(holder.lower(), []).append(process_id)
+            self.wallets.setdefault(wallet.lower(), []).append(process_id)
+
+
+    def remove(self, process_id:str):
+        with self.lock:
+            info = self.applications.pop(process_id.lower(), None)
+
+            if not info:
+                return
+
+            for (index, key) in [(self.holders, info['policyHolder']), (self.wallets, info['protectedWallet'])]:
+                process_ids = index.get(key.lower(), [])
+
+                if process_id.lower() in process_ids:
+                    process_ids.remove(process_id.lower())
+
+                if len(process_ids) == 0:
+                    index.pop(key.lower(), None)
+
+
+    def get_process_ids_by_holder(self, holder:str) -> list:
+        with self.lock:
+            return list(self.holders.get(holder.lower(), []))
+
+
+    def get_process_ids_by_wallet(self, wallet:str) -> list:
+        with self.lock:
+            return list(self.wallets.get(wallet.lower(), []))
+
+
+    def get_application(self, process_id:str) -> dict:
+        with self.lock:
+            return self.applications.get(process_id.lower())
+
+
+    def get_wallet(self, address:str) -> dict:
+        """applications held by address and applications protecting address, in creation order"""
+        with self.lock:
+            holder_ids = self.get_process_ids_by_holder(address)
+            wallet_ids = self.get_process_ids_by_wallet(address)
+
+            return {
+                'address': address,
+                'block': self.last_block,
+                'holder': holder_ids,
+                'protected': wallet_ids,
+                'applications': {
+                    process_id: self.applications[process_id]
+                    for process_id in holder_ids + wallet_ids},
+            }
+
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'block': self.last_block,
+                'applications': len(self.applications),
+                'holders': len(self.holders),
+                'wallets': len(self.wallets),
+            }
+
+
+    def _run(self):
+        while not self.stop_requested:
+            try:
+                if not self.is_seeded():
+                    self.seed()
+                elif get_unix_time() - self.resynced_at > self.resync_interval:
+                    self.resync()
+                else:
+                    self.update()
+
+            except Exception as ex:
+                logger.warning('wallet index update failed: {}'.format(ex))
+
+            time.sleep(self.update_interval)
+
+
+    def _read_applications(self, from_block:int, to_block:int) -> list:
+        """(process id, holder, wallet, info) of the applications created in the block range"""
+        entries = []
+
+        for start in range(from_block, to_block + 1, self.max_block_range):
+            logs = web3.eth.get_logs({
+                'fromBlock': start,
+                'toBlock': min(start + self.max_block_range - 1, to_block),
+                'address': self.product.address,
+                'topics': [self.topic]})
+
+            if len(logs) > 0:
+                entries += self._to_entries(logs)
+
+        return entries
+
+
+    def _to_entries(self, logs:list) -> list:
+        events = [(log, decode_log(self.event_abi, log)) for log in logs]
+        applications = self.multicall.map(
+            self.instance_service.getApplication,
+            [args['processId'] for (_, args) in events])
+
+        entries = []
+
+        for ((log, args), application) in zip(events, applications):
+            application = application.dict()
+            data = decode_application_data(application['data'])
+
+            entries.append((args['processId'], args['policyHolder'], args['protectedWallet'], {
+                'processId': args['processId'],
+                'policyHolder': args['policyHolder'],
+                'protectedWallet': args['protectedWallet'],
+                'protectedBalance': args['protectedBalance'],
+                'sumInsured': args['sumInsuredAmount'],
+                'duration': data['duration'],
+                'bundleId': data['bundleId'],
+                'createdAt': application['createdAt'],
+                'blockNumber': log['blockNumber'],
+            }))
+
+        logger.info('wallet index: {} new applications'.format(len(events)))
+        return entries
+
+
+def get_deploy_block(address:str) -> int:
+    """first block with contract code at address (bisection on eth_getCode, requires historical state)"""
+    latest = web3.eth.block_number
+
+    try:
+        if len(web3.eth.get_code(address, block_identifier=latest)) == 0:
+            raise RuntimeError('no contract at {}'.format(address))
+
+        (low, high) = (0, latest)
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if len(web3.eth.get_code(address, block_identifier=middle)) > 0:
+                high = middle
+            else:
+                low = middle + 1
+
+    except ValueError as ex:
+        raise RuntimeError('deploy block of {} not available from node, set wallet_index_start_block: {}'.format(address, ex)) from ex
+
+    return low
+
+
+# periodic rescan of recent blocks as safety net for reorged applications
+wallet_index = WalletIndex(
+    settings.wallet_index_resync_interval,
+    settings.wallet_index_start_block,
+    settings.wallet_index_resync_depth,
+    settings.wallet_index_update_interval)
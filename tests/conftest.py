@@ -15,6 +15,7 @@ from brownie import (
     DepegRiskpool,
     DepegMessageHelper,
     MockRegistryStaking,
+    Multicall3,
     DIP
 )
 
@@ -26,6 +27,8 @@ from scripts.const import (
     MORALIS_API_KEY
 )
 
+from scripts.contract_cache import contract_cache
+
 from scripts.util import (
     get_account,
     get_package,
@@ -62,6 +65,9 @@ def run_around_tests():
         # dummy_account = get_account(ACCOUNTS_MNEMONIC, 999)
         # execute_simple_incrementer_trx(dummy_account)
 
+        # chain state is reverted between tests, resolved contract graphs may be stale
+        contract_cache.invalidate_graphs()
+
 #=== moralis api  ======================================================#
 
 @pytest.fixture(scope="module")
@@ -170,6 +176,9 @@ def dip(instanceOperator) -> DIP: return DIP.deploy({'from': instanceOperator})
 @pytest.fixture(scope="module")
 def testCoin(instanceOperator, gif) -> Contract: return gif.TestCoin.deploy({'from':instanceOperator})
 
+@pytest.fixture(scope="module")
+def multicall3(instanceOperator) -> Multicall3: return Multicall3.deploy({'from': instanceOperator})
+
 #=== gif instance fixtures ====================================================#
 
 @pytest.fixture(scope="module")
@@ -8,6 +8,7 @@ from brownie import (
     USD1,
 )
 
+from scripts.round_watcher import RoundWatcher
 from scripts.util import contract_from_address
 
 MAINNET = 1
@@ -117,3 +118,60 @@ def test_aggregator_interface_ganache(
     assert round_data2['roundId'] == round_id2
     assert round_data2['startedAt'] == timestamp2
     assert round_data2['updatedAt'] == timestamp2
+
+
+def test_aggregator_round_events_ganache(
+    usdc_feeder: UsdcPriceDataProvider,
+    usd1: USD1
+):
+
+    if web3.chain_id == MAINNET:
+        print('test case only relevant when executed on testnet')
+        return
+
+    multiplier = 10 ** usd1.decimals()
+    price = int(0.999 * multiplier)
+    timestamp = chain.time()
+
+    tx = usdc_feeder.addRoundData(price, timestamp)
+
+    assert 'NewRound' in tx.events
+    assert tx.events['NewRound']['roundId'] == 1
+    assert tx.events['NewRound']['startedAt'] == timestamp
+
+    assert 'AnswerUpdated' in tx.events
+    assert tx.events['AnswerUpdated']['current'] == price
+    assert tx.events['AnswerUpdated']['roundId'] == 1
+    assert tx.events['AnswerUpdated']['updatedAt'] == timestamp
+
+
+def test_round_watcher_ganache(
+    usdc_feeder: UsdcPriceDataProvider,
+    usd1: USD1
+):
+
+    if web3.chain_id == MAINNET:
+        print('test case only relevant when executed on testnet')
+        return
+
+    # testnet feeder is its own aggregator (no proxy)
+    watcher = RoundWatcher(usdc_feeder.getAggregatorAddress())
+    assert watcher.aggregator_address == usdc_feeder.address
+
+    # no new blocks: no log query
+    assert watcher.poll() == []
+    assert watcher.log_queries == 0
+
+    multiplier = 10 ** usd1.decimals()
+    timestamp = chain.time()
+    usdc_feeder.addRoundData(int(1.0 * multiplier), timestamp - 1)
+    usdc_feeder.addRoundData(int(0.99 * multiplier), timestamp)
+
+    assert watcher.poll() == [1, 2]
+    assert watcher.log_queries == 1
+
+    # new block without new round
+    chain.mine(1)
+    assert watcher.poll() == []
+    assert watcher.log_queries == 2
+    assert not watcher.refresh_aggregator()
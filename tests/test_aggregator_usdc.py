@@ -22,9 +22,14 @@ from scripts.price_data import (
     USDC_CHAINLINK_DATA_TRIGGER_AND_RECOVER,
     USDC_CHAINLINK_DATA_TRIGGER_AND_DEPEG,
     inject_data,
+    inject_data_batch,
     data_to_round_data,
 )
 
+from scripts.round_file import rounds_from_csv
+
+from tests.test_depeg_data import DEPEG_DATA_230312
+
 
 MAINNET = 1
 GANACHE = 1337
@@ -155,6 +160,11 @@ def test_feed_manipulation_disabled_on_mainnet(
     with brownie.reverts("Ownable: caller is not the owner"):
         usdc_feeder.resetDepeg({'from':instanceOperator})
 
+    # check AggregatorDataProvider.setRoundDataBatch
+    round_data = data_to_round_data(USDC_CHAINLINK_DATA[0])
+    with brownie.reverts("ERROR:ADP-001:NOT_TEST_CHAIN"):
+        usdc_feeder.setRoundDataBatch([round_data], {'from':productOwner})
+
 
 def test_force_and_reset_depeg(
     usdc_feeder: UsdcPriceDataProvider, 
@@ -382,6 +392,40 @@ def test_test_data(usdc_feeder: UsdcPriceDataProvider):
         check_round(actual_data, expected_data)
 
 
+def test_test_data_batch(
+    usdc_feeder: UsdcPriceDataProvider,
+    instanceOperator:Account,
+    productOwner:Account
+):
+
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    with brownie.reverts("Ownable: caller is not the owner"):
+        inject_data_batch(usdc_feeder, USDC_CHAINLINK_DATA, instanceOperator)
+
+    # 400 rounds of the usdc depeg in 8 transactions
+    rounds = rounds_from_csv(DEPEG_DATA_230312)
+    assert inject_data_batch(usdc_feeder, rounds, productOwner, chunk_size=50) == 8
+
+    for expected_data in rounds[:3] + rounds[-3:]:
+        actual_data = usdc_feeder.getRoundData(expected_data[0])
+        check_round(actual_data, expected_data)
+
+    check_round(usdc_feeder.latestRoundData(), rounds[-1])
+    assert usdc_feeder.latestRound() == rounds[-1][0]
+
+    # latest price info is based on the last round of the last batch
+    price_info = usdc_feeder.getLatestPriceInfo().dict()
+    assert price_info['id'] == rounds[-1][0]
+    assert price_info['price'] == rounds[-1][1]
+
+    tx = usdc_feeder.setRoundDataBatch(rounds[:2], {'from': productOwner})
+    assert len(tx.events['AnswerUpdated']) == 2
+    assert len(tx.events['NewRound']) == 2
+
+
 def test_price_price_id_sequence_repeat(usdc_feeder: UsdcPriceDataProvider):
 
     if web3.chain_id != GANACHE:
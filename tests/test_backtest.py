@@ -0,0 +1,137 @@
+import random
+
+from scripts.backtest import (
+    RoundSeries,
+    load_rounds,
+    from_strings,
+    get_compliance,
+    find_events,
+    get_states,
+    get_grid,
+    sweep,
+    run,
+)
+
+from scripts.price_data import (
+    USDC_CHAINLINK_DATA,
+    USDC_CHAINLINK_DATA_HEARTBEAT_VIOLATED,
+    USDC_CHAINLINK_DATA_DEVIATION_VIOLATED,
+    USDC_CHAINLINK_DATA_TRIGGER_AND_RECOVER,
+    USDC_CHAINLINK_DATA_TRIGGER_AND_DEPEG,
+    ROUND_ID_INITIAL,
+    data_to_round_data,
+)
+
+from scripts.price_provider_model import (
+    UsdcPriceDataProviderModel,
+    DEPEG_TRIGGER_PRICE,
+    DEPEG_RECOVERY_PRICE,
+    DEPEG_RECOVERY_WINDOW,
+)
+
+from tests.test_depeg_data import DEPEG_DATA_230312
+
+# pure python/numpy tests, no chain interaction
+
+
+def test_backtest_vs_model_test_data():
+    for dataset in [
+        USDC_CHAINLINK_DATA,
+        USDC_CHAINLINK_DATA_HEARTBEAT_VIOLATED,
+        USDC_CHAINLINK_DATA_DEVIATION_VIOLATED,
+        USDC_CHAINLINK_DATA_TRIGGER_AND_RECOVER,
+        USDC_CHAINLINK_DATA_TRIGGER_AND_DEPEG,
+    ]:
+        rounds = [data_to_round_data(data) for data in dataset]
+        check_backtest_vs_model(from_strings(dataset), rounds)
+
+
+def test_backtest_vs_model_random_walk():
+    rng = random.Random(42)
+
+    for _ in range(20):
+        rounds = []
+        updated_at = 1660000000
+
+        for i in range(200):
+            price = rng.choice([100000000, 99950000, 99900000, 99899999, 99700000, 99500001, 99500000, 98000000])
+            updated_at += rng.choice([3600, 12 * 3600, 24 * 3600, 24 * 3600 + 101, 2 * 24 * 3600])
+
+            # occasional gaps in the round ids
+            round_id = ROUND_ID_INITIAL + i + (1 if i > 100 else 0)
+            rounds.append((round_id, price, updated_at, updated_at, round_id))
+
+        for params in [
+            (DEPEG_TRIGGER_PRICE, DEPEG_RECOVERY_PRICE, DEPEG_RECOVERY_WINDOW),
+            (99700000, 99950000, 12 * 3600),
+            (99000000, 99900000, 48 * 3600),
+        ]:
+            check_backtest_vs_model(RoundSeries.from_rounds(rounds), rounds, *params)
+
+
+def test_backtest_depeg_230312():
+    series = load_rounds(DEPEG_DATA_230312)
+    assert len(series) == 400
+
+    result = run(series, DEPEG_TRIGGER_PRICE, DEPEG_RECOVERY_PRICE, DEPEG_RECOVERY_WINDOW)
+    assert result['triggers'] == 1
+    assert result['recoveries'] == 0
+    assert result['first_triggered_at'] == 1678497491
+    assert result['depegged_at'] == 1678583975
+    assert result['depeg_round_id'] == 36893488147419104334
+
+    rounds = [
+        (series.get_round_id(i), int(series.answer[i]), int(series.updated_at[i]), int(series.updated_at[i]), series.get_round_id(i))
+        for i in range(len(series))]
+
+    check_backtest_vs_model(series, rounds)
+
+
+def test_backtest_sweep_parallel():
+    series = load_rounds(DEPEG_DATA_230312)
+    grid = get_grid(
+        [99500000, 99000000, 98000000],
+        [99900000, 99800000],
+        [12 * 3600, 24 * 3600, 48 * 3600])
+
+    assert len(grid) == 18
+
+    results_sequential = sweep(series, grid, workers=1)
+    results_parallel = sweep(series, grid, workers=2)
+    assert results_parallel == results_sequential
+
+    for (params, result) in zip(grid, results_sequential):
+        assert (result['trigger_price'], result['recovery_price'], result['recovery_window']) == params
+
+
+def check_backtest_vs_model(
+    series,
+    rounds,
+    trigger_price=DEPEG_TRIGGER_PRICE,
+    recovery_price=DEPEG_RECOVERY_PRICE,
+    recovery_window=DEPEG_RECOVERY_WINDOW
+):
+    """compares per round compliance and state of the backtest with the price provider model"""
+    model = UsdcPriceDataProviderModel(
+        trigger_price=trigger_price,
+        recovery_price=recovery_price,
+        recovery_window=recovery_window)
+
+    price_infos = [
+        price_info
+        for price_info in model.process_rounds(sorted(rounds))
+        if price_info['createdAt'] > 0]
+
+    compliance = get_compliance(series)['compliance']
+    (triggers, recoveries, depeg) = find_events(series, trigger_price, recovery_price, recovery_window)
+    states = get_states(series, triggers, recoveries, depeg)
+
+    assert len(price_infos) == len(series)
+
+    for (i, price_info) in enumerate(price_infos):
+        assert price_info['id'] == series.get_round_id(i)
+        assert price_info['compliance'] == compliance[i]
+        assert price_info['stability'] == states['stability'][i]
+        assert price_info['eventType'] == states['event_type'][i]
+        assert price_info['triggeredAt'] == states['triggered_at'][i]
+        assert price_info['depeggedAt'] == states['depegged_at'][i]
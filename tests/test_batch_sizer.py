@@ -0,0 +1,95 @@
+import pytest
+
+from scripts.batch_sizer import GasBatchSizer
+
+BASE_GAS = 50000
+GAS_PER_ELEMENT = 30000
+BLOCK_GAS_LIMIT = 6000000
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+class Transaction(object):
+
+    def __init__(self, gas_used:int, gas_price:int):
+        self.gas_used = gas_used
+        self.gas_price = gas_price
+
+
+def estimate_gas(batch:list) -> int:
+    if 'revert' in batch:
+        raise ValueError('execution reverted')
+
+    return BASE_GAS + GAS_PER_ELEMENT * len(batch)
+
+
+def test_batch_sizer_calibration():
+    sizer = GasBatchSizer(estimate_gas, block_gas_fraction=0.5, max_batch_size=500, block_gas_limit=BLOCK_GAS_LIMIT)
+    assert sizer.batch_size == 10
+
+    # budget 6m * 0.5 / 1.2 = 2.5m gas
+    assert sizer.get_gas_budget() == 2500000
+    assert sizer.calibrate(['a'] * 20) == 81
+    assert sizer.base_gas == BASE_GAS
+    assert sizer.gas_per_element == GAS_PER_ELEMENT
+    assert sizer.fits(81, estimate_gas(['a'] * 81))
+    assert not sizer.fits(82, estimate_gas(['a'] * 82))
+
+    # capped by max batch size
+    sizer = GasBatchSizer(estimate_gas, max_batch_size=5, block_gas_limit=BLOCK_GAS_LIMIT)
+    assert sizer.calibrate(['a'] * 20) == 5
+
+    # reverting sample leaves the batch size unchanged
+    sizer = GasBatchSizer(estimate_gas, initial_batch_size=3, block_gas_limit=BLOCK_GAS_LIMIT)
+    assert sizer.calibrate(['revert', 'a']) == 3
+    assert sizer.gas_per_element == 0
+
+    # gas used from receipts refines the gas per element
+    sizer = GasBatchSizer(estimate_gas, block_gas_limit=BLOCK_GAS_LIMIT)
+    sizer.calibrate(['a'] * 20)
+    sizer.record(10, BASE_GAS + 10 * 40000, 2)
+    assert sizer.gas_per_element == 33000
+    assert sizer.batch_size == (2500000 - BASE_GAS) // 33000
+
+
+def test_batch_sizer_send_all():
+    sent = []
+
+    def send(batch:list, gas_limit:int) -> Transaction:
+        assert gas_limit == int(estimate_gas(batch) * 1.2)
+
+        if 'fail' in batch:
+            raise ValueError('transaction reverted')
+
+        sent.extend(batch)
+        return Transaction(estimate_gas(batch), 10)
+
+    elements = ['e{}'.format(idx) for idx in range(200)]
+    elements[17] = 'revert'
+    elements[120] = 'fail'
+
+    sizer = GasBatchSizer(estimate_gas, max_batch_size=50, block_gas_limit=BLOCK_GAS_LIMIT)
+    transactions = sizer.send_all(elements, send)
+
+    # failing elements are isolated by splitting, all others are sent in order
+    assert sent == [element for element in elements if element not in ['revert', 'fail']]
+    assert sorted(sizer.failed.keys()) == [17, 120]
+
+    report = sizer.get_report()
+    assert report['elements'] == 198
+    assert report['failed'] == 2
+    assert report['transactions'] == len(transactions)
+    assert report['splits'] > 0
+    assert report['gas_used'] == sum([tx.gas_used for tx in transactions])
+    assert report['gas_cost'] == 10 * report['gas_used']
+    assert max([tx.gas_used for tx in transactions]) <= estimate_gas(['a'] * 50)
+
+    # batches above the gas budget are split before sending
+    sizer = GasBatchSizer(estimate_gas, initial_batch_size=200, max_batch_size=200, block_gas_limit=BLOCK_GAS_LIMIT)
+    sizer.gas_per_element = 1
+    transactions = sizer.send_all(['a'] * 200, lambda batch, gas_limit: Transaction(estimate_gas(batch), 0))
+    assert all([sizer.fits(2, tx.gas_used) for tx in transactions])
+    assert sum([(tx.gas_used - BASE_GAS) // GAS_PER_ELEMENT for tx in transactions]) == 200
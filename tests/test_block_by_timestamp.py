@@ -0,0 +1,125 @@
+import random
+import pytest
+
+from bisect import bisect_right
+
+from scripts.block_by_timestamp import (
+    BlockResolver,
+    CONFIRMATIONS,
+)
+
+# pure python tests against a simulated chain, no chain interaction
+
+GENESIS_TIMESTAMP = 1438269973
+
+
+class FakeEth(object):
+
+    def __init__(self, timestamps, genesis_hash='0x01'):
+        self.timestamps = timestamps
+        self.genesis_hash = genesis_hash
+        self.calls = 0
+
+    def get_block(self, block_identifier):
+        self.calls += 1
+        block_number = len(self.timestamps) - 1 if block_identifier == 'latest' else block_identifier
+        block_hash = self.genesis_hash if block_number == 0 else '0x{:x}'.format(block_number + 1000)
+
+        return {
+            'number': block_number,
+            'timestamp': self.timestamps[block_number],
+            'hash': block_hash}
+
+
+class FakeWeb3(object):
+
+    def __init__(self, timestamps, genesis_hash='0x01'):
+        self.eth = FakeEth(timestamps, genesis_hash)
+        self.chain_id = 1
+
+
+def get_timestamps(blocks, seed=42):
+    """block times mostly 12s with missed slots, a few equal timestamps and a long gap"""
+    rng = random.Random(seed)
+    timestamps = [GENESIS_TIMESTAMP]
+
+    for i in range(1, blocks):
+        delta = rng.choice([0, 12, 12, 12, 12, 24, 36]) if i != blocks // 3 else 5 * 24 * 3600
+        timestamps.append(timestamps[-1] + delta)
+
+    return timestamps
+
+
+def expected_block(timestamps, timestamp):
+    return bisect_right(timestamps, timestamp) - 1
+
+
+def test_block_resolver_vs_linear_scan():
+    timestamps = get_timestamps(100000)
+    w3 = FakeWeb3(timestamps)
+    resolver = BlockResolver(w3, use_index_file=False)
+    rng = random.Random(1)
+
+    targets = [
+        GENESIS_TIMESTAMP,
+        timestamps[1],
+        timestamps[-1] - 1,
+        timestamps[len(timestamps) // 3] - 1,
+        timestamps[len(timestamps) // 3] + 3600,
+    ] + [rng.randint(GENESIS_TIMESTAMP, timestamps[-1]) for _ in range(200)]
+
+    for target in targets:
+        calls_before = w3.eth.calls
+        assert resolver.get_block_number(target) == expected_block(timestamps, target)
+        assert w3.eth.calls - calls_before <= 2 * 17 + 1
+
+    # at or after the latest block
+    assert resolver.get_block_number(timestamps[-1]) == len(timestamps) - 1
+    assert resolver.get_block_number(timestamps[-1] + 3600) == len(timestamps) - 1
+
+    with pytest.raises(ValueError):
+        resolver.get_block_number(GENESIS_TIMESTAMP - 1)
+
+
+def test_block_resolver_regular_blocks():
+    timestamps = [GENESIS_TIMESTAMP + 12 * i for i in range(1000000)]
+    w3 = FakeWeb3(timestamps)
+    resolver = BlockResolver(w3, use_index_file=False)
+
+    calls_before = w3.eth.calls
+    assert resolver.get_block_number(timestamps[654321] + 5) == 654321
+    assert w3.eth.calls - calls_before <= 4
+
+
+def test_block_resolver_index_file(tmp_path):
+    index_file = str(tmp_path / 'block_index' / '1.json')
+    timestamps = get_timestamps(20000)
+    target = timestamps[5000] + 5
+    block_number = expected_block(timestamps, target)
+
+    w3 = FakeWeb3(timestamps)
+    resolver = BlockResolver(w3, index_file)
+    assert resolver.get_block_number(target) == block_number
+
+    # repeated lookups inside the resolved gap are answered from the index
+    calls_before = w3.eth.calls
+    assert resolver.get_block_number(target) == block_number
+    assert resolver.get_block_number(timestamps[block_number]) == block_number
+    assert w3.eth.calls == calls_before
+
+    # a new resolver only reads the genesis block
+    w3 = FakeWeb3(timestamps)
+    resolver = BlockResolver(w3, index_file)
+    assert w3.eth.calls == 1
+    assert resolver.get_block_number(target) == block_number
+    assert w3.eth.calls == 1
+
+    # recent blocks are not persisted
+    assert max(resolver.index.block_numbers) <= len(timestamps) - 1 - CONFIRMATIONS
+
+    # index of a different chain is discarded
+    w3 = FakeWeb3(timestamps, genesis_hash='0x02')
+    resolver = BlockResolver(w3, index_file)
+    assert len(resolver.index) == 1
+    assert resolver.get_block_number(target) == block_number
+    assert w3.eth.calls > 1
@@ -0,0 +1,97 @@
+import random
+
+from scripts.benchmark_bundle_match import (
+    NOW,
+    get_bundles,
+    get_queries,
+    find_linear,
+)
+
+from scripts.quote import (
+    BUNDLE_STATE_ACTIVE,
+    BundleMatchIndex,
+    QuoteEngine,
+)
+
+# pure python tests, no chain interaction
+
+DAY = 24 * 3600
+BUNDLE_STATE_LOCKED = 1
+
+
+def test_bundle_match_vs_linear_scan():
+    bundles = get_bundles(500)
+    index = BundleMatchIndex(bundles)
+
+    assert len(index) == 500
+    assert index.get_bundles() == bundles
+
+    for (sum_insured, duration) in get_queries(500):
+        for now in [NOW, NOW + 30 * DAY, NOW + 200 * DAY]:
+            assert index.find(sum_insured, duration, now) == find_linear(bundles, sum_insured, duration, now)
+
+
+def test_bundle_match_updates():
+    rng = random.Random(3)
+    bundles = {bundle['bundleId']: bundle for bundle in get_bundles(300)}
+    index = BundleMatchIndex(list(bundles.values()))
+    next_bundle_id = len(bundles) + 1
+
+    for step in range(300):
+        action = rng.choice(['collateralize', 'collateralize', 'fund', 'lock', 'unlock', 'create'])
+        bundle_id = rng.choice(list(bundles.keys()))
+        bundle = dict(bundles[bundle_id])
+
+        if action == 'collateralize':
+            bundle['lockedCapital'] = rng.randint(0, bundle['capital'])
+        elif action == 'fund':
+            bundle['capital'] += rng.randint(1, 10000) * 10 ** 6
+        elif action == 'lock':
+            bundle['state'] = BUNDLE_STATE_LOCKED
+        elif action == 'unlock':
+            bundle['state'] = BUNDLE_STATE_ACTIVE
+        else:
+            bundle['bundleId'] = next_bundle_id
+            next_bundle_id += 1
+
+        # locked bundles leave the active list, (re)activated ones are appended after their apr peers
+        if action in ['unlock', 'create']:
+            bundles.pop(bundle['bundleId'], None)
+            index.remove(bundle['bundleId'])
+
+        bundles[bundle['bundleId']] = bundle
+
+        if bundle['state'] == BUNDLE_STATE_ACTIVE:
+            index.upsert(bundle)
+        else:
+            index.remove(bundle['bundleId'])
+
+        if step % 10 == 0:
+            active = sorted(
+                [bundle for bundle in bundles.values() if bundle['state'] == BUNDLE_STATE_ACTIVE],
+                key=lambda bundle: bundle['annualPercentageReturn'])
+
+            assert index.get_bundles() == active
+
+            for (sum_insured, duration) in get_queries(50, seed=step):
+                assert index.find(sum_insured, duration, NOW) == find_linear(active, sum_insured, duration, NOW)
+
+
+def test_bundle_match_quote_engine():
+    bundles = get_bundles(200)
+    pool = {'capital': 10 ** 15, 'lockedCapital': 0, 'sumOfSumInsuredCap': 10 ** 15, 'sumOfSumInsuredAtRisk': 0}
+    fee = {'fixedFee': 0, 'fractionalFee': 10 ** 17, 'fractionFullUnit': 10 ** 18}
+    engine = QuoteEngine(bundles, pool, fee, 100)
+
+    for (protected_balance, duration) in get_queries(200):
+        bundle = find_linear(bundles, protected_balance, duration, NOW)
+        quote = engine.quote(protected_balance, duration, NOW)
+
+        assert quote['bundleId'] == (bundle['bundleId'] if bundle else None)
+
+        # explicit bundle id only matches that bundle
+        if bundle:
+            assert engine.quote(protected_balance, duration, NOW, bundle['bundleId'])['premium'] == quote['premium']
+
+    engine.remove_bundle(bundles[0]['bundleId'])
+    assert engine.bundles == bundles[1:]
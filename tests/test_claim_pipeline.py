@@ -0,0 +1,404 @@
+import json
+import pytest
+
+from brownie import (
+    chain,
+    interface,
+    web3,
+    UsdcPriceDataProvider,
+)
+
+from scripts.batch_sizer import GAS_LIMIT_MARGIN
+from scripts.depeg_balances import DepegBalanceSnapshot
+from scripts.util import contract_from_address
+
+from scripts.setup import (
+    create_bundle,
+    apply_for_policy_with_bundle,
+)
+
+from server_processor.claim_pipeline import (
+    BATCH_CONFIRMED,
+    BATCH_REVERTED,
+    ClaimPipeline,
+    ProcessingState,
+)
+
+from tests.test_policy_lifecycle import force_product_into_depegged_state
+
+GANACHE = 1337
+
+POLICIES = 6
+BATCH_SIZE = 2
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+@pytest.fixture
+def miner():
+    # restarts the ganache miner if a test fails while it is stopped
+    yield
+    start_miner()
+
+
+def stop_miner():
+    # transactions stay in the ganache tx pool until chain.mine() while the miner is stopped
+    web3.provider.make_request('miner_stop', [])
+
+
+def start_miner():
+    web3.provider.make_request('miner_start', [])
+
+
+def create_open_claims(
+    instance,
+    instanceService,
+    instanceOperator,
+    productOwner,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    protectedWallet2,
+    product,
+    riskpool,
+    riskpoolWallet,
+) -> list:
+    """depegged product with POLICIES open claims and uploaded depeg balances, returns the process ids"""
+    protected_token = interface.IERC20Metadata(product.getProtectedToken())
+    tf = 10 ** protected_token.decimals()
+
+    # create token allowance for payouts
+    token = interface.IERC20Metadata(instanceService.getComponentToken(riskpool.getId()))
+    token.approve(instanceService.getTreasuryAddress(), 100000 * 10 ** token.decimals(), {'from': riskpoolWallet})
+
+    bundle_id = create_bundle(
+        instance,
+        instanceOperator,
+        investor,
+        riskpool,
+        funding=30000,
+        minProtectedBalance=2000,
+        maxProtectedBalance=10000)
+
+    protected_token.transfer(protectedWallet, 20000 * tf, {'from': instanceOperator})
+    protected_token.transfer(protectedWallet2, 20000 * tf, {'from': instanceOperator})
+
+    process_ids = [
+        apply_for_policy_with_bundle(instance, instanceOperator, product, holder, bundle_id, wallet, 5000, 60, 80)
+        for (holder, wallet) in [(customer, protectedWallet), (customer2, protectedWallet2)] * (POLICIES // 2)]
+
+    depeg_price = int(0.9 * product.getTargetPrice())
+    force_product_into_depegged_state(product, productOwner, depeg_price)
+
+    for process_id in process_ids:
+        product.createDepegClaim(process_id, {'from': product.getProtectedWallet(process_id)})
+
+    price_feed = contract_from_address(UsdcPriceDataProvider, product.getPriceDataProvider())
+    price_feed.setDepeggedBlockNumber(chain.height, 'local block', {'from': productOwner})
+    DepegBalanceSnapshot(product).run(productOwner)
+
+    assert product.policiesToProcess() == POLICIES
+    return [str(process_id) for process_id in process_ids]
+
+
+def get_pipeline(state_file) -> ClaimPipeline:
+    return ClaimPipeline(
+        str(state_file),
+        max_in_flight=2,
+        block_gas_fraction=0.5,
+        initial_batch_size=BATCH_SIZE,
+        max_batch_size=BATCH_SIZE,
+        confirmation_timeout=600)
+
+
+def prepare(pipeline:ClaimPipeline, product, account) -> int:
+    """sets up the pipeline like run() does and returns the next nonce of the account"""
+    pipeline._prepare(product, account, False)
+    pipeline._read_queue(product)
+    return web3.eth.get_transaction_count(account.address, 'pending')
+
+
+def test_claim_pipeline_run(
+    instance,
+    instanceService,
+    instanceOperator,
+    productOwner,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    protectedWallet2,
+    product,
+    riskpool,
+    riskpoolWallet,
+    tmp_path,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    process_ids = create_open_claims(
+        instance, instanceService, instanceOperator, productOwner, investor, customer, customer2,
+        protectedWallet, protectedWallet2, product, riskpool, riskpoolWallet)
+
+    state_file = tmp_path / 'claim_processing.json'
+    pipeline = get_pipeline(state_file)
+    pipeline.run(product, productOwner)
+
+    # all batches confirmed and their policies marked processed
+    assert product.policiesToProcess() == 0
+    assert sorted(pipeline.state.processed) == sorted(process_ids)
+    assert pipeline.state.failed == {}
+    assert pipeline.state.pending == []
+    assert pipeline.state.transactions == POLICIES // BATCH_SIZE
+
+    report = pipeline.get_report()
+    assert report.policies_processed == POLICIES
+    assert report.policies_failed == 0
+    assert report.policies_in_flight == 0
+    assert report.gas_used > 0
+    assert report.gas_per_policy > 0
+
+    with open(state_file) as json_file:
+        state = ProcessingState(**json.load(json_file))
+
+    assert state.product_address == product.address
+    assert sorted(state.processed) == sorted(process_ids)
+    assert state.gas_used == pipeline.state.gas_used
+
+
+def test_claim_pipeline_reverted_batch(
+    instance,
+    instanceService,
+    instanceOperator,
+    productOwner,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    protectedWallet2,
+    product,
+    riskpool,
+    riskpoolWallet,
+    tmp_path,
+    miner,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    process_ids = create_open_claims(
+        instance, instanceService, instanceOperator, productOwner, investor, customer, customer2,
+        protectedWallet, protectedWallet2, product, riskpool, riskpoolWallet)
+
+    pipeline = get_pipeline(tmp_path / 'claim_processing.json')
+    nonce = prepare(pipeline, product, productOwner)
+    assert list(pipeline.queue) == process_ids
+
+    # gas limit below the estimate: batch runs out of gas when mined
+    stop_miner()
+    pipeline.sizer.gas_limit_margin = 0.5
+    nonce = pipeline._submit_next_batch(product, productOwner, nonce)
+    pipeline.sizer.gas_limit_margin = GAS_LIMIT_MARGIN
+
+    batch = pipeline.state.pending[0]
+    assert batch.process_ids == process_ids[:BATCH_SIZE]
+
+    chain.mine()
+    assert not pipeline._check_pending(product, productOwner)
+
+    # reverted batch is split, both halves are back at the front of the queue
+    assert batch.status == BATCH_REVERTED
+    assert pipeline.state.pending == []
+    assert pipeline.state.processed == []
+    assert pipeline.sizer.splits == 1
+    assert pipeline.sizer.batch_size == 1
+    assert list(pipeline.queue) == process_ids
+
+    # retried policies are processed with single policy batches
+    nonce = pipeline._submit_next_batch(product, productOwner, nonce)
+    nonce = pipeline._submit_next_batch(product, productOwner, nonce)
+    assert [batch.process_ids for batch in pipeline.state.pending] == [[process_id] for process_id in process_ids[:BATCH_SIZE]]
+
+    chain.mine()
+    pipeline._check_pending(product, productOwner)
+    assert pipeline.state.pending == []
+    assert pipeline.state.processed == process_ids[:BATCH_SIZE]
+    assert pipeline.state.failed == {}
+
+    start_miner()
+    pipeline.run(product, productOwner)
+    assert product.policiesToProcess() == 0
+    assert sorted(pipeline.state.processed) == sorted(process_ids)
+
+
+def test_claim_pipeline_stuck_transaction(
+    instance,
+    instanceService,
+    instanceOperator,
+    productOwner,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    protectedWallet2,
+    product,
+    riskpool,
+    riskpoolWallet,
+    tmp_path,
+    miner,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    process_ids = create_open_claims(
+        instance, instanceService, instanceOperator, productOwner, investor, customer, customer2,
+        protectedWallet, protectedWallet2, product, riskpool, riskpoolWallet)
+
+    pipeline = get_pipeline(tmp_path / 'claim_processing.json')
+    nonce = prepare(pipeline, product, productOwner)
+
+    stop_miner()
+    pipeline._submit_next_batch(product, productOwner, nonce)
+    batch = pipeline.state.pending[0]
+    (tx_hash, gas_price) = (batch.tx_hash, batch.gas_price)
+
+    # within the confirmation timeout the pending batch is left alone
+    assert not pipeline._check_pending(product, productOwner)
+    assert batch.tx_hash == tx_hash
+    assert batch.replaced == []
+
+    # after the timeout the batch is replaced with the same nonce and a higher gas price
+    pipeline.confirmation_timeout = 0
+    assert not pipeline._check_pending(product, productOwner)
+    assert batch.replaced == [tx_hash]
+    assert batch.tx_hash != tx_hash
+    assert batch.nonce == nonce
+    assert batch.gas_price > gas_price
+    assert web3.eth.get_transaction(batch.tx_hash)['nonce'] == nonce
+
+    chain.mine()
+    assert not pipeline._check_pending(product, productOwner)
+    assert batch.status == BATCH_CONFIRMED
+    assert web3.eth.get_transaction_receipt(batch.tx_hash)['status'] == 1
+    assert pipeline.state.processed == process_ids[:BATCH_SIZE]
+
+    # original transaction mined while its replacement was broadcast: receipt of the replaced tx is picked up
+    pipeline.confirmation_timeout = 600
+    pipeline._submit_next_batch(product, productOwner, nonce + 1)
+    batch = pipeline.state.pending[0]
+    tx_hash = batch.tx_hash
+
+    chain.mine()
+    batch.replaced.append(tx_hash)
+    batch.tx_hash = '0x' + '00' * 32
+
+    assert not pipeline._check_pending(product, productOwner)
+    assert batch.status == BATCH_CONFIRMED
+    assert batch.tx_hash == tx_hash
+    assert pipeline.state.pending == []
+    assert pipeline.state.processed == process_ids[:2 * BATCH_SIZE]
+
+
+def test_claim_pipeline_external_nonce(
+    instance,
+    instanceService,
+    instanceOperator,
+    productOwner,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    protectedWallet2,
+    product,
+    riskpool,
+    riskpoolWallet,
+    tmp_path,
+    miner,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    process_ids = create_open_claims(
+        instance, instanceService, instanceOperator, productOwner, investor, customer, customer2,
+        protectedWallet, protectedWallet2, product, riskpool, riskpoolWallet)
+
+    pipeline = get_pipeline(tmp_path / 'claim_processing.json')
+    nonce = prepare(pipeline, product, productOwner)
+
+    stop_miner()
+    pipeline._submit_next_batch(product, productOwner, nonce)
+    batch = pipeline.state.pending[0]
+
+    # external transaction of the same account takes the nonce of the batch
+    productOwner.transfer(productOwner, 0, nonce=nonce, gas_price=2 * batch.gas_price, required_confs=0)
+    chain.mine()
+    assert web3.eth.get_transaction_count(productOwner.address) == nonce + 1
+
+    # replacing fails, the batch is dropped and its policies are requeued, the nonce needs a resync
+    pipeline.confirmation_timeout = 0
+    assert pipeline._check_pending(product, productOwner)
+    assert pipeline.state.pending == []
+    assert pipeline.state.processed == []
+    assert pipeline.state.failed == {}
+    assert list(pipeline.queue) == process_ids
+
+    start_miner()
+    pipeline.confirmation_timeout = 600
+    pipeline.run(product, productOwner)
+    assert product.policiesToProcess() == 0
+    assert sorted(pipeline.state.processed) == sorted(process_ids)
+
+
+def test_claim_pipeline_restart(
+    instance,
+    instanceService,
+    instanceOperator,
+    productOwner,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    protectedWallet2,
+    product,
+    riskpool,
+    riskpoolWallet,
+    tmp_path,
+    miner,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    process_ids = create_open_claims(
+        instance, instanceService, instanceOperator, productOwner, investor, customer, customer2,
+        protectedWallet, protectedWallet2, product, riskpool, riskpoolWallet)
+
+    # pipeline stops with two batches in flight
+    state_file = tmp_path / 'claim_processing.json'
+    pipeline = get_pipeline(state_file)
+    nonce = prepare(pipeline, product, productOwner)
+
+    stop_miner()
+    nonce = pipeline._submit_next_batch(product, productOwner, nonce)
+    nonce = pipeline._submit_next_batch(product, productOwner, nonce)
+    assert len(pipeline.state.pending) == 2
+
+    chain.mine()
+    start_miner()
+
+    # restarted pipeline settles the pending batches from the state file and processes the rest
+    restarted = get_pipeline(state_file)
+    restarted.run(product, productOwner)
+
+    assert product.policiesToProcess() == 0
+    assert restarted.state.transactions == POLICIES // BATCH_SIZE
+    assert sorted(restarted.state.processed) == sorted(process_ids)
+    assert restarted.state.processed[:2 * BATCH_SIZE] == process_ids[:2 * BATCH_SIZE]
+    assert restarted.state.pending == []
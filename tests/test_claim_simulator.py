@@ -0,0 +1,261 @@
+import pytest
+
+from brownie import (
+    chain,
+    interface,
+    web3,
+    Multicall3,
+    UsdcPriceDataProvider,
+)
+
+from scripts.claim_simulator import (
+    ERROR_BALANCE_PROCESSED_ALREADY,
+    ERROR_DEPEG_BALANCE_MISSING,
+    ERROR_DEPEG_BALANCE_ZERO,
+    ClaimSimulator,
+    calculate_claim_amount,
+    get_claim_simulator,
+    simulate_open_claims,
+)
+
+from scripts.depeg_balances import DepegBalanceSnapshot
+from scripts.multicall import Multicall
+from scripts.util import contract_from_address
+
+from scripts.setup import (
+    create_bundle,
+    apply_for_policy_with_bundle,
+)
+
+from tests.test_policy_lifecycle import force_product_into_depegged_state
+
+GANACHE = 1337
+
+TARGET_PRICE = 10 ** 8
+WALLET_1 = '0x' + 'aa' * 20
+WALLET_2 = '0x' + 'bb' * 20
+WALLET_3 = '0x' + 'cc' * 20
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def test_claim_amount():
+    # 10% depeg, 20% sum insured percentage: no capping
+    assert calculate_claim_amount(5000, TARGET_PRICE, 90 * 10 ** 6, 20) == 500
+
+    # 30% depeg is capped at the protected min depeg price of 0.8
+    assert calculate_claim_amount(5000, TARGET_PRICE, 70 * 10 ** 6, 20) == 1000
+
+    # rounding down as in solidity
+    assert calculate_claim_amount(7, TARGET_PRICE, 90 * 10 ** 6, 20) == 0
+    assert calculate_claim_amount(2 ** 200, TARGET_PRICE, 90 * 10 ** 6, 20) == 2 ** 200 // 10
+
+
+def test_claim_simulation_over_insurance():
+    depeg_price = 90 * 10 ** 6
+    depeg_balances = {
+        WALLET_1: (8000, 100),
+        WALLET_2: (3000, 100),
+        WALLET_3: (0, 100),
+    }
+
+    simulator = ClaimSimulator(TARGET_PRICE, depeg_price, 20, depeg_balances)
+    policies = [
+        ('0x01', WALLET_1.upper().replace('0X', '0x'), 5000, 500, 1),
+        ('0x02', WALLET_2, 5000, 500, 1),
+        ('0x03', WALLET_1, 5000, 500, 2),
+        ('0x04', WALLET_1, 5000, 500, 2),
+        ('0x05', WALLET_3, 1000, 100, 2),
+        ('0x06', '0x' + 'dd' * 20, 1000, 100, 2),
+    ]
+
+    simulation = simulator.simulate(policies)
+    results = simulation['policies']
+
+    assert [result['processId'] for result in results] == [process_id for (process_id, _, _, _, _) in policies]
+    assert [result['protectedAmount'] for result in results] == [5000, 3000, 3000, 0, 0, 0]
+    assert [result['payoutAmount'] for result in results] == [500, 300, 300, 0, 0, 0]
+
+    # case A for the policy exceeding the wallet balance, case B for the 2nd policy of wallet 1
+    assert [result['protectedAmountReduction'] for result in results] == [False, True, False, False, False, False]
+    assert [result['processedAmountReduction'] for result in results] == [False, False, True, False, False, False]
+    assert [result['error'] for result in results] == [
+        None, None, None, ERROR_BALANCE_PROCESSED_ALREADY, ERROR_DEPEG_BALANCE_ZERO, ERROR_DEPEG_BALANCE_MISSING]
+
+    assert simulation['payoutAmount'] == 1100
+    assert simulation['bundles'] == {
+        1: {'policies': 2, 'claimAmount': 1000, 'payoutAmount': 800},
+        2: {'policies': 1, 'claimAmount': 500, 'payoutAmount': 300},
+    }
+    assert simulation['processedBalances'] == {WALLET_1: 8000, WALLET_2: 3000}
+
+    # processing order decides which policy of a wallet is reduced
+    simulation = simulator.simulate([policies[2], policies[0]])
+    assert [result['processedAmountReduction'] for result in simulation['policies']] == [False, True]
+
+    # processed balances from earlier processPolicies transactions
+    simulator = ClaimSimulator(TARGET_PRICE, depeg_price, 20, depeg_balances, {WALLET_1.lower(): 7000})
+    simulation = simulator.simulate(policies[:1])
+    assert simulation['policies'][0]['protectedAmount'] == 1000
+    assert simulation['payoutAmount'] == 100
+
+
+class Struct(tuple):
+    """tuple with dict() like brownie return values of struct outputs"""
+
+    def __new__(cls, fields:dict):
+        struct = super().__new__(cls, fields.values())
+        struct.fields = fields
+        return struct
+
+    def dict(self) -> dict:
+        return dict(self.fields)
+
+
+class FakeMulticall(object):
+
+    def map(self, method, args_list:list, block_identifier=None) -> list:
+        return [method(args) for args in args_list]
+
+    def call(self, calls:list, block_identifier=None) -> list:
+        return [method(*args) for (method, args) in calls]
+
+
+class FakeProduct(object):
+
+    def __init__(self, depeg_balances:dict, processed_balances:dict):
+        self.depeg_balances = depeg_balances
+        self.processed_balances = processed_balances
+
+    def getDepegBalance(self, wallet:str) -> Struct:
+        # DepegProduct.DepegBalance field order: wallet, blockNumber, balance
+        (balance, block_number) = self.depeg_balances.get(wallet, (0, 0))
+        return Struct({'wallet': wallet, 'blockNumber': block_number, 'balance': balance})
+
+    def getProcessedBalance(self, wallet:str) -> int:
+        return self.processed_balances.get(wallet, 0)
+
+    def getTargetPrice(self) -> int:
+        return TARGET_PRICE
+
+    def getDepegPriceInfo(self) -> Struct:
+        return Struct({'id': 1, 'price': 90 * 10 ** 6, 'compliance': 0, 'stability': 0, 'triggeredAt': 0, 'depeggedAt': 0, 'createdAt': 0})
+
+
+class FakeRiskpool(object):
+
+    def getSumInsuredPercentage(self) -> int:
+        return 20
+
+
+def test_claim_simulator_inputs():
+    product = FakeProduct({WALLET_1: (8000, 100), WALLET_2: (3000, 100)}, {WALLET_1: 1000})
+    simulator = get_claim_simulator(product, FakeRiskpool(), [WALLET_1, WALLET_2, WALLET_1, WALLET_3], FakeMulticall(), 120)
+
+    assert simulator.target_price == TARGET_PRICE
+    assert simulator.depeg_price == 90 * 10 ** 6
+    assert simulator.sum_insured_percentage == 20
+    assert simulator.depeg_balances == {WALLET_1: (8000, 100), WALLET_2: (3000, 100), WALLET_3: (0, 0)}
+    assert simulator.processed_balances == {WALLET_1: 1000, WALLET_2: 0, WALLET_3: 0}
+
+    simulation = simulator.simulate([('0x01', WALLET_1, 8000, 800, 1), ('0x02', WALLET_3, 1000, 100, 1)])
+    assert simulation['policies'][0]['protectedAmount'] == 7000
+    assert simulation['policies'][1]['error'] == ERROR_DEPEG_BALANCE_MISSING
+
+
+def test_claim_simulation_vs_processing(
+    multicall3: Multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    productOwner,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    protectedWallet2,
+    product,
+    riskpool,
+    riskpoolWallet,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    protected_token = interface.IERC20Metadata(product.getProtectedToken())
+    tf = 10 ** protected_token.decimals()
+
+    # create token allowance for payouts
+    token = interface.IERC20Metadata(instanceService.getComponentToken(riskpool.getId()))
+    token.approve(instanceService.getTreasuryAddress(), 100000 * 10 ** token.decimals(), {'from': riskpoolWallet})
+
+    bundle_ids = [
+        create_bundle(
+            instance,
+            instanceOperator,
+            investor,
+            riskpool,
+            bundleName='bundle-{}'.format(idx),
+            funding=30000,
+            minProtectedBalance=2000,
+            maxProtectedBalance=10000)
+        for idx in range(2)]
+
+    protected_token.transfer(protectedWallet, 8000 * tf, {'from': instanceOperator})
+    protected_token.transfer(protectedWallet2, 3000 * tf, {'from': instanceOperator})
+
+    # case B for protected wallet (2 x 5000 for 8000), case A for protected wallet 2 (5000 for 3000)
+    process_ids = [
+        apply_for_policy_with_bundle(instance, instanceOperator, product, holder, bundle_id, wallet, protected_balance, 60, 80)
+        for (holder, bundle_id, wallet, protected_balance) in [
+            (customer, bundle_ids[0], protectedWallet, 5000),
+            (customer2, bundle_ids[1], protectedWallet, 6000),
+            (customer, bundle_ids[1], protectedWallet2, 5000)]]
+
+    depeg_price = int(0.9 * product.getTargetPrice())
+    force_product_into_depegged_state(product, productOwner, depeg_price)
+
+    for process_id in process_ids:
+        product.createDepegClaim(process_id, {'from': product.getProtectedWallet(process_id)})
+
+    price_feed = contract_from_address(UsdcPriceDataProvider, product.getPriceDataProvider())
+    price_feed.setDepeggedBlockNumber(chain.height, 'local block', {'from': productOwner})
+
+    multicall = Multicall(multicall3.address, chunk_size=2)
+    DepegBalanceSnapshot(product, multicall).run(productOwner)
+
+    simulation = simulate_open_claims(product, riskpool, instanceService, multicall)
+    assert simulation['errors'] == 0
+    assert simulation['protectedAmountReductions'] == 1
+    assert simulation['processedAmountReductions'] == 1
+
+    # process in the order of the simulation (getPolicyToProcess order)
+    tx = product.processPolicies(
+        [result['processId'] for result in simulation['policies']],
+        {'from': productOwner})
+
+    payouts = {str(event['processId']): event['payoutAmount'] for event in tx.events['LogDepegPayoutProcessed']}
+    reduced_a = [str(event['processId']) for event in tx.events['LogDepegProtectedAmountReduction']]
+    reduced_b = [str(event['processId']) for event in tx.events['LogDepegProcessedAmountReduction']]
+
+    for result in simulation['policies']:
+        process_id = result['processId']
+
+        assert result['payoutAmount'] == payouts[process_id]
+        assert result['protectedAmountReduction'] == (process_id in reduced_a)
+        assert result['processedAmountReduction'] == (process_id in reduced_b)
+
+    assert simulation['payoutAmount'] == sum(payouts.values())
+
+    for (bundle_id, bundle) in simulation['bundles'].items():
+        assert bundle_id in bundle_ids
+        assert bundle['payoutAmount'] == sum([
+            payouts[result['processId']]
+            for result in simulation['policies']
+            if result['bundleId'] == bundle_id])
+
+    for wallet in [protectedWallet, protectedWallet2]:
+        assert simulation['processedBalances'][wallet.address.lower()] == product.getProcessedBalance(wallet)
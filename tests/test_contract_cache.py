@@ -0,0 +1,62 @@
+import pytest
+
+from brownie.network.account import Account
+from brownie import (
+    interface,
+    DepegProduct,
+    USD1,
+)
+
+from scripts.contract_cache import ContractCache
+from scripts.deploy_depeg import get_product_graph
+from scripts.util import contract_from_address
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def test_contract_cache_handles(
+    usd1: USD1,
+    customer: Account,
+):
+    cache = ContractCache(max_size=2)
+
+    token = cache.get(USD1, usd1.address)
+    assert token.address == usd1.address
+    assert token.balanceOf(customer) == usd1.balanceOf(customer)
+
+    # same address and abi: same handle
+    assert cache.get(USD1, usd1.address.lower()) is token
+    assert cache.get_stats()['hits'] == 1
+
+    # same address with different abi: different handle
+    token_erc20 = cache.get(interface.IERC20Metadata, usd1.address)
+    assert token_erc20 is not token
+    assert cache.get_stats()['contracts'] == 2
+
+    # lru eviction: usd1 handle was used more recently than the erc20 handle
+    cache.get(USD1, usd1.address)
+    cache.get(interface.IERC20, usd1.address)
+    assert cache.get_stats()['contracts'] == 2
+    assert cache.get(USD1, usd1.address) is token
+
+    cache.invalidate()
+    assert cache.get_stats()['contracts'] == 0
+    assert cache.get(USD1, usd1.address) is not token
+
+
+def test_contract_cache_product_graph(
+    product20,
+):
+    graph = get_product_graph(product20)
+    assert graph['product'].address == product20.address
+    assert graph['riskpool'].address != graph['product'].address
+
+    # graph is resolved once per product address
+    assert get_product_graph(product20) is graph
+    assert get_product_graph(product20.address) is graph
+
+    # shared handles
+    assert contract_from_address(DepegProduct, product20.address) is graph['product']
@@ -0,0 +1,133 @@
+import pytest
+
+from brownie.network.account import Account
+from brownie import (
+    chain,
+    interface,
+    web3,
+    Multicall3,
+    UsdcPriceDataProvider,
+)
+
+from scripts.depeg_balances import DepegBalanceSnapshot
+from scripts.multicall import Multicall
+from scripts.util import contract_from_address
+
+from scripts.setup import (
+    create_bundle,
+    apply_for_policy_with_bundle,
+)
+
+from tests.test_policy_lifecycle import force_product_into_depegged_state
+
+GANACHE = 1337
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def test_depeg_balance_snapshot(
+    multicall3: Multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    productOwner,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    protectedWallet2,
+    product,
+    riskpool,
+    riskpoolWallet,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    protected_token = interface.IERC20Metadata(product.getProtectedToken())
+    tf = 10 ** protected_token.decimals()
+
+    # create token allowance for payouts
+    token = interface.IERC20Metadata(instanceService.getComponentToken(riskpool.getId()))
+    token.approve(instanceService.getTreasuryAddress(), 100000 * 10 ** token.decimals(), {'from': riskpoolWallet})
+
+    bundle_id = create_bundle(
+        instance,
+        instanceOperator,
+        investor,
+        riskpool,
+        funding=30000,
+        minProtectedBalance=2000,
+        maxProtectedBalance=10000)
+
+    protected_token.transfer(protectedWallet, 8000 * tf, {'from': instanceOperator})
+    protected_token.transfer(protectedWallet2, 3000 * tf, {'from': instanceOperator})
+
+    # 2 policies for protected wallet, 1 for protected wallet 2
+    process_ids = [
+        apply_for_policy_with_bundle(instance, instanceOperator, product, holder, bundle_id, wallet, 5000, 60, 80)
+        for (holder, wallet) in [(customer, protectedWallet), (customer2, protectedWallet), (customer, protectedWallet2)]]
+
+    depeg_price = int(0.9 * product.getTargetPrice())
+    force_product_into_depegged_state(product, productOwner, depeg_price)
+
+    for process_id in process_ids:
+        product.createDepegClaim(process_id, {'from': product.getProtectedWallet(process_id)})
+
+    # balances at depeg block differ from current balances
+    depeg_block_number = chain.height
+    protected_token.transfer(protectedWallet, 1000 * tf, {'from': instanceOperator})
+
+    price_feed = contract_from_address(UsdcPriceDataProvider, product.getPriceDataProvider())
+    price_feed.setDepeggedBlockNumber(depeg_block_number, 'local block', {'from': productOwner})
+
+    snapshot = DepegBalanceSnapshot(product, Multicall(multicall3.address, chunk_size=2))
+    wallets = snapshot.get_protected_wallets()
+    assert sorted(wallets) == sorted([protectedWallet.address, protectedWallet2.address])
+    assert sorted(snapshot.get_protected_wallets(all_policies=True)) == sorted(wallets)
+
+    report = snapshot.run(productOwner, chunk_size=1)
+    assert report['block_number'] == depeg_block_number
+    assert report['wallets'] == 2
+    assert report['transactions'] == 2
+    assert report['added'] == 2
+    assert report['errors'] == 0
+
+    assert product.getDepegBalance(protectedWallet).dict()['balance'] == 8000 * tf
+    assert product.getDepegBalance(protectedWallet).dict()['blockNumber'] == depeg_block_number
+    assert product.getDepegBalance(protectedWallet2).dict()['balance'] == 3000 * tf
+
+    # nothing left to upload, sequential calls give the same result
+    report = DepegBalanceSnapshot(product).run(productOwner)
+    assert report['balances'] == 0
+    assert report['transactions'] == 0
+
+    # claims can be processed now
+    product.processPolicies(process_ids, {'from': productOwner})
+    assert product.policiesToProcess() == 0
+
+
+def test_depeg_balance_upload_errors(
+    product,
+    productOwner: Account,
+    protectedWallet: Account,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    depeg_price = int(0.9 * product.getTargetPrice())
+    force_product_into_depegged_state(product, productOwner, depeg_price)
+
+    price_feed = contract_from_address(UsdcPriceDataProvider, product.getPriceDataProvider())
+    price_feed.setDepeggedBlockNumber(chain.height, 'local block', {'from': productOwner})
+
+    # balance for wrong block is rejected by the contract
+    snapshot = DepegBalanceSnapshot(product)
+    with pytest.raises(RuntimeError):
+        snapshot.upload([(protectedWallet, chain.height - 1, 1000)], productOwner)
+
+    assert snapshot.get_chunk_size([(protectedWallet, chain.height, 1000)] * 20, productOwner) > 1
@@ -0,0 +1,106 @@
+import pytest
+import time
+
+from server.jobs import (
+    MISSED_RUN_CATCH_UP,
+    MISSED_RUN_COALESCE,
+    MISSED_RUN_SKIP,
+    Job,
+    Scheduler,
+)
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def get_scheduled(scheduler:Scheduler) -> list:
+    """ids of the jobs with a valid heap entry, stale entries are skipped by the scheduler"""
+    return sorted([
+        job.id
+        for (_, generation, job) in scheduler.heap
+        if scheduler.generations.get(job.id) == generation])
+
+
+def test_job_missed_run_policies():
+    with pytest.raises(ValueError):
+        Job(name='invalid', missed_run_policy='later')
+
+    for policy in [MISSED_RUN_SKIP, MISSED_RUN_COALESCE, MISSED_RUN_CATCH_UP]:
+        # run completed in time: next slot
+        job = Job(name=policy, next_execution=100, interval=10, missed_run_policy=policy)
+        job.reschedule(105)
+        assert job.next_execution == 110
+        assert job.missed == 0
+
+    # 3 slots (110, 120, 130) missed at 135
+    job = Job(name='skip', next_execution=100, interval=10, missed_run_policy=MISSED_RUN_SKIP)
+    job.reschedule(135)
+    assert job.next_execution == 140
+    assert job.missed == 3
+
+    job = Job(name='coalesce', next_execution=100, interval=10, missed_run_policy=MISSED_RUN_COALESCE)
+    job.reschedule(135)
+    assert job.next_execution == 135
+    assert job.missed == 3
+
+    job = Job(name='catch up', next_execution=100, interval=10, missed_run_policy=MISSED_RUN_CATCH_UP)
+    job.reschedule(135)
+    assert job.next_execution == 110
+    assert job.missed == 0
+
+    job.reschedule(135)
+    job.reschedule(135)
+    assert job.next_execution == 130
+    job.reschedule(135)
+    assert job.next_execution == 140
+
+
+def test_scheduler_add_remove():
+    scheduler = Scheduler(2)
+    job = Job(name='job', interval=10)
+    other = Job(name='other', interval=10)
+
+    scheduler.add(job)
+    scheduler.add(other)
+    assert sorted(scheduler.jobs.keys()) == sorted([job.id, other.id])
+    assert get_scheduled(scheduler) == sorted([job.id, other.id])
+
+    scheduler.remove(job)
+    assert list(scheduler.jobs.keys()) == [other.id]
+    assert get_scheduled(scheduler) == [other.id]
+
+    # re-added job has a single valid heap entry, the one of the removed job is stale
+    scheduler.add(job)
+    assert len(scheduler.heap) == 3
+    assert get_scheduled(scheduler) == sorted([job.id, other.id])
+
+    scheduler.remove(job)
+    scheduler.remove(job)
+    scheduler.add(job)
+    assert len(scheduler.heap) == 4
+    assert get_scheduled(scheduler) == sorted([job.id, other.id])
+
+
+def test_scheduler_re_added_job():
+    executions = []
+    job = Job(name='job', interval=1, method_to_run=lambda: executions.append(time.time()))
+
+    # heap entry due now is left behind by remove, re-added job is due in 0.5s
+    scheduler = Scheduler(2)
+    scheduler.add(job)
+    scheduler.remove(job)
+
+    started_at = time.time()
+    job.next_execution = started_at + 0.5
+    scheduler.add(job)
+
+    scheduler.start()
+    time.sleep(2.0)
+    scheduler.stop()
+
+    # runs at 0.5s and 1.5s only, the stale entry does not start a second schedule
+    assert len(executions) == 2
+    assert executions[0] - started_at >= 0.5
+    assert job.executions == 2
@@ -0,0 +1,102 @@
+import brownie
+import pytest
+
+from brownie.network.account import Account
+from brownie import (
+    chain,
+    Multicall3,
+    USD1,
+)
+
+from scripts.multicall import Multicall
+from scripts.setup import create_bundle
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def test_multicall_balances(
+    multicall3: Multicall3,
+    usd1: USD1,
+    instanceOperator: Account,
+    customer: Account,
+    customer2: Account,
+):
+    usd1.transfer(customer, 1000, {'from': instanceOperator})
+    usd1.transfer(customer2, 2000, {'from': instanceOperator})
+
+    accounts = [instanceOperator, customer, customer2, customer, instanceOperator]
+    expected = [usd1.balanceOf(a) for a in accounts]
+
+    # chunk size 2 for 5 calls results in 3 round trips
+    multicall = Multicall(multicall3.address, chunk_size=2)
+    assert multicall.is_batching()
+
+    balances = multicall.map(usd1.balanceOf, accounts)
+    assert balances == expected
+    assert balances[1] == 1000
+    assert balances[2] == 2000
+    assert multicall.round_trips == 3
+
+    # mixed calls and pinned block
+    block_number = chain.height
+    usd1.transfer(customer, 500, {'from': instanceOperator})
+
+    (symbol, decimals, balance_before) = multicall.call([
+        (usd1.symbol, ()),
+        (usd1.decimals, ()),
+        (usd1.balanceOf, (customer,)),
+    ], block_identifier=block_number)
+
+    assert symbol == usd1.symbol()
+    assert decimals == usd1.decimals()
+    assert balance_before == 1000
+    assert usd1.balanceOf(customer) == 1500
+
+
+def test_multicall_failure(
+    multicall3: Multicall3,
+    instance,
+    instanceOperator: Account,
+    investor: Account,
+    riskpool,
+):
+    bundle_id = create_bundle(instance, instanceOperator, investor, riskpool)
+    multicall = Multicall(multicall3.address)
+
+    # index 1 is out of range and reverts
+    with pytest.raises(RuntimeError):
+        multicall.map(riskpool.getBundleId, [0, 1])
+
+    bundle_ids = multicall.map(riskpool.getBundleId, [0, 1], allow_failure=True)
+    assert bundle_ids == [bundle_id, None]
+
+
+def test_multicall_bundle_infos(
+    multicall3: Multicall3,
+    instance,
+    instanceOperator: Account,
+    investor: Account,
+    riskpool,
+):
+    for i in range(3):
+        create_bundle(instance, instanceOperator, investor, riskpool, bundleName='bundle-{}'.format(i))
+
+    bundle_ids = [riskpool.getBundleId(idx) for idx in range(riskpool.bundles())]
+    expected = [riskpool.getBundleInfo(bundle_id).dict() for bundle_id in bundle_ids]
+
+    batched = Multicall(multicall3.address)
+    sequential = Multicall()
+    assert not sequential.is_batching()
+
+    for multicall in [batched, sequential]:
+        ids = multicall.map(riskpool.getBundleId, range(riskpool.bundles()))
+        infos = [info.dict() for info in multicall.map(riskpool.getBundleInfo, ids)]
+
+        assert ids == bundle_ids
+        assert infos == expected
+
+    assert batched.round_trips == 2
+    assert sequential.round_trips == 2 * len(bundle_ids)
@@ -0,0 +1,159 @@
+import pytest
+
+from brownie.network.account import Account
+from brownie import (
+    interface,
+    Multicall3,
+)
+
+from scripts.multicall import Multicall
+from scripts.portfolio_export import (
+    PortfolioExport,
+    read_meta,
+    read_rows,
+)
+
+from scripts.setup import (
+    create_bundle,
+    apply_for_policy_with_bundle,
+)
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def test_portfolio_export_rows(
+    multicall3: Multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    investor: Account,
+    customer: Account,
+    product,
+    riskpool,
+):
+    bundle_id = create_bundle(instance, instanceOperator, investor, riskpool, funding=20000)
+    process_ids = [
+        apply_for_policy_with_bundle(instance, instanceOperator, product, customer, bundle_id, customer, protected_balance, 45, 100)
+        for protected_balance in [3000, 5000]]
+
+    export = PortfolioExport(product, instanceService, Multicall(multicall3.address))
+    rows = export.get_rows(0, product.applications(), multicall3.getBlockNumber())
+
+    assert [row['processId'] for row in rows] == [str(process_id) for process_id in process_ids]
+
+    for (idx, row) in enumerate(rows):
+        process_id = product.getApplicationId(idx)
+        application = instanceService.getApplication(process_id).dict()
+        policy = instanceService.getPolicy(process_id).dict()
+        (wallet, protected_balance, duration, bundle, max_premium) = riskpool.decodeApplicationParameterFromData(application['data'])
+
+        assert row['idx'] == idx
+        assert row['owner'] == customer
+        assert row['kind'] == 'policy'
+        assert row['wallet'] == wallet
+        assert row['protectedBalance'] == protected_balance
+        assert row['duration'] == duration
+        assert row['bundleId'] == bundle == bundle_id
+        assert row['maxPremium'] == max_premium
+        assert row['sumInsured'] == application['sumInsuredAmount']
+        assert row['premium'] == application['premiumAmount']
+        assert row['premiumPaid'] == policy['premiumPaidAmount']
+        assert row['payoutMax'] == policy['payoutMaxAmount']
+
+
+@pytest.mark.parametrize('extension', ['csv', 'ndjson'])
+def test_portfolio_export_refresh(
+    multicall3: Multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    investor: Account,
+    customer: Account,
+    product,
+    riskpool,
+    tmp_path,
+    extension,
+):
+    bundle_id = create_bundle(instance, instanceOperator, investor, riskpool, funding=20000)
+    apply_for_policy_with_bundle(instance, instanceOperator, product, customer, bundle_id, customer, 3000, 45, 100)
+
+    file_name = str(tmp_path / 'portfolio.{}'.format(extension))
+    export = PortfolioExport(product, instanceService, Multicall(multicall3.address), chunk_size=2)
+
+    summary = export.export(file_name, report=None)
+    assert summary['rows'] == summary['new_rows'] == 1
+    assert len(read_rows(file_name)) == 1
+
+    for protected_balance in [4000, 5000, 6000]:
+        apply_for_policy_with_bundle(instance, instanceOperator, product, customer, bundle_id, customer, protected_balance, 45, 100)
+
+    # refresh only reads the new applications
+    summary = export.export(file_name, report=None)
+    assert summary['rows'] == 4
+    assert summary['new_rows'] == 3
+    assert read_meta(file_name)['applications'] == 4
+
+    rows = read_rows(file_name)
+    assert [row['idx'] for row in rows] == [0, 1, 2, 3]
+    assert rows == export.get_rows(0, 4, summary['block'])
+
+    tf = 10 ** interface.IERC20Metadata(product.getProtectedToken()).decimals()
+    assert [row['protectedBalance'] // tf for row in rows] == [3000, 4000, 5000, 6000]
+
+    # full export rewrites the file
+    summary = export.export(file_name, full=True, report=None)
+    assert summary['new_rows'] == 4
+    assert read_rows(file_name) == rows
+
+
+@pytest.mark.parametrize('extension', ['csv', 'ndjson'])
+def test_portfolio_export_interrupted(
+    multicall3: Multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    investor: Account,
+    customer: Account,
+    product,
+    riskpool,
+    tmp_path,
+    extension,
+):
+    bundle_id = create_bundle(instance, instanceOperator, investor, riskpool, funding=20000)
+
+    for protected_balance in [3000, 4000, 5000, 6000, 7000]:
+        apply_for_policy_with_bundle(instance, instanceOperator, product, customer, bundle_id, customer, protected_balance, 45, 100)
+
+    file_name = str(tmp_path / 'portfolio.{}'.format(extension))
+    export = PortfolioExport(product, instanceService, Multicall(multicall3.address), chunk_size=2)
+
+    def interrupt(message):
+        raise KeyboardInterrupt(message)
+
+    # interrupted after the first chunk: meta covers the rows written so far
+    with pytest.raises(KeyboardInterrupt):
+        export.export(file_name, report=interrupt)
+
+    assert read_meta(file_name)['applications'] == 2
+
+    # rows written after the last meta update are cut off by the refresh
+    with open(file_name, 'a') as export_file:
+        export_file.write('{"idx": 99}\n' if extension == 'ndjson' else '99\n')
+
+    summary = export.export(file_name, report=None)
+    assert summary['new_rows'] == 3
+
+    rows = read_rows(file_name)
+    assert [row['idx'] for row in rows] == [0, 1, 2, 3, 4]
+    assert rows == export.get_rows(0, 5, summary['block'])
+
+    # interrupted full export: the meta is rewritten from the first chunk on
+    with pytest.raises(KeyboardInterrupt):
+        export.export(file_name, full=True, report=interrupt)
+
+    assert read_meta(file_name)['applications'] == 2
+    assert export.export(file_name, report=None)['new_rows'] == 3
+    assert read_rows(file_name) == rows
@@ -0,0 +1,127 @@
+import os
+import pytest
+
+from brownie.network.account import Account
+from brownie import (
+    web3,
+    MockChainlinkAggregator,
+    MockPriceFeedProxy,
+)
+
+from scripts.price_feed import (
+    abiFeed,
+    download,
+    fetchPhaseRounds,
+)
+
+from scripts.round_store import (
+    RoundStore,
+    COLUMN_FILE_EXTENSION,
+)
+
+GANACHE = 1337
+PHASE_OFFSET = 2 ** 64
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+@pytest.fixture
+def feed_proxy(productOwner) -> MockPriceFeedProxy:
+    """stand-in price feed with 2 phases, 12 rounds in phase 1 and 5 rounds in phase 2"""
+    proxy = MockPriceFeedProxy.deploy('USDC / USD', 8, {'from': productOwner})
+    updated_at = 1660000000
+
+    for rounds in [12, 5]:
+        aggregator = MockChainlinkAggregator.deploy({'from': productOwner})
+        proxy.addPhase(aggregator, {'from': productOwner})
+
+        for i in range(rounds):
+            updated_at += 3600
+            aggregator.addRoundData(100000000 - i, updated_at, updated_at, {'from': productOwner})
+
+    return proxy
+
+
+def get_feed(proxy):
+    return web3.eth.contract(address=proxy.address, abi=abiFeed)
+
+
+def test_download_and_refresh(feed_proxy: MockPriceFeedProxy, productOwner: Account, tmp_path):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    feed = get_feed(feed_proxy)
+    store = RoundStore(str(tmp_path))
+
+    # chunk size 5 for 12 + 5 rounds
+    assert download(web3, feed, store, workers=4, chunkSize=5) == 17
+    assert store.get_rows(feed.address) == 17
+    assert store.get_last_round(feed.address, 1) == 12
+    assert store.get_last_round(feed.address, 2) == 5
+
+    rounds = store.read_rounds(feed.address)
+    assert rounds[0] == tuple(feed_proxy.getRoundData(PHASE_OFFSET + 1))
+    assert rounds[12] == tuple(feed_proxy.getRoundData(2 * PHASE_OFFSET + 1))
+    assert rounds[-1][0] == 2 * PHASE_OFFSET + 5
+
+    # nothing new
+    assert download(web3, feed, store) == 0
+
+    # incremental refresh only fetches the new rounds of the current phase
+    aggregator = MockChainlinkAggregator.at(feed_proxy.phaseAggregators(2))
+    aggregator.addRoundData(99990000, 1670000000, 1670000000, {'from': productOwner})
+    aggregator.addRoundData(99980000, 1670003600, 1670003600, {'from': productOwner})
+
+    assert download(web3, feed, store) == 2
+    assert store.get_rows(feed.address) == 19
+
+    rounds = store.read_rounds(feed.address)
+    assert rounds[-1] == tuple(feed_proxy.getRoundData(2 * PHASE_OFFSET + 7))
+    assert [r[0] for r in rounds] == sorted(set([r[0] for r in rounds]))
+
+
+def test_download_resume(feed_proxy: MockPriceFeedProxy, tmp_path):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    feed = get_feed(feed_proxy)
+    store = RoundStore(str(tmp_path))
+
+    # truncated download, then interrupted append (column data without meta update)
+    assert download(web3, feed, store, trunc=4) == 8
+
+    with open(os.path.join(str(tmp_path), feed.address.lower(), 'answer' + COLUMN_FILE_EXTENSION), 'a') as column_file:
+        column_file.write('123\n456\n')
+
+    # new store instance drops uncommitted rows and resumes after round 4 of each phase
+    store = RoundStore(str(tmp_path))
+    assert store.get_rows(feed.address) == 8
+    assert len(store.read(feed.address)['answer']) == 8
+
+    assert download(web3, feed, store) == 9
+    rounds = store.read_rounds(feed.address)
+    assert len(rounds) == 17
+    assert rounds == [tuple(feed_proxy.getRoundData(r[0])) for r in rounds]
+
+    with pytest.raises(ValueError):
+        store.append(feed.address, [(1, 12, PHASE_OFFSET + 12, 1, 1, 1, PHASE_OFFSET + 12)])
+
+
+def test_fetch_rounds_batch(feed_proxy: MockPriceFeedProxy):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    feed = get_feed(feed_proxy)
+
+    rows_pool = fetchPhaseRounds(feed, 1, 1, 12, workers=4)
+    rows_batch = fetchPhaseRounds(feed, 1, 1, 12, workers=2, batchSize=5)
+
+    assert rows_batch == rows_pool
+    assert rows_pool[0][:3] == (1, 1, PHASE_OFFSET + 1)
+    assert rows_pool[-1][:3] == (1, 12, PHASE_OFFSET + 12)
@@ -0,0 +1,189 @@
+import pytest
+import random
+
+from brownie import (
+    web3,
+    UsdcPriceDataProvider,
+)
+
+from brownie.network.account import Account
+
+from scripts.price_data import (
+    USDC_CHAINLINK_DATA,
+    USDC_CHAINLINK_DATA_HEARTBEAT_VIOLATED,
+    USDC_CHAINLINK_DATA_DEVIATION_VIOLATED,
+    USDC_CHAINLINK_DATA_TRIGGER_AND_RECOVER,
+    USDC_CHAINLINK_DATA_TRIGGER_AND_DEPEG,
+    ROUND_ID_INITIAL,
+    data_to_round_data,
+)
+
+from scripts.price_provider_model import (
+    UsdcPriceDataProviderModel,
+    EVENT_DEPEG,
+    EVENT_RECOVERY,
+    EVENT_TRIGGER,
+    STABILITY_DEPEGGED,
+)
+
+from tests.test_depeg_data import (
+    DEPEG_DATA_230312,
+    get_price_data,
+)
+
+GANACHE = 1337
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+@pytest.mark.parametrize('dataset', [
+    USDC_CHAINLINK_DATA,
+    USDC_CHAINLINK_DATA_HEARTBEAT_VIOLATED,
+    USDC_CHAINLINK_DATA_DEVIATION_VIOLATED,
+    USDC_CHAINLINK_DATA_TRIGGER_AND_RECOVER,
+    USDC_CHAINLINK_DATA_TRIGGER_AND_DEPEG,
+])
+def test_model_vs_contract_test_data(
+    usdc_feeder: UsdcPriceDataProvider,
+    productOwner: Account,
+    dataset
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    rounds = [data_to_round_data(data) for data in dataset]
+    check_model_vs_contract(usdc_feeder, productOwner, rounds)
+
+
+def test_model_vs_contract_random_walk(
+    usdc_feeder: UsdcPriceDataProvider,
+    productOwner: Account,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    # prices around trigger/recovery levels, irregular heartbeats and deviations
+    rng = random.Random(42)
+    rounds = []
+    updated_at = 1660000000
+
+    for i in range(60):
+        price = rng.choice([100000000, 99950000, 99900000, 99899999, 99700000, 99500001, 99500000, 98000000])
+        updated_at += rng.choice([3600, 12 * 3600, 24 * 3600, 24 * 3600 + 101, 2 * 24 * 3600])
+        round_id = ROUND_ID_INITIAL + i
+        rounds.append((round_id, price, updated_at, updated_at, round_id))
+
+    check_model_vs_contract(usdc_feeder, productOwner, rounds)
+
+
+def test_model_vs_contract_depeg_230312(
+    usdc_feeder: UsdcPriceDataProvider,
+    productOwner: Account,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    (header, keys, data) = get_price_data(DEPEG_DATA_230312)
+    rounds = [
+        (int(key), int(data[key]['answer']), int(data[key]['updatedAt']), int(data[key]['updatedAt']), int(key))
+        for key in keys]
+
+    price_infos = check_model_vs_contract(usdc_feeder, productOwner, rounds)
+    event_types = [price_info['eventType'] for price_info in price_infos]
+
+    assert event_types.count(EVENT_TRIGGER) == 1
+    assert event_types.count(EVENT_DEPEG) == 1
+    assert price_infos[-1]['stability'] == STABILITY_DEPEGGED
+
+
+def test_model_force_and_reset_depeg(
+    usdc_feeder: UsdcPriceDataProvider,
+    productOwner: Account,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    rounds = [data_to_round_data(data) for data in USDC_CHAINLINK_DATA_TRIGGER_AND_RECOVER[:4]]
+    check_model_vs_contract(usdc_feeder, productOwner, rounds)
+
+    model = UsdcPriceDataProviderModel()
+    model.process_rounds(rounds)
+
+    usdc_feeder.forceDepegForNextPriceInfo({'from': productOwner})
+    model.force_depeg_for_next_price_info()
+    assert usdc_feeder.getTriggeredAt() == model.triggered_at
+
+    # next round is outside of the (shifted) recovery window
+    (round_id, price, _, updated_at, _) = rounds[-1]
+    next_round = (round_id + 1, price, updated_at + 1, updated_at + 1, round_id + 1)
+    usdc_feeder.setRoundData(*next_round, {'from': productOwner})
+    model.set_round_data(*next_round)
+
+    tx = usdc_feeder.processLatestPriceInfo({'from': productOwner})
+    price_info = model.process_latest_price_info()
+    assert tx.return_value.dict() == price_info
+    assert price_info['eventType'] == EVENT_DEPEG
+    assert usdc_feeder.getDepegPriceInfo().dict() == model.depeg_price_info
+
+    usdc_feeder.resetDepeg({'from': productOwner})
+    model.reset_depeg()
+    assert usdc_feeder.getDepegPriceInfo().dict() == model.depeg_price_info
+    assert usdc_feeder.getTriggeredAt() == model.triggered_at
+    assert usdc_feeder.getDepeggedAt() == model.depegged_at
+
+
+def test_model_event_sequence():
+    # pure python, no chain interaction
+    model = UsdcPriceDataProviderModel()
+    rounds = [data_to_round_data(data) for data in USDC_CHAINLINK_DATA_TRIGGER_AND_RECOVER]
+    event_types = [price_info['eventType'] for price_info in model.process_rounds(rounds)]
+
+    # 3: at trigger price, 7: at recovery price
+    assert event_types.index(EVENT_TRIGGER) == 3
+    assert event_types.index(EVENT_RECOVERY) == 7
+    assert model.triggered_at == 0
+    assert model.depegged_at == 0
+
+
+def check_model_vs_contract(usdc_feeder, owner, rounds) -> list:
+    """feeds the rounds to contract and model, processes after each round and compares all outputs"""
+    model = UsdcPriceDataProviderModel(
+        trigger_price=usdc_feeder.DEPEG_TRIGGER_PRICE(),
+        recovery_price=usdc_feeder.DEPEG_RECOVERY_PRICE(),
+        recovery_window=usdc_feeder.DEPEG_RECOVERY_WINDOW(),
+        deviation=usdc_feeder.getDeviation(),
+        heartbeat=usdc_feeder.getHeartbeat(),
+        heartbeat_margin=usdc_feeder.heartbeatMargin())
+
+    price_infos = []
+
+    for round_data in rounds:
+        usdc_feeder.setRoundData(*round_data, {'from': owner})
+        model.set_round_data(*round_data)
+
+        (round_id, price, _, updated_at, _) = round_data
+        assert usdc_feeder.getCompliance(round_id, price, updated_at) == model.get_compliance(round_id, price, updated_at)
+        assert usdc_feeder.getLatestPriceInfo().dict() == model.get_latest_price_info()
+
+        (new_event, _, _) = usdc_feeder.isNewPriceInfoEventAvailable()
+        (model_new_event, _, _) = model.is_new_price_info_event_available(updated_at)
+        assert new_event == model_new_event
+
+        tx = usdc_feeder.processLatestPriceInfo({'from': owner})
+        price_info = model.process_latest_price_info()
+
+        assert tx.return_value.dict() == price_info
+        assert usdc_feeder.getTriggeredAt() == model.triggered_at
+        assert usdc_feeder.getDepeggedAt() == model.depegged_at
+        assert usdc_feeder.getDepegPriceInfo().dict() == model.depeg_price_info
+
+        price_infos.append(price_info)
+
+    return price_infos
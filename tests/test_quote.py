@@ -0,0 +1,116 @@
+import random
+import pytest
+
+from brownie.network.account import Account
+from brownie import (
+    chain,
+    history,
+    interface,
+    Multicall3,
+)
+
+from scripts.multicall import Multicall
+from scripts.quote import (
+    COMMENT_MATCH,
+    COMMENT_NO_MATCH,
+    calculate_net_premium,
+    calculate_premium,
+    get_quote_engine,
+)
+
+from scripts.setup import (
+    create_bundle,
+    apply_for_policy_with_bundle,
+)
+
+DAY = 24 * 3600
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def test_quote_math_vs_contract(
+    product,
+    riskpool,
+):
+    rng = random.Random(42)
+    fee = product.getFeeSpecification(product.getId()).dict()
+    fraction_full_unit = product.getFeeFractionFullUnit()
+
+    for _ in range(10):
+        sum_insured = rng.randint(0, 10 ** 12)
+        duration = rng.randint(14 * DAY, 120 * DAY)
+        apr = rng.randint(1, riskpool.MAX_APR())
+
+        net_premium = riskpool.calculatePremium(sum_insured, duration, apr)
+        assert calculate_net_premium(sum_insured, duration, apr) == net_premium
+        assert calculate_premium(net_premium, fee['fixedFee'], fee['fractionalFee'], fraction_full_unit) == product.calculatePremium(net_premium)
+
+
+def test_quote_bundle_matching(
+    multicall3: Multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    investor: Account,
+    customer: Account,
+    product,
+    riskpool,
+):
+    tf = 10 ** interface.IERC20Metadata(product.getToken()).decimals()
+
+    # bundles in increasing apr, overlapping protected balance and duration ranges
+    bundle_cheap = create_bundle(instance, instanceOperator, investor, riskpool, funding=5000,
+        minProtectedBalance=2000, maxProtectedBalance=10000, minDurationDays=30, maxDurationDays=60, aprPercentage=2.0)
+    bundle_mid = create_bundle(instance, instanceOperator, investor, riskpool, funding=20000,
+        minProtectedBalance=2000, maxProtectedBalance=20000, minDurationDays=30, maxDurationDays=90, aprPercentage=3.5)
+    bundle_long = create_bundle(instance, instanceOperator, investor, riskpool, funding=20000, bundleLifetimeDays=30,
+        minProtectedBalance=5000, maxProtectedBalance=20000, minDurationDays=60, maxDurationDays=120, aprPercentage=5.0)
+
+    engine = get_quote_engine(product, riskpool, instanceService, Multicall(multicall3.address))
+    now = chain.time()
+
+    assert [bundle['bundleId'] for bundle in engine.bundles] == list(riskpool.getActiveBundleIds())
+
+    for (protected_balance, duration_days, bundle_id) in [
+        (5000, 45, bundle_cheap),
+        (5000, 75, bundle_mid),
+        (15000, 45, bundle_mid),
+        (15000, 100, bundle_long),
+        (25000, 45, None),
+        (1000, 45, None),
+    ]:
+        quote = engine.quote(protected_balance * tf, duration_days * DAY, now)
+        assert quote['bundleId'] == bundle_id
+
+        if bundle_id:
+            duration = duration_days * DAY
+            net_premium = product.calculateNetPremium(quote['sumInsured'], duration, bundle_id)
+            assert quote['comment'] == COMMENT_MATCH
+            assert quote['netPremium'] == net_premium
+            assert quote['premium'] == product.calculatePremium(net_premium)
+        else:
+            assert quote['comment'] == COMMENT_NO_MATCH
+
+    # explicit bundle restricts the match
+    assert engine.quote(5000 * tf, 45 * DAY, now, bundle_mid)['bundleId'] == bundle_mid
+    assert engine.quote(5000 * tf, 45 * DAY, now, bundle_long)['bundleId'] is None
+
+    # quoted premium is what the product charges
+    quote = engine.quote(5000 * tf, 45 * DAY, now)
+    process_id = apply_for_policy_with_bundle(instance, instanceOperator, product, customer, quote['bundleId'], customer, 5000, 45, 100)
+    assert history[-1].events['LogDepegApplicationCreated']['premiumAmount'] == quote['premium']
+    assert instanceService.getPolicy(process_id).dict()['premiumExpectedAmount'] == quote['premium']
+
+    # capacity of the cheap bundle is used up by locked capital
+    engine = get_quote_engine(product, riskpool, instanceService, Multicall(multicall3.address))
+    bundle = [bundle for bundle in engine.bundles if bundle['bundleId'] == bundle_cheap][0]
+    assert bundle['lockedCapital'] == quote['sumInsured']
+    assert engine.quote(5000 * tf, 45 * DAY, now)['bundleId'] == bundle_mid
+
+    # expired bundles no longer match
+    chain.sleep(31 * DAY)
+    chain.mine(1)
+    assert engine.quote(15000 * tf, 100 * DAY, chain.time())['bundleId'] is None
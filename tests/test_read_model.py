@@ -0,0 +1,239 @@
+import pytest
+
+from scripts.multicall import Multicall
+from scripts.read_model import (
+    STATE_ACTIVE,
+    STATE_APPLIED,
+    STATE_EXPIRED,
+    CLAIM_STATE_PAID,
+    EventIndexer,
+    ReadModel,
+)
+
+from scripts.setup import (
+    create_bundle,
+    apply_for_policy_with_bundle,
+)
+
+PROCESS_ID_1 = '0x' + '11' * 32
+PROCESS_ID_2 = '0x' + '22' * 32
+HOLDER = '0x' + 'aa' * 20
+WALLET = '0x' + 'bb' * 20
+DISTRIBUTOR = '0x' + 'cc' * 20
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def get_event(block_number:int, log_index:int, name:str, **args) -> dict:
+    return {
+        'blockNumber': block_number,
+        'logIndex': log_index,
+        'transactionHash': '0x' + '00' * 32,
+        'contract': 'product',
+        'event': name,
+        'args': args,
+    }
+
+
+def get_application_events(block_number:int, process_id:str, protected_balance:int) -> list:
+    return [
+        get_event(block_number, 0, 'LogDepegApplicationCreated',
+            processId=process_id, policyHolder=HOLDER, protectedWallet=WALLET, protectedBalance=protected_balance,
+            sumInsuredAmount=protected_balance // 2, premiumAmount=protected_balance // 100,
+            duration=45 * 24 * 3600, bundleId=1, maxPremium=2 ** 256 - 1, createdAt=1680000000 + block_number),
+        get_event(block_number, 1, 'LogDepegPolicyCreated',
+            processId=process_id, policyHolder=HOLDER, sumInsuredAmount=protected_balance // 2),
+    ]
+
+
+def test_read_model_projections(tmp_path):
+    read_model = ReadModel(str(tmp_path / 'depeg.db'))
+    assert read_model.get_cursor() == (None, None)
+
+    read_model.ingest(get_application_events(10, PROCESS_ID_1, 5000 * 10 ** 6), 10, '0x10')
+    read_model.ingest(
+        get_application_events(12, PROCESS_ID_2, 3000 * 10 ** 6) + [
+        get_event(12, 2, 'LogDepegPolicySold', distributor=DISTRIBUTOR, processId=PROCESS_ID_2,
+            premiumTotalAmount=30 * 10 ** 6, protectedWallet=WALLET, protectedBalance=3000 * 10 ** 6),
+        get_event(12, 3, 'LogDistributionInfoUpdated', distributor=DISTRIBUTOR, commissionAmount=10 ** 6,
+            commissionBalance=10 ** 6, totalPoliciesSold=1)],
+        15, '0x15', {12: '0x12'})
+
+    assert read_model.get_cursor() == (15, '0x15')
+    assert read_model.get_block_hashes() == [(15, '0x15'), (12, '0x12'), (10, '0x10')]
+
+    policy = read_model.get_policy(PROCESS_ID_2)
+    assert policy['state'] == STATE_ACTIVE
+    assert policy['protectedWallet'] == WALLET
+    assert policy['maxPremium'] == 2 ** 256 - 1
+    assert policy['distributor'] == DISTRIBUTOR
+    assert policy['claims'] == []
+
+    read_model.ingest([
+        get_event(20, 0, 'LogDepegClaimCreated', processId=PROCESS_ID_1, claimId=0, claimAmount=500 * 10 ** 6),
+        get_event(20, 1, 'LogDepegClaimConfirmed', processId=PROCESS_ID_1, claimId=0, claimAmount=400 * 10 ** 6,
+            accountBalance=4000 * 10 ** 6, payoutAmount=400 * 10 ** 6),
+        get_event(20, 2, 'LogDepegPayoutProcessed', processId=PROCESS_ID_1, claimId=0, payoutId=0, payoutAmount=400 * 10 ** 6),
+        get_event(21, 0, 'LogDepegPolicyExpired', processId=PROCESS_ID_2),
+        get_event(21, 1, 'LogPriceDataTriggered', priceId=7, price=994000, triggeredAt=1680001000)],
+        21, '0x21')
+
+    policy = read_model.get_policy(PROCESS_ID_1)
+    assert policy['claimState'] == CLAIM_STATE_PAID
+    assert policy['payoutAmount'] == 400 * 10 ** 6
+    assert policy['claims'][0]['accountBalance'] == 4000 * 10 ** 6
+
+    assert [policy['processId'] for policy in read_model.get_policies()] == [PROCESS_ID_1, PROCESS_ID_2]
+    assert [policy['processId'] for policy in read_model.get_policies(STATE_EXPIRED)] == [PROCESS_ID_2]
+    assert read_model.get_policies(offset=1, limit=1)[0]['processId'] == PROCESS_ID_2
+
+    totals = read_model.get_totals()
+    assert totals['applications'] == 2
+    assert totals['policies'] == 2
+    assert totals['states'][STATE_ACTIVE]['sumInsured'] == 2500 * 10 ** 6
+    assert totals['payoutAmount'] == 400 * 10 ** 6
+    assert totals['distributors'] == 1
+
+    assert read_model.get_price_events()[0]['priceId'] == 7
+    assert read_model.get_distributors()[0]['policiesSold'] == 1
+
+    # readers in other processes open the database read only
+    reader = ReadModel(str(tmp_path / 'depeg.db'), read_only=True)
+    assert reader.get_totals() == totals
+
+
+def test_read_model_rollback(tmp_path):
+    read_model = ReadModel(str(tmp_path / 'depeg.db'))
+
+    read_model.ingest(get_application_events(10, PROCESS_ID_1, 5000 * 10 ** 6), 10, '0x10')
+    read_model.ingest(get_application_events(12, PROCESS_ID_2, 3000 * 10 ** 6), 12, '0x12')
+    read_model.ingest([get_event(13, 0, 'LogDepegPolicyExpired', processId=PROCESS_ID_1)], 13, '0x13')
+
+    totals = read_model.get_totals()
+    assert totals['states'][STATE_EXPIRED]['count'] == 1
+
+    # fork after block 10: block 12 and 13 events are dropped, projections rebuilt
+    read_model.rollback(10)
+
+    assert read_model.get_cursor() == (10, '0x10')
+    assert read_model.get_policy(PROCESS_ID_2) is None
+    assert read_model.get_policy(PROCESS_ID_1)['state'] == STATE_ACTIVE
+    assert len(read_model.get_events()) == 2
+
+    # re-ingesting the canonical chain
+    read_model.ingest(get_application_events(11, PROCESS_ID_2, 3000 * 10 ** 6)[:1], 12, '0x12b')
+    assert read_model.get_policy(PROCESS_ID_2)['state'] == STATE_APPLIED
+    assert read_model.get_totals()['policies'] == 1
+
+
+
+def test_read_model_policy_pages(tmp_path):
+    read_model = ReadModel(str(tmp_path / 'depeg.db'))
+    wallets = ['0x' + '{:02x}'.format(idx) * 20 for idx in range(3)]
+    events = []
+
+    for idx in range(50):
+        process_id = '0x{:064x}'.format(1000 - idx)
+        events.append(get_event(100 + idx, 0, 'LogDepegApplicationCreated',
+            processId=process_id, policyHolder=HOLDER, protectedWallet=wallets[idx % 3], protectedBalance=(idx % 7 + 1) * 10 ** 9,
+            sumInsuredAmount=10 ** 9, premiumAmount=10 ** 7, duration=(30 + idx % 5) * 24 * 3600, bundleId=idx % 4 + 1,
+            maxPremium=10 ** 8, createdAt=1680000000 + idx))
+
+        if idx % 10 != 0:
+            events.append(get_event(100 + idx, 1, 'LogDepegPolicyCreated', processId=process_id, policyHolder=HOLDER, sumInsuredAmount=10 ** 9))
+
+    read_model.ingest(events, 200, '0x200')
+    policies = read_model.get_policies(limit=1000)
+
+    for (filters, sort, descending) in [
+        ({}, 'created', False),
+        ({}, 'created', True),
+        ({'state': STATE_ACTIVE}, 'expiry', False),
+        ({'protectedWallet': wallets[1].upper().replace('0X', '0x')}, 'protectedBalance', True),
+        ({'bundleId': 2, 'expiresAfter': 1680000000 + 32 * 24 * 3600}, 'expiry', True),
+    ]:
+        expected = [
+            policy for policy in policies
+            if all([
+                filters.get('state', policy['state']) == policy['state'],
+                filters.get('protectedWallet', policy['protectedWallet']).lower() == policy['protectedWallet'].lower(),
+                filters.get('bundleId', policy['bundleId']) == policy['bundleId'],
+                policy['expiresAt'] >= filters.get('expiresAfter', 0)])]
+
+        sort_column = {'created': 'createdSeq', 'expiry': 'expiresAt', 'protectedBalance': 'protectedBalance'}[sort]
+        expected = sorted(expected, key=lambda policy: (policy[sort_column], policy['processId']), reverse=descending)
+
+        collected = []
+        cursor = None
+
+        while True:
+            page = read_model.get_policy_page(filters, sort, descending, cursor, limit=7)
+            assert len(page['policies']) <= 7
+            assert page['block'] == 200
+
+            collected += page['policies']
+            cursor = page['next']
+
+            if not cursor:
+                break
+
+        assert [policy['processId'] for policy in collected] == [policy['processId'] for policy in expected]
+
+    with pytest.raises(ValueError):
+        read_model.get_policy_page(sort='premium')
+
+    with pytest.raises(ValueError):
+        read_model.get_policy_page({'owner': HOLDER})
+
+    # cursor of a different sort order
+    cursor = read_model.get_policy_page(limit=1)['next']
+    with pytest.raises(ValueError):
+        read_model.get_policy_page(sort='expiry', cursor=cursor)
+
+
+def test_read_model_indexer(
+    multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    investor,
+    customer,
+    product,
+    riskpool,
+    tmp_path,
+):
+    bundle_id = create_bundle(instance, instanceOperator, investor, riskpool, funding=20000)
+    process_ids = [
+        apply_for_policy_with_bundle(instance, instanceOperator, product, customer, bundle_id, customer, protected_balance, 45, 100)
+        for protected_balance in [3000, 5000]]
+
+    read_model = ReadModel(str(tmp_path / 'depeg.db'))
+    indexer = EventIndexer(
+        read_model,
+        [('product', product), ('riskpool', riskpool)],
+        instance_service=instanceService,
+        multicall=Multicall(multicall3.address),
+        max_block_range=5)
+
+    assert indexer.update() > 0
+    assert indexer.update() == 0
+
+    policies = read_model.get_policies()
+    assert [policy['processId'] for policy in policies] == [str(process_id).lower() for process_id in process_ids]
+
+    for policy in policies:
+        application = instanceService.getApplication(policy['processId']).dict()
+        (wallet, protected_balance, duration, bundle, max_premium) = riskpool.decodeApplicationParameterFromData(application['data'])
+
+        assert policy['state'] == STATE_ACTIVE
+        assert policy['policyHolder'] == customer
+        assert policy['protectedWallet'] == wallet
+        assert policy['protectedBalance'] == protected_balance
+        assert policy['sumInsured'] == application['sumInsuredAmount']
+        assert policy['premium'] == application['premiumAmount']
+        assert policy['duration'] == duration
+        assert policy['bundleId'] == bundle == bundle_id
+        assert policy['createdAt'] == application['createdAt']
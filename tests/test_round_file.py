@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from scripts.backtest import (
+    RoundSeries,
+    load_rounds,
+    run,
+)
+
+from scripts.price_data import (
+    USDC_CHAINLINK_DATA_TRIGGER_AND_DEPEG,
+    data_to_round_data,
+)
+
+from scripts.round_file import (
+    write,
+    open_rounds,
+    convert,
+    rounds_from_csv,
+    rounds_from_strings,
+)
+
+from tests.test_depeg_data import (
+    DEPEG_DATA_230312,
+    get_price_data,
+)
+
+PHASE_OFFSET = 2 ** 64
+
+# pure python/numpy tests, no chain interaction
+
+
+def test_round_file_from_csv(tmp_path):
+    file_name = str(tmp_path / 'usdc_usd.rounds')
+    assert convert(DEPEG_DATA_230312, file_name) == 400
+
+    round_file = open_rounds(file_name)
+    assert len(round_file) == 400
+    assert isinstance(round_file.updated_at, np.memmap)
+    assert round_file.time_sorted
+
+    (header, keys, data) = get_price_data(DEPEG_DATA_230312)
+    assert [round_file.get_round_id(i) for i in range(400)] == [int(key) for key in keys]
+    assert list(round_file.answer) == [int(data[key]['answer']) for key in keys]
+    assert list(round_file.phase_id) == [int(data[key]['phaseId']) for key in keys]
+    assert list(round_file.aggregator_round_id) == [int(data[key]['aggregatorRoundId']) for key in keys]
+    assert round_file.get_rounds() == rounds_from_csv(DEPEG_DATA_230312)
+
+
+def test_round_file_from_strings(tmp_path):
+    file_name = str(tmp_path / 'trigger_and_depeg.rounds')
+    rounds = [data_to_round_data(data) for data in USDC_CHAINLINK_DATA_TRIGGER_AND_DEPEG]
+    assert rounds_from_strings(USDC_CHAINLINK_DATA_TRIGGER_AND_DEPEG) == rounds
+
+    write(file_name, rounds)
+    assert open_rounds(file_name).get_rounds() == sorted(rounds)
+
+
+def test_round_file_slices(tmp_path):
+    file_name = str(tmp_path / 'usdc_usd.rounds')
+    convert(DEPEG_DATA_230312, file_name)
+    round_file = open_rounds(file_name)
+
+    first_round_id = round_file.get_round_id(0)
+    window = round_file.slice_rounds(first_round_id + 10, first_round_id + 19)
+    assert len(window) == 10
+    assert window.get_round_id(0) == first_round_id + 10
+    assert np.shares_memory(window.updated_at, round_file.updated_at)
+
+    # bounds outside of the stored rounds
+    assert len(round_file.slice_rounds(0, first_round_id - 1)) == 0
+    assert len(round_file.slice_rounds(first_round_id, 3 * PHASE_OFFSET)) == 400
+
+    from_timestamp = int(round_file.updated_at[100])
+    to_timestamp = int(round_file.updated_at[199])
+    window = round_file.slice_time(from_timestamp, to_timestamp)
+    assert len(window) == 100
+    assert window.get_round(0) == round_file.get_round(100)
+    assert window.get_round(99) == round_file.get_round(199)
+
+    # backtest on zero-copy views
+    series = RoundSeries.from_round_file(round_file)
+    assert np.shares_memory(series.answer, round_file.answer_limbs)
+    assert run(series, 99500000, 99900000, 24 * 3600) == run(load_rounds(DEPEG_DATA_230312), 99500000, 99900000, 24 * 3600)
+    assert run(load_rounds(file_name), 99500000, 99900000, 24 * 3600)['depeg_round_id'] == 36893488147419104334
+
+
+def test_round_file_int256_and_uint80(tmp_path):
+    file_name = str(tmp_path / 'extreme.rounds')
+    rounds = [
+        (2 ** 80 - 1, 2 ** 255 - 1, 1, 3, 2 ** 80 - 1),
+        (PHASE_OFFSET + 1, -2 ** 255, 1, 1, PHASE_OFFSET + 1),
+        (PHASE_OFFSET + 2, -1, 2, 2, PHASE_OFFSET + 1),
+        (5, 0, 0, 0, 5),
+    ]
+
+    write(file_name, rounds)
+    round_file = open_rounds(file_name)
+    assert round_file.get_rounds() == sorted(rounds)
+
+    # answers beyond int64 are only available as python ints
+    with pytest.raises(ValueError):
+        round_file.answer
+
+    assert list(round_file[2:3].answer) == [-1]
+
+    with pytest.raises(ValueError):
+        write(file_name, [(2 ** 80, 1, 1, 1, 1)])
+
+    with pytest.raises(ValueError):
+        write(file_name, [(1, 2 ** 255, 1, 1, 1)])
+
+
+def test_round_file_empty(tmp_path):
+    file_name = str(tmp_path / 'empty.rounds')
+    write(file_name, [])
+    round_file = open_rounds(file_name)
+
+    assert len(round_file) == 0
+    assert round_file.get_rounds() == []
+    assert len(round_file.slice_rounds(0, PHASE_OFFSET)) == 0
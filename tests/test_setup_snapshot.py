@@ -0,0 +1,64 @@
+from scripts.setup_snapshot import (
+    SetupSnapshot,
+    to_plain,
+)
+
+# pure python tests, no chain interaction
+
+
+class FakeReturnValue(tuple):
+
+    def __new__(cls, values:dict):
+        value = super().__new__(cls, values.values())
+        value.names = list(values.keys())
+        return value
+
+    def dict(self):
+        return dict(zip(self.names, self))
+
+
+def test_setup_snapshot_to_plain():
+    info = FakeReturnValue({'id': 3, 'price': 99000000})
+    event = FakeReturnValue({'newEvent': True, 'priceInfo': info, 'timeSinceEvent': 120})
+
+    assert to_plain(None) is None
+    assert to_plain(True) is True
+    assert to_plain(42) == 42
+    assert to_plain(b'\x00\x01') == '0x0001'
+    assert to_plain((1, [2, b'\xff'])) == [1, [2, '0xff']]
+    assert to_plain(event) == {'newEvent': True, 'priceInfo': {'id': 3, 'price': 99000000}, 'timeSinceEvent': 120}
+    assert to_plain(FakeReturnValue({})) == []
+
+
+def test_setup_snapshot_diff_and_json(tmp_path):
+    previous = SetupSnapshot(1, 100, 1680000000, {
+        'riskpool.balance': 1000,
+        'riskpool.bundles': 2,
+        'staking.stake_balance': None,
+        'feeder.info': {'id': 3}})
+
+    snapshot = SetupSnapshot(1, 110, 1680000120, {
+        'riskpool.balance': 1200,
+        'riskpool.bundles': 2,
+        'staking.stake_balance': 5,
+        'feeder.info': {'id': 4},
+        'nft.name': 'nft'})
+
+    assert snapshot.diff(previous) == {
+        'feeder.info': ({'id': 3}, {'id': 4}),
+        'nft.name': (None, 'nft'),
+        'riskpool.balance': (1000, 1200),
+        'staking.stake_balance': (None, 5)}
+
+    assert previous.diff(previous) == {}
+    assert 'nft.name' in snapshot and 'nft.name' not in previous
+    assert snapshot['riskpool.bundles'] == 2
+    assert previous.get('nft.name', 'n/a') == 'n/a'
+
+    file_name = str(tmp_path / 'snapshot.json')
+    snapshot.save(file_name)
+    restored = SetupSnapshot.load(file_name)
+
+    assert restored.to_dict() == snapshot.to_dict()
+    assert restored.diff(snapshot) == {}
+    assert SetupSnapshot.from_json(previous.to_json()).block_number == 100
@@ -0,0 +1,175 @@
+import pytest
+
+from brownie import (
+    chain,
+    interface,
+    web3,
+    Multicall3,
+)
+
+from scripts.multicall import Multicall
+
+from scripts.setup import (
+    create_bundle,
+    apply_for_policy_with_bundle,
+)
+
+from server_processor.wallet_index import (
+    WalletIndex,
+    get_deploy_block,
+)
+
+GANACHE = 1337
+
+# enforce function isolation for tests below
+@pytest.fixture(autouse=True)
+def isolation(fn_isolation):
+    pass
+
+
+def get_wallet_index(product, instanceService, multicall3:Multicall3) -> WalletIndex:
+    wallet_index = WalletIndex(3600)
+    wallet_index.connect(product, instanceService, Multicall(multicall3.address, chunk_size=2))
+    return wallet_index
+
+
+def test_wallet_index_seed(
+    multicall3: Multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    product,
+    riskpool,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    tf = 10 ** interface.IERC20Metadata(product.getProtectedToken()).decimals()
+    bundle_id = create_bundle(
+        instance,
+        instanceOperator,
+        investor,
+        riskpool,
+        funding=30000,
+        minProtectedBalance=2000,
+        maxProtectedBalance=10000)
+
+    # 2 policies for protected wallet, customer protects its own wallet with the 3rd one
+    process_ids = [
+        str(apply_for_policy_with_bundle(instance, instanceOperator, product, holder, bundle_id, wallet, 5000, 60, 80)).lower()
+        for (holder, wallet) in [(customer, protectedWallet), (customer2, protectedWallet), (customer, None)]]
+
+    wallet_index = get_wallet_index(product, instanceService, multicall3)
+    assert not wallet_index.is_seeded()
+
+    with pytest.raises(RuntimeError):
+        wallet_index.update()
+
+    wallet_index.seed()
+    assert wallet_index.is_seeded()
+    assert wallet_index.last_block == web3.eth.block_number
+
+    # seeding starts at the product deploy block
+    deploy_block = get_deploy_block(product.address)
+    assert wallet_index.from_block == deploy_block
+    assert len(web3.eth.get_code(product.address, block_identifier=deploy_block)) > 0
+    assert len(web3.eth.get_code(product.address, block_identifier=deploy_block - 1)) == 0
+
+    assert wallet_index.get_stats() == {
+        'block': wallet_index.last_block,
+        'applications': 3,
+        'holders': 2,
+        'wallets': 2,
+    }
+
+    application = wallet_index.get_application(process_ids[0].upper().replace('0X', '0x'))
+    assert application['processId'] == process_ids[0]
+    assert application['policyHolder'] == customer.address
+    assert application['protectedWallet'] == protectedWallet.address
+    assert application['protectedBalance'] == 5000 * tf
+    assert application['duration'] == 60 * 24 * 3600
+    assert application['bundleId'] == bundle_id
+    assert application['blockNumber'] > deploy_block
+
+    # holder and protected wallet lookups, case insensitive
+    assert wallet_index.get_process_ids_by_holder(customer.address.lower()) == [process_ids[0], process_ids[2]]
+    assert wallet_index.get_process_ids_by_holder(customer2.address) == [process_ids[1]]
+    assert wallet_index.get_process_ids_by_wallet(protectedWallet.address) == process_ids[:2]
+    assert wallet_index.get_process_ids_by_wallet(customer2.address) == []
+
+    wallet = wallet_index.get_wallet(protectedWallet.address)
+    assert wallet['holder'] == []
+    assert wallet['protected'] == process_ids[:2]
+    assert sorted(wallet['applications'].keys()) == sorted(process_ids[:2])
+
+    # holder == protected wallet: application is listed in both roles
+    wallet = wallet_index.get_wallet(customer.address)
+    assert wallet['holder'] == [process_ids[0], process_ids[2]]
+    assert wallet['protected'] == [process_ids[2]]
+    assert sorted(wallet['applications'].keys()) == sorted([process_ids[0], process_ids[2]])
+
+    # log tail picks up new applications
+    process_id = str(apply_for_policy_with_bundle(instance, instanceOperator, product, customer2, bundle_id, customer2, 5000, 60, 80)).lower()
+    wallet_index.update()
+    assert wallet_index.last_block == web3.eth.block_number
+    assert wallet_index.get_process_ids_by_holder(customer2.address) == [process_ids[1], process_id]
+    assert wallet_index.get_process_ids_by_wallet(customer2.address) == [process_id]
+    assert wallet_index.get_stats()['applications'] == 4
+
+
+# chain.snapshot() replaces the fn_isolation snapshot, keep this test last in the module
+def test_wallet_index_resync(
+    multicall3: Multicall3,
+    instance,
+    instanceService,
+    instanceOperator,
+    investor,
+    customer,
+    customer2,
+    protectedWallet,
+    product,
+    riskpool,
+):
+    if web3.chain_id != GANACHE:
+        print('unsupported test case for chain_id {}'.format(web3.chain_id))
+        return
+
+    bundle_id = create_bundle(
+        instance,
+        instanceOperator,
+        investor,
+        riskpool,
+        funding=30000,
+        minProtectedBalance=2000,
+        maxProtectedBalance=10000)
+
+    process_id = str(apply_for_policy_with_bundle(instance, instanceOperator, product, customer, bundle_id, protectedWallet, 5000, 60, 80)).lower()
+
+    wallet_index = get_wallet_index(product, instanceService, multicall3)
+    wallet_index.seed()
+    chain.snapshot()
+
+    # application in blocks that are reverted afterwards
+    reverted_id = str(apply_for_policy_with_bundle(instance, instanceOperator, product, customer2, bundle_id, protectedWallet, 5000, 60, 80)).lower()
+    wallet_index.update()
+    assert wallet_index.get_process_ids_by_wallet(protectedWallet.address) == [process_id, reverted_id]
+
+    # reorg: the application is gone and another one takes its place
+    # (process ids are derived from a counter, the replacing application may reuse the reverted id)
+    chain.revert()
+    replacing_id = str(apply_for_policy_with_bundle(instance, instanceOperator, product, customer, bundle_id, customer, 5000, 60, 80)).lower()
+
+    wallet_index.resync()
+    assert wallet_index.last_block == web3.eth.block_number
+    assert wallet_index.get_application(replacing_id)['policyHolder'] == customer.address
+    assert wallet_index.get_application(replacing_id)['protectedWallet'] == customer.address
+    assert wallet_index.get_process_ids_by_holder(customer2.address) == []
+    assert wallet_index.get_process_ids_by_wallet(protectedWallet.address) == [process_id]
+    assert wallet_index.get_process_ids_by_holder(customer.address) == [process_id, replacing_id]
+    assert wallet_index.get_process_ids_by_wallet(customer.address) == [replacing_id]
+    assert wallet_index.get_stats()['applications'] == 2